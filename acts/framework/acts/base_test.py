@@ -14,21 +14,30 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import logging
+import copy
 import os
 import traceback
 from concurrent.futures import ThreadPoolExecutor
 
 from acts import asserts
+from acts import checkpoint
+from acts import device_pool
+from acts import diagnostics_queue
 from acts import keys
+from acts import log_accounting
 from acts import logger
+from acts import profiler
 from acts import records
 from acts import signals
+from acts import test_order
 from acts import tracelogger
 from acts import utils
 
 # Macro strings for test result reporting
 TEST_CASE_TOKEN = "[Test Case]"
 RESULT_LINE_TEMPLATE = TEST_CASE_TOKEN + " %s %s"
+# The collapsed stack file the test profiles are appended to.
+PROFILE_FILE_NAME = "test_profile.collapsed"
 
 
 class Error(Exception):
@@ -57,6 +66,9 @@ class BaseTestClass(object):
     """
 
     TAG = None
+    # The estimated cost, e.g. in seconds, of changing each of the setup keys
+    # returned by get_setup_keys.
+    setup_key_costs = ()
 
     def __init__(self, configs):
         self.tests = []
@@ -66,9 +78,19 @@ class BaseTestClass(object):
         for name, value in configs.items():
             setattr(self, name, value)
         self.results = records.TestResult()
+        # Records are streamed to disk as they are added, if the test runner
+        # provided a stream.
+        self.results.stream_writer = getattr(self, "result_stream_writer",
+                                             None)
         self.current_test_name = None
         self.log = tracelogger.TraceLogger(self.log)
         self.size_limit_reached = False
+        self.diagnostics_queue = None
+        self.profiler = None
+        # The parameters of the generated test case being executed, and the
+        # number of generated test cases executed so far, for checkpoints.
+        self._checkpoint_params = None
+        self._generated_count = 0
         if 'android_devices' in self.__dict__:
             for ad in self.android_devices:
                 if ad.droid:
@@ -170,6 +192,59 @@ class BaseTestClass(object):
         Implementation is optional.
         """
 
+    def setup_device(self, ad):
+        """Setup function for a device leased from the device pool.
+
+        If the user param "parallel_device_pool" is set, test cases are run
+        concurrently, one per android device, on copies of the test class
+        instance. In a copy, self.android_devices only holds the leased
+        device, and attributes referring to the first android device, e.g.
+        self.dut, refer to the leased device instead. This is called on the
+        copy, after setup_class, before it executes any test case. Attributes
+        derived from the device in setup_class should be updated here.
+
+        To signal setup failure, return False or raise an exception. The
+        device then does not execute any test case.
+
+        Implementation is optional.
+
+        Args:
+            ad: The AndroidDevice leased to the copy.
+        """
+
+    def teardown_device(self, ad):
+        """Teardown function for a device leased from the device pool.
+
+        Called on the copy of the test class instance after it executed its
+        last test case, see setup_device.
+
+        Implementation is optional.
+
+        Args:
+            ad: The AndroidDevice leased to the copy.
+        """
+
+    def get_setup_keys(self, test_name):
+        """Describes the device state a test case needs.
+
+        If the user param "reorder_by_setup_keys" is set, test cases are run
+        grouped by their setup keys, so that consecutive test cases share as
+        much setup as possible. See acts.test_order. This is called after
+        setup_class, so the keys can depend on the configs it loads. If it
+        raises, the test cases run in canonical order.
+
+        Implementation is optional.
+
+        Args:
+            test_name: The name of a test case.
+
+        Returns:
+            A tuple of hashable values, ordered from the most to the least
+            expensive to change, e.g. (AP configuration, attenuator path).
+            None if the test case needs no particular setup.
+        """
+        return None
+
     def _setup_test(self, test_name):
         """Proxy function to guarantee the base implementation of setup_test is
         called.
@@ -350,7 +425,8 @@ class BaseTestClass(object):
                        case executed.
         """
         try:
-            func(tr_record)
+            with profiler.span(func.__name__.lstrip("_")):
+                func(tr_record)
         except signals.TestAbortAll:
             raise
         except Exception as e:
@@ -372,6 +448,10 @@ class BaseTestClass(object):
             kwargs: Extra kwargs.
         """
         is_generate_trigger = False
+        generated_count = self._generated_count
+        profile_tree = None
+        if self.profiler:
+            profile_tree = self.profiler.begin_tree(test_name)
         tr_record = records.TestResultRecord(test_name, self.TAG)
         tr_record.test_begin()
         self.begin_time = int(tr_record.begin_time)
@@ -382,19 +462,23 @@ class BaseTestClass(object):
         try:
             try:
                 if hasattr(self, 'android_devices'):
-                    for ad in self.android_devices:
-                        if not ad.is_adb_logcat_on:
-                            ad.start_adb_logcat(cont_logcat_file=True)
-                ret = self._setup_test(self.test_name)
+                    with profiler.span("start_adb_logcat"):
+                        for ad in self.android_devices:
+                            if not ad.is_adb_logcat_on:
+                                ad.start_adb_logcat(cont_logcat_file=True)
+                with profiler.span("setup_test"):
+                    ret = self._setup_test(self.test_name)
                 asserts.assert_true(ret is not False,
                                     "Setup for %s failed." % test_name)
-                if args or kwargs:
-                    verdict = test_func(*args, **kwargs)
-                else:
-                    verdict = test_func()
+                with profiler.span("test"):
+                    if args or kwargs:
+                        verdict = test_func(*args, **kwargs)
+                    else:
+                        verdict = test_func()
             finally:
                 try:
-                    self._teardown_test(self.test_name)
+                    with profiler.span("teardown_test"):
+                        self._teardown_test(self.test_name)
                 except signals.TestAbortAll:
                     raise
                 except Exception as e:
@@ -446,6 +530,18 @@ class BaseTestClass(object):
         finally:
             if not is_generate_trigger:
                 self.results.add_record(tr_record)
+                # A test case that executed generated test cases is run
+                # again on resume, so the generated ones that did not
+                # complete are run again.
+                if self._generated_count == generated_count:
+                    self._checkpoint_record(tr_record)
+            # Make sure the logs of this test case are on disk before the
+            # next one starts.
+            logger.flush_test_logger()
+            if profile_tree:
+                # Trigger tests of generated tests are not reported.
+                self.profiler.end_tree(
+                    profile_tree, keep=not is_generate_trigger)
 
     def run_generated_testcases(self,
                                 test_func,
@@ -454,7 +550,8 @@ class BaseTestClass(object):
                                 kwargs=None,
                                 tag="",
                                 name_func=None,
-                                format_args=False):
+                                format_args=False,
+                                setup_key_func=None):
         """Runs generated test cases.
 
         Generated test cases are not written down as functions, but as a list
@@ -478,6 +575,11 @@ class BaseTestClass(object):
                        truncated.
             format_args: If True, args will be appended as the first argument
                          in the args list passed to test_func.
+            setup_key_func: A function that takes a setting and returns its
+                            setup keys, see get_setup_keys. If provided and
+                            the user param "reorder_by_setup_keys" is set,
+                            the settings are run grouped by setup keys and
+                            reported in the order they were given.
 
         Returns:
             A list of settings that did not pass.
@@ -486,9 +588,8 @@ class BaseTestClass(object):
         kwargs = kwargs or {}
         failed_settings = []
 
-        for setting in settings:
-            test_name = "{} {}".format(tag, setting)
-
+        def get_test_name(setting):
+            test_name = "{} {}".format(tag, checkpoint.stable_str(setting))
             if name_func:
                 try:
                     test_name = name_func(setting, *args, **kwargs)
@@ -496,25 +597,65 @@ class BaseTestClass(object):
                     self.log.exception(("Failed to get test name from "
                                         "test_func. Fall back to default %s"),
                                        test_name)
+            return test_name
+
+        order = None
+        if setup_key_func:
+            settings = list(settings)
+            order = self._get_test_order(
+                [get_test_name(s) for s in settings],
+                lambda i: setup_key_func(settings[i]),
+                "%s %s Test Order" % (self.TAG, tag))
+        if not order:
+            for setting in settings:
+                if not self._run_generated_testcase(
+                        test_func, setting, get_test_name(setting), args,
+                        kwargs, format_args):
+                    failed_settings.append(setting)
+            return failed_settings
+
+        failed = set()
+        with test_order.CanonicalOrderBuffer(self.results) as order_buffer:
+            for i in order:
+                order_buffer.current_index = i
+                if not self._run_generated_testcase(
+                        test_func, settings[i], get_test_name(settings[i]),
+                        args, kwargs, format_args):
+                    failed.add(i)
+        return [settings[i] for i in sorted(failed)]
+
+    def _run_generated_testcase(self, test_func, setting, test_name, args,
+                                kwargs, format_args):
+        """Runs one generated test case.
+
+        Returns:
+            True if the test case passed.
+        """
+        self.results.requested.append(test_name)
 
-            self.results.requested.append(test_name)
+        if len(test_name) > utils.MAX_FILENAME_LEN:
+            test_name = test_name[:utils.MAX_FILENAME_LEN]
 
-            if len(test_name) > utils.MAX_FILENAME_LEN:
-                test_name = test_name[:utils.MAX_FILENAME_LEN]
+        completed = self._completed_result(test_name, setting)
+        if completed is not None:
+            # The setting passed only if its carried over record did.
+            return completed == records.TestResultEnums.TEST_RESULT_PASS
+        self._generated_count += 1
 
-            previous_success_cnt = len(self.results.passed)
+        previous_success_cnt = len(self.results.passed)
 
+        self._checkpoint_params = setting
+        try:
             if format_args:
                 self.exec_one_testcase(test_name, test_func,
                                        args + (setting,), **kwargs)
             else:
                 self.exec_one_testcase(test_name, test_func,
                                        (setting,) + args, **kwargs)
+        finally:
+            self._checkpoint_params = None
 
-            if len(self.results.passed) - previous_success_cnt != 1:
-                failed_settings.append(setting)
-
-        return failed_settings
+        return len(self.results.passed) - previous_success_cnt == 1
 
     def _exec_func(self, func, *args):
         """Executes a function with exception safeguard.
@@ -608,6 +749,8 @@ class BaseTestClass(object):
             tests: The tests to block.
         """
         for test_name, test_func in tests:
+            if self._skip_completed(test_name):
+                continue
             signal = signals.TestBlocked("Failed class setup")
             record = records.TestResultRecord(test_name, self.TAG)
             record.test_begin()
@@ -617,6 +760,40 @@ class BaseTestClass(object):
             self.results.add_record(record)
             self._on_blocked(record)
 
+    def _get_test_order(self, test_names, key_func, extras_key):
+        """Computes the execution order of test cases from their setup keys.
+
+        Args:
+            test_names: The names of the test cases, in canonical order.
+            key_func: A function that takes an index into test_names and
+                      returns the setup keys of that test case.
+            extras_key: The result extras key to report the reordering under.
+
+        Returns:
+            A list of indices into test_names in execution order, or None if
+            the test cases should run in canonical order, including when
+            key_func raised.
+        """
+        if not self.user_params.get("reorder_by_setup_keys", False):
+            return None
+        try:
+            setup_keys = [key_func(i) for i in range(len(test_names))]
+        except Exception:
+            self.log.warning("Failed to get the setup keys for %s, running "
+                             "test cases in canonical order.", extras_key,
+                             exc_info=True)
+            return None
+        if all(k is None for k in setup_keys):
+            return None
+        order = test_order.order_by_setup_keys(setup_keys)
+        summary = test_order.summarize(test_names, setup_keys, order,
+                                       self.setup_key_costs)
+        self.log.info("Reordered %s test cases by setup keys, estimated "
+                      "setup time saved: %s.", len(test_names),
+                      summary["Estimated Setup Time Saved"])
+        self.results.set_extra_data(extras_key, summary)
+        return order
+
     def run(self, test_names=None, test_case_iterations=1):
         """Runs test cases within a test class by the order they appear in the
         execution list.
@@ -648,22 +825,48 @@ class BaseTestClass(object):
                 test_names = self._get_all_test_names()
         self.results.requested = test_names
         tests = self._get_test_funcs(test_names)
+        if self.user_params.get(keys.Config.key_profile_tests.value, False):
+            self.profiler = profiler.Profiler()
+            self.profiler.start()
         # A TestResultRecord used for when setup_class fails.
         # Setup for the class.
         try:
-            if self._setup_class() is False:
+            if self._exec_profiled(self._setup_class) is False:
                 self.log.error("Failed to setup %s.", self.TAG)
                 self._block_all_test_cases(tests)
+                self._drain_diagnostics()
+                self._collect_profile()
                 return self.results
         except Exception as e:
             self.log.exception("Failed to setup %s.", self.TAG)
-            self._exec_func(self.teardown_class)
+            self._exec_profiled(self._exec_func, self.teardown_class)
             self._block_all_test_cases(tests)
+            self._drain_diagnostics()
+            self._collect_profile()
             return self.results
-        # Run tests in order.
+        # Run tests in order. Reordered tests are still reported in canonical
+        # order. The setup keys may depend on the state built by setup_class.
+        order_buffer = None
         try:
-            for test_name, test_func in tests:
+            order = self._get_test_order(
+                [name for name, _ in tests],
+                lambda i: self.get_setup_keys(tests[i][0]),
+                "%s Test Order" % self.TAG)
+            if order:
+                order_buffer = test_order.CanonicalOrderBuffer(self.results)
+                order_buffer.start()
+            pool = self._get_device_pool()
+            if pool:
+                self._run_on_device_pool(pool, tests, order,
+                                         test_case_iterations)
+                return self.results
+            for i in order or range(len(tests)):
+                test_name, test_func = tests[i]
+                if order_buffer:
+                    order_buffer.current_index = i
                 for _ in range(test_case_iterations):
+                    if self._skip_completed(test_name):
+                        continue
                     self.exec_one_testcase(test_name, test_func, self.cli_args)
             return self.results
         except signals.TestAbortClass:
@@ -674,7 +877,11 @@ class BaseTestClass(object):
             setattr(e, "results", self.results)
             raise e
         finally:
-            self._exec_func(self.teardown_class)
+            if order_buffer:
+                order_buffer.stop()
+            self._exec_profiled(self._exec_func, self.teardown_class)
+            self._drain_diagnostics()
+            self._collect_profile()
             self.log.info("Summary for test class %s: %s", self.TAG,
                           self.results.summary_str())
 
@@ -731,8 +938,15 @@ class BaseTestClass(object):
                 self.user_params.get("soft_output_size_limit") or "invalid")
             log_path = getattr(logging, "log_path", None)
             if log_path:
-                curr_log_size = utils.get_directory_size(log_path)
-                if curr_log_size > max_log_size:
+                # Artifacts are accounted as they are written, so this only
+                # walks the log directory once per reconcile interval.
+                accountant = log_accounting.get_accountant(
+                    log_path,
+                    reconcile_interval=int(
+                        self.user_params.get(
+                            "log_size_reconcile_interval",
+                            log_accounting.DEFAULT_RECONCILE_INTERVAL)))
+                if accountant.exceeds(max_log_size):
                     self.log.info(
                         "Skipping bug report, as we've reached the size limit."
                     )
@@ -742,10 +956,242 @@ class BaseTestClass(object):
             pass
         return False
 
+    def _get_diagnostics_queue(self):
+        """Returns the background diagnostics queue of this test class.
+
+        The queue is only used if the user param "async_diagnostics" is set.
+
+        Returns:
+            A diagnostics_queue.DiagnosticsQueue, or None if diagnostics
+            should be collected synchronously.
+        """
+        if not self.user_params.get("async_diagnostics", False):
+            return None
+        if not self.diagnostics_queue:
+            max_tasks = int(
+                self.user_params.get(
+                    "diagnostics_max_tasks_per_device",
+                    diagnostics_queue.DEFAULT_MAX_TASKS_PER_DEVICE))
+            self.diagnostics_queue = diagnostics_queue.DiagnosticsQueue(
+                max_tasks_per_device=max_tasks, log=self.log)
+        return self.diagnostics_queue
+
+    def _drain_diagnostics(self):
+        """Waits for queued diagnostics to finish and reports their timing.
+
+        The time spent waiting in the queue and collecting the diagnostics is
+        written to the test result extras, separately from the test times.
+        """
+        if not self.diagnostics_queue:
+            return
+        timeout = self.user_params.get("diagnostics_drain_timeout")
+        self.diagnostics_queue.shutdown(timeout)
+        summary = self.diagnostics_queue.summary_dict()
+        self.log.info(
+            "Diagnostics for %s: %s tasks, queue time %ss, run time %ss.",
+            self.TAG, len(summary["Tasks"]), summary["Total Queue Time"],
+            summary["Total Run Time"])
+        self.results.set_extra_data("%s Diagnostics" % self.TAG, summary)
+        self.diagnostics_queue = None
+
+    def _get_device_pool(self):
+        """Gets the android devices to run test cases concurrently on.
+
+        The user param "parallel_device_pool" is either True, to use all
+        android devices, or the maximum number of devices to use.
+
+        Returns:
+            A list of at least two android devices, or None if test cases
+            should run one at a time.
+        """
+        pool_size = self.user_params.get("parallel_device_pool", False)
+        if not pool_size:
+            return None
+        devices = list(getattr(self, "android_devices", []))
+        if not isinstance(pool_size, bool):
+            devices = devices[:int(pool_size)]
+        if len(devices) < 2:
+            return None
+        return devices
+
+    def _clone_for_device(self, ad, stream_writer):
+        """Creates the copy of this instance that runs test cases on ad.
+
+        Args:
+            ad: The AndroidDevice leased to the copy.
+            stream_writer: The stream writer of the copy's results.
+
+        Returns:
+            A shallow copy of this instance, see setup_device.
+        """
+        worker = copy.copy(self)
+        first = self.android_devices[0]
+        for name, value in vars(self).items():
+            if value is first:
+                setattr(worker, name, ad)
+        worker.android_devices = [ad]
+        worker.results = records.TestResult()
+        worker.results.stream_writer = stream_writer
+        worker.log = logger.create_tagged_trace_logger(ad.serial)
+        worker.current_test_name = None
+        # Diagnostics are queued to the queue of this instance, which is
+        # drained at the end of the class.
+        worker.diagnostics_queue = self._get_diagnostics_queue()
+        # Span trees are only recorded for test cases run on the main
+        # thread, the spans of the workers are background spans.
+        worker.profiler = None
+        worker._checkpoint_params = None
+        worker._generated_count = 0
+        return worker
+
+    def _run_on_device_pool(self, pool, tests, order, test_case_iterations):
+        """Runs test cases concurrently, one per device of the pool.
+
+        Records are reported in the same order as if the test cases ran one
+        at a time.
+
+        Args:
+            pool: The android devices to lease, see _get_device_pool.
+            tests: A list of (test name, test function) tuples.
+            order: The execution order, or None for the order of tests.
+            test_case_iterations: The number of times to run each test case.
+        """
+        work = []
+        for i in order or range(len(tests)):
+            for iteration in range(test_case_iterations):
+                if not self._skip_completed(tests[i][0]):
+                    # Indexed by canonical position, then by iteration.
+                    work.append(((i, iteration), ) + tuple(tests[i]))
+        self.log.info("Running %d test cases on a pool of %d devices.",
+                      len(work), len(pool))
+        runner = device_pool.DevicePoolRunner(self, pool)
+        remaining = runner.run(work)
+        if remaining:
+            self.log.error("No device of the pool could be set up.")
+            self._block_all_test_cases([item[1:] for item in remaining])
+
+    def _completed_result(self, test_name, params=None):
+        """Gets the result of a test case completed by the resumed run.
+
+        Args:
+            test_name: The name of the test case.
+            params: The setting of a generated test case.
+
+        Returns:
+            The result of the record carried over from the resumed run by the
+            test runner, or None if the test case should be executed.
+        """
+        run_checkpoint = getattr(self, "run_checkpoint", None)
+        if not run_checkpoint:
+            return None
+        result = run_checkpoint.completed_result(self.TAG, test_name, params)
+        if result is not None:
+            self.log.info("%s %s was completed by the resumed run with %s, "
+                          "skipping.", TEST_CASE_TOKEN, test_name, result)
+        return result
+
+    def _skip_completed(self, test_name, params=None):
+        """Checks whether a test case was completed by the resumed run.
+
+        Args:
+            test_name: The name of the test case.
+            params: The setting of a generated test case.
+
+        Returns:
+            True if the test case should not be executed again. Its record
+            was carried over from the resumed run by the test runner.
+        """
+        return self._completed_result(test_name, params) is not None
+
+    def _checkpoint_record(self, record):
+        """Checkpoints the record of a test case, in checkpoint mode."""
+        run_checkpoint = getattr(self, "run_checkpoint", None)
+        if not run_checkpoint:
+            return
+        try:
+            run_checkpoint.add_record(record, self._checkpoint_params)
+        except (IOError, OSError):
+            self.log.exception("Failed to checkpoint %s.", record.test_name)
+
+    def _exec_profiled(self, func, *args):
+        """Executes a class level function, recording its own span tree.
+
+        Args:
+            func: The function to execute. If it is _exec_func, the span tree
+                  is named after the function it executes.
+            args: The arguments to call func with.
+
+        Returns:
+            The return value of func.
+        """
+        if not self.profiler:
+            return func(*args)
+        name = (args[0] if func == self._exec_func else func).__name__
+        profile_tree = self.profiler.begin_tree(name.lstrip("_"))
+        try:
+            return func(*args)
+        finally:
+            self.profiler.end_tree(profile_tree)
+
+    def _collect_profile(self):
+        """Stops the profiler and reports the recorded span trees.
+
+        The merged call trees of each test case are written to the test
+        result extras, and the self time of each call stack is appended to a
+        collapsed stack file in the log path, for use with flame graph tools.
+        """
+        if not self.profiler:
+            return
+        self.profiler.stop()
+        self.results.set_extra_data("%s Profile" % self.TAG,
+                                    self.profiler.to_dict())
+        path = os.path.join(self.log_path, PROFILE_FILE_NAME)
+        try:
+            self.profiler.write_collapsed(path, prefix=(self.TAG, ))
+        except IOError:
+            self.log.exception("Failed to write the profile of %s to %s.",
+                               self.TAG, path)
+        self.profiler = None
+
+    def _ad_finish_bugreport(self, ad, capture, begin_time):
+        try:
+            ad.finish_bug_report(capture)
+            return True
+        except Exception as e:
+            ad.log.error("bugreport error: %s, taking it again.", e)
+        return self._ad_take_bugreport(ad, capture.test_name, begin_time)
+
     def _take_bug_report(self, test_name, begin_time):
+        """Takes bug reports and extra logs on all the android devices.
+
+        With the user param "async_diagnostics" set, the bug reports are
+        started right away, so they capture the state of the devices at the
+        failure, and the diagnostics queue waits for them and pulls them.
+        Crash reports and QXDM logs are collected by the queue, from the
+        files written since begin_time.
+        """
         if self._skip_bug_report():
             return
 
+        queue = self._get_diagnostics_queue()
+        if queue:
+            for ad in getattr(self, 'android_devices', []):
+                try:
+                    capture = ad.start_bug_report(test_name, begin_time)
+                except Exception as e:
+                    ad.log.error("Failed to start bugreport: %s", e)
+                    queue.submit(ad.serial, "bugreport %s" % test_name,
+                                 self._ad_take_bugreport, ad, test_name,
+                                 begin_time)
+                else:
+                    queue.submit(ad.serial, "bugreport %s" % test_name,
+                                 self._ad_finish_bugreport, ad, capture,
+                                 begin_time)
+                queue.submit(ad.serial, "extra logs %s" % test_name,
+                             self._ad_take_extra_logs, ad, test_name,
+                             begin_time)
+            return
+
         executor = ThreadPoolExecutor(max_workers=10)
         for ad in getattr(self, 'android_devices', []):
             executor.submit(self._ad_take_bugreport, ad, test_name, begin_time)
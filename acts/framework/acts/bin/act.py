@@ -24,6 +24,7 @@ import traceback
 
 from acts import config_parser
 from acts import keys
+from acts import sharding
 from acts import signals
 from acts import test_runner
 
@@ -113,6 +114,27 @@ def _run_tests_parallel(parsed_configs, test_identifiers, repeat):
             return False
 
 
+def _run_tests_sharded(parsed_configs, test_identifiers, repeat):
+    """Executes requested tests once, spread over all testbeds.
+
+    Idle testbeds pull the next test case (or test class, if no test cases
+    are specified) from a shared queue, see acts.sharding.
+
+    Args:
+        parsed_configs: A list of dicts, each is a set of configs for one
+                        test_runner.TestRunner.
+        test_identifiers: A list of tuples, each identifies what test case to
+                          run on what test class.
+        repeat: Number of times to iterate the specified tests.
+
+    Returns:
+        True if all test runs executed successfully, False otherwise.
+    """
+    print("Sharding tests across {} testbeds.".format(len(parsed_configs)))
+    results = sharding.run_sharded(parsed_configs, test_identifiers, repeat)
+    return results.is_all_pass
+
+
 def _run_tests_sequential(parsed_configs, test_identifiers, repeat):
     """Executes requested tests sequentially.
 
@@ -171,6 +193,12 @@ def main(argv):
         action="store_true",
         help=("If set, tests will be executed on all testbeds in parallel. "
               "Otherwise, tests are executed iteratively testbed by testbed."))
+    parser.add_argument(
+        '-s',
+        '--shard',
+        action="store_true",
+        help=("If set with --parallel, the requested tests are run once, "
+              "spread over all testbeds, instead of once per testbed."))
     parser.add_argument(
         '-ci',
         '--campaign_iterations',
@@ -229,6 +257,18 @@ def main(argv):
         nargs='?',
         type=int,
         help="Number of times to run every test case.")
+    parser.add_argument(
+        '--checkpoint',
+        action="store_true",
+        help=("If set, completed test cases are recorded durably as they "
+              "finish, so the run can be resumed with --resume."))
+    parser.add_argument(
+        '--resume',
+        type=str,
+        metavar="<PATH>",
+        help=("Log path of an interrupted run to resume. Test cases it "
+              "completed are not executed again and their records are "
+              "merged into the results. Implies --checkpoint."))
 
     args = parser.parse_args(argv)
     test_list = None
@@ -239,11 +279,20 @@ def main(argv):
     parsed_configs = config_parser.load_test_config_file(
         args.config[0], args.testbed, args.testpaths, args.logpath,
         args.test_args, args.random, args.test_case_iterations)
+    for parsed_config in parsed_configs:
+        if args.checkpoint or args.resume:
+            parsed_config[keys.Config.key_checkpoint.value] = True
+        if args.resume:
+            parsed_config[keys.Config.key_resume_from.value] = args.resume
     # Prepare args for test runs
     test_identifiers = config_parser.parse_test_list(test_list)
 
     # Execute test runners.
-    if args.parallel and len(parsed_configs) > 1:
+    if args.parallel and args.shard and len(parsed_configs) > 1:
+        print('Running tests sharded across testbeds.')
+        exec_result = _run_tests_sharded(parsed_configs, test_identifiers,
+                                         args.campaign_iterations)
+    elif args.parallel and len(parsed_configs) > 1:
         print('Running tests in parallel.')
         exec_result = _run_tests_parallel(parsed_configs, test_identifiers,
                                           args.campaign_iterations)
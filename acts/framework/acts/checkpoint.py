@@ -0,0 +1,246 @@
+#!/usr/bin/env python3.4
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Checkpoints of completed test cases, used to resume interrupted runs.
+
+In checkpoint mode, every test case that completes, i.e. passes or is
+skipped, is appended to a checkpoint file in the log path of the run, and the
+file is fsync'ed before the next test case starts. A test case is identified
+by its test class, its name and a digest of its parameters, for generated
+test cases.
+
+A run resumed from the log path of a previous run starts with the records of
+the test cases completed in that run, and does not execute them again. Test
+cases that failed, or never finished, are executed again. The resumed run
+writes its own checkpoint, which includes the inherited records, so it can be
+resumed in turn.
+"""
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+from acts import records
+
+CHECKPOINT_FILE_NAME = "test_run_checkpoint.jsonl"
+# Results for which a test case does not need to be executed again.
+COMPLETED_RESULTS = (records.TestResultEnums.TEST_RESULT_PASS,
+                     records.TestResultEnums.TEST_RESULT_SKIP)
+
+_ENTRY_PARAMS = "Params"
+_ENTRY_RECORD = "Record"
+_ADDRESS_REGEX = re.compile(r" at 0x[0-9a-fA-F]+")
+
+
+def stable_str(obj):
+    """Gets str(obj), without the memory addresses of default object reprs.
+
+    Used for names of generated test cases, which need to be the same in a
+    resumed run.
+    """
+    return _ADDRESS_REGEX.sub("", str(obj))
+
+
+def _canonical(obj):
+    if isinstance(obj, dict):
+        return [[_canonical(k), _canonical(v)]
+                for k, v in sorted(obj.items(), key=lambda i: repr(i[0]))]
+    if isinstance(obj, (set, frozenset)):
+        return sorted((_canonical(o) for o in obj), key=repr)
+    if isinstance(obj, (list, tuple)):
+        return [_canonical(o) for o in obj]
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    return _ADDRESS_REGEX.sub("", repr(obj))
+
+
+def params_digest(params):
+    """Gets a digest of test parameters that is stable across runs.
+
+    Dictionaries and sets are digested independently of their order, and
+    the memory addresses of default object reprs are ignored.
+
+    Args:
+        params: The parameters of a test case, e.g. the setting of a
+                generated test case, or None.
+
+    Returns:
+        A hex digest string, or None if params is None.
+    """
+    if params is None:
+        return None
+    canonical = json.dumps(_canonical(params), sort_keys=True)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+def find_checkpoint(log_dir, testbed_name=None):
+    """Finds the checkpoint file of a previous run.
+
+    Args:
+        log_dir: The log path of the previous run, or the root log path, in
+                 which case the latest run of testbed_name is used.
+        testbed_name: The name of the testbed of the run to resume.
+
+    Returns:
+        The path of the checkpoint file, or None if there is none.
+    """
+    path = os.path.join(log_dir, CHECKPOINT_FILE_NAME)
+    if os.path.isfile(path):
+        return path
+    if not testbed_name:
+        return None
+    testbed_dir = os.path.join(log_dir, testbed_name)
+    if not os.path.isdir(testbed_dir):
+        return None
+    # Run directories are named by their start time, so the latest run sorts
+    # last.
+    for run_dir in sorted(os.listdir(testbed_dir), reverse=True):
+        path = os.path.join(testbed_dir, run_dir, CHECKPOINT_FILE_NAME)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def load_checkpoint(path):
+    """Reads the completed test cases of a checkpoint file.
+
+    A partially written last line, e.g. from a host crash, is skipped.
+
+    Args:
+        path: The path of a checkpoint file.
+
+    Returns:
+        A list of (params digest, TestResultRecord) tuples.
+    """
+    entries = []
+    for entry in records.iter_streamed_records(path):
+        try:
+            record = records.TestResultRecord.from_dict(entry[_ENTRY_RECORD])
+        except (KeyError, TypeError):
+            logging.warning("Skipping malformed entry in %s: %s", path, entry)
+            continue
+        entries.append((entry.get(_ENTRY_PARAMS), record))
+    return entries
+
+
+class Checkpoint(object):
+    """Appends completed test cases to a checkpoint file.
+
+    Attributes:
+        path: The path of the checkpoint file.
+    """
+
+    def __init__(self, path, inherited=()):
+        """Creates a checkpoint.
+
+        Args:
+            path: The path of the checkpoint file to append to.
+            inherited: A list of (params digest, TestResultRecord) tuples of
+                       the test cases completed by a resumed run, see
+                       load_checkpoint.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a")
+        # The results of the remaining completions of each test case, so
+        # that repeated test cases are resumed correctly.
+        self._completed = collections.defaultdict(collections.deque)
+        for digest, record in inherited:
+            self._completed[self._key(record.test_class, record.test_name,
+                                      digest)].append(record.result)
+            self._write(digest, record)
+        self._sync()
+
+    @staticmethod
+    def _key(test_class, test_name, digest):
+        return (test_class, test_name, digest)
+
+    def _write(self, digest, record):
+        self._file.write(
+            json.dumps({
+                _ENTRY_PARAMS: digest,
+                _ENTRY_RECORD: record.to_dict()
+            }) + "\n")
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def completed_result(self, test_class, test_name, params=None):
+        """Gets the result of a test case completed by the resumed run.
+
+        Each completion is only counted once, so a test case executed several
+        times is executed again as many times as it did not complete.
+
+        Args:
+            test_class: The name of the test class.
+            test_name: The name of the test case.
+            params: The parameters of the test case, see params_digest.
+
+        Returns:
+            The result of the carried over record, one of COMPLETED_RESULTS,
+            or None if the test case should be executed again.
+        """
+        key = self._key(test_class, test_name, params_digest(params))
+        with self._lock:
+            completions = self._completed.get(key)
+            if completions:
+                return completions.popleft()
+        return None
+
+    def is_completed(self, test_class, test_name, params=None):
+        """Checks whether a test case was completed by the resumed run.
+
+        See completed_result.
+
+        Returns:
+            True if the test case should not be executed again.
+        """
+        return self.completed_result(test_class, test_name,
+                                     params) is not None
+
+    def add_record(self, record, params=None):
+        """Checkpoints a record, if its test case completed.
+
+        The checkpoint is on disk when this returns.
+
+        Args:
+            record: The TestResultRecord of a test case that finished.
+            params: The parameters of the test case, see params_digest.
+        """
+        if record.result not in COMPLETED_RESULTS:
+            return
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                self._write(params_digest(params), record)
+            except TypeError:
+                logging.exception("Record of %s is not JSON serializable, it "
+                                  "will not be checkpointed.",
+                                  record.test_name)
+                return
+            self._sync()
+
+    def close(self):
+        """Closes the checkpoint file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
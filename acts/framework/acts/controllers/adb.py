@@ -21,6 +21,7 @@ import re
 import shellescape
 
 from acts import error
+from acts import profiler
 from acts.libs.proc import job
 
 DEFAULT_ADB_TIMEOUT = 60
@@ -180,8 +181,13 @@ class AdbProxy(object):
             return out
 
     def _exec_adb_cmd(self, name, arg_str, **kwargs):
-        return self._exec_cmd(' '.join((self.adb_str, name, arg_str)),
-                              **kwargs)
+        span_name = 'adb %s' % name
+        if name == 'shell' and arg_str:
+            # Name shell spans after the command run, without its arguments.
+            span_name += ' ' + arg_str.split(None, 1)[0].strip('\'"')
+        with profiler.span(span_name):
+            return self._exec_cmd(' '.join((self.adb_str, name, arg_str)),
+                                  **kwargs)
 
     def _exec_cmd_nb(self, cmd, **kwargs):
         """Executes adb commands in a new shell, non blocking.
@@ -266,6 +272,9 @@ class AdbProxy(object):
     def shell_nb(self, command):
         return self._exec_adb_cmd_nb('shell', shellescape.quote(command))
 
+    def bugreport_nb(self, command):
+        return self._exec_adb_cmd_nb('bugreport', command)
+
     def pull(self,
              command,
              ignore_status=False,
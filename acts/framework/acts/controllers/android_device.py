@@ -19,18 +19,23 @@ from builtins import open
 from datetime import datetime
 
 import collections
+import itertools
 import logging
 import math
 import os
 import re
 import socket
+import subprocess
 import time
 
+from acts import log_accounting
 from acts import logger as acts_logger
+from acts import profiler
 from acts import signals
 from acts import tracelogger
 from acts import utils
 from acts.controllers import adb
+from acts.controllers import crash_tracker
 from acts.controllers import fastboot
 from acts.controllers.sl4a_lib import sl4a_manager
 from acts.controllers.utils_lib.ssh import connection
@@ -51,7 +56,11 @@ CRASH_REPORT_SKIPS = ("RAMDUMP_RESERVED", "RAMDUMP_STATUS", "RAMDUMP_OUTPUT",
                       "bluetooth")
 DEFAULT_QXDM_LOG_PATH = "/data/vendor/radio/diag_logs"
 BUG_REPORT_TIMEOUT = 1800
+# The device directory start_bug_report keeps the output of bugreportz in.
+BUG_REPORT_STATUS_DIR = "/data/local/tmp"
 PULL_TIMEOUT = 300
+# Maximum number of files to pull with a single adb pull command.
+PULL_BATCH_SIZE = 50
 PORT_RETRY_COUNT = 3
 IPERF_TIMEOUT = 60
 SL4A_APK_NAME = "com.googlecode.android_scripting"
@@ -61,6 +70,18 @@ DEFAULT_DEVICE_PASSWORD = "1111"
 RELEASE_ID_REGEXES = [re.compile(r'\w+\.\d+\.\d+'), re.compile(r'N\w+')]
 
 
+# A bug report being taken, see AndroidDevice.start_bug_report.
+#   test_name: The name of the test case that triggered the bug report.
+#   out_path: The path the bug report is stored at.
+#   process: The adb process taking the bug report.
+#   status_path: The path of the bugreportz output on the device, None if the
+#                device does not support bugreportz.
+#   start_time: Epoch time in seconds the bug report was started at.
+BugReportCapture = collections.namedtuple(
+    'BugReportCapture',
+    ['test_name', 'out_path', 'process', 'status_path', 'start_time'])
+
+
 class AndroidDeviceError(signals.ControllerError):
     pass
 
@@ -396,9 +417,15 @@ class AndroidDevice:
         self._ssh_connection = ssh_connection
         self.skip_sl4a = False
         self.crash_report = None
+        self.crash_tracker = crash_tracker.CrashTracker(
+            self.adb, CRASH_REPORT_PATHS, CRASH_REPORT_SKIPS, log=self.log)
         self.data_accounting = collections.defaultdict(int)
         self._sl4a_manager = sl4a_manager.Sl4aManager(self.adb)
         self.last_logcat_timestamp = None
+        # The BugReportCapture of the last bug report started, and the
+        # numbers of the status files of start_bug_report.
+        self._bug_report_capture = None
+        self._bug_report_count = itertools.count()
 
     def clean_up(self):
         """Cleans up the AndroidDevice object and releases any resources it
@@ -666,13 +693,6 @@ class AndroidDevice:
         """
         return self._sl4a_manager.sessions[droid.uid].get_event_dispatcher()
 
-    def _is_timestamp_in_range(self, target, log_begin_time, log_end_time):
-        low = acts_logger.logline_timestamp_comparator(log_begin_time,
-                                                       target) <= 0
-        high = acts_logger.logline_timestamp_comparator(log_end_time,
-                                                        target) >= 0
-        return low and high
-
     def cat_adb_log(self, tag, begin_time):
         """Takes an excerpt of the adb logcat log from a certain time point to
         current time.
@@ -697,6 +717,9 @@ class AndroidDevice:
         tag = tag[:tag_len]
         out_name = tag + out_name
         full_adblog_path = os.path.join(adb_excerpt_path, out_name)
+        # Compare integer keys so each line's timestamp is parsed only once.
+        begin_key = acts_logger.logline_timestamp_to_int(log_begin_time)
+        end_key = acts_logger.logline_timestamp_to_int(log_end_time)
         with open(full_adblog_path, 'w', encoding='utf-8') as out:
             in_file = self.adb_logcat_file_path
             with open(in_file, 'r', encoding='utf-8', errors='replace') as f:
@@ -712,8 +735,9 @@ class AndroidDevice:
                     line_time = line[:acts_logger.log_line_timestamp_len]
                     if not acts_logger.is_valid_logline_timestamp(line_time):
                         continue
-                    if self._is_timestamp_in_range(line_time, log_begin_time,
-                                                   log_end_time):
+                    line_key = acts_logger.logline_timestamp_to_int(
+                        line_time)
+                    if begin_key <= line_key <= end_key:
                         in_range = True
                         if not line.endswith('\n'):
                             line += '\n'
@@ -721,6 +745,7 @@ class AndroidDevice:
                     else:
                         if in_range:
                             break
+        log_accounting.account_path(full_adblog_path)
 
     def start_adb_logcat(self, cont_logcat_file=False):
         """Starts a standing adb logcat collection in separate subprocesses and
@@ -871,12 +896,12 @@ class AndroidDevice:
     def start_sl4a(self):
         self._sl4a_manager.start_sl4a_service()
 
-    def take_bug_report(self, test_name, begin_time):
-        """Takes a bug report on the device and stores it in a file.
+    def _prepare_bug_report(self, test_name, begin_time):
+        """Gets the device ready for a bug report and the path to store it at.
 
-        Args:
-            test_name: Name of the test case that triggered this bug report.
-            begin_time: Epoch time when the test started.
+        Returns:
+            A tuple of whether the device supports bugreportz, and the path
+            of the bug report file.
         """
         self.adb.wait_for_device(timeout=WAIT_FOR_DEVICE_TIMEOUT)
         new_br = True
@@ -895,24 +920,123 @@ class AndroidDevice:
         out_name = "AndroidDevice%s_%s" % (
             self.serial, time_stamp.replace(" ", "_").replace(":", "-"))
         out_name = "%s.zip" % out_name if new_br else "%s.txt" % out_name
-        full_out_path = os.path.join(br_path, out_name)
         # in case device restarted, wait for adb interface to return
         self.wait_for_boot_completion()
+        return new_br, os.path.join(br_path, out_name)
+
+    def _wait_for_bug_report(self):
+        """Waits for the bug report started last to be taken, so that bug
+        reports of the device do not overlap.
+
+        The bug report is stopped if it takes longer than BUG_REPORT_TIMEOUT,
+        finish_bug_report then reports it as failed.
+        """
+        capture = self._bug_report_capture
+        if not capture:
+            return
+        self._bug_report_capture = None
+        timeout = max(
+            BUG_REPORT_TIMEOUT - (time.time() - capture.start_time), 0)
+        try:
+            utils.wait_for_standing_subprocess(capture.process, timeout)
+        except subprocess.TimeoutExpired:
+            utils.stop_standing_subprocess(capture.process)
+
+    def _pull_bugreportz(self, out, full_out_path):
+        """Pulls the bug report bugreportz reported to have taken."""
+        if not out.startswith("OK"):
+            raise AndroidDeviceError(
+                "Failed to take bugreport on %s: %s" % (self.serial, out))
+        br_out_path = out.split(':')[1].strip().split()[0]
+        self.adb.pull("%s %s" % (br_out_path, full_out_path))
+
+    @profiler.profiled()
+    def take_bug_report(self, test_name, begin_time):
+        """Takes a bug report on the device and stores it in a file.
+
+        Args:
+            test_name: Name of the test case that triggered this bug report.
+            begin_time: Epoch time when the test started.
+        """
+        self._wait_for_bug_report()
+        new_br, full_out_path = self._prepare_bug_report(test_name, begin_time)
         self.log.info("Taking bugreport for %s.", test_name)
         if new_br:
             out = self.adb.shell("bugreportz", timeout=BUG_REPORT_TIMEOUT)
-            if not out.startswith("OK"):
-                raise AndroidDeviceError(
-                    "Failed to take bugreport on %s: %s" % (self.serial, out))
-            br_out_path = out.split(':')[1].strip().split()[0]
-            self.adb.pull("%s %s" % (br_out_path, full_out_path))
+            self._pull_bugreportz(out, full_out_path)
         else:
             self.adb.bugreport(
                 " > {}".format(full_out_path), timeout=BUG_REPORT_TIMEOUT)
+        log_accounting.account_path(full_out_path)
         self.log.info("Bugreport for %s taken at %s.", test_name,
                       full_out_path)
         self.adb.wait_for_device(timeout=WAIT_FOR_DEVICE_TIMEOUT)
 
+    @profiler.profiled()
+    def start_bug_report(self, test_name, begin_time):
+        """Starts taking a bug report on the device, without waiting for it.
+
+        The device starts dumping its state before this returns, so the bug
+        report shows the device as it was when this was called, however late
+        finish_bug_report stores it. A bug report still being taken on the
+        device is waited for first.
+
+        Args:
+            test_name: Name of the test case that triggered this bug report.
+            begin_time: Epoch time when the test started.
+
+        Returns:
+            A BugReportCapture to pass to finish_bug_report.
+        """
+        self._wait_for_bug_report()
+        new_br, full_out_path = self._prepare_bug_report(test_name, begin_time)
+        self.log.info("Starting bugreport for %s.", test_name)
+        start_time = time.time()
+        status_path = None
+        if new_br:
+            # bugreportz prints the path of the report once it is done, which
+            # is kept on the device, as the output of shell_nb is discarded.
+            # Reports of the same test case get status files of their own.
+            status_path = "%s/%s_%d.status" % (
+                BUG_REPORT_STATUS_DIR, os.path.basename(full_out_path),
+                next(self._bug_report_count))
+            proc = self.adb.shell_nb("bugreportz > %s" % status_path)
+        else:
+            proc = self.adb.bugreport_nb(" > {}".format(full_out_path))
+        self._bug_report_capture = BugReportCapture(
+            test_name, full_out_path, proc, status_path, start_time)
+        return self._bug_report_capture
+
+    @profiler.profiled()
+    def finish_bug_report(self, capture):
+        """Waits for a bug report started by start_bug_report and stores it.
+
+        Args:
+            capture: The BugReportCapture of start_bug_report.
+
+        Raises:
+            AndroidDeviceError if the bug report could not be taken.
+        """
+        timeout = max(
+            BUG_REPORT_TIMEOUT - (time.time() - capture.start_time), 0)
+        try:
+            utils.wait_for_standing_subprocess(capture.process, timeout)
+        except subprocess.TimeoutExpired:
+            utils.stop_standing_subprocess(capture.process)
+            raise AndroidDeviceError(
+                "Bugreport for %s on %s did not finish in %ss." %
+                (capture.test_name, self.serial, BUG_REPORT_TIMEOUT))
+        if capture.status_path:
+            out = self.adb.shell(
+                "cat %s" % capture.status_path, ignore_status=True)
+            self.adb.shell(
+                "rm -f %s" % capture.status_path, ignore_status=True)
+            self._pull_bugreportz(out, capture.out_path)
+        log_accounting.account_path(capture.out_path)
+        self.log.info("Bugreport for %s taken at %s.", capture.test_name,
+                      capture.out_path)
+        self.adb.wait_for_device(timeout=WAIT_FOR_DEVICE_TIMEOUT)
+
     def get_file_names(self,
                        directory,
                        begin_time=None,
@@ -936,33 +1060,43 @@ class AndroidDevice:
         return files
 
     def pull_files(self, files, remote_path=None):
-        """Pull files from devies."""
+        """Pull files from devies.
+
+        Files are pulled in batches, with one adb pull command per batch.
+        """
         if not remote_path:
             remote_path = self.log_path
-        for file_name in files:
+        for i in range(0, len(files), PULL_BATCH_SIZE):
+            batch = files[i:i + PULL_BATCH_SIZE]
             self.adb.pull(
-                "%s %s" % (file_name, remote_path), timeout=PULL_TIMEOUT)
+                "%s %s" % (" ".join(batch), remote_path),
+                timeout=PULL_TIMEOUT * len(batch))
+            for file_name in batch:
+                log_accounting.account_path(
+                    os.path.join(remote_path, os.path.basename(file_name)))
 
     def check_crash_report(self,
                            test_name=None,
                            begin_time=None,
-                           log_crash_report=False):
-        """check crash report on the device."""
-        crash_reports = []
-        for crash_path in CRASH_REPORT_PATHS:
-            crashes = self.get_file_names(
-                crash_path,
-                skip_files=CRASH_REPORT_SKIPS,
-                begin_time=begin_time)
-            if crash_path == "/data/tombstones/" and crashes:
-                tombstones = crashes[:]
-                for tombstone in tombstones:
-                    if self.adb.shell(
-                            'cat %s | grep "crash_dump failed to dump process"'
-                            % tombstone):
-                        crashes.remove(tombstone)
-            if crashes:
-                crash_reports.extend(crashes)
+                           log_crash_report=False,
+                           since_last_check=False):
+        """check crash report on the device.
+
+        All crash directories are scanned with a single adb call.
+
+        Args:
+            test_name: Name of the test case, used for the log directory.
+            begin_time: Epoch time in ms. Only crash reports written after
+                        this time are returned.
+            log_crash_report: If True, pull the crash reports found.
+            since_last_check: If True, crash reports returned by an earlier
+                              call with since_last_check set are skipped.
+
+        Returns:
+            A list of device paths of crash reports.
+        """
+        crash_reports = self.crash_tracker.get_crash_reports(
+            begin_time=begin_time, since_last_check=since_last_check)
         if crash_reports and log_crash_report:
             test_name = test_name or time.strftime("%Y-%m-%d-%Y-%H-%M-%S")
             crash_log_path = os.path.join(self.log_path, test_name,
@@ -996,6 +1130,7 @@ class AndroidDevice:
                 omadm_log_path,
                 timeout=PULL_TIMEOUT,
                 ignore_status=True)
+            log_accounting.account_path(omadm_log_path)
 
     def start_new_session(self, max_connections=None, server_port=None):
         """Start a new session in sl4a.
@@ -1088,6 +1223,7 @@ class AndroidDevice:
             return False, clean_out
         return True, clean_out
 
+    @profiler.profiled()
     def wait_for_boot_completion(self):
         """Waits for Android framework to broadcast ACTION_BOOT_COMPLETED.
 
@@ -1110,6 +1246,7 @@ class AndroidDevice:
         raise AndroidDeviceError(
             "Device %s booting process timed out." % self.serial)
 
+    @profiler.profiled()
     def reboot(self, stop_at_lock_screen=False):
         """Reboots the device.
 
@@ -17,6 +17,7 @@
 import importlib
 import logging
 
+from acts import profiler
 from acts.keys import Config
 from acts.libs.proc import job
 
@@ -223,6 +224,7 @@ class Attenuator(object):
             raise IndexError(
                 "Attenuator index out of range for attenuator instrument")
 
+    @profiler.profiled()
     def set_atten(self, value):
         r"""This function sets the attenuation of Attenuator.
 
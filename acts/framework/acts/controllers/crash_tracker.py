@@ -0,0 +1,171 @@
+#!/usr/bin/env python3.4
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Tracks crash reports written on an Android device.
+
+All crash directories are listed with a single device-side find/stat call, so
+checking for crashes costs one adb round trip when there are none. A
+high-water mark (mtime and the inodes seen at that mtime) is kept per
+directory to tell which files appeared since the previous check.
+"""
+
+import collections
+import math
+
+from acts import utils
+
+# Tombstones containing this string are not real crashes.
+TOMBSTONE_IGNORE_STRING = "crash_dump failed to dump process"
+TOMBSTONE_PATH = "/data/tombstones/"
+
+CrashFile = collections.namedtuple('CrashFile',
+                                   ['path', 'directory', 'mtime', 'inode'])
+
+
+class CrashTracker(object):
+    """Finds new crash report files on a device.
+
+    Attributes:
+        crash_paths: The device directories that hold crash reports.
+        skip_files: File name patterns to ignore in the crash directories.
+    """
+
+    def __init__(self, adb, crash_paths, skip_files=(), log=None):
+        """
+        Args:
+            adb: The AdbProxy of the device.
+            crash_paths: The device directories that hold crash reports.
+            skip_files: File name patterns to ignore.
+            log: The logger to use.
+        """
+        self._adb = adb
+        self.crash_paths = tuple(crash_paths)
+        self.skip_files = tuple(skip_files)
+        self.log = log
+        # Maps a crash directory to (mtime, set of inodes with that mtime).
+        self._high_water_marks = {}
+
+    def _get_directory(self, path):
+        """Returns the most specific crash directory containing path."""
+        matches = [d for d in self.crash_paths
+                   if path.startswith(d.rstrip('/') + '/')]
+        if not matches:
+            return None
+        return max(matches, key=len)
+
+    def _build_scan_command(self):
+        cmd = "find %s -type f" % ' '.join(self.crash_paths)
+        for skip_file in self.skip_files:
+            cmd = "%s ! -iname %s" % (cmd, skip_file)
+        return 'date +%%s; %s -exec stat -c "%%Y %%i %%n" {} + 2>/dev/null' % (
+            cmd)
+
+    def scan(self):
+        """Lists every crash file on the device with one adb call.
+
+        Returns:
+            A tuple of (device epoch time in seconds, list of CrashFile).
+        """
+        out = self._adb.shell(self._build_scan_command(), ignore_status=True)
+        lines = (out or '').splitlines()
+        device_time = None
+        files = collections.OrderedDict()
+        for line in lines:
+            line = line.strip()
+            if device_time is None:
+                try:
+                    device_time = int(line)
+                    continue
+                except ValueError:
+                    pass
+            fields = line.split(' ', 2)
+            if len(fields) != 3:
+                continue
+            try:
+                mtime, inode = int(fields[0]), int(fields[1])
+            except ValueError:
+                continue
+            path = fields[2]
+            # Overlapping crash directories list the same file twice.
+            if path in files:
+                continue
+            files[path] = CrashFile(path, self._get_directory(path), mtime,
+                                    inode)
+        return device_time, list(files.values())
+
+    def _is_beyond_mark(self, crash_file):
+        mark = self._high_water_marks.get(crash_file.directory)
+        if mark is None:
+            return True
+        mtime, inodes = mark
+        return (crash_file.mtime > mtime or
+                (crash_file.mtime == mtime and crash_file.inode not in inodes))
+
+    def _update_marks(self, crash_files):
+        for crash_file in crash_files:
+            mark = self._high_water_marks.get(crash_file.directory)
+            if mark is None or crash_file.mtime > mark[0]:
+                self._high_water_marks[crash_file.directory] = (
+                    crash_file.mtime, {crash_file.inode})
+            elif crash_file.mtime == mark[0]:
+                mark[1].add(crash_file.inode)
+
+    def _filter_tombstones(self, paths):
+        """Drops tombstones of processes crash_dump failed to dump.
+
+        All candidate tombstones are checked with a single grep call.
+        """
+        tombstones = [p for p in paths if p.startswith(TOMBSTONE_PATH)]
+        if not tombstones:
+            return paths
+        out = self._adb.shell(
+            'grep -l "%s" %s' % (TOMBSTONE_IGNORE_STRING, ' '.join(tombstones)),
+            ignore_status=True)
+        ignored = set(line.strip() for line in (out or '').splitlines())
+        return [p for p in paths if p not in ignored]
+
+    def reset(self):
+        """Sets the high-water marks to the current state of the device."""
+        _, crash_files = self.scan()
+        self._high_water_marks = {}
+        self._update_marks(crash_files)
+
+    def get_crash_reports(self, begin_time=None, since_last_check=False):
+        """Gets the crash reports on the device.
+
+        Args:
+            begin_time: Epoch time in ms. If set, only files modified after
+                        this time are returned. The window is computed against
+                        the device clock, like find's -mtime.
+            since_last_check: If True, files already seen by a previous call
+                              with since_last_check set are not returned.
+
+        Returns:
+            A list of device paths of crash report files.
+        """
+        device_time, crash_files = self.scan()
+        candidates = crash_files
+        if begin_time and device_time is not None:
+            current_time = utils.get_current_epoch_time()
+            seconds = int(math.ceil((current_time - begin_time) / 1000.0))
+            cutoff = device_time - seconds
+            candidates = [f for f in candidates if f.mtime > cutoff]
+        if since_last_check:
+            candidates = [f for f in candidates if self._is_beyond_mark(f)]
+            self._update_marks(crash_files)
+        crash_reports = self._filter_tombstones([f.path for f in candidates])
+        if crash_reports and self.log:
+            self.log.debug("Found crash reports: %s", crash_reports)
+        return crash_reports
@@ -19,14 +19,16 @@ Based on the original py2 script of kens@google.com
 """
 
 import fcntl
+import json
 import logging
 import os
 import select
 import struct
 import sys
+import tempfile
 import time
-import collections
 
+import numpy as np
 # http://pyserial.sourceforge.net/
 # On ubuntu, apt-get install python3-pyserial
 import serial
@@ -39,6 +41,72 @@ from acts.controllers import android_device
 ACTS_CONTROLLER_CONFIG_NAME = "Monsoon"
 ACTS_CONTROLLER_REFERENCE_NAME = "monsoons"
 
+# The samples of a data packet: main, usb and aux current, and voltage.
+SAMPLE_DTYPE = np.dtype([("main", ">i2"), ("usb", ">i2"), ("aux", ">i2"),
+                         ("voltage", ">i2")])
+SAMPLE_SIZE = SAMPLE_DTYPE.itemsize
+# The maximum number of packets CollectData decodes at once, about 50ms of
+# data at the native sample rate.
+MAX_PACKETS_PER_COLLECT = 256
+
+# The format and fields of status packets.
+STATUS_FORMAT = ">BBBhhhHhhhHBBBxBbHBHHHHBbbHHBBBbbbbbbbbbBH"
+STATUS_FIELDS = [
+    "packetType",
+    "firmwareVersion",
+    "protocolVersion",
+    "mainFineCurrent",
+    "usbFineCurrent",
+    "auxFineCurrent",
+    "voltage1",
+    "mainCoarseCurrent",
+    "usbCoarseCurrent",
+    "auxCoarseCurrent",
+    "voltage2",
+    "outputVoltageSetting",
+    "temperature",
+    "status",
+    "leds",
+    "mainFineResistor",
+    "serialNumber",
+    "sampleRate",
+    "dacCalLow",
+    "dacCalHigh",
+    "powerUpCurrentLimit",
+    "runTimeCurrentLimit",
+    "powerUpTime",
+    "usbFineResistor",
+    "auxFineResistor",
+    "initialUsbVoltage",
+    "initialAuxVoltage",
+    "hardwareRevision",
+    "temperatureLimit",
+    "usbPassthroughMode",
+    "mainCoarseResistor",
+    "usbCoarseResistor",
+    "auxCoarseResistor",
+    "defMainFineResistor",
+    "defUsbFineResistor",
+    "defAuxFineResistor",
+    "defMainCoarseResistor",
+    "defUsbCoarseResistor",
+    "defAuxCoarseResistor",
+    "eventCode",
+    "eventData",
+]
+
+# The number of samples per chunk of a SampleAccumulator, 512KB of float64.
+DEFAULT_CHUNK_SIZE = 65536
+# The first bytes of every MonsoonData record of a binary file.
+BINARY_MAGIC = b"MONSOON\x00"
+BINARY_VERSION = 1
+# The data points of binary files are float32, whose precision is well below
+# the 1e-6 A resolution of the text format.
+BINARY_DATA_DTYPE = np.dtype("<f4")
+# The magic, then the length of the json header as a little endian uint32.
+_BINARY_PREFIX = struct.Struct("<8sI")
+_BINARY_ALIGNMENT = 8
+
 
 def create(configs):
     objs = []
@@ -70,7 +138,14 @@ class MonsoonProxy(object):
     mon.StopDataCollection()
 
     See http://wiki/Main/MonsoonProtocol for information on the protocol.
+
+    Attributes:
+        use_numpy: If True, CollectData decodes the samples of all the packets
+                   it reads at once with numpy. Otherwise each sample is
+                   unpacked separately, which gives the same values at a
+                   fraction of the throughput.
     """
+    use_numpy = True
 
     def __init__(self, device=None, serialno=None, wait=1):
         """Establish a connection to a Monsoon.
@@ -84,6 +159,9 @@ class MonsoonProxy(object):
         self._coarse_ref = self._fine_ref = self._coarse_zero = 0
         self._fine_zero = self._coarse_scale = self._fine_scale = 0
         self._last_seq = 0
+        # Input read from the serial port, but not consumed yet.
+        self._input = bytearray()
+        self._read_error = None
         self.start_voltage = 0
         self.serial = serialno
 
@@ -142,52 +220,6 @@ class MonsoonProxy(object):
         Returns:
             status dictionary.
         """
-        # status packet format
-        STATUS_FORMAT = ">BBBhhhHhhhHBBBxBbHBHHHHBbbHHBBBbbbbbbbbbBH"
-        STATUS_FIELDS = [
-            "packetType",
-            "firmwareVersion",
-            "protocolVersion",
-            "mainFineCurrent",
-            "usbFineCurrent",
-            "auxFineCurrent",
-            "voltage1",
-            "mainCoarseCurrent",
-            "usbCoarseCurrent",
-            "auxCoarseCurrent",
-            "voltage2",
-            "outputVoltageSetting",
-            "temperature",
-            "status",
-            "leds",
-            "mainFineResistor",
-            "serialNumber",
-            "sampleRate",
-            "dacCalLow",
-            "dacCalHigh",
-            "powerUpCurrentLimit",
-            "runTimeCurrentLimit",
-            "powerUpTime",
-            "usbFineResistor",
-            "auxFineResistor",
-            "initialUsbVoltage",
-            "initialAuxVoltage",
-            "hardwareRevision",
-            "temperatureLimit",
-            "usbPassthroughMode",
-            "mainCoarseResistor",
-            "usbCoarseResistor",
-            "auxCoarseResistor",
-            "defMainFineResistor",
-            "defUsbFineResistor",
-            "defAuxFineResistor",
-            "defMainCoarseResistor",
-            "defUsbCoarseResistor",
-            "defAuxCoarseResistor",
-            "eventCode",
-            "eventData",
-        ]
-
         self._SendStruct("BBB", 0x01, 0x00, 0x00)
         while 1:  # Keep reading, discarding non-status packets
             read_bytes = self._ReadPacket()
@@ -301,9 +333,33 @@ class MonsoonProxy(object):
 
     def CollectData(self):
         """Return some current samples. Call StartDataCollection() first.
+
+        Blocks until a data packet is read. The samples of the data packets
+        that were already received after it are returned as well.
         """
+        if self._read_error:
+            error, self._read_error = self._read_error, None
+            raise error
+        out = []
+        # The sample bytes of data packets that share the same calibration.
+        pending = bytearray()
+        num_packets = 0
         while 1:  # loop until we get data or a timeout
-            _bytes = self._ReadPacket()
+            if out or pending:
+                if num_packets >= MAX_PACKETS_PER_COLLECT:
+                    break
+                try:
+                    _bytes = self._ReadBufferedPacket()
+                except MonsoonError as e:
+                    # Return the samples read so far, the error is raised by
+                    # the next call.
+                    self._read_error = e
+                    break
+                if _bytes is None:
+                    break
+            else:
+                _bytes = self._ReadPacket()
+            num_packets += 1
             if not _bytes:
                 raise MonsoonError("Data collection failed due to empty data")
             if len(_bytes) < 4 + 8 + 1 or _bytes[0] < 0x20 or _bytes[0] > 0x2F:
@@ -312,11 +368,9 @@ class MonsoonProxy(object):
                 continue
 
             seq, _type, x, y = struct.unpack("BBBB", _bytes[:4])
-            data = [
-                struct.unpack(">hhhh", _bytes[x:x + 8])
-                for x in range(4,
-                               len(_bytes) - 8, 8)
-            ]
+            # The last complete sample of a packet without trailing bytes is
+            # not part of the data.
+            num_samples = (len(_bytes) - 5) // SAMPLE_SIZE
 
             if self._last_seq and seq & 0xF != (self._last_seq + 1) & 0xF:
                 logging.warning("Data sequence skipped, lost packet?")
@@ -327,20 +381,18 @@ class MonsoonProxy(object):
                     logging.warning(
                         "Waiting for calibration, dropped data packet.")
                     continue
-                out = []
-                for main, usb, aux, voltage in data:
-                    if main & 1:
-                        coarse = ((main & ~1) - self._coarse_zero)
-                        out.append(coarse * self._coarse_scale)
-                    else:
-                        out.append((main - self._fine_zero) * self._fine_scale)
-                return out
-            elif _type == 1:
-                self._fine_zero = data[0][0]
-                self._coarse_zero = data[1][0]
+                pending += _bytes[4:4 + num_samples * SAMPLE_SIZE]
+                continue
+            # The calibration changes, decode the data calibrated before.
+            out.extend(self._CalibrateSamples(pending))
+            pending = bytearray()
+            data = self._DecodeSamples(_bytes[4:4 + num_samples * SAMPLE_SIZE])
+            if _type == 1:
+                self._fine_zero = int(data[0][0])
+                self._coarse_zero = int(data[1][0])
             elif _type == 2:
-                self._fine_ref = data[0][0]
-                self._coarse_ref = data[1][0]
+                self._fine_ref = int(data[0][0])
+                self._coarse_ref = int(data[1][0])
             else:
                 logging.warning("Discarding data packet type=0x%02x", _type)
                 continue
@@ -351,6 +403,54 @@ class MonsoonProxy(object):
                     self._coarse_ref - self._coarse_zero)
             if self._fine_ref != self._fine_zero:
                 self._fine_scale = 0.0332 / (self._fine_ref - self._fine_zero)
+        out.extend(self._CalibrateSamples(pending))
+        return out
+
+    def _DecodeSamples(self, data):
+        """Decodes the samples of a data packet.
+
+        Args:
+            data: The sample bytes of one or more data packets.
+
+        Returns:
+            An array of SAMPLE_DTYPE, or a list of (main, usb, aux, voltage)
+            tuples if use_numpy is False.
+        """
+        if self.use_numpy:
+            return np.frombuffer(data, dtype=SAMPLE_DTYPE)
+        return [
+            struct.unpack(">hhhh", data[x:x + SAMPLE_SIZE])
+            for x in range(0, len(data), SAMPLE_SIZE)
+        ]
+
+    def _CalibrateSamples(self, data):
+        """Converts the main current of samples to amps.
+
+        Args:
+            data: The sample bytes of data packets, see _DecodeSamples.
+
+        Returns:
+            A list of currents in amps.
+        """
+        if not data:
+            return []
+        samples = self._DecodeSamples(data)
+        if not self.use_numpy:
+            out = []
+            for main, usb, aux, voltage in samples:
+                if main & 1:
+                    coarse = ((main & ~1) - self._coarse_zero)
+                    out.append(coarse * self._coarse_scale)
+                else:
+                    out.append((main - self._fine_zero) * self._fine_scale)
+            return out
+        main = samples["main"].astype(np.int64)
+        # The integer differences are exact, so the currents are the same as
+        # when computed one sample at a time.
+        coarse = (main & ~1) - self._coarse_zero
+        fine = main - self._fine_zero
+        return np.where(main & 1, coarse * self._coarse_scale,
+                        fine * self._fine_scale).tolist()
 
     def _SendStruct(self, fmt, *args):
         """Pack a struct (without length or checksum) and send it.
@@ -363,24 +463,51 @@ class MonsoonProxy(object):
         out = struct.pack("B", data_len) + data + struct.pack("B", checksum)
         self.ser.write(out)
 
+    def _Read(self, size):
+        """Reads bytes, from the input read ahead by _ReadBufferedPacket first.
+        """
+        if not self._input:
+            return self.ser.read(size)
+        result = self._input[:size]
+        del self._input[:size]
+        if len(result) < size:
+            result += self.ser.read(size - len(result))
+        return bytes(result)
+
+    def _ReadBufferedPacket(self):
+        """Reads a packet if it was already received, without blocking.
+
+        Returns:
+            The packet, see _ReadPacket, or None if no complete packet was
+            received. Empty packets are left for _ReadPacket.
+        """
+        waiting = self.ser.in_waiting
+        if waiting:
+            self._input += self.ser.read(waiting)
+        if not self._input or not self._input[0]:
+            return None
+        if len(self._input) <= self._input[0]:
+            return None
+        return self._ReadPacket()
+
     def _ReadPacket(self):
         """Read a single data record as a string (without length or checksum).
         """
-        len_char = self.ser.read(1)
+        len_char = self._Read(1)
         if not len_char:
             raise MonsoonError("Reading from serial port timed out")
 
         data_len = ord(len_char)
         if not data_len:
             return ""
-        result = self.ser.read(int(data_len))
+        result = self._Read(int(data_len))
         result = bytearray(result)
         if len(result) != data_len:
             raise MonsoonError(
                 "Length mismatch, expected %d bytes, got %d bytes.", data_len,
                 len(result))
         body = result[:-1]
-        checksum = (sum(struct.unpack("B" * len(body), body)) + data_len) % 256
+        checksum = (sum(body) + data_len) % 256
         if result[-1] != checksum:
             raise MonsoonError(
                 "Invalid checksum from serial port! Expected %s, got %s",
@@ -389,6 +516,8 @@ class MonsoonProxy(object):
 
     def _FlushInput(self):
         """ Flush all read data until no more available. """
+        self._input = bytearray()
+        self._read_error = None
         self.ser.reset_input_buffer()
         flushed = 0
         while True:
@@ -407,10 +536,257 @@ class MonsoonProxy(object):
         #     logging.info("dropped >%d bytes" % flushed)
 
 
+class SampleAccumulator(object):
+    """Accumulates samples into preallocated numpy chunks.
+
+    Appending takes constant time per sample, and each sample takes the size
+    of its dtype in memory, instead of a Python float object and a list slot.
+    When a memory cap is set, the full chunks beyond the cap are spilled to an
+    anonymous temporary file, and to_array returns a read-only memory map of
+    that file.
+
+    Attributes:
+        dtype: The numpy dtype of the samples.
+        chunk_size: The number of samples per chunk.
+        memory_cap: The maximum number of bytes of full chunks to keep in
+                    memory, or None to never spill.
+        spill_dir: The directory of the spill file, the default temporary
+                   directory if None.
+    """
+
+    def __init__(self,
+                 dtype=np.float64,
+                 chunk_size=DEFAULT_CHUNK_SIZE,
+                 memory_cap=None,
+                 spill_dir=None):
+        self.dtype = np.dtype(dtype)
+        self.chunk_size = chunk_size
+        self.memory_cap = memory_cap
+        self.spill_dir = spill_dir
+        self._chunks = []
+        self._chunk = np.empty(chunk_size, self.dtype)
+        self._fill = 0
+        self._len = 0
+        self._spill_file = None
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def spilled(self):
+        """True if samples were spilled to disk."""
+        return self._spill_file is not None
+
+    def append(self, value):
+        """Appends a single sample."""
+        self._chunk[self._fill] = value
+        self._fill += 1
+        self._len += 1
+        if self._fill == self.chunk_size:
+            self._next_chunk()
+
+    def extend(self, values):
+        """Appends a sequence of samples."""
+        values = np.asarray(values, dtype=self.dtype)
+        start = 0
+        while start < len(values):
+            n = min(self.chunk_size - self._fill, len(values) - start)
+            self._chunk[self._fill:self._fill + n] = values[start:start + n]
+            self._fill += n
+            self._len += n
+            start += n
+            if self._fill == self.chunk_size:
+                self._next_chunk()
+
+    def _next_chunk(self):
+        self._chunks.append(self._chunk)
+        self._chunk = np.empty(self.chunk_size, self.dtype)
+        self._fill = 0
+        if (self.memory_cap is not None and
+                sum(c.nbytes for c in self._chunks) > self.memory_cap):
+            self._spill()
+
+    def _spill(self):
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile(dir=self.spill_dir)
+            logging.info("Sample memory cap of %d bytes exceeded, spilling "
+                         "samples to disk.", self.memory_cap)
+        for chunk in self._chunks:
+            self._spill_file.write(chunk.tobytes())
+        self._chunks = []
+
+    def to_array(self):
+        """Gets the samples appended so far as a single array.
+
+        Returns:
+            A numpy array, or a read-only numpy memmap if samples were
+            spilled to disk. Samples appended later are not included.
+        """
+        if self._spill_file is None:
+            # Chunks are released as they are copied, so the samples are not
+            # held twice.
+            array = np.empty(self._len, self.dtype)
+            position = 0
+            self._chunks.append(self._chunk[:self._fill].copy())
+            while self._chunks:
+                chunk = self._chunks.pop(0)
+                array[position:position + len(chunk)] = chunk
+                position += len(chunk)
+            self._chunks = [array]
+            self._fill = 0
+            return array
+        # The partial chunk is spilled too, so the memory map covers every
+        # sample.
+        self._chunks.append(self._chunk[:self._fill])
+        self._spill()
+        self._chunk = np.empty(self.chunk_size, self.dtype)
+        self._fill = 0
+        self._spill_file.flush()
+        return np.memmap(
+            self._spill_file, dtype=self.dtype, mode="r", shape=(self._len, ))
+
+    def close(self):
+        """Closes the spill file, if any.
+
+        Memory maps returned by to_array remain valid. No samples can be
+        appended after closing.
+        """
+        if self._spill_file is not None:
+            self._spill_file.close()
+
+
+class Resampler(object):
+    """Converts samples from the native sample rate of a Monsoon to another.
+
+    Each output sample is the average of the input samples consumed for it.
+    Input samples wait in a preallocated buffer that is compacted in place,
+    so buffering takes constant time per sample.
+
+    In case sample_hz doesn't divide native_hz exactly, this invariant holds:
+    offset = (consumed samples) * sample_hz - (emitted samples) * native_hz.
+    This is the error accumulator in a variation of Bresenham's algorithm.
+
+    Attributes:
+        native_hz: The sample rate of the input samples.
+        sample_hz: The sample rate of the output samples.
+        offset: The error accumulator.
+    """
+
+    def __init__(self, native_hz, sample_hz, capacity=DEFAULT_CHUNK_SIZE):
+        self.native_hz = native_hz
+        self.sample_hz = sample_hz
+        self.offset = 0
+        self._buffer = np.empty(capacity)
+        self._head = self._tail = 0
+
+    def __len__(self):
+        """The number of input samples waiting to be consumed."""
+        return self._tail - self._head
+
+    def _append(self, samples):
+        n = len(samples)
+        if self._tail + n > len(self._buffer):
+            waiting = self._tail - self._head
+            if waiting + n > len(self._buffer):
+                buffer = np.empty(max(2 * len(self._buffer), waiting + n))
+            else:
+                buffer = self._buffer
+            buffer[:waiting] = self._buffer[self._head:self._tail]
+            self._buffer = buffer
+            self._head, self._tail = 0, waiting
+        self._buffer[self._tail:self._tail + n] = samples
+        self._tail += n
+
+    def feed(self, samples, limit=None):
+        """Adds input samples and emits the output samples they complete.
+
+        Args:
+            samples: A sequence of input samples.
+            limit: Stops consuming input once this many output samples were
+                   emitted, or None for no limit. Upsampling may emit a few
+                   more.
+
+        Returns:
+            A numpy array of output samples.
+        """
+        self._append(samples)
+        # The k-th output is emitted once the consumed input samples c_k
+        # satisfy offset + c_k * sample_hz >= k * native_hz, so the whole
+        # schedule is computed at once instead of output by output.
+        count = int((self.offset + len(self) * self.sample_hz) //
+                    self.native_hz)
+        if limit is not None:
+            count = min(count, limit)
+        if count <= 0:
+            return np.empty(0)
+        k = np.arange(1, count + 1)
+        ends = -((self.offset - k * self.native_hz) // self.sample_hz)
+        ends = ends.astype(np.int64)
+        # When upsampling, all the outputs completed by the last input sample
+        # are emitted, even beyond the limit.
+        last = int(ends[-1])
+        count = int((self.offset + last * self.sample_hz) // self.native_hz)
+        boundaries, repeats = np.unique(ends, return_counts=True)
+        if count > len(ends):
+            repeats[-1] += count - len(ends)
+        starts = np.concatenate(([0], boundaries[:-1]))
+        segment = self._buffer[self._head:self._head + last]
+        averages = np.add.reduceat(segment, starts) / (boundaries - starts)
+        self.offset += last * self.sample_hz - count * self.native_hz
+        self._head += last
+        return np.repeat(averages, repeats)
+
+
+class RollingAverager(object):
+    """Computes the average of the last n samples, for every sample.
+
+    The samples are fed in batches, and the window sums are the differences
+    of a cumulative sum over the previous n - 1 samples and the batch, so
+    the cost is linear in the number of samples whatever n is. The
+    cumulative sum restarts with every batch, which bounds its rounding
+    error.
+
+    Attributes:
+        n: The number of samples to average over.
+        count: The number of samples fed so far.
+    """
+
+    def __init__(self, n):
+        if n < 1:
+            raise MonsoonError("Cannot average over %s data points." % n)
+        self.n = n
+        self.count = 0
+        self._tail = np.empty(0)
+
+    def feed(self, values):
+        """Adds samples and gets their rolling averages.
+
+        Args:
+            values: A sequence of samples.
+
+        Returns:
+            A numpy array with, for each sample, the average of the last n
+            samples up to it, or of all samples up to it for the first n - 1
+            samples.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        window = np.concatenate((self._tail, values))
+        sums = np.concatenate(([0.0], np.cumsum(window)))
+        ends = np.arange(len(self._tail), len(window)) + 1
+        starts = np.maximum(ends - self.n, 0)
+        counts = np.minimum(self.count + np.arange(1, len(values) + 1),
+                            self.n)
+        self._tail = window[len(window) - min(self.n - 1, len(window)):]
+        self.count += len(values)
+        return (sums[ends] - sums[starts]) / counts
+
+
 class MonsoonData(object):
     """A class for reporting power measurement data from monsoon.
 
-    Data means the measured current value in Amps.
+    Data means the measured current value in Amps. The data points and
+    timestamps are numpy arrays, possibly memory mapped from a binary file,
+    see from_binary_file.
     """
     # Number of digits for long rounding.
     lr = 8
@@ -423,15 +799,17 @@ class MonsoonData(object):
         """Instantiates a MonsoonData object.
 
         Args:
-            data_points: A list of current values in Amp (float).
-            timestamps: A list of epoch timestamps (int).
+            data_points: A list or array of current values in Amp (float).
+            timestamps: A list or array of epoch timestamps (int).
             hz: The hertz at which the data points are measured.
             voltage: The voltage at which the data points are measured.
             offset: The number of initial data points to discard
                 in calculations.
         """
-        self._data_points = data_points
-        self._timestamps = timestamps
+        self._data_points = np.asanyarray(data_points)
+        if not np.issubdtype(self._data_points.dtype, np.floating):
+            self._data_points = self._data_points.astype(np.float64)
+        self._timestamps = np.asanyarray(timestamps)
         self.offset = offset
         num_of_data_pt = len(self._data_points)
         if self.offset >= num_of_data_pt:
@@ -452,14 +830,16 @@ class MonsoonData(object):
         len_data_pt = len(self.data_points)
         if len_data_pt == 0:
             return 0
-        cur = sum(self.data_points) * 1000 / len_data_pt
+        total = float(self.data_points.sum(dtype=np.float64))
+        cur = total * 1000 / len_data_pt
         return round(cur, self.sr)
 
     @property
     def total_charge(self):
         """Total charged used in the unit of mAh.
         """
-        charge = (sum(self.data_points) / self.hz) * 1000 / 3600
+        total = float(self.data_points.sum(dtype=np.float64))
+        charge = (total / self.hz) * 1000 / 3600
         return round(charge, self.sr)
 
     @property
@@ -554,6 +934,108 @@ class MonsoonData(object):
                 results.append(MonsoonData.from_string(data_str))
         return results
 
+    @staticmethod
+    def save_to_binary_file(monsoon_data, file_path):
+        """Save multiple MonsoonData objects to a binary file.
+
+        Each object is written as a record: BINARY_MAGIC, the length of a json
+        header, the header, then the raw data points as BINARY_DATA_DTYPE and
+        the raw timestamps as int64, or float64 if any is fractional. All data
+        points are written, including the offset ones, and the offset is kept
+        in the header.
+
+        Args:
+            monsoon_data: A list of MonsoonData objects to write to a binary
+                file.
+            file_path: The full path of the file to save to, including the file
+                name.
+        """
+        if not monsoon_data:
+            raise MonsoonError("Attempting to write empty Monsoon data to "
+                               "file, abort")
+        utils.create_dir(os.path.dirname(file_path))
+        with open(file_path, 'ab') as f:
+            for md in monsoon_data:
+                timestamps = md._timestamps
+                if np.issubdtype(timestamps.dtype, np.integer):
+                    timestamp_dtype = np.dtype("<i8")
+                else:
+                    timestamp_dtype = np.dtype("<f8")
+                header = json.dumps({
+                    "version": BINARY_VERSION,
+                    "hz": md.hz,
+                    "voltage": md.voltage,
+                    "offset": md.offset,
+                    "tag": md.tag,
+                    "samples": len(md._data_points),
+                    "data_dtype": BINARY_DATA_DTYPE.str,
+                    "timestamp_dtype": timestamp_dtype.str
+                }).encode("utf-8")
+                # Pad the header so that the arrays are aligned in the file.
+                length = _BINARY_PREFIX.size + len(header)
+                header += b" " * (-length % _BINARY_ALIGNMENT)
+                f.write(_BINARY_PREFIX.pack(BINARY_MAGIC, len(header)))
+                f.write(header)
+                f.write(md._data_points.astype(BINARY_DATA_DTYPE).tobytes())
+                f.write(timestamps.astype(timestamp_dtype).tobytes())
+
+    @staticmethod
+    def from_binary_file(file_path, mmap=True):
+        """Load MonsoonData objects from a binary file generated by
+        MonsoonData.save_to_binary_file.
+
+        Args:
+            file_path: The full path of the file load from, including the file
+                name.
+            mmap: If True, the arrays are read-only memory maps of the file,
+                so only the parts used are read. Otherwise they are read into
+                memory.
+
+        Returns:
+            A list of MonsoonData objects.
+        """
+        results = []
+        with open(file_path, 'rb') as f:
+            while True:
+                prefix = f.read(_BINARY_PREFIX.size)
+                if not prefix:
+                    break
+                if len(prefix) < _BINARY_PREFIX.size:
+                    raise MonsoonError("Truncated record in %s." % file_path)
+                magic, header_len = _BINARY_PREFIX.unpack(prefix)
+                if magic != BINARY_MAGIC:
+                    raise MonsoonError("%s is not a binary Monsoon data file."
+                                       % file_path)
+                header = json.loads(f.read(header_len).decode("utf-8"))
+                if header["version"] > BINARY_VERSION:
+                    raise MonsoonError(
+                        "Unsupported binary Monsoon data version %s in %s." %
+                        (header["version"], file_path))
+                arrays = []
+                for key in ("data_dtype", "timestamp_dtype"):
+                    dtype = np.dtype(header[key])
+                    count = header["samples"]
+                    if mmap:
+                        position = f.tell()
+                        arrays.append(
+                            np.memmap(
+                                file_path,
+                                dtype=dtype,
+                                mode="r",
+                                offset=position,
+                                shape=(count, )))
+                        f.seek(position + dtype.itemsize * count)
+                    else:
+                        arrays.append(np.fromfile(f, dtype=dtype, count=count))
+                    if len(arrays[-1]) != count:
+                        raise MonsoonError(
+                            "Truncated record in %s." % file_path)
+                md = MonsoonData(arrays[0], arrays[1], header["hz"],
+                                 header["voltage"], header["offset"])
+                md.tag = header["tag"]
+                results.append(md)
+        return results
+
     def _validate_data(self):
         """Verifies that the data points contained in the class are valid.
         """
@@ -581,10 +1063,9 @@ class MonsoonData(object):
         Returns:
             A list of tuples in the format of (timestamp, data)
         """
-        result = []
-        for t, d in zip(self.timestamps, self.data_points):
-            result.append(t, round(d, self.lr))
-        return result
+        return list(
+            zip(self.timestamps.tolist(),
+                np.round(self.data_points, self.lr).tolist()))
 
     def get_average_record(self, n):
         """Returns a list of average current numbers, each representing the
@@ -596,15 +1077,14 @@ class MonsoonData(object):
         Returns:
             A list of average current values.
         """
-        history_deque = collections.deque()
-        averages = []
-        for d in self.data_points:
-            history_deque.appendleft(d)
-            if len(history_deque) > n:
-                history_deque.pop()
-            avg = sum(history_deque) / len(history_deque)
-            averages.append(round(avg, self.lr))
-        return averages
+        averager = RollingAverager(n)
+        averages = [
+            averager.feed(self.data_points[i:i + DEFAULT_CHUNK_SIZE])
+            for i in range(0, len(self.data_points), DEFAULT_CHUNK_SIZE)
+        ]
+        if not averages:
+            return []
+        return np.round(np.concatenate(averages), self.lr).tolist()
 
     def _header(self):
         strs = [""]
@@ -623,11 +1103,25 @@ class MonsoonData(object):
     def __len__(self):
         return len(self.data_points)
 
+    def __getitem__(self, index):
+        """Gets the data points of a slice, after the offset, as MonsoonData.
+
+        The arrays of the new object are views, no data is copied.
+        """
+        if not isinstance(index, slice):
+            raise TypeError("MonsoonData can only be indexed by slices.")
+        md = MonsoonData(self.data_points[index], self.timestamps[index],
+                         self.hz, self.voltage)
+        md.tag = self.tag
+        return md
+
     def __str__(self):
         strs = []
         strs.append(self._header())
         strs.append("Time" + ' ' * 7 + "Amp")
-        for t, d in zip(self.timestamps, self.data_points):
+        # Python floats and ints format the same as the lists of the text
+        # format, unlike numpy scalars.
+        for t, d in zip(self.timestamps.tolist(), self.data_points.tolist()):
             strs.append("{} {}".format(t, round(d, self.sr)))
         return "\n".join(strs)
 
@@ -637,7 +1131,16 @@ class MonsoonData(object):
 
 class Monsoon(object):
     """The wrapper class for test scripts to interact with monsoon.
+
+    Attributes:
+        sample_memory_cap: The number of bytes of samples take_samples keeps
+                           in memory before spilling them to a temporary
+                           file, or None to keep all samples in memory.
+        spill_dir: The directory of the temporary files samples are spilled
+                   to, the default temporary directory if None.
     """
+    sample_memory_cap = None
+    spill_dir = None
 
     def __init__(self, *args, **kwargs):
         serial = kwargs["serial"]
@@ -699,11 +1202,17 @@ class Monsoon(object):
         """
         return self.mon.GetStatus()
 
-    def take_samples(self, sample_hz, sample_num, sample_offset=0, live=False):
+    def take_samples(self,
+                     sample_hz,
+                     sample_num,
+                     sample_offset=0,
+                     live=False,
+                     until=None):
         """Take samples of the current value supplied by monsoon.
 
         This is the actual measurement for power consumption. This function
-        blocks until the number of samples requested has been fulfilled.
+        blocks until the number of samples requested has been fulfilled, or
+        until returns True.
 
         Args:
             hz: Number of points to take for every second.
@@ -711,10 +1220,14 @@ class Monsoon(object):
             offset: The number of initial data points to discard in MonsoonData
                 calculations. sample_num is extended by offset to compensate.
             live: Print each sample in console as measurement goes on.
+            until: A function called with each numpy array of new samples,
+                without the offset ones, that ends the sampling early by
+                returning True, e.g. a convergence.ConvergenceMonitor.
 
         Returns:
             A MonsoonData object representing the data obtained in this
-            sampling. None if sampling is unsuccessful.
+            sampling, backed by numpy arrays. None if sampling is
+            unsuccessful.
         """
         sys.stdout.flush()
         voltage = self.mon.GetVoltage()
@@ -729,46 +1242,38 @@ class Monsoon(object):
         # Collect and average samples as specified
         self.mon.StartDataCollection()
 
-        # In case sample_hz doesn't divide native_hz exactly, use this
-        # invariant: 'offset' = (consumed samples) * sample_hz -
-        # (emitted samples) * native_hz
-        # This is the error accumulator in a variation of Bresenham's
-        # algorithm.
-        emitted = offset = 0
-        collected = []
-        # past n samples for rolling average
-        history_deque = collections.deque()
-        current_values = []
-        timestamps = []
+        resampler = Resampler(native_hz, sample_hz)
+        current_values = SampleAccumulator(
+            memory_cap=self.sample_memory_cap, spill_dir=self.spill_dir)
+        timestamps = SampleAccumulator(
+            dtype=np.int64,
+            memory_cap=self.sample_memory_cap,
+            spill_dir=self.spill_dir)
 
         try:
             last_flush = time.time()
-            while emitted < sample_num or sample_num == -1:
-                # The number of raw samples to consume before emitting the next
-                # output
-                need = int((native_hz - offset + sample_hz - 1) / sample_hz)
-                if need > len(collected):  # still need more input samples
-                    samples = self.mon.CollectData()
-                    if not samples:
-                        break
-                    collected.extend(samples)
-                else:
-                    # Have enough data, generate output samples.
-                    # Adjust for consuming 'need' input samples.
-                    offset += need * sample_hz
-                    # maybe multiple, if sample_hz > native_hz
-                    while offset >= native_hz:
-                        # TODO(angli): Optimize "collected" operations.
-                        this_sample = sum(collected[:need]) / need
-                        this_time = int(time.time())
-                        timestamps.append(this_time)
-                        if live:
-                            self.log.info("%s %s", this_time, this_sample)
-                        current_values.append(this_sample)
-                        sys.stdout.flush()
-                        offset -= native_hz
-                        emitted += 1  # adjust for emitting 1 output sample
-                    collected = collected[need:]
+            while len(current_values) < sample_num or sample_num == -1:
+                samples = self.mon.CollectData()
+                if not samples:
+                    break
+                limit = None
+                if sample_num != -1:
+                    limit = sample_num - len(current_values)
+                values = resampler.feed(samples, limit)
+                if not len(values):
+                    continue
+                this_time = int(time.time())
+                offset_left = max(sample_offset - len(current_values), 0)
+                current_values.extend(values)
+                timestamps.extend(np.full(len(values), this_time, np.int64))
+                if (until is not None and offset_left < len(values)
+                        and until(values[offset_left:])):
+                    self.log.info("Sampling ended early after %d samples.",
+                                  len(current_values) - sample_offset)
+                    break
+                if live:
+                    for this_sample in values:
+                        self.log.info("%s %s", this_time, this_sample)
                     now = time.time()
                     if now - last_flush >= 0.99:  # flush every second
                         sys.stdout.flush()
@@ -778,13 +1283,16 @@ class Monsoon(object):
         self.mon.StopDataCollection()
         try:
             return MonsoonData(
-                current_values,
-                timestamps,
+                current_values.to_array(),
+                timestamps.to_array(),
                 sample_hz,
                 voltage,
                 offset=sample_offset)
         except:
             return None
+        finally:
+            current_values.close()
+            timestamps.close()
 
     @utils.timeout(60)
     def usb(self, state):
@@ -976,7 +1484,7 @@ class Monsoon(object):
         except Exception as e:
             raise MonsoonError("Error happened trying to reconnect DUT")
 
-    def measure_power(self, hz, duration, tag, offset=30):
+    def measure_power(self, hz, duration, tag, offset=30, until=None):
         """Measure power consumption of the attached device.
 
         Because it takes some time for the device to calm down after the usb
@@ -985,9 +1493,12 @@ class Monsoon(object):
 
         Args:
             hz: Number of samples to take per second.
-            duration: Number of seconds to take samples for in each step.
+            duration: Number of seconds to take samples for in each step, at
+                most if until is given.
             offset: The number of seconds of initial data to discard.
             tag: A string that's the name of the collected data group.
+            until: A function ending the measurement early, see
+                take_samples.
 
         Returns:
             A MonsoonData object with the measured power data.
@@ -996,7 +1507,7 @@ class Monsoon(object):
         oset = offset * hz
         data = None
         try:
-            data = self.take_samples(hz, num, sample_offset=oset)
+            data = self.take_samples(hz, num, sample_offset=oset, until=until)
             if not data:
                 raise MonsoonError(
                     ("No data was collected in measurement %s.") % tag)
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Captures from several Monsoons at once, on a common timebase.
+
+Testbeds with several Monsoons, e.g. a DUT and a reference device, or one
+Monsoon per rail, need their captures aligned in time. A CaptureGroup
+streams from all of them, each on threads of its own:
+
+    group = capture_group.CaptureGroup([dut_monsoon, ref_monsoon], hz=500)
+    group.start()
+    ...
+    capture = group.stop()
+    dut_current, ref_current = capture.values
+
+All the Monsoons are armed before any is started, so that only the start
+commands separate their starts. The start of each Monsoon is measured on
+time.monotonic(), as is the decoding of each block of its samples, and the
+captures are trimmed so that the samples at the same index were measured at
+the same time, to within one sample period.
+"""
+
+import time
+
+import numpy as np
+
+from acts.controllers import monsoon
+from acts.controllers.monsoon_lib import streaming
+
+
+def estimate_start_time(stream):
+    """Estimates the time a stream's Monsoon started sampling.
+
+    The start command is sent before the Monsoon starts, and no block of
+    samples can be decoded before its last sample was measured. The earliest
+    of the time the start command returned and of the times the blocks imply
+    is the estimate.
+
+    Args:
+        stream: A stopped MonsoonStream.
+
+    Returns:
+        The estimated time.monotonic() of the start of the first sample.
+    """
+    start_time = stream.start_time
+    if stream.block_ends is not None and len(stream.block_ends):
+        implied = stream.block_times - stream.block_ends / stream.hz
+        start_time = min(start_time, float(implied.min()))
+    return start_time
+
+
+def _stop_streams(streams):
+    """Stops every stream, even if stopping one of them fails.
+
+    Returns:
+        The captures returned by MonsoonStream.stop, in the order of streams.
+
+    Raises:
+        The first error raised by MonsoonStream.stop, once all the streams
+        are stopped.
+    """
+    captures = []
+    error = None
+    for stream in streams:
+        try:
+            captures.append(stream.stop())
+        except Exception as e:
+            captures.append(None)
+            if error is None:
+                error = e
+    if error is not None:
+        raise error
+    return captures
+
+
+class AlignedCapture(object):
+    """The aligned captures of a CaptureGroup.
+
+    Attributes:
+        hz: The sample rate of the captures.
+        data: A list of MonsoonData, one per Monsoon in the order of the
+              group, all of the same length. Sample i of every capture was
+              measured at timestamps[i].
+        start_time: The time.monotonic() of the first aligned sample.
+        start_times: The estimated time.monotonic() at which each Monsoon
+                     started sampling.
+        skew: The time between the first and the last Monsoon to start, in
+              seconds.
+        offsets: The number of samples trimmed from the start of each
+                 capture to align it.
+    """
+
+    def __init__(self, hz, data, start_time, start_times, offsets):
+        self.hz = hz
+        self.data = data
+        self.start_time = start_time
+        self.start_times = start_times
+        self.skew = max(start_times) - min(start_times)
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.data[0])
+
+    @property
+    def values(self):
+        """A numpy array of the currents in Amps, one row per Monsoon."""
+        return np.vstack([d.data_points for d in self.data])
+
+    @property
+    def timestamps(self):
+        """A numpy array of the time.monotonic() of each sample."""
+        return self.start_time + np.arange(len(self)) / self.hz
+
+
+class CaptureGroup(object):
+    """Captures from several Monsoons at once.
+
+    Attributes:
+        hz: The sample rate of the captures.
+        streams: A MonsoonStream per Monsoon, to which consumers can
+                 subscribe before the group starts.
+    """
+
+    def __init__(self,
+                 monsoons,
+                 hz,
+                 queue_size=streaming.DEFAULT_QUEUE_SIZE):
+        """
+        Args:
+            monsoons: The Monsoons to capture from, at least one.
+            hz: The number of samples per second of every capture.
+            queue_size: The queue size of each stream, see MonsoonStream.
+        """
+        if not monsoons:
+            raise monsoon.MonsoonError('A capture group needs a Monsoon.')
+        self.hz = hz
+        self.streams = [
+            streaming.MonsoonStream(m, hz, queue_size) for m in monsoons
+        ]
+
+    def start(self):
+        """Arms all the Monsoons, then starts them back to back.
+
+        If a Monsoon fails to start, the Monsoons started before it are
+        stopped.
+        """
+        for stream in self.streams:
+            stream.arm()
+        started = []
+        try:
+            for stream in self.streams:
+                stream.start()
+                started.append(stream)
+        except Exception:
+            try:
+                _stop_streams(started)
+            except Exception:
+                self.streams[0].log.exception(
+                    'Failed to stop the started Monsoons.')
+            raise
+        skew = self.streams[-1].start_time - self.streams[0].start_time
+        self.streams[0].log.info(
+            'Started %d Monsoons within %.2fms.', len(self.streams),
+            skew * 1000)
+
+    def mark(self, name):
+        """Marks the start of a phase in every capture, see
+        MonsoonStream.mark."""
+        for stream in self.streams:
+            stream.mark(name)
+
+    def stop(self):
+        """Stops all the Monsoons and aligns their captures.
+
+        Returns:
+            An AlignedCapture.
+
+        Raises:
+            MonsoonError: A Monsoon collected no samples, or the captures do
+                          not overlap.
+            Exception: The first error stopping a Monsoon, raised once all
+                       the Monsoons are stopped.
+        """
+        captures = _stop_streams(self.streams)
+        for stream, data in zip(self.streams, captures):
+            if data is None:
+                raise monsoon.MonsoonError(
+                    'Monsoon %s collected no samples.' % stream.monsoon.serial)
+        start_times = [estimate_start_time(s) for s in self.streams]
+        start_time = max(start_times)
+        offsets = [
+            int(round((start_time - t) * self.hz)) for t in start_times
+        ]
+        length = min(len(d) - o for d, o in zip(captures, offsets))
+        if length <= 0:
+            raise monsoon.MonsoonError('The captures do not overlap.')
+        aligned = [d[o:o + length] for d, o in zip(captures, offsets)]
+        return AlignedCapture(self.hz, aligned, start_time, start_times,
+                              offsets)
+
+    def capture(self, duration):
+        """Captures for a number of seconds, blocking until done.
+
+        Returns:
+            An AlignedCapture.
+        """
+        self.start()
+        time.sleep(duration)
+        return self.stop()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Decides when the average current of a capture is known precisely enough.
+
+Consecutive current samples are strongly correlated, e.g. by the periodic
+wakeups of an idle device, so the confidence interval of their mean cannot
+be computed from the sample variance. BatchMeans splits the samples into
+batches spanning several periods, whose means are close to independent, and
+computes the interval from the variance of the batch means.
+
+A ConvergenceMonitor ends Monsoon.take_samples once the interval is narrow
+enough:
+
+    monitor = convergence.ConvergenceMonitor(hz=500, precision=0.01)
+    data = mon.take_samples(500, max_duration * 500, until=monitor)
+    logging.info('%s', monitor.summary())
+"""
+
+import math
+
+import numpy as np
+
+DEFAULT_CONFIDENCE = 0.95
+# The duration of a batch in seconds, several DTIM and scan periods.
+DEFAULT_BATCH_DURATION = 1
+# The number of batches before the interval is trusted. Fewer batches make
+# the variance of the batch means, and so the interval, unreliable.
+DEFAULT_MIN_BATCHES = 20
+
+
+def normal_quantile(p):
+    """Gets the quantile of the standard normal distribution."""
+    low, high = -40.0, 40.0
+    for _ in range(100):
+        mid = (low + high) / 2
+        if 0.5 * math.erfc(-mid / math.sqrt(2)) < p:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2
+
+
+def t_quantile(p, df):
+    """Gets the quantile of Student's t distribution.
+
+    Uses the Cornish-Fisher expansion around the normal quantile, which is
+    within 0.5% of the exact quantile from 5 degrees of freedom.
+    """
+    z = normal_quantile(p)
+    return (z + (z**3 + z) / (4 * df) +
+            (5 * z**5 + 16 * z**3 + 3 * z) / (96 * df**2) +
+            (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / (384 * df**3))
+
+
+class BatchMeans(object):
+    """Keeps the mean of a stream of samples and its confidence interval.
+
+    Attributes:
+        batch_size: The number of samples per batch.
+        confidence: The confidence level of the interval.
+        count: The number of samples received.
+    """
+
+    def __init__(self, batch_size, confidence=DEFAULT_CONFIDENCE):
+        self.batch_size = batch_size
+        self.confidence = confidence
+        self.count = 0
+        self._total = 0.0
+        self._pending = np.empty(0)
+        # The sums of the batch means and of their squares.
+        self._batches = 0
+        self._batch_total = 0.0
+        self._batch_squares = 0.0
+
+    def feed(self, values):
+        """Adds samples.
+
+        Args:
+            values: A numpy array of samples.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        self.count += len(values)
+        self._total += float(values.sum())
+        if len(self._pending):
+            values = np.concatenate((self._pending, values))
+        num_batches = len(values) // self.batch_size
+        whole = num_batches * self.batch_size
+        if num_batches:
+            means = values[:whole].reshape(num_batches,
+                                           self.batch_size).mean(axis=1)
+            self._batches += num_batches
+            self._batch_total += float(means.sum())
+            self._batch_squares += float(np.dot(means, means))
+        self._pending = values[whole:].copy()
+
+    @property
+    def num_batches(self):
+        """The number of complete batches received."""
+        return self._batches
+
+    @property
+    def mean(self):
+        """The mean of all the samples received."""
+        return self._total / self.count if self.count else 0.0
+
+    @property
+    def half_width(self):
+        """The half width of the confidence interval of the mean.
+
+        Infinite with less than two batches.
+        """
+        n = self._batches
+        if n < 2:
+            return math.inf
+        batch_mean = self._batch_total / n
+        variance = max(self._batch_squares / n - batch_mean**2, 0) * n / (
+            n - 1)
+        quantile = t_quantile(1 - (1 - self.confidence) / 2, n - 1)
+        return quantile * math.sqrt(variance / n)
+
+
+class ConvergenceMonitor(object):
+    """Tells when the mean current of a capture reached a precision.
+
+    The mean is precise enough once its confidence interval is within the
+    relative precision of the mean, or within the absolute precision.
+    Instances are meant for the until argument of Monsoon.take_samples.
+
+    Attributes:
+        hz: The sample rate of the capture.
+        precision: The relative half width of the confidence interval to
+                   reach, e.g. 0.01 for +-1%.
+        absolute_precision: The half width in Amps that is precise enough
+                            regardless of the mean, for captures close to
+                            0A.
+        min_batches: The number of batches before the capture can stop.
+        stats: The BatchMeans of the capture.
+        converged: True once the precision was reached.
+    """
+
+    def __init__(self,
+                 hz,
+                 precision,
+                 confidence=DEFAULT_CONFIDENCE,
+                 batch_duration=DEFAULT_BATCH_DURATION,
+                 min_batches=DEFAULT_MIN_BATCHES,
+                 absolute_precision=0):
+        """
+        Args:
+            hz: The sample rate of the capture.
+            precision: The relative half width of the interval to reach.
+            confidence: The confidence level of the interval.
+            batch_duration: The number of seconds per batch. Batches should
+                            span many periods of the periodic activity of
+                            the device.
+            min_batches: The number of batches before the capture can stop.
+            absolute_precision: The half width in Amps that is precise
+                                enough.
+        """
+        self.hz = hz
+        self.precision = precision
+        self.absolute_precision = absolute_precision
+        self.min_batches = min_batches
+        self.stats = BatchMeans(
+            max(int(batch_duration * hz), 1), confidence=confidence)
+        self.converged = False
+
+    def __call__(self, values):
+        """Adds samples in Amps.
+
+        Returns:
+            True if the precision was reached.
+        """
+        self.stats.feed(values)
+        if self.stats.num_batches >= self.min_batches:
+            target = max(self.precision * abs(self.stats.mean),
+                         self.absolute_precision)
+            self.converged = self.stats.half_width <= target
+        return self.converged
+
+    def summary(self):
+        """Gets the achieved precision, e.g. for the extras of a result.
+
+        Returns:
+            A dictionary of the mean and half width of the interval in mA,
+            the relative half width, the confidence level, the number of
+            batches, the duration in seconds and whether the precision was
+            reached.
+        """
+        half_width = self.stats.half_width
+        mean = self.stats.mean
+        return {
+            'mean_current': round(mean * 1000, 6),
+            'half_width': (round(half_width * 1000, 6)
+                           if math.isfinite(half_width) else None),
+            'relative_half_width': (round(half_width / abs(mean), 6)
+                                    if mean and math.isfinite(half_width) else
+                                    None),
+            'confidence': self.stats.confidence,
+            'batches': self.stats.num_batches,
+            'duration': self.stats.count / self.hz,
+            'converged': self.converged
+        }
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Downsamples power traces for plotting.
+
+Plotting every sample of a long capture produces plots that browsers cannot
+open. The traces are reduced to a point budget instead, with one of:
+
+    min_max: The minimum and the maximum of equal sized buckets, in sample
+             order. Every peak of the trace is kept.
+    lttb: Largest-Triangle-Three-Buckets, one point per bucket chosen to
+          preserve the visual shape of the trace.
+
+Each point also carries the average of its bucket, so the average over a
+range of points is the average of the samples they represent.
+
+For interactive plots, write_tiles writes the trace at increasing resolutions
+as tiles, which the plot loads as the view is zoomed in.
+"""
+
+import collections
+import json
+import os
+
+import numpy as np
+
+MIN_MAX = 'min_max'
+LTTB = 'lttb'
+METHODS = (MIN_MAX, LTTB)
+
+# The ratio of the time spans of tiles of consecutive levels.
+ZOOM_FACTOR = 8
+# The name of the file describing the tiles, in the tile directory.
+TILE_INDEX_FILE_NAME = 'index.json'
+
+# A downsampled trace.
+#   indices: The sorted indices of the samples kept.
+#   means: For each sample kept, the average of the samples of its bucket.
+Downsampled = collections.namedtuple('Downsampled', ['indices', 'means'])
+
+
+def _bucket_edges(num_samples, num_buckets):
+    return np.linspace(0, num_samples, num_buckets + 1).astype(np.int64)
+
+
+def _first_matches(values, starts, sizes, targets):
+    """Gets, for each bucket, the index of its first value equal to its
+    target."""
+    bucket = np.repeat(np.arange(len(starts)), sizes)
+    hits = np.flatnonzero(values == np.repeat(targets, sizes))
+    _, first = np.unique(bucket[hits], return_index=True)
+    return hits[first]
+
+
+def min_max(values, num_points):
+    """Keeps the minimum and the maximum of each bucket.
+
+    Args:
+        values: A numpy array of samples.
+        num_points: The maximum number of points to keep, at least 2.
+
+    Returns:
+        A Downsampled trace.
+    """
+    values = np.asarray(values)
+    if len(values) <= num_points:
+        return Downsampled(np.arange(len(values)), values.astype(np.float64))
+    edges = _bucket_edges(len(values), num_points // 2)
+    starts = edges[:-1]
+    sizes = np.diff(edges)
+    mins = _first_matches(values, starts, sizes,
+                          np.minimum.reduceat(values, starts))
+    maxes = _first_matches(values, starts, sizes,
+                           np.maximum.reduceat(values, starts))
+    means = np.add.reduceat(values, starts, dtype=np.float64) / sizes
+    # A flat bucket has the same index for both.
+    indices, unique = np.unique(
+        np.concatenate((mins, maxes)), return_index=True)
+    return Downsampled(indices, np.concatenate((means, means))[unique])
+
+
+def lttb(values, num_points):
+    """Keeps the points of Largest-Triangle-Three-Buckets.
+
+    The first and last samples are kept. The other samples are split into
+    num_points - 2 buckets, and of each bucket the sample forming the
+    largest triangle with the point kept from the previous bucket and the
+    average of the next bucket is kept.
+
+    Args:
+        values: A numpy array of samples.
+        num_points: The maximum number of points to keep, at least 3.
+
+    Returns:
+        A Downsampled trace. The first and last points are their own bucket.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n <= num_points:
+        return Downsampled(np.arange(n), values)
+    edges = 1 + _bucket_edges(n - 2, num_points - 2)
+    starts = edges[:-1]
+    sizes = np.diff(edges)
+    means = np.add.reduceat(values[:-1], starts) / sizes
+    # The average point of the next bucket, the last sample for the last.
+    next_x = np.append(starts[1:] + (sizes[1:] - 1) / 2.0, n - 1)
+    next_y = np.append(means[1:], values[-1])
+    indices = np.empty(num_points, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    previous = 0
+    for b in range(len(starts)):
+        x = np.arange(starts[b], edges[b + 1])
+        y = values[starts[b]:edges[b + 1]]
+        # Twice the triangle areas, the constant factor does not matter.
+        areas = np.abs((previous - next_x[b]) * (y - values[previous]) -
+                       (previous - x) * (next_y[b] - values[previous]))
+        previous = starts[b] + int(np.argmax(areas))
+        indices[b + 1] = previous
+    return Downsampled(indices,
+                       np.concatenate(([values[0]], means, [values[-1]])))
+
+
+def downsample(values, num_points, method=MIN_MAX):
+    """Downsamples a trace with one of METHODS."""
+    if method == MIN_MAX:
+        return min_max(values, num_points)
+    if method == LTTB:
+        return lttb(values, num_points)
+    raise ValueError('Unknown downsampling method %s, expected one of %s.' %
+                     (method, ', '.join(METHODS)))
+
+
+def tile_spans(num_samples, num_points):
+    """Gets the number of samples per tile of each level of tiles.
+
+    Level 1 tiles span 1/ZOOM_FACTOR of the trace, and each level spans
+    1/ZOOM_FACTOR of the previous one, until tiles hold every sample.
+
+    Args:
+        num_samples: The number of samples of the trace.
+        num_points: The point budget of a tile.
+
+    Returns:
+        A list of spans in samples, empty if the trace fits the budget.
+    """
+    spans = []
+    span = num_samples
+    while span > num_points:
+        span = -(-span // ZOOM_FACTOR)
+        spans.append(span)
+    return spans
+
+
+def _js_array(array, decimals):
+    return '[%s]' % ','.join(map(str, np.round(array, decimals).tolist()))
+
+
+def write_tiles(values, hz, directory, num_points, method=MIN_MAX, scale=1):
+    """Writes a trace as tiles of increasing resolution.
+
+    Each tile is a javascript file, so that plots opened from the file
+    system can load it with a script tag. The file registers the tile in
+    window.monsoonTiles under '<directory name>/<level>_<index>', as the
+    columns x0 (time in seconds), y0 (the sample value times scale) and
+    mean (the bucket average times scale). Tiles holding every sample have
+    the time of their first sample as start instead of x0 and mean. The
+    levels are described in TILE_INDEX_FILE_NAME.
+
+    Args:
+        values: A numpy array of samples.
+        hz: The sample rate of the trace.
+        directory: The directory to write the tiles to, created if needed.
+        num_points: The point budget of a tile.
+        method: The downsampling method, one of METHODS.
+        scale: A factor applied to the values, e.g. 1000 for mA.
+
+    Returns:
+        A dictionary with the sample rate, the number of samples and the
+        span and number of tiles of each level, also written to the index.
+    """
+    name = os.path.basename(os.path.normpath(directory))
+    os.makedirs(directory, exist_ok=True)
+    spans = tile_spans(len(values), num_points)
+    index = {
+        'hz': hz,
+        'samples': len(values),
+        'spans': spans,
+        'counts': [-(-len(values) // span) for span in spans]
+    }
+    for level, (span, count) in enumerate(zip(spans, index['counts']), 1):
+        for i in range(count):
+            start = i * span
+            tile = downsample(values[start:start + span], num_points, method)
+            y = _js_array(values[tile.indices + start] * scale, 4)
+            if len(tile.indices) == len(values[start:start + span]):
+                # Tiles of every sample only need the start time, the x0 and
+                # mean columns are implied.
+                columns = '"start": %r, "y0": %s' % (start / hz, y)
+            else:
+                columns = '"x0": %s, "y0": %s, "mean": %s' % (
+                    _js_array((tile.indices + start) / hz, 6), y,
+                    _js_array(tile.means * scale, 4))
+            path = os.path.join(directory, '%d_%d.js' % (level, i))
+            with open(path, 'w') as f:
+                f.write('window.monsoonTiles = window.monsoonTiles || {};\n'
+                        'window.monsoonTiles["%s/%d_%d"] = {%s};\n' %
+                        (name, level, i, columns))
+    with open(os.path.join(directory, TILE_INDEX_FILE_NAME), 'w') as f:
+        json.dump(index, f)
+    return index
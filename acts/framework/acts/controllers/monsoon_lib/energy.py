@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Attributes the charge of a power trace to the phases of a test.
+
+A phase is a named time interval, e.g. a scan or a call setup. Phases come
+from timestamped markers, each starting a phase that lasts until the next
+one, from logcat lines, or from the spans of acts.profiler:
+
+    phases = energy.phases_from_markers([('idle', t0), ('scan', t1),
+                                         ('idle', t2)])
+    for stats in energy.phase_stats(data, phases, start_time=t0):
+        logging.info('%s: %.3fmAh, peak %.1fmA', stats.name, stats.charge,
+                     stats.peak_current)
+
+Wakeup bursts, e.g. the DTIM wakeups of an idle device, are found with
+detect_bursts. The samples are processed with numpy, and the python work
+grows with the number of phases and bursts only.
+
+Times are in seconds, on the clock of the markers. Sample i of a trace was
+measured at start_time + i / hz, so start_time must be on the same clock.
+Currents are in mA and charges in mAh, as in MonsoonData.
+"""
+
+import collections
+import datetime
+import math
+import re
+
+import numpy as np
+
+# The name of the phases of detect_bursts.
+BURST_PHASE_NAME = 'burst'
+# Samples more than this many robust standard deviations above the median
+# are part of a burst, unless a threshold is given.
+DEFAULT_BURST_SIGMAS = 5
+# The minimum difference between the burst threshold and the median, in
+# Amps, so that the quantization noise of a flat trace is not a burst.
+MIN_BURST_RISE = 0.001
+# The scale of the median absolute deviation of a normal distribution.
+_MAD_TO_SIGMA = 1.4826
+
+# The logcat timestamp of the default format, e.g. "07-21 13:51:02.116".
+_LOGCAT_TIMESTAMP_RE = re.compile(r'^(\d\d-\d\d \d\d:\d\d:\d\d\.\d\d\d)')
+
+# A named time interval.
+#   name: The name of the phase.
+#   start: The start time of the phase.
+#   end: The end time of the phase.
+Phase = collections.namedtuple('Phase', ['name', 'start', 'end'])
+
+# The charge and current of the samples of a phase.
+#   name: The name of the phase.
+#   start: The time of the first sample of the phase.
+#   duration: The time spanned by the samples of the phase, in seconds.
+#   charge: The charge in mAh.
+#   energy: The energy in mWh.
+#   average_current: The average current in mA.
+#   peak_current: The highest current in mA.
+#   peak_time: The time of the first sample with the highest current.
+PhaseStats = collections.namedtuple('PhaseStats', [
+    'name', 'start', 'duration', 'charge', 'energy', 'average_current',
+    'peak_current', 'peak_time'
+])
+
+
+def phases_from_markers(markers, end=math.inf):
+    """Gets the phases started by markers.
+
+    Args:
+        markers: An iterable of (name, time) tuples. Each phase lasts until
+                 the next marker, in time order.
+        end: The end time of the last phase, the end of the trace by
+             default.
+
+    Returns:
+        A list of Phases, in time order.
+    """
+    markers = sorted(markers, key=lambda marker: marker[1])
+    ends = [marker[1] for marker in markers[1:]] + [end]
+    return [
+        Phase(name, start, phase_end)
+        for (name, start), phase_end in zip(markers, ends)
+    ]
+
+
+def phases_from_spans(span, separator='/'):
+    """Gets a phase for each span nested in an acts.profiler Span.
+
+    The times are time.monotonic() values. Spans still running are skipped.
+
+    Args:
+        span: A profiler.Span, whose descendants are the phases.
+        separator: The separator of the span names of a phase name, e.g.
+                   'test_scan/adb shell'.
+
+    Returns:
+        A list of Phases, possibly overlapping.
+    """
+    phases = []
+
+    def add(parent, prefix):
+        for child in parent.children:
+            name = prefix + child.name
+            if child.end is not None:
+                phases.append(Phase(name, child.begin, child.end))
+            add(child, name + separator)
+
+    add(span, '')
+    return phases
+
+
+def markers_from_logcat(lines, patterns, year=None):
+    """Gets markers from logcat lines of the default format.
+
+    Logcat timestamps have no year and are in the local time of the
+    device, which is assumed to be the local time of the host.
+
+    Args:
+        lines: An iterable of logcat lines.
+        patterns: A dictionary of marker names to regular expressions. A
+                  line matching a pattern is a marker of that name.
+        year: The year of the timestamps, the current year if None.
+
+    Returns:
+        A list of (name, epoch time) tuples, in the order of the lines.
+    """
+    year = year or datetime.datetime.now().year
+    patterns = [(name, re.compile(pattern))
+                for name, pattern in patterns.items()]
+    markers = []
+    for line in lines:
+        match = _LOGCAT_TIMESTAMP_RE.match(line)
+        if not match:
+            continue
+        for name, pattern in patterns:
+            if pattern.search(line):
+                stamp = datetime.datetime.strptime(
+                    '%d-%s' % (year, match.group(1)), '%Y-%m-%d %H:%M:%S.%f')
+                markers.append((name, stamp.timestamp()))
+                break
+    return markers
+
+
+def _start_time(data, start_time):
+    if start_time is not None:
+        return start_time
+    if len(data.timestamps):
+        return float(data.timestamps[0])
+    return 0.0
+
+
+def _interval_stats(values, starts, ends):
+    """Computes the sums and peaks of sample intervals.
+
+    Args:
+        values: A numpy array of samples.
+        starts: A numpy array of the first indices of the intervals.
+        ends: A numpy array of the indices after the last of the intervals,
+              greater than the starts. Intervals may overlap.
+
+    Returns:
+        A numpy array of the sums of the intervals, and one of the indices
+        of their first highest sample.
+    """
+    num_samples = len(values)
+    # The intervals are made of the segments between consecutive bounds,
+    # whose sums and maxima are computed in one pass over the samples.
+    bounds = np.unique(np.concatenate((starts, ends)))
+    bounds = bounds[bounds < num_samples]
+    bound_ends = np.append(bounds[1:], num_samples)
+    segment_sums = np.add.reduceat(values, bounds, dtype=np.float64)
+    segment_peaks = np.maximum.reduceat(values, bounds)
+    cumulative = np.concatenate(([0.0], np.cumsum(segment_sums)))
+    first = np.searchsorted(bounds, starts)
+    last = np.searchsorted(bounds, ends)
+    sums = cumulative[last] - cumulative[first]
+    peaks = np.empty(len(starts), np.int64)
+    for i, (a, b) in enumerate(zip(first.tolist(), last.tolist())):
+        k = a + int(np.argmax(segment_peaks[a:b]))
+        peaks[i] = bounds[k] + int(np.argmax(values[bounds[k]:bound_ends[k]]))
+    return sums, peaks
+
+
+def _stats(data, names, starts, ends, start_time):
+    """Gets the PhaseStats of non-empty sample intervals."""
+    if not len(starts):
+        return []
+    values = data.data_points
+    sums, peaks = _interval_stats(values, starts, ends)
+    counts = ends - starts
+    charges = sums / data.hz * 1000 / 3600
+    voltage = data.voltage or 0
+    peak_values = values[peaks].astype(np.float64)
+    return [
+        PhaseStats(name, start_time + start / data.hz, count / data.hz,
+                   charge, charge * voltage, total * 1000 / count, peak * 1000,
+                   start_time + peak_index / data.hz)
+        for name, start, count, charge, total, peak, peak_index in zip(
+            names, starts.tolist(), counts.tolist(), charges.tolist(),
+            sums.tolist(), peak_values.tolist(), peaks.tolist())
+    ]
+
+
+def phase_stats(data, phases, start_time=None):
+    """Computes the charge and current of each phase.
+
+    A phase has the samples measured from its start, up to its end. Phases
+    without samples, e.g. outside of the trace, are left out.
+
+    Args:
+        data: A MonsoonData.
+        phases: An iterable of Phases.
+        start_time: The time sample 0 was measured at, on the clock of the
+                    phases. By default, the first timestamp of the data,
+                    which is only precise to the second.
+
+    Returns:
+        A list of PhaseStats, in the order of the phases.
+    """
+    start_time = _start_time(data, start_time)
+    phases = list(phases)
+    num_samples = len(data)
+    times = np.array([(p.start, p.end) for p in phases],
+                     dtype=np.float64).reshape(-1, 2)
+    indices = np.clip(
+        np.round((times - start_time) * data.hz), 0,
+        num_samples).astype(np.int64)
+    non_empty = np.flatnonzero(indices[:, 1] > indices[:, 0])
+    return _stats(data, [phases[i].name for i in non_empty],
+                  indices[non_empty, 0], indices[non_empty, 1], start_time)
+
+
+def burst_threshold(data, sigmas=DEFAULT_BURST_SIGMAS):
+    """Gets a current threshold above the idle current of a trace.
+
+    Args:
+        data: A MonsoonData, mostly idle.
+        sigmas: The number of robust standard deviations above the median.
+
+    Returns:
+        The threshold in Amps.
+    """
+    values = data.data_points
+    median = float(np.median(values))
+    sigma = float(np.median(np.abs(values - median))) * _MAD_TO_SIGMA
+    return median + max(sigmas * sigma, MIN_BURST_RISE)
+
+
+def detect_bursts(data,
+                  threshold=None,
+                  min_duration=0,
+                  merge_gap=0,
+                  start_time=None):
+    """Finds the bursts of current above a threshold.
+
+    Args:
+        data: A MonsoonData.
+        threshold: The current in Amps above which samples are part of a
+                   burst, see burst_threshold for the default.
+        min_duration: The minimum duration of a burst in seconds.
+        merge_gap: Bursts separated by at most this many seconds are merged
+                   into one.
+        start_time: The time sample 0 was measured at, see phase_stats.
+
+    Returns:
+        A list of PhaseStats named BURST_PHASE_NAME, in time order.
+    """
+    if threshold is None:
+        threshold = burst_threshold(data)
+    above = np.concatenate(([False], data.data_points > threshold, [False]))
+    changes = np.flatnonzero(above[1:] != above[:-1])
+    starts = changes[0::2]
+    ends = changes[1::2]
+    if len(starts) > 1:
+        keep = starts[1:] - ends[:-1] > merge_gap * data.hz
+        starts = starts[np.concatenate(([True], keep))]
+        ends = ends[np.concatenate((keep, [True]))]
+    long_enough = ends - starts >= min_duration * data.hz
+    starts = starts[long_enough]
+    ends = ends[long_enough]
+    return _stats(data, [BURST_PHASE_NAME] * len(starts), starts, ends,
+                  _start_time(data, start_time))
+
+
+def summarize_bursts(bursts, duration):
+    """Summarizes the bursts of a trace.
+
+    Args:
+        bursts: The PhaseStats of detect_bursts.
+        duration: The duration of the trace in seconds.
+
+    Returns:
+        A dictionary with the number of bursts, their rate per second, the
+        median time between their starts (the wakeup period, or None with
+        fewer than two bursts), their total charge and their share of the
+        trace's duration.
+    """
+    starts = np.array([b.start for b in bursts])
+    return {
+        'count': len(bursts),
+        'rate': len(bursts) / duration if duration else 0,
+        'period': float(np.median(np.diff(starts))) if len(bursts) > 1 else
+        None,
+        'charge': sum(b.charge for b in bursts),
+        'duty_cycle': (sum(b.duration for b in bursts) / duration
+                       if duration else 0)
+    }
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""A serial port with a simulated Monsoon behind it.
+
+FakeMonsoonSerial answers the commands MonsoonProxy sends, and once told to
+start sampling, produces data packets in real time, as a Monsoon would. The
+current it measures is a function of time on a clock shared with the test,
+so captures from several fake Monsoons can be checked for alignment:
+
+    fake = fake_serial.FakeMonsoonSerial(
+        serial_number=1, current=lambda t: np.where(t < edge, 0.1, 0.2))
+    with mock.patch('serial.Serial', return_value=fake):
+        mon = monsoon.Monsoon(serial=1, device=fake.name)
+"""
+
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+from acts.controllers import monsoon
+
+# The number of samples of a data packet.
+SAMPLES_PER_PACKET = 10
+
+# The calibration the fake Monsoon reports. Fine samples have a resolution of
+# 20uA up to FINE_LIMIT, coarse samples of 2mA.
+_FINE_ZERO = 0
+_FINE_REF = 3320
+_FINE_SCALE = 0.0332 / (_FINE_REF - _FINE_ZERO)
+_COARSE_ZERO = 0
+_COARSE_REF = 2880
+_COARSE_SCALE = 2.88 / (_COARSE_REF - _COARSE_ZERO)
+FINE_LIMIT = 0.32
+
+
+def _frame(payload):
+    """Frames a packet with its length and checksum."""
+    data_len = len(payload) + 1
+    checksum = (data_len + sum(payload)) % 256
+    return bytes([data_len]) + bytes(payload) + bytes([checksum])
+
+
+def encode_currents(amps):
+    """Encodes currents as the main values of samples.
+
+    Args:
+        amps: A numpy array of currents in Amps.
+
+    Returns:
+        A numpy array of SAMPLE_DTYPE, which MonsoonProxy decodes back to the
+        currents, rounded to the resolution of the calibration.
+    """
+    amps = np.clip(amps, 0, None)
+    samples = np.zeros(len(amps), monsoon.SAMPLE_DTYPE)
+    fine = np.round(amps / _FINE_SCALE / 2).astype(np.int64) * 2 + _FINE_ZERO
+    coarse = (np.round(amps / _COARSE_SCALE / 2).astype(np.int64) * 2 +
+              _COARSE_ZERO) | 1
+    samples['main'] = np.where(amps < FINE_LIMIT, fine,
+                               np.minimum(coarse, 32767))
+    return samples
+
+
+class FakeMonsoonSerial(object):
+    """A serial.Serial connected to a simulated Monsoon.
+
+    Attributes:
+        name: The name of the port.
+        timeout: The read timeout in seconds.
+        serial_number: The serial number the Monsoon reports.
+        native_hz: The number of samples per second the Monsoon measures.
+        voltage: The output voltage, as last set.
+        start_time: The clock time at which sampling started, None if not
+                    sampling.
+        write_delay: The number of seconds writes take before the Monsoon
+                     receives the command, to simulate slow ports.
+    """
+
+    def __init__(self,
+                 serial_number=1,
+                 native_hz=5000,
+                 current=lambda t: np.full(len(t), 0.1),
+                 clock=time.monotonic,
+                 write_delay=0):
+        """
+        Args:
+            serial_number: The serial number the Monsoon reports.
+            native_hz: The sample rate, a multiple of 1000.
+            current: A function from a numpy array of clock times to the
+                     currents in Amps measured at those times.
+            clock: The clock the times passed to current are read from.
+            write_delay: The number of seconds writes take.
+        """
+        self.name = 'fake_monsoon_%s' % serial_number
+        self.timeout = 1
+        self.serial_number = serial_number
+        self.native_hz = native_hz
+        self.voltage = 4.2
+        self.start_time = None
+        self.write_delay = write_delay
+        self._current = current
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._commands = bytearray()
+        self._output = bytearray()
+        self._packets_sent = 0
+        self._samples_sent = 0
+        # MonsoonProxy selects on the port to flush it, the output is never
+        # pending on this pipe, as it is produced on demand.
+        self._pipe = os.pipe()
+
+    def fileno(self):
+        return self._pipe[0]
+
+    def close(self):
+        for fd in self._pipe:
+            os.close(fd)
+
+    def write(self, data):
+        if self.write_delay:
+            time.sleep(self.write_delay)
+        with self._lock:
+            self._commands += data
+            while self._commands and len(self._commands) > self._commands[0]:
+                data_len = self._commands[0]
+                self._handle(bytes(self._commands[1:data_len]))
+                del self._commands[:data_len + 1]
+        return len(data)
+
+    def _handle(self, command):
+        if command[0] == 0x01 and command[1] == 0x00:
+            self._output += self._status_packet()
+        elif command[0] == 0x01 and command[1] == 0x01:
+            self.voltage = 2.0 + command[2] * 0.01 if command[2] else 0
+        elif command[0] == 0x02:
+            self.start_time = self._clock()
+            self._samples_sent = 0
+            self._output += self._calibration_packets()
+        elif command[0] == 0x03:
+            self.start_time = None
+
+    def _status_packet(self):
+        status = dict.fromkeys(monsoon.STATUS_FIELDS, 0)
+        status['packetType'] = 0x10
+        status['voltage1'] = int(self.voltage / 0.000125)
+        status['outputVoltageSetting'] = int(round(
+            (self.voltage - 2.0) / 0.01)) if self.voltage else 0
+        status['serialNumber'] = self.serial_number
+        status['sampleRate'] = self.native_hz // 1000
+        return _frame(
+            struct.pack(monsoon.STATUS_FORMAT,
+                        *[status[f] for f in monsoon.STATUS_FIELDS]))
+
+    def _data_packet(self, packet_type, samples):
+        header = bytes([0x20 | (self._packets_sent & 0xF), packet_type, 0, 0])
+        self._packets_sent += 1
+        # A trailing byte, so that the last sample is part of the data.
+        return _frame(header + samples.tobytes() + b'\x00')
+
+    def _calibration_packets(self):
+        packets = b''
+        for packet_type, fine, coarse in ((1, _FINE_ZERO, _COARSE_ZERO),
+                                          (2, _FINE_REF, _COARSE_REF)):
+            samples = np.zeros(2, monsoon.SAMPLE_DTYPE)
+            samples['main'] = (fine, coarse)
+            packets += self._data_packet(packet_type, samples)
+        return packets
+
+    def _sample(self):
+        """Produces the data packets of the samples measured by now."""
+        if self.start_time is None:
+            return
+        first = self._samples_sent
+        elapsed = self._clock() - self.start_time
+        num_packets = int(elapsed * self.native_hz) // SAMPLES_PER_PACKET
+        last = num_packets * SAMPLES_PER_PACKET
+        if last <= first:
+            return
+        self._samples_sent = last
+        times = self.start_time + np.arange(first, last) / self.native_hz
+        samples = encode_currents(np.asarray(self._current(times)))
+        for i in range(0, len(samples), SAMPLES_PER_PACKET):
+            self._output += self._data_packet(
+                0, samples[i:i + SAMPLES_PER_PACKET])
+
+    def _next_packet_time(self):
+        return self.start_time + (
+            self._samples_sent + SAMPLES_PER_PACKET) / self.native_hz
+
+    @property
+    def in_waiting(self):
+        with self._lock:
+            self._sample()
+            return len(self._output)
+
+    def read(self, size=1):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._lock:
+                self._sample()
+                if len(self._output) >= size or self.start_time is None:
+                    break
+                wait = self._next_packet_time() - self._clock()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(max(wait, 0.0005), remaining))
+        with self._lock:
+            result = bytes(self._output[:size])
+            del self._output[:size]
+            return result
+
+    def reset_input_buffer(self):
+        with self._lock:
+            self._sample()
+            del self._output[:]
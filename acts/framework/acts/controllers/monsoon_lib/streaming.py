@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Streams Monsoon samples from a background thread to live consumers.
+
+Monsoon.take_samples blocks its caller for the whole capture. A MonsoonStream
+collects samples on a thread of its own instead, so the test thread is free
+to drive the DUT, and to mark the phases of the capture while sampling goes
+on:
+
+    stream = streaming.MonsoonStream(mon, hz=500)
+    average = stream.subscribe(streaming.RunningAverage())
+    stream.subscribe(streaming.ThresholdTrigger(0.5, on_spike))
+    stream.subscribe(streaming.SampleFileWriter(path))
+    stream.start()
+    stream.mark('screen_on')
+    ...
+    data = stream.stop()
+
+The acquisition thread only decodes samples, and puts them in a bounded
+queue. A dispatch thread delivers them to the consumers, so a slow consumer
+cannot stall the serial port. When the queue is full, the samples are not
+delivered to consumers, but they are still part of the captured data.
+
+The Monsoon must not be sent other commands while it is streaming.
+"""
+
+import collections
+import json
+import logging
+import queue
+import threading
+import time
+
+import numpy as np
+
+from acts.controllers import monsoon
+
+# The number of sample batches the queue to consumers holds. A batch is the
+# output of one CollectData call, at most MAX_PACKETS_PER_COLLECT packets.
+DEFAULT_QUEUE_SIZE = 1024
+# The number of blocks per chunk of the block times, blocks are far fewer
+# than samples.
+_BLOCK_CHUNK_SIZE = 4096
+
+# A batch of consecutive samples.
+#   index: The index of the first sample in the capture.
+#   timestamp: The epoch time at which the samples were decoded.
+#   values: A numpy array of current values in Amps.
+SampleBatch = collections.namedtuple('SampleBatch',
+                                     ['index', 'timestamp', 'values'])
+
+# The start of a phase of the capture.
+#   name: The name of the phase.
+#   index: The index of the first sample of the phase. Samples received by
+#          the Monsoon but not yet decoded when the mark is made count as
+#          part of the phase, a delay in the order of tens of milliseconds.
+#   timestamp: The epoch time at which the mark was made.
+Mark = collections.namedtuple('Mark', ['name', 'index', 'timestamp'])
+
+
+class StreamConsumer(object):
+    """The base class of the consumers of a MonsoonStream.
+
+    The methods are called on the dispatch thread of the stream, marks and
+    batches in capture order.
+    """
+
+    def on_start(self, stream):
+        """Called when the stream starts, before any sample."""
+
+    def on_samples(self, batch):
+        """Called with each SampleBatch."""
+
+    def on_mark(self, mark):
+        """Called with each Mark, after the samples preceding it."""
+
+    def on_stop(self):
+        """Called after the last sample and mark."""
+
+
+class RunningAverage(StreamConsumer):
+    """Keeps the average current of the capture and of each phase.
+
+    Attributes:
+        count: The number of samples received.
+        phase: The name of the current phase, None before the first mark.
+        phase_averages: An OrderedDict of the phase names to their average
+                        current in Amps, for phases that ended. The samples
+                        before the first mark are under None.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.phase = None
+        self.phase_averages = collections.OrderedDict()
+        self._total = 0.0
+        self._phase_count = 0
+        self._phase_total = 0.0
+
+    @property
+    def average(self):
+        """The average current of the capture so far in Amps."""
+        return self._total / self.count if self.count else 0
+
+    @property
+    def phase_average(self):
+        """The average current of the current phase so far in Amps."""
+        if not self._phase_count:
+            return 0
+        return self._phase_total / self._phase_count
+
+    def on_samples(self, batch):
+        total = float(batch.values.sum())
+        self._total += total
+        self._phase_total += total
+        self._phase_count += len(batch.values)
+        self.count += len(batch.values)
+
+    def on_mark(self, mark):
+        if self._phase_count:
+            self.phase_averages[self.phase] = self.phase_average
+        self.phase = mark.name
+        self._phase_count = 0
+        self._phase_total = 0.0
+
+    def on_stop(self):
+        if self._phase_count:
+            self.phase_averages[self.phase] = self.phase_average
+
+
+class RollingAverage(StreamConsumer):
+    """Computes the average over the last n samples as samples arrive.
+
+    This is MonsoonData.get_average_record during the capture.
+
+    Attributes:
+        n: The number of samples to average over.
+        latest: The average of the last n samples received, in Amps.
+    """
+
+    def __init__(self, n, keep_record=False):
+        """
+        Args:
+            n: The number of samples to average over.
+            keep_record: If True, the average at every sample is kept, see
+                         get_record.
+        """
+        self.n = n
+        self.latest = 0
+        self._averager = monsoon.RollingAverager(n)
+        self._record = monsoon.SampleAccumulator() if keep_record else None
+
+    def on_samples(self, batch):
+        averages = self._averager.feed(batch.values)
+        self.latest = float(averages[-1])
+        if self._record is not None:
+            self._record.extend(averages)
+
+    def get_record(self):
+        """Gets the average at every sample received, as a numpy array."""
+        if self._record is None:
+            raise monsoon.MonsoonError(
+                'The record is only kept with keep_record=True.')
+        return self._record.to_array()
+
+
+class ThresholdTrigger(StreamConsumer):
+    """Detects the current crossing a threshold.
+
+    A crossing is a sample beyond the threshold following one that is not,
+    or the first sample of the capture if it is beyond the threshold.
+
+    Attributes:
+        threshold: The threshold in Amps.
+        falling: If True, crossings are from above to below the threshold,
+                 otherwise from below to above.
+        crossings: The indices of the samples that crossed the threshold.
+        triggered: A threading.Event set on the first crossing.
+    """
+
+    def __init__(self, threshold, callback=None, falling=False):
+        """
+        Args:
+            threshold: The threshold in Amps.
+            callback: A function called with the index and the value of each
+                      sample that crosses the threshold, on the dispatch
+                      thread.
+            falling: True to detect the current falling below the threshold.
+        """
+        self.threshold = threshold
+        self.falling = falling
+        self.crossings = []
+        self.triggered = threading.Event()
+        self._callback = callback
+        self._beyond = False
+
+    def on_samples(self, batch):
+        values = batch.values
+        if self.falling:
+            beyond = values < self.threshold
+        else:
+            beyond = values > self.threshold
+        previous = np.concatenate(([self._beyond], beyond[:-1]))
+        for i in np.flatnonzero(beyond & ~previous):
+            index = batch.index + int(i)
+            self.crossings.append(index)
+            if self._callback:
+                self._callback(index, float(values[i]))
+        self._beyond = bool(beyond[-1])
+        if self.crossings:
+            self.triggered.set()
+
+
+class SampleFileWriter(StreamConsumer):
+    """Writes the samples to a file as they are received.
+
+    The file holds the raw current values as little endian float32, and can
+    be read with numpy.fromfile or numpy.memmap, also while the capture is
+    running. The sample rate and the marks are written to a json file next
+    to it when the stream stops.
+
+    Attributes:
+        path: The path of the sample file.
+        metadata_path: The path of the json file.
+    """
+
+    DTYPE = np.dtype('<f4')
+
+    def __init__(self, path):
+        self.path = path
+        self.metadata_path = path + '.json'
+        self._file = None
+        self._stream = None
+        self._marks = []
+        self._count = 0
+
+    def on_start(self, stream):
+        self._stream = stream
+        self._file = open(self.path, 'wb')
+
+    def on_samples(self, batch):
+        # Samples not delivered to consumers leave a gap, which is zero
+        # filled so that positions in the file are sample indices.
+        if batch.index > self._count:
+            self._file.write(
+                np.zeros(batch.index - self._count, self.DTYPE).tobytes())
+        self._file.write(batch.values.astype(self.DTYPE).tobytes())
+        self._file.flush()
+        self._count = batch.index + len(batch.values)
+
+    def on_mark(self, mark):
+        self._marks.append(mark._asdict())
+
+    def on_stop(self):
+        self._file.close()
+        with open(self.metadata_path, 'w') as f:
+            json.dump({
+                'hz': self._stream.hz,
+                'voltage': self._stream.voltage,
+                'dtype': self.DTYPE.str,
+                'samples': self._count,
+                'dropped_samples': self._stream.dropped_samples,
+                'marks': self._marks
+            }, f, indent=4)
+
+
+class MonsoonStream(object):
+    """Collects samples from a Monsoon on a background thread.
+
+    Attributes:
+        monsoon: The Monsoon being sampled.
+        hz: The sample rate of the stream.
+        voltage: The output voltage of the Monsoon, read on start.
+        marks: The Marks of the capture, in order.
+        dropped_samples: The number of samples not delivered to consumers
+                         because the queue was full.
+        error: The exception that ended the acquisition early, or None.
+        start_time: The time.monotonic() at which the Monsoon was told to
+                    start sampling, or None before start.
+        block_ends: After stop, a numpy array of the number of samples
+                    collected after each block of samples was decoded.
+        block_times: After stop, a numpy array of the time.monotonic() at
+                     which each block of samples was decoded.
+    """
+
+    def __init__(self, monsoon_device, hz, queue_size=DEFAULT_QUEUE_SIZE):
+        """
+        Args:
+            monsoon_device: The Monsoon to sample. Its sample_memory_cap and
+                            spill_dir apply to the captured data.
+            hz: The number of samples per second.
+            queue_size: The number of sample batches the queue to consumers
+                        holds.
+        """
+        self.monsoon = monsoon_device
+        self.hz = hz
+        self.voltage = None
+        self.marks = []
+        self.dropped_samples = 0
+        self.error = None
+        self.start_time = None
+        self.block_ends = None
+        self.block_times = None
+        self.log = monsoon_device.log
+        self._consumers = []
+        self._queue = queue.Queue(queue_size)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._count = 0
+        self._values = None
+        self._timestamps = None
+        self._block_ends = None
+        self._block_times = None
+        self._armed = False
+        self._acquisition_thread = None
+        self._dispatch_thread = None
+
+    def subscribe(self, consumer):
+        """Adds a StreamConsumer. Must be called before start.
+
+        Returns:
+            The consumer.
+        """
+        if self._acquisition_thread:
+            raise monsoon.MonsoonError(
+                'Consumers must subscribe before the stream starts.')
+        self._consumers.append(consumer)
+        return consumer
+
+    @property
+    def is_running(self):
+        """True if samples are being collected."""
+        return bool(self._acquisition_thread and
+                    self._acquisition_thread.is_alive())
+
+    @property
+    def sample_count(self):
+        """The number of samples collected so far."""
+        return self._count
+
+    def arm(self):
+        """Prepares the Monsoon and the consumers to start sampling.
+
+        Arming is done by start, it only needs to be called first to start
+        several streams close together.
+        """
+        if self._armed:
+            raise monsoon.MonsoonError('The stream was already armed.')
+        mon = self.monsoon.mon
+        self.voltage = mon.GetVoltage()
+        self.log.info('Streaming samples at %dhz, voltage %.2fv.', self.hz,
+                      self.voltage)
+        # Make sure state is normal
+        mon.StopDataCollection()
+        native_hz = mon.GetStatus()['sampleRate'] * 1000
+        self._resampler = monsoon.Resampler(native_hz, self.hz)
+        self._values = monsoon.SampleAccumulator(
+            memory_cap=self.monsoon.sample_memory_cap,
+            spill_dir=self.monsoon.spill_dir)
+        self._timestamps = monsoon.SampleAccumulator(
+            dtype=np.int64,
+            memory_cap=self.monsoon.sample_memory_cap,
+            spill_dir=self.monsoon.spill_dir)
+        self._block_ends = monsoon.SampleAccumulator(
+            dtype=np.int64, chunk_size=_BLOCK_CHUNK_SIZE)
+        self._block_times = monsoon.SampleAccumulator(
+            chunk_size=_BLOCK_CHUNK_SIZE)
+        for consumer in self._consumers:
+            consumer.on_start(self)
+        self._armed = True
+
+    def start(self):
+        """Starts collecting samples, arming the stream if needed."""
+        if self._acquisition_thread:
+            raise monsoon.MonsoonError('The stream was already started.')
+        if not self._armed:
+            self.arm()
+        self.monsoon.mon.StartDataCollection()
+        self.start_time = time.monotonic()
+        self._acquisition_thread = threading.Thread(
+            target=self._acquire, name='MonsoonAcquisition')
+        self._dispatch_thread = threading.Thread(
+            target=self._dispatch, name='MonsoonDispatch')
+        self._acquisition_thread.start()
+        self._dispatch_thread.start()
+
+    def mark(self, name):
+        """Marks the start of a phase of the capture.
+
+        Args:
+            name: The name of the phase.
+
+        Returns:
+            The Mark.
+        """
+        with self._lock:
+            mark = Mark(name, self._count, time.time())
+            self.marks.append(mark)
+        return mark
+
+    def stop(self):
+        """Stops collecting samples, and waits for the consumers.
+
+        Returns:
+            A MonsoonData of the samples collected, or None if there are
+            none.
+        """
+        if not self._acquisition_thread:
+            raise monsoon.MonsoonError('The stream was not started.')
+        self._stopping.set()
+        self._acquisition_thread.join()
+        self.monsoon.mon.StopDataCollection()
+        self._queue.put(None)
+        self._dispatch_thread.join()
+        if self.dropped_samples:
+            self.log.warning('%d samples were not delivered to consumers.',
+                             self.dropped_samples)
+        try:
+            if not len(self._values):
+                return None
+            return monsoon.MonsoonData(self._values.to_array(),
+                                       self._timestamps.to_array(), self.hz,
+                                       self.voltage)
+        finally:
+            self.block_ends = self._block_ends.to_array()
+            self.block_times = self._block_times.to_array()
+            for accumulator in (self._values, self._timestamps,
+                                self._block_ends, self._block_times):
+                accumulator.close()
+
+    def _acquire(self):
+        mon = self.monsoon.mon
+        try:
+            while not self._stopping.is_set():
+                samples = mon.CollectData()
+                if not samples:
+                    break
+                values = self._resampler.feed(samples)
+                if not len(values):
+                    continue
+                now = time.time()
+                monotonic_now = time.monotonic()
+                with self._lock:
+                    batch = SampleBatch(self._count, now, values)
+                    self._values.extend(values)
+                    self._timestamps.extend(
+                        np.full(len(values), int(now), np.int64))
+                    self._count += len(values)
+                    self._block_ends.append(self._count)
+                    self._block_times.append(monotonic_now)
+                    try:
+                        self._queue.put_nowait(batch)
+                    except queue.Full:
+                        self.dropped_samples += len(values)
+        except Exception as e:
+            self.error = e
+            self.log.exception('Monsoon acquisition stopped.')
+
+    def _deliver(self, method, item):
+        for consumer in self._consumers:
+            try:
+                getattr(consumer, method)(item)
+            except Exception:
+                self.log.exception('Exception in stream consumer %s.',
+                                   consumer)
+
+    def _dispatch(self):
+        delivered_marks = 0
+        while True:
+            batch = self._queue.get()
+            with self._lock:
+                marks = self.marks[delivered_marks:]
+            for mark in marks:
+                if batch is not None and mark.index > batch.index:
+                    break
+                self._deliver('on_mark', mark)
+                delivered_marks += 1
+            if batch is None:
+                break
+            self._deliver('on_samples', batch)
+        for consumer in self._consumers:
+            try:
+                consumer.on_stop()
+            except Exception:
+                self.log.exception('Exception in stream consumer %s.',
+                                   consumer)
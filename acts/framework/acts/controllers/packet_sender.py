@@ -22,10 +22,12 @@ import socket
 import time
 
 import acts.signals
+from acts.libs import lazy_import
 from acts.test_utils.wifi import wifi_power_test_utils as wputils
 # http://www.secdev.org/projects/scapy/
 # On ubuntu, sudo pip3 install scapy-python3
-import scapy.all as scapy
+# scapy takes seconds to import, so it is only imported when packets are made.
+scapy = lazy_import.lazy_import('scapy.all')
 
 ACTS_CONTROLLER_CONFIG_NAME = 'PacketSender'
 ACTS_CONTROLLER_REFERENCE_NAME = 'packet_senders'
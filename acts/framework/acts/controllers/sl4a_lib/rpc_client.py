@@ -21,6 +21,7 @@ from concurrent import futures
 
 from acts import error
 from acts import logger
+from acts import profiler
 
 # The default timeout value when no timeout is set.
 SOCKET_TIMEOUT = 60
@@ -219,6 +220,11 @@ class RpcClient(object):
             Sl4aProtocolError: Something went wrong with the sl4a protocol.
             Sl4aApiError: The rpc went through, however executed with errors.
         """
+        with profiler.span('rpc %s' % method):
+            return self._rpc(method, *args, timeout=timeout, retries=retries)
+
+    def _rpc(self, method, *args, timeout=None, retries=3):
+        """Sends an rpc to sl4a. See rpc."""
         connection = self._get_free_connection()
         ticket = connection.get_new_ticket()
         timed_out = False
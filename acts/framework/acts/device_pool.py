@@ -0,0 +1,243 @@
+#!/usr/bin/env python3.4
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Runs the test cases of a test class concurrently over identical devices.
+
+Each device of the pool is leased to one worker thread. A worker executes
+test cases on its own copy of the test class instance, in which the device
+replaces the first device of the pool, see BaseTestClass.setup_device. The
+workers take test cases from a shared queue until it is empty, so a slow
+device runs fewer test cases.
+
+Every worker also writes the log lines of its thread to a log file of its
+own. The records of all workers are streamed as they finish, and added to
+the results of the test class once all workers are done, in the order of
+the indices the test cases were queued with.
+"""
+
+import itertools
+import logging
+import os
+import queue
+import threading
+
+from acts import logger
+from acts import signals
+
+# The log file of a worker, formatted with the test class and device serial.
+WORKER_LOG_FILE_NAME_FORMAT = "%s_%s.log"
+
+
+class _ThreadFilter(logging.Filter):
+    """Accepts the log records of a single thread."""
+
+    def __init__(self, thread_id):
+        super(_ThreadFilter, self).__init__()
+        self.thread_id = thread_id
+
+    def filter(self, record):
+        return record.thread == self.thread_id
+
+
+class _RecordCollector(object):
+    """The stream writer of a worker's TestResult.
+
+    Passes each record on to the stream writer of the test class right away,
+    and records its queue index, so the records of all workers can be merged
+    in order.
+
+    Attributes:
+        current_index: The queue index of the test case being executed.
+    """
+
+    def __init__(self, entries, counter, lock, stream_writer):
+        self.current_index = 0
+        self._entries = entries
+        self._counter = counter
+        self._lock = lock
+        self._stream_writer = stream_writer
+
+    def write_record(self, record):
+        with self._lock:
+            line = None
+            if self._stream_writer:
+                line = self._stream_writer.write_record(record)
+            self._entries.append((self.current_index, next(self._counter),
+                                  record, line))
+            return line
+
+    def reorder(self, entries):
+        """Restores the order of records a worker's CanonicalOrderBuffer
+        restored, e.g. for reordered generated test cases.
+
+        Args:
+            entries: A list of (record, line number) tuples, in canonical
+                     order.
+        """
+        rank = {id(record): n for n, (record, _) in enumerate(entries)}
+        with self._lock:
+            positions = [
+                n for n, entry in enumerate(self._entries)
+                if id(entry[2]) in rank
+            ]
+            reordered = sorted((self._entries[n] for n in positions),
+                               key=lambda entry: rank[id(entry[2])])
+            for n, entry in zip(positions, reordered):
+                self._entries[n] = self._entries[n][:2] + entry[2:]
+
+
+class DevicePoolRunner(object):
+    """Executes test cases of a test class on a pool of devices.
+
+    Attributes:
+        devices: The devices of the pool.
+        setup_failures: The devices whose setup_device failed, which did not
+                        execute any test case.
+    """
+
+    def __init__(self, test_instance, devices):
+        """
+        Args:
+            test_instance: The BaseTestClass instance, after setup_class.
+            devices: The devices to lease to workers, at least one.
+        """
+        self.devices = list(devices)
+        self.setup_failures = []
+        self._test_instance = test_instance
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._entries = []
+        self._counter = itertools.count()
+        self._aborted = threading.Event()
+        self._abort_all = None
+        self._workers = []
+
+    def _add_worker_log(self, ad):
+        path = os.path.join(
+            self._test_instance.log_path, WORKER_LOG_FILE_NAME_FORMAT %
+            (self._test_instance.TAG, ad.serial))
+        handler = logging.FileHandler(path)
+        handler.setFormatter(
+            logging.Formatter(logger.log_line_format,
+                              logger.log_line_time_format))
+        handler.setLevel(logging.DEBUG)
+        handler.addFilter(_ThreadFilter(threading.get_ident()))
+        logging.getLogger().addHandler(handler)
+        return handler
+
+    def _run_worker(self, ad):
+        handler = self._add_worker_log(ad)
+        try:
+            self._run_tests_on_device(ad)
+        finally:
+            logging.getLogger().removeHandler(handler)
+            handler.close()
+
+    def _run_tests_on_device(self, ad):
+        collector = _RecordCollector(self._entries, self._counter, self._lock,
+                                     self._test_instance.results.stream_writer)
+        worker = self._test_instance._clone_for_device(ad, collector)
+        with self._lock:
+            self._workers.append(worker)
+        try:
+            ready = worker.setup_device(ad) is not False
+        except Exception:
+            worker.log.exception("Exception in setup_device.")
+            ready = False
+        if not ready:
+            worker.log.error("Failed to set up device %s, it will not "
+                             "execute test cases.", ad.serial)
+            with self._lock:
+                self.setup_failures.append(ad)
+            worker._exec_func(worker.teardown_device, ad)
+            return
+        try:
+            while not self._aborted.is_set():
+                try:
+                    index, test_name, test_func = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                collector.current_index = index
+                # Test functions are bound to the instance they were looked
+                # up on, they need to run on the worker's copy instead.
+                if getattr(test_func, "__self__", None) is self._test_instance:
+                    test_func = test_func.__func__.__get__(worker)
+                try:
+                    worker.exec_one_testcase(test_name, test_func,
+                                             worker.cli_args)
+                except signals.TestAbortClass:
+                    self._aborted.set()
+                except signals.TestAbortAll as e:
+                    self._abort_all = e
+                    self._aborted.set()
+        finally:
+            worker._exec_func(worker.teardown_device, ad)
+
+    def run(self, work):
+        """Executes test cases on the pool and merges their records.
+
+        Args:
+            work: A list of (index, test name, test function) tuples, in the
+                  order to execute them. Records are added to the class
+                  results ordered by index.
+
+        Returns:
+            The (index, test name, test function) tuples that were not
+            executed because no device could be set up, in queued order.
+
+        Raises:
+            signals.TestAbortAll: A test case aborted the whole run.
+        """
+        for item in work:
+            self._queue.put(item)
+        threads = [
+            threading.Thread(
+                target=self._run_worker,
+                args=(ad, ),
+                name="DevicePool-%s" % ad.serial) for ad in self.devices
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self._merge()
+        if self._abort_all:
+            raise self._abort_all
+        if len(self.setup_failures) < len(self.devices):
+            return []
+        remaining = []
+        while not self._queue.empty():
+            remaining.append(self._queue.get_nowait())
+        return remaining
+
+    def _merge(self):
+        results = self._test_instance.results
+        self._entries.sort(key=lambda entry: entry[:2])
+        # The records were streamed by the workers already.
+        stream_writer = results.stream_writer
+        results.stream_writer = None
+        try:
+            for entry in self._entries:
+                results.add_record(entry[2])
+        finally:
+            results.stream_writer = stream_writer
+        reorder = getattr(stream_writer, "reorder", None)
+        if reorder and self._entries:
+            reorder([entry[2:] for entry in self._entries])
+        for worker in self._workers:
+            # Names of generated test cases are requested by the workers.
+            results.requested.extend(worker.results.requested)
+            results.extras.update(worker.results.extras)
+            results.controller_info.update(worker.results.controller_info)
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3.4
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""A background queue for collecting post-failure diagnostics.
+
+Bugreports, crash reports and QXDM logs can take minutes per device to
+collect. Instead of blocking the next test case, the collection functions are
+submitted to a DiagnosticsQueue, which runs them off the critical path with a
+bounded number of concurrent tasks per device. The queue must be drained
+before the devices are torn down.
+"""
+
+from concurrent import futures
+import logging
+import threading
+import time
+
+from acts import profiler
+
+DEFAULT_MAX_TASKS_PER_DEVICE = 2
+
+
+class DiagnosticsTask(object):
+    """The bookkeeping for a single diagnostics collection function.
+
+    Attributes:
+        name: A string describing the task, e.g. 'bugreport test_foo'.
+        device: The key of the device the task collects from.
+        submit_time: Epoch time in seconds when the task was queued.
+        start_time: Epoch time in seconds when the task started running.
+        end_time: Epoch time in seconds when the task finished.
+        error: A string describing the exception raised by the task, if any.
+    """
+
+    def __init__(self, name, device):
+        self.name = name
+        self.device = device
+        self.submit_time = time.time()
+        self.start_time = None
+        self.end_time = None
+        self.error = None
+
+    @property
+    def queue_time(self):
+        """Seconds the task waited in the queue before it started."""
+        if self.start_time is None:
+            return time.time() - self.submit_time
+        return self.start_time - self.submit_time
+
+    @property
+    def run_time(self):
+        """Seconds the task spent running."""
+        if self.start_time is None:
+            return 0
+        if self.end_time is None:
+            return time.time() - self.start_time
+        return self.end_time - self.start_time
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'device': self.device,
+            'queue_time': round(self.queue_time, 3),
+            'run_time': round(self.run_time, 3),
+            'finished': self.end_time is not None,
+            'error': self.error,
+        }
+
+
+class DiagnosticsQueue(object):
+    """Runs diagnostics collection functions in the background.
+
+    Each device gets its own executor, so at most max_tasks_per_device
+    functions run against a device at the same time, while different devices
+    are serviced in parallel.
+
+    Attributes:
+        max_tasks_per_device: The number of tasks that may run concurrently
+                              against a single device.
+        tasks: A list of DiagnosticsTask objects, in submission order.
+    """
+
+    def __init__(self, max_tasks_per_device=DEFAULT_MAX_TASKS_PER_DEVICE,
+                 log=logging):
+        self.max_tasks_per_device = max_tasks_per_device
+        self.tasks = []
+        self.log = log
+        self._executors = {}
+        self._futures = []
+        self._lock = threading.Lock()
+
+    def _get_executor(self, device):
+        executor = self._executors.get(device)
+        if executor is None:
+            executor = futures.ThreadPoolExecutor(
+                max_workers=self.max_tasks_per_device)
+            self._executors[device] = executor
+        return executor
+
+    def _run_task(self, task, func, args, kwargs):
+        task.start_time = time.time()
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            task.error = str(e)
+            self.log.exception('Diagnostics task "%s" failed.', task.name)
+        finally:
+            task.end_time = time.time()
+
+    def submit(self, device, name, func, *args, **kwargs):
+        """Queues a diagnostics collection function.
+
+        The arguments are bound at submission time, so everything the function
+        needs to know about the failure (test name, begin time, output paths)
+        should be passed in here rather than read from shared state later.
+        Likewise, the profiler spans of the function are attributed to the
+        span it was submitted from, see profiler.propagate.
+
+        Args:
+            device: A hashable key identifying the device, e.g. its serial.
+            name: A string describing the task.
+            func: The function to run.
+            *args: Positional arguments for func.
+            **kwargs: Keyword arguments for func.
+
+        Returns:
+            A concurrent.futures.Future for the task.
+        """
+        task = DiagnosticsTask(name, device)
+        with self._lock:
+            self.tasks.append(task)
+            future = self._get_executor(device).submit(
+                self._run_task, task, profiler.propagate(func), args, kwargs)
+            self._futures.append(future)
+        return future
+
+    @property
+    def pending(self):
+        """The number of tasks that have not finished yet."""
+        with self._lock:
+            return len([f for f in self._futures if not f.done()])
+
+    def drain(self, timeout=None):
+        """Blocks until all queued tasks have finished.
+
+        Args:
+            timeout: The maximum number of seconds to wait. If None, waits
+                     until every task is done.
+
+        Returns:
+            True if all tasks finished, False if the timeout expired first.
+        """
+        with self._lock:
+            pending = list(self._futures)
+        if not pending:
+            return True
+        self.log.info('Waiting for %s diagnostics tasks to finish.',
+                      len([f for f in pending if not f.done()]))
+        _, not_done = futures.wait(pending, timeout=timeout)
+        if not_done:
+            self.log.warning('%s diagnostics tasks did not finish in %ss.',
+                             len(not_done), timeout)
+        return not not_done
+
+    def shutdown(self, timeout=None):
+        """Drains the queue and releases the worker threads.
+
+        Args:
+            timeout: The maximum number of seconds to wait for pending tasks.
+
+        Returns:
+            True if all tasks finished, False if the timeout expired first.
+        """
+        finished = self.drain(timeout)
+        with self._lock:
+            for executor in self._executors.values():
+                executor.shutdown(wait=finished)
+            self._executors = {}
+            self._futures = [f for f in self._futures if not f.done()]
+        return finished
+
+    def summary_dict(self):
+        """Gets a dictionary summarizing the time spent on diagnostics.
+
+        Queue time and run time are reported separately, as neither of them
+        counts towards the time of the test case that triggered them.
+
+        Returns:
+            A json serializable dictionary.
+        """
+        with self._lock:
+            tasks = list(self.tasks)
+        return {
+            'Tasks': [t.to_dict() for t in tasks],
+            'Total Queue Time': round(sum(t.queue_time for t in tasks), 3),
+            'Total Run Time': round(sum(t.run_time for t in tasks), 3),
+            'Failed': len([t for t in tasks if t.error]),
+            'Unfinished': len([t for t in tasks if t.end_time is None]),
+        }
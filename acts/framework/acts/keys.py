@@ -36,6 +36,14 @@ class Config(enum.Enum):
     key_random = "random"
     key_test_case_iterations = "test_case_iterations"
     key_test_failure_tracebacks = "test_failure_tracebacks"
+    key_async_logging = "async_logging"
+    key_log_queue_size = "log_queue_size"
+    key_log_overflow_policy = "log_overflow_policy"
+    key_lazy_test_discovery = "lazy_test_discovery"
+    key_test_index_path = "test_index_path"
+    key_profile_tests = "profile_tests"
+    key_checkpoint = "checkpoint"
+    key_resume_from = "resume_from"
     # Config names for controllers packaged in ACTS.
     key_android_device = "AndroidDevice"
     key_chameleon_device = "ChameleonDevice"
@@ -55,6 +63,7 @@ class Config(enum.Enum):
     ikey_logger = "log"
     ikey_logpath = "log_path"
     ikey_cli_args = "cli_args"
+    ikey_run_checkpoint = "run_checkpoint"
     # module name of controllers packaged in ACTS.
     m_key_monsoon = "monsoon"
     m_key_android_device = "android_device"
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3.4
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Module proxies that defer importing heavy optional dependencies.
+
+Usage:
+    scapy = lazy_import.lazy_import('scapy.all')
+
+scapy.sendp(...) then imports scapy.all on first use. A missing dependency
+is reported when a function that needs it runs, not when the module using it
+is imported, so tests that do not need the dependency can still run.
+"""
+
+import importlib
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    """A stand-in for a module that is imported on first attribute access.
+
+    Once imported, the attributes of the real module are copied onto the
+    proxy, so later lookups cost the same as on the real module.
+    """
+
+    def __init__(self, name):
+        super(LazyModule, self).__init__(name)
+        self.__dict__['_lazy_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__.update(module.__dict__)
+            self.__dict__['_lazy_module'] = module
+        return module
+
+    def __getattr__(self, name):
+        # Only called for attributes not yet copied from the real module.
+        return getattr(self._load(), name)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        if self.__dict__['_lazy_module'] is None:
+            return "<lazily imported module '%s'>" % self.__name__
+        return repr(self.__dict__['_lazy_module'])
+
+
+def lazy_import(name):
+    """Gets a proxy for a module that imports it on first attribute access.
+
+    If the module is already imported, it is returned directly.
+
+    Args:
+        name: The absolute name of the module, e.g. 'scapy.all'.
+
+    Returns:
+        The module, or a LazyModule standing in for it.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3.4
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Incremental accounting of the bytes written under a log directory.
+
+Walking the whole log directory to enforce a size budget gets slower with
+every artifact written during a run. Instead, the code that writes or pulls
+artifacts reports them with account_path, and the running total is
+reconciled with a directory scan at most once per reconcile interval. The
+scan picks up files written by external tools, e.g. the adb logcat process.
+"""
+
+import os
+import threading
+import time
+
+# Seconds between two reconciliations of the running total with the disk.
+DEFAULT_RECONCILE_INTERVAL = 300
+
+_accountants = {}
+_accountants_lock = threading.Lock()
+
+
+def _get_path_size(path):
+    """Returns the size of a file, or of all files under a directory."""
+    if os.path.isdir(path):
+        total = 0
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, filename))
+                except OSError:
+                    # The file was removed while walking.
+                    pass
+        return total
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class LogSizeAccountant(object):
+    """Keeps a running total of the bytes stored under a log root.
+
+    Attributes:
+        log_root: The absolute path of the directory being accounted.
+        reconcile_interval: Seconds after which the running total is
+                            considered stale and is recomputed from disk.
+    """
+
+    def __init__(self, log_root,
+                 reconcile_interval=DEFAULT_RECONCILE_INTERVAL):
+        self.log_root = os.path.abspath(log_root)
+        self.reconcile_interval = reconcile_interval
+        self._total = 0
+        self._last_reconcile_time = None
+        self._lock = threading.Lock()
+
+    def add_bytes(self, num_bytes):
+        """Adds num_bytes written under the log root to the running total."""
+        with self._lock:
+            self._total += num_bytes
+
+    def add_path(self, path):
+        """Accounts a newly written file or directory under the log root.
+
+        Args:
+            path: The path of the new artifact. Paths outside of the log root
+                  are ignored.
+        """
+        if not self.contains(path):
+            return
+        self.add_bytes(_get_path_size(path))
+
+    def contains(self, path):
+        """Returns True if path is under the log root."""
+        path = os.path.abspath(path)
+        return path == self.log_root or path.startswith(
+            os.path.join(self.log_root, ''))
+
+    def reconcile(self):
+        """Recomputes the running total from disk.
+
+        Returns:
+            The size of the log root in bytes.
+        """
+        total = _get_path_size(self.log_root)
+        with self._lock:
+            self._total = total
+            self._last_reconcile_time = time.time()
+        return total
+
+    @property
+    def is_stale(self):
+        """True if the running total is due to be reconciled."""
+        return (self._last_reconcile_time is None or
+                time.time() - self._last_reconcile_time >=
+                self.reconcile_interval)
+
+    @property
+    def size(self):
+        """The number of bytes under the log root.
+
+        This is O(1) unless the running total is stale.
+        """
+        if self.is_stale:
+            return self.reconcile()
+        return self._total
+
+    def exceeds(self, limit):
+        """Checks whether the log root holds more than limit bytes.
+
+        A positive answer from the running total is confirmed by a
+        reconciliation, since artifacts may have been deleted since they were
+        accounted.
+
+        Args:
+            limit: The size budget in bytes.
+
+        Returns:
+            True if the size of the log root is over limit.
+        """
+        if not self.is_stale and self._total <= limit:
+            return False
+        return self.reconcile() > limit
+
+
+def get_accountant(log_root, reconcile_interval=DEFAULT_RECONCILE_INTERVAL):
+    """Gets the accountant for a log root, creating it if needed.
+
+    Args:
+        log_root: The log directory to account.
+        reconcile_interval: The reconcile interval of a new accountant.
+
+    Returns:
+        The LogSizeAccountant shared by all users of log_root.
+    """
+    log_root = os.path.abspath(log_root)
+    with _accountants_lock:
+        if log_root not in _accountants:
+            _accountants[log_root] = LogSizeAccountant(
+                log_root, reconcile_interval)
+        return _accountants[log_root]
+
+
+def account_path(path):
+    """Reports a newly written artifact to the accountant of its log root.
+
+    Nothing happens if path is not under an accounted log root; its size will
+    be picked up when an accountant is created for it.
+
+    Args:
+        path: The path of a file or directory that was just written.
+    """
+    with _accountants_lock:
+        accountants = [a for a in _accountants.values() if a.contains(path)]
+    if accountants:
+        max(accountants, key=lambda a: len(a.log_root)).add_path(path)
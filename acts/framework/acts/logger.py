@@ -18,9 +18,12 @@ from __future__ import print_function
 
 import datetime
 import logging
+import logging.handlers
 import os
+import queue
 import re
 import sys
+import threading
 
 from acts import tracelogger
 from acts.utils import create_dir
@@ -30,8 +33,25 @@ log_line_format = "%(asctime)s.%(msecs).03d %(levelname)s %(message)s"
 # so the time format does not include ms.
 log_line_time_format = "%Y-%m-%d %H:%M:%S"
 log_line_timestamp_len = 23
+# Length of logcat's default timestamps, which have no year.
+logcat_timestamp_len = 18
 
-logline_timestamp_re = re.compile("\d\d\d\d-\d\d-\d\d \d\d:\d\d:\d\d.\d\d\d")
+logline_timestamp_re = re.compile(r"\d\d\d\d-\d\d-\d\d \d\d:\d\d:\d\d.\d\d\d")
+
+# Overflow policies for the asynchronous logging queue.
+# Block the logging thread until the queue has room.
+OVERFLOW_BLOCK = "block"
+# Drop the new record.
+OVERFLOW_DROP = "drop"
+# Drop new DEBUG records, block for more severe ones.
+OVERFLOW_DROP_DEBUG = "drop_debug"
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP, OVERFLOW_DROP_DEBUG)
+DEFAULT_LOG_QUEUE_SIZE = 10000
+# Maximum number of records written between two flushes of the log files.
+LOG_BATCH_SIZE = 100
+
+# The listener writing records of the asynchronous logger, if one is set up.
+_log_listener = None
 
 
 def _parse_logline_timestamp(t):
@@ -51,6 +71,30 @@ def _parse_logline_timestamp(t):
     return year, month, day, h, m, s, ms
 
 
+def logline_timestamp_to_int(t):
+    """Converts a logline timestamp into an integer with the same ordering.
+
+    Well-formed timestamps are converted by fixed slicing, which is cheap
+    enough to be done for every line of a logcat file. Timestamps without a
+    year ("MM-DD HH:MM:SS.mmm", logcat's default format) are accepted as
+    well, but only compare correctly with other timestamps without a year.
+
+    Args:
+        t: Timestamp in logline format, e.g. "2016-07-21 13:51:02.116".
+
+    Returns:
+        An integer, e.g. 20160721135102116.
+    """
+    if len(t) == log_line_timestamp_len:
+        return int(t[0:4] + t[5:7] + t[8:10] + t[11:13] + t[14:16] +
+                   t[17:19] + t[20:23])
+    if len(t) == logcat_timestamp_len:
+        return int(t[0:2] + t[3:5] + t[6:8] + t[9:11] + t[12:14] + t[15:18])
+    # The milliseconds are not zero-padded by epoch_to_log_line_timestamp.
+    year, month, day, h, m, s, ms = _parse_logline_timestamp(t)
+    return int("%s%s%s%s%s%s%03d" % (year, month, day, h, m, s, int(ms)))
+
+
 def is_valid_logline_timestamp(timestamp):
     if len(timestamp) == log_line_timestamp_len:
         if logline_timestamp_re.match(timestamp):
@@ -68,14 +112,9 @@ def logline_timestamp_comparator(t1, t2):
     Returns:
         -1 if t1 < t2; 1 if t1 > t2; 0 if t1 == t2.
     """
-    dt1 = _parse_logline_timestamp(t1)
-    dt2 = _parse_logline_timestamp(t2)
-    for u1, u2 in zip(dt1, dt2):
-        if u1 < u2:
-            return -1
-        elif u1 > u2:
-            return 1
-    return 0
+    k1 = logline_timestamp_to_int(t1)
+    k2 = logline_timestamp_to_int(t2)
+    return (k1 > k2) - (k1 < k2)
 
 
 def _get_timestamp(time_format, delta=None):
@@ -131,19 +170,145 @@ def get_log_file_timestamp(delta=None):
     return _get_timestamp("%Y-%m-%d-%Y_%H-%M-%S-%f", delta)
 
 
-def _setup_test_logger(log_path, prefix=None, filename=None):
+class _BatchedFileHandler(logging.FileHandler):
+    """A FileHandler that leaves flushing to the queue listener.
+
+    The listener flushes once per batch of records instead of once per record.
+    """
+
+    def emit(self, record):
+        if self.stream is None:
+            self.stream = self._open()
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+
+class _BoundedQueueHandler(logging.handlers.QueueHandler):
+    """A QueueHandler that applies an overflow policy when its queue is full.
+
+    Attributes:
+        overflow_policy: One of OVERFLOW_POLICIES.
+        dropped: The number of records dropped because the queue was full.
+    """
+
+    def __init__(self, log_queue, overflow_policy=OVERFLOW_BLOCK):
+        super(_BoundedQueueHandler, self).__init__(log_queue)
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError("Unknown log overflow policy %s, expected one of "
+                             "%s." % (overflow_policy, OVERFLOW_POLICIES))
+        self.overflow_policy = overflow_policy
+        self.dropped = 0
+
+    def enqueue(self, record):
+        if self.overflow_policy == OVERFLOW_BLOCK:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if (self.overflow_policy == OVERFLOW_DROP_DEBUG and
+                    record.levelno > logging.DEBUG):
+                self.queue.put(record)
+            else:
+                self.dropped += 1
+
+
+class _BatchingQueueListener(object):
+    """Writes the records of a log queue to handlers in a background thread.
+
+    Records are written in the order they were queued. All records available
+    in the queue, up to LOG_BATCH_SIZE, are written before the handlers are
+    flushed.
+    """
+    _SENTINEL = None
+
+    def __init__(self, log_queue, handlers, batch_size=LOG_BATCH_SIZE):
+        self.queue = log_queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._monitor)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _handle(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def _monitor(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = False
+            flush_events = []
+            for record in batch:
+                if record is self._SENTINEL:
+                    stop = True
+                elif isinstance(record, threading.Event):
+                    flush_events.append(record)
+                else:
+                    self._handle(record)
+            for handler in self.handlers:
+                handler.flush()
+            for event in flush_events:
+                event.set()
+            if stop:
+                return
+
+    def flush(self):
+        """Blocks until the records queued so far are written and flushed.
+
+        Records queued by other threads after this call are not waited for.
+        """
+        if self._thread and self._thread.is_alive():
+            flushed = threading.Event()
+            self.queue.put(flushed)
+            flushed.wait()
+
+    def stop(self):
+        """Writes the remaining records and stops the listener thread."""
+        if self._thread and self._thread.is_alive():
+            self.queue.put(self._SENTINEL)
+            self._thread.join()
+        self._thread = None
+
+
+def _setup_test_logger(log_path,
+                       prefix=None,
+                       filename=None,
+                       async_logging=False,
+                       queue_size=DEFAULT_LOG_QUEUE_SIZE,
+                       overflow_policy=OVERFLOW_BLOCK):
     """Customizes the root logger for a test run.
 
     The logger object has a stream handler and a file handler. The stream
     handler logs INFO level to the terminal, the file handler logs DEBUG
     level to files.
 
+    With async_logging, the root logger only puts records in a bounded queue,
+    and a listener thread writes them to the same handlers, so logging calls
+    do not do disk I/O on the calling thread.
+
     Args:
         log_path: Location of the log file.
         prefix: A prefix for each log line in terminal.
         filename: Name of the log file. The default is the time the logger
                   is requested.
+        async_logging: If True, write the logs from a background thread.
+        queue_size: The maximum number of records waiting to be written.
+        overflow_policy: What to do when the queue is full, one of
+                         OVERFLOW_POLICIES.
     """
+    global _log_listener
     log = logging.getLogger()
     kill_test_logger(log)
     log.propagate = False
@@ -162,32 +327,67 @@ def _setup_test_logger(log_path, prefix=None, filename=None):
     if filename is None:
         filename = get_log_file_timestamp()
         create_dir(log_path)
-    fh = logging.FileHandler(os.path.join(log_path, 'test_run_details.txt'))
+    file_handler_cls = (_BatchedFileHandler
+                        if async_logging else logging.FileHandler)
+    fh = file_handler_cls(os.path.join(log_path, 'test_run_details.txt'))
     fh.setFormatter(f_formatter)
     fh.setLevel(logging.DEBUG)
-    fh_info = logging.FileHandler(os.path.join(log_path, 'test_run_info.txt'))
+    fh_info = file_handler_cls(os.path.join(log_path, 'test_run_info.txt'))
     fh_info.setFormatter(f_formatter)
     fh_info.setLevel(logging.INFO)
-    fh_error = logging.FileHandler(
-        os.path.join(log_path, 'test_run_error.txt'))
+    fh_error = file_handler_cls(os.path.join(log_path, 'test_run_error.txt'))
     fh_error.setFormatter(f_formatter)
     fh_error.setLevel(logging.WARNING)
-    log.addHandler(ch)
-    log.addHandler(fh)
-    log.addHandler(fh_info)
-    log.addHandler(fh_error)
+    if async_logging:
+        log_queue = queue.Queue(maxsize=queue_size)
+        log.addHandler(_BoundedQueueHandler(log_queue, overflow_policy))
+        _log_listener = _BatchingQueueListener(log_queue,
+                                               [ch, fh, fh_info, fh_error])
+        _log_listener.start()
+    else:
+        log.addHandler(ch)
+        log.addHandler(fh)
+        log.addHandler(fh_info)
+        log.addHandler(fh_error)
     log.log_path = log_path
     logging.log_path = log_path
 
 
+def flush_test_logger():
+    """Blocks until the asynchronous logger has written all queued records.
+
+    Does nothing if the test logger writes synchronously.
+    """
+    if _log_listener:
+        _log_listener.flush()
+
+
 def kill_test_logger(logger):
     """Cleans up a test logger object by removing all of its handlers.
 
     Args:
         logger: The logging object to clean up.
     """
-    for h in list(logger.handlers):
+    global _log_listener
+    handlers = list(logger.handlers)
+    for h in handlers:
         logger.removeHandler(h)
+    queue_handlers = [
+        h for h in handlers if isinstance(h, _BoundedQueueHandler)
+    ]
+    if _log_listener and queue_handlers:
+        _log_listener.stop()
+        dropped = sum(h.dropped for h in queue_handlers)
+        if dropped:
+            # The queue is gone, the warning goes to the handlers directly.
+            _log_listener._handle(
+                logger.makeRecord(
+                    logger.name, logging.WARNING, __file__, 0,
+                    "Dropped %d log records because the log queue was "
+                    "full, see the log overflow policy.", (dropped, ), None))
+        handlers.extend(_log_listener.handlers)
+        _log_listener = None
+    for h in handlers:
         if isinstance(h, logging.FileHandler):
             h.close()
 
@@ -204,7 +404,12 @@ def create_latest_log_alias(actual_path):
     os.symlink(actual_path, link_path)
 
 
-def setup_test_logger(log_path, prefix=None, filename=None):
+def setup_test_logger(log_path,
+                      prefix=None,
+                      filename=None,
+                      async_logging=False,
+                      queue_size=DEFAULT_LOG_QUEUE_SIZE,
+                      overflow_policy=OVERFLOW_BLOCK):
     """Customizes the root logger for a test run.
 
     Args:
@@ -212,11 +417,16 @@ def setup_test_logger(log_path, prefix=None, filename=None):
         prefix: A prefix for each log line in terminal.
         filename: Name of the files. The default is the time the objects
             are requested.
+        async_logging: If True, write the logs from a background thread.
+        queue_size: The maximum number of records waiting to be written.
+        overflow_policy: What to do when the queue is full, one of
+                         OVERFLOW_POLICIES.
     """
     if filename is None:
         filename = get_log_file_timestamp()
     create_dir(log_path)
-    logger = _setup_test_logger(log_path, prefix, filename)
+    logger = _setup_test_logger(log_path, prefix, filename, async_logging,
+                                queue_size, overflow_policy)
     create_latest_log_alias(log_path)
 
 
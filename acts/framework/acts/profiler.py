@@ -0,0 +1,417 @@
+#!/usr/bin/env python3.4
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Nested timing spans for finding where test cases spend their time.
+
+Framework code marks interesting operations with spans:
+
+    with profiler.span('adb shell'):
+        ...
+
+Spans are only recorded while a Profiler is started, otherwise span() returns
+a shared no-op context manager. Each test case is recorded as its own tree,
+see Profiler.begin_tree. While a Profiler is started, time.sleep is replaced
+so that sleeps show up as 'sleep' spans. Modules that imported sleep with
+"from time import sleep" are not affected.
+
+Spans started on other threads are attached to the span that was innermost
+on the thread that started them, when it called Thread.start, or when it
+wrapped the function they are started from with propagate, e.g. to queue it
+to an executor. Since those spans can overlap, the time of a parent is not
+always the sum of the time of its children. Spans of other threads not
+started from within a test case are recorded in the BACKGROUND_TREE_NAME
+tree, so they are not attributed to the test case running at the time.
+"""
+
+import collections
+import contextlib
+import functools
+import threading
+import time
+import weakref
+
+SLEEP_SPAN_NAME = 'sleep'
+# The name of the tree of the spans of threads not started by a test case.
+BACKGROUND_TREE_NAME = 'background'
+
+_active = None
+_real_sleep = time.sleep
+_real_thread_start = threading.Thread.start
+# The inherited parent of a thread that runs no propagated function.
+_UNSET = object()
+
+
+class Span(object):
+    """A timed operation and the operations nested in it.
+
+    Attributes:
+        name: The name of the operation.
+        begin: The time.monotonic() value when the operation started.
+        end: The time.monotonic() value when the operation ended, or None if
+             it is still running.
+        children: A list of the Spans started during this one.
+    """
+
+    __slots__ = ('name', 'begin', 'end', 'children')
+
+    def __init__(self, name):
+        self.name = name
+        self.begin = time.monotonic()
+        self.end = None
+        self.children = []
+
+    @property
+    def duration(self):
+        """The duration of the span in seconds, up to now if still running."""
+        return (self.end or time.monotonic()) - self.begin
+
+    def to_dict(self):
+        """Gets a json serializable call tree of this span.
+
+        Children with the same name are merged into a single node, so the
+        size of the tree does not grow with the number of calls made.
+
+        Returns:
+            A dictionary with the name, the total duration, the number of
+            calls and the merged children.
+        """
+        return _merge([self])[0]
+
+
+def _merge(spans):
+    """Merges a list of spans into a list of call tree nodes by name."""
+    nodes = collections.OrderedDict()
+    for span in spans:
+        node = nodes.setdefault(span.name, {
+            'name': span.name,
+            'duration': 0,
+            'count': 0,
+            'spans': []
+        })
+        node['duration'] += span.duration
+        node['count'] += 1
+        node['spans'].extend(span.children)
+    for node in nodes.values():
+        children = node.pop('spans')
+        if children:
+            node['children'] = _merge(children)
+    return list(nodes.values())
+
+
+def collapsed_stacks(span, prefix=()):
+    """Gets the self time of every call stack of a span tree.
+
+    Args:
+        span: The root Span.
+        prefix: A tuple of frame names to prepend to every stack.
+
+    Yields:
+        (stack, seconds) tuples, where stack is a tuple of frame names. The
+        self time of a span is its duration minus that of its children,
+        never less than zero.
+    """
+    stack = prefix + (span.name, )
+    child_time = 0
+    for child in span.children:
+        child_time += child.duration
+        yield from collapsed_stacks(child, stack)
+    yield stack, max(span.duration - child_time, 0)
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Profiler(object):
+    """Records span trees, one per test case.
+
+    Attributes:
+        trees: An OrderedDict of the tree name to the list of root Spans
+               recorded under that name, in execution order.
+    """
+
+    def __init__(self):
+        self.trees = collections.OrderedDict()
+        self._thread = None
+        # The stacks of the trees being recorded on the profiling thread,
+        # innermost last. Each stack is a list of open Spans, root first.
+        self._tree_stacks = []
+        self._local = threading.local()
+        # The span each thread started while profiling was started from.
+        self._thread_parents = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Makes this the profiler that records spans from now on."""
+        global _active
+        self._thread = threading.current_thread()
+        _active = self
+        time.sleep = self._sleep
+        threading.Thread.start = _start_thread
+
+    def stop(self):
+        """Stops recording spans."""
+        global _active
+        if _active is self:
+            _active = None
+            time.sleep = _real_sleep
+            threading.Thread.start = _real_thread_start
+
+    def _stack(self):
+        if threading.current_thread() is self._thread:
+            return self._tree_stacks[-1] if self._tree_stacks else None
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _parent(self, stack):
+        if stack:
+            return stack[-1]
+        if threading.current_thread() is self._thread:
+            return None
+        # A top level span of another thread is nested in the span its work
+        # was started from.
+        parent = getattr(self._local, 'parent', _UNSET)
+        if parent is _UNSET:
+            parent = self._thread_parents.get(threading.current_thread())
+        return parent
+
+    def current_span(self):
+        """Gets the innermost span of the calling thread, None if none."""
+        stack = self._stack()
+        if stack and threading.current_thread() is self._thread:
+            # Sleeps do not start threads or queue work.
+            for span in reversed(stack):
+                if span.name != SLEEP_SPAN_NAME:
+                    return span
+        return self._parent(stack)
+
+    def _add_background(self, span):
+        """Records a span of another thread not started by a test case."""
+        root = Span(BACKGROUND_TREE_NAME)
+        root.begin = span.begin
+        root.children.append(span)
+        with self._lock:
+            self.trees.setdefault(BACKGROUND_TREE_NAME, []).append(root)
+        return root
+
+    def begin_tree(self, name):
+        """Starts recording a new span tree on the profiling thread.
+
+        Trees can nest, e.g. generated test cases are executed from within
+        another test case. Spans are recorded into the innermost tree.
+
+        Args:
+            name: The name of the root span, usually the test name.
+
+        Returns:
+            The root Span.
+        """
+        root = Span(name)
+        self._tree_stacks.append([root])
+        return root
+
+    def end_tree(self, root, keep=True):
+        """Stops recording the innermost span tree.
+
+        Args:
+            root: The root Span returned by begin_tree.
+            keep: False to drop the tree, e.g. for a test case that is not
+                  reported.
+        """
+        root.end = time.monotonic()
+        if self._tree_stacks and self._tree_stacks[-1][0] is root:
+            self._tree_stacks.pop()
+        if keep:
+            self.trees.setdefault(root.name, []).append(root)
+
+    @contextlib.contextmanager
+    def span(self, name):
+        """Records the execution of the with block as a span."""
+        stack = self._stack()
+        if stack is None:
+            # Not within a test case, nothing to attribute the time to.
+            yield None
+            return
+        parent = self._parent(stack)
+        span = Span(name)
+        background = None
+        if parent is None:
+            background = self._add_background(span)
+        else:
+            parent.children.append(span)
+        stack.append(span)
+        try:
+            yield span
+        finally:
+            span.end = time.monotonic()
+            if background:
+                background.end = span.end
+            stack.pop()
+
+    @contextlib.contextmanager
+    def _inherit(self, parent):
+        """Nests the top level spans of the with block in parent.
+
+        The spans are background spans if parent is None.
+        """
+        previous = getattr(self._local, 'parent', _UNSET)
+        self._local.parent = parent
+        try:
+            yield
+        finally:
+            if previous is _UNSET:
+                del self._local.parent
+            else:
+                self._local.parent = previous
+
+    def _note_thread_start(self, thread):
+        parent = self.current_span()
+        if parent is not None:
+            with self._lock:
+                self._thread_parents[thread] = parent
+
+    def _sleep(self, seconds):
+        stack = self._stack()
+        # Background threads sleep in loops while idle, only their sleeps
+        # within another span are of interest.
+        if threading.current_thread() is not self._thread and not stack:
+            return _real_sleep(seconds)
+        with self.span(SLEEP_SPAN_NAME):
+            return _real_sleep(seconds)
+
+    def to_dict(self):
+        """Gets the merged call trees of the recorded span trees.
+
+        Returns:
+            A dictionary of the tree name to a list of call trees, one per
+            execution, see Span.to_dict. The BACKGROUND_TREE_NAME tree has a
+            single call tree.
+        """
+        trees = collections.OrderedDict()
+        for name, roots in self.trees.items():
+            if name == BACKGROUND_TREE_NAME:
+                # Background spans are not executions of anything, they are
+                # merged into a single call tree.
+                trees[name] = _merge(roots)
+            else:
+                trees[name] = [root.to_dict() for root in roots]
+        return trees
+
+    def write_collapsed(self, path, prefix=()):
+        """Appends the recorded trees to a collapsed stack file.
+
+        Each line of the file is a semicolon separated call stack followed by
+        its self time in microseconds, the input format of flame graph tools
+        such as flamegraph.pl and speedscope. Identical stacks are summed.
+
+        Args:
+            path: The path of the file to append to.
+            prefix: A tuple of frame names to prepend to every stack, e.g. the
+                    test class name.
+        """
+        totals = collections.OrderedDict()
+        for roots in self.trees.values():
+            for root in roots:
+                for stack, seconds in collapsed_stacks(root, tuple(prefix)):
+                    totals[stack] = totals.get(stack, 0) + seconds
+        with open(path, 'a') as f:
+            for stack, seconds in totals.items():
+                micros = int(round(seconds * 1e6))
+                if micros:
+                    f.write('%s %d\n' % (';'.join(
+                        frame.replace(';', ':') for frame in stack), micros))
+
+
+def span(name):
+    """Gets a context manager recording a span in the active profiler.
+
+    Args:
+        name: The name of the span.
+
+    Returns:
+        A context manager, which does nothing if no profiler is active.
+    """
+    profiler = _active
+    if profiler is None:
+        return _NULL_SPAN
+    return profiler.span(name)
+
+
+def _start_thread(thread):
+    """Replaces Thread.start while a profiler is active.
+
+    Notes the span the thread is started from, see Profiler._parent.
+    """
+    profiler = _active
+    if profiler is not None:
+        profiler._note_thread_start(thread)
+    return _real_thread_start(thread)
+
+
+def propagate(func):
+    """Wraps a function to nest its spans in the current span.
+
+    For functions run on threads that were not started for them, e.g. those
+    of an executor, whose spans would otherwise be attributed to the span the
+    thread was started from.
+
+    Args:
+        func: The function to wrap.
+
+    Returns:
+        A function that runs func with its top level spans nested in the span
+        that is current now, on whichever thread it is called. func itself if
+        no profiler is active.
+    """
+    profiler = _active
+    if profiler is None:
+        return func
+    parent = profiler.current_span()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with profiler._inherit(parent):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def profiled(name=None):
+    """Decorates a function to record each of its calls as a span.
+
+    Args:
+        name: The name of the span, the function's qualified name by default.
+    """
+
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
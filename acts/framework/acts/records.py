@@ -18,7 +18,11 @@
 
 import json
 import logging
+import os
 import pprint
+import sys
+import threading
+import time
 
 from acts import logger
 from acts import signals
@@ -50,9 +54,19 @@ class TestResultEnums(object):
     TEST_RESULT_UNKNOWN = "UNKNOWN"
 
 
+# Number of streamed records after which the stream file is fsync'ed.
+STREAM_FSYNC_BATCH_SIZE = 20
+# Seconds after which a streamed record is fsync'ed regardless of batch size.
+STREAM_FSYNC_INTERVAL = 5
+
+
 class TestResultRecord(object):
     """A record that holds the information of a test case execution.
 
+    Records of a large run are kept in memory until the run ends, so the
+    record uses __slots__, interns the test class name, and derives the log
+    line timestamps from the epoch times on demand.
+
     Attributes:
         test_name: A string representing the name of the test case.
         begin_time: Epoch timestamp of when the test case started.
@@ -63,18 +77,63 @@ class TestResultRecord(object):
         self.details: A string explaining the details of the test case.
     """
 
+    __slots__ = ('test_name', 'test_class', 'begin_time', 'end_time',
+                 '_log_begin_time', '_log_end_time', 'uid', 'result',
+                 'extras', 'details', '_additional_errors')
+
     def __init__(self, t_name, t_class=None):
         self.test_name = t_name
+        if isinstance(t_class, str):
+            t_class = sys.intern(t_class)
         self.test_class = t_class
         self.begin_time = None
         self.end_time = None
-        self.log_begin_time = None
-        self.log_end_time = None
+        self._log_begin_time = None
+        self._log_end_time = None
         self.uid = None
         self.result = None
         self.extras = None
         self.details = None
-        self.additional_errors = {}
+        self._additional_errors = None
+
+    @staticmethod
+    def _to_log_line_timestamp(epoch_time):
+        if epoch_time is None:
+            return None
+        return logger.epoch_to_log_line_timestamp(epoch_time)
+
+    @property
+    def log_begin_time(self):
+        """The begin time in log line timestamp format."""
+        if self._log_begin_time is not None:
+            return self._log_begin_time
+        return self._to_log_line_timestamp(self.begin_time)
+
+    @log_begin_time.setter
+    def log_begin_time(self, value):
+        self._log_begin_time = value
+
+    @property
+    def log_end_time(self):
+        """The end time in log line timestamp format."""
+        if self._log_end_time is not None:
+            return self._log_end_time
+        return self._to_log_line_timestamp(self.end_time)
+
+    @log_end_time.setter
+    def log_end_time(self, value):
+        self._log_end_time = value
+
+    @property
+    def additional_errors(self):
+        """A dict of the errors added with add_error, keyed by tag."""
+        if self._additional_errors is None:
+            return {}
+        return self._additional_errors
+
+    @additional_errors.setter
+    def additional_errors(self, value):
+        self._additional_errors = value or None
 
     def test_begin(self):
         """Call this when the test case it records begins execution.
@@ -82,8 +141,6 @@ class TestResultRecord(object):
         Sets the begin_time of this record.
         """
         self.begin_time = utils.get_current_epoch_time()
-        self.log_begin_time = logger.epoch_to_log_line_timestamp(
-            self.begin_time)
 
     def _test_end(self, result, e):
         """Class internal function to signal the end of a test case execution.
@@ -95,9 +152,8 @@ class TestResultRecord(object):
                 acts.signals.TestSignal.
         """
         self.end_time = utils.get_current_epoch_time()
-        self.log_end_time = logger.epoch_to_log_line_timestamp(self.end_time)
         self.result = result
-        if self.additional_errors:
+        if self._additional_errors:
             self.result = TestResultEnums.TEST_RESULT_UNKNOWN
         if isinstance(e, signals.TestSignal):
             self.details = e.details
@@ -161,7 +217,9 @@ class TestResultRecord(object):
             e: An exception object.
         """
         self.result = TestResultEnums.TEST_RESULT_UNKNOWN
-        self.additional_errors[tag] = str(e)
+        if self._additional_errors is None:
+            self._additional_errors = {}
+        self._additional_errors[tag] = str(e)
 
     def __str__(self):
         d = self.to_dict()
@@ -210,6 +268,28 @@ class TestResultRecord(object):
         """
         return json.dumps(self.to_dict())
 
+    @classmethod
+    def from_dict(cls, d):
+        """Creates a record from a dictionary produced by to_dict.
+
+        Args:
+            d: A dictionary representing a test record.
+
+        Returns:
+            A TestResultRecord object.
+        """
+        record = cls(d[TestResultEnums.RECORD_NAME],
+                     d.get(TestResultEnums.RECORD_CLASS))
+        record.begin_time = d.get(TestResultEnums.RECORD_BEGIN_TIME)
+        record.end_time = d.get(TestResultEnums.RECORD_END_TIME)
+        record.result = d.get(TestResultEnums.RECORD_RESULT)
+        record.uid = d.get(TestResultEnums.RECORD_UID)
+        record.extras = d.get(TestResultEnums.RECORD_EXTRAS)
+        record.details = d.get(TestResultEnums.RECORD_DETAILS)
+        record.additional_errors = d.get(
+            TestResultEnums.RECORD_ADDITIONAL_ERRORS)
+        return record
+
 
 class TestResult(object):
     """A class that contains metrics of a test run.
@@ -237,6 +317,7 @@ class TestResult(object):
         self.controller_info = {}
         self.post_run_data = {}
         self.extras = {}
+        self.stream_writer = None
 
     def __add__(self, r):
         """Overrides '+' operator for TestResult class.
@@ -259,14 +340,45 @@ class TestResult(object):
             l_value = getattr(self, name)
             if isinstance(r_value, list):
                 setattr(sum_result, name, l_value + r_value)
+            elif name == "extras":
+                # Extras are keyed by their producer, e.g. a test class or a
+                # controller, so the two sides are merged.
+                extras = dict(l_value)
+                extras.update(r_value)
+                setattr(sum_result, name, extras)
             elif isinstance(r_value, dict):
                 # '+' operator for TestResult is only valid when multiple
                 # TestResult objs were created in the same test run, which means
                 # the controller info would be the same across all of them.
                 # TODO(angli): have a better way to validate this situation.
                 setattr(sum_result, name, l_value)
+        sum_result.stream_writer = self.stream_writer
         return sum_result
 
+    def __iadd__(self, r):
+        """Overrides '+=' operator for TestResult class.
+
+        Same as '+', but the lists of r are appended to this object in place,
+        so merging class results into a run result does not copy all of the
+        records accumulated so far.
+
+        Args:
+            r: another instance of TestResult to be added
+
+        Returns:
+            This TestResult instance.
+        """
+        if not isinstance(r, TestResult):
+            raise TypeError("Operand %s of type %s is not a TestResult." %
+                            (r, type(r)))
+        for name, l_value in self.__dict__.items():
+            r_value = getattr(r, name)
+            if isinstance(l_value, list):
+                l_value.extend(r_value)
+            elif name == "extras":
+                l_value.update(r_value)
+        return self
+
     def add_controller_info(self, name, info):
         try:
             json.dumps(info)
@@ -307,6 +419,8 @@ class TestResult(object):
         else:
             self.executed.append(record)
             self.unknown.append(record)
+        if self.stream_writer:
+            self.stream_writer.write_record(record)
 
     @property
     def is_all_pass(self):
@@ -376,3 +490,234 @@ class TestResult(object):
         d["Blocked"] = len(self.blocked)
         d["Unknown"] = len(self.unknown)
         return d
+
+
+class TestResultStreamWriter(object):
+    """Appends test records to a JSON lines file as they are added.
+
+    Each line of the stream is the json representation of one record, written
+    as soon as the record is added to a TestResult. The file is flushed after
+    every record, so it can be tailed to follow the progress of a run, and
+    fsync'ed in batches so that a crash of the host loses at most a few
+    records.
+
+    Records of test cases run out of canonical order, see
+    acts.test_order, are streamed as they finish, and put back in canonical
+    order in the summary written by write_summary_from_stream.
+
+    Attributes:
+        path: The path of the stream file.
+        canonical_orders: A list of lists of the line numbers of records
+                          streamed out of canonical order, each in canonical
+                          order, see reorder.
+    """
+
+    def __init__(self,
+                 path,
+                 fsync_batch_size=STREAM_FSYNC_BATCH_SIZE,
+                 fsync_interval=STREAM_FSYNC_INTERVAL):
+        self.path = path
+        self.canonical_orders = []
+        self._count = 0
+        self._fsync_batch_size = fsync_batch_size
+        self._fsync_interval = fsync_interval
+        self._file = open(path, 'a')
+        self._unsynced = 0
+        self._last_sync_time = time.time()
+        self._lock = threading.Lock()
+
+    def write_record(self, record):
+        """Appends a record to the stream.
+
+        Args:
+            record: A TestResultRecord object.
+
+        Returns:
+            The line number of the record in the stream, or None if it was
+            not streamed.
+        """
+        try:
+            line = record.json_str()
+        except TypeError:
+            logging.exception("Record of %s is not JSON serializable, it will "
+                              "not be streamed.", record.test_name)
+            return None
+        with self._lock:
+            if self._file is None:
+                return None
+            self._file.write(line + '\n')
+            self._file.flush()
+            self._unsynced += 1
+            if (self._unsynced >= self._fsync_batch_size or
+                    time.time() - self._last_sync_time >= self._fsync_interval):
+                self._sync()
+            self._count += 1
+            return self._count - 1
+
+    def reorder(self, entries):
+        """Notes the canonical order of records streamed out of order.
+
+        Args:
+            entries: A list of (record, line number) tuples, in canonical
+                     order, with the line numbers returned by write_record.
+        """
+        lines = [line for _, line in entries if line is not None]
+        if lines:
+            with self._lock:
+                self.canonical_orders.append(lines)
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync_time = time.time()
+
+    def sync(self):
+        """Forces the streamed records to disk."""
+        with self._lock:
+            if self._file is not None and self._unsynced:
+                self._sync()
+
+    def close(self):
+        """Syncs and closes the stream file."""
+        with self._lock:
+            if self._file is None:
+                return
+            self._sync()
+            self._file.close()
+            self._file = None
+
+
+def iter_streamed_records(path):
+    """Reads the records of a stream file one at a time.
+
+    A partially written last line, e.g. from a host crash, is skipped.
+
+    Args:
+        path: The path of a file written by TestResultStreamWriter.
+
+    Yields:
+        A dictionary for each record, as returned by TestResultRecord.to_dict.
+    """
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logging.warning("Skipping malformed line in %s: %s", path,
+                                line)
+
+
+def _indent(text, prefix):
+    return '\n'.join(prefix + line for line in text.split('\n'))
+
+
+def _in_canonical_order(streamed, canonical_orders):
+    """Puts streamed records back in canonical order.
+
+    Args:
+        streamed: An iterable of the records of a stream, in line order.
+        canonical_orders: Lists of line numbers in canonical order, see
+                          TestResultStreamWriter.reorder.
+
+    Yields:
+        The records. The records of each list of line numbers are held back
+        until the last of them, and yielded in canonical order.
+    """
+    held_lines = {}
+    for order in canonical_orders:
+        block = (order, {})
+        for line in order:
+            held_lines[line] = block
+    pending = []
+    for line, record in enumerate(streamed):
+        block = held_lines.pop(line, None)
+        if block is None:
+            yield record
+            continue
+        order, held = block
+        if not held:
+            pending.append(block)
+        held[line] = record
+        if len(held) == len(order):
+            pending.remove(block)
+            for held_line in order:
+                yield held[held_line]
+    # The stream of a crashed run may lack some of the records.
+    for order, held in pending:
+        for held_line in order:
+            if held_line in held:
+                yield held[held_line]
+
+
+def write_summary_from_stream(stream_path,
+                              summary_path,
+                              test_result,
+                              canonical_orders=()):
+    """Writes the test run summary file from a record stream.
+
+    The records are read from the stream one at a time, so memory use does not
+    grow with the number of records. The output is the same as writing
+    test_result.json_str(), with the record list and counts taken from the
+    stream and the rest taken from test_result.
+
+    Args:
+        stream_path: The path of a file written by TestResultStreamWriter.
+        summary_path: The path of the summary json file to write.
+        test_result: The TestResult of the run, used for the requested
+                     tests, the controller info and the extras.
+        canonical_orders: The canonical_orders of the TestResultStreamWriter,
+                          to report reordered test cases in canonical order.
+    """
+    counts = {
+        "Executed": 0,
+        "Passed": 0,
+        "Failed": 0,
+        "Skipped": 0,
+        "Blocked": 0,
+        "Unknown": 0
+    }
+    indent = ' ' * 4
+    tmp_path = summary_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write('{\n')
+        f.write('%s"ControllerInfo": %s,\n' % (indent, _indent(
+            json.dumps(test_result.controller_info, indent=4, sort_keys=True),
+            indent)[len(indent):]))
+        f.write('%s"Extras": %s,\n' % (indent, _indent(
+            json.dumps(test_result.extras, indent=4, sort_keys=True),
+            indent)[len(indent):]))
+        f.write('%s"Results": [' % indent)
+        first = True
+        for record in _in_canonical_order(
+                iter_streamed_records(stream_path), canonical_orders):
+            result = record[TestResultEnums.RECORD_RESULT]
+            if result == TestResultEnums.TEST_RESULT_SKIP:
+                counts["Skipped"] += 1
+                continue
+            if result == TestResultEnums.TEST_RESULT_BLOCKED:
+                counts["Blocked"] += 1
+                continue
+            counts["Executed"] += 1
+            if result == TestResultEnums.TEST_RESULT_PASS:
+                counts["Passed"] += 1
+            elif result == TestResultEnums.TEST_RESULT_FAIL:
+                counts["Failed"] += 1
+            else:
+                counts["Unknown"] += 1
+            f.write('\n' if first else ',\n')
+            first = False
+            f.write(
+                _indent(
+                    json.dumps(record, indent=4, sort_keys=True),
+                    indent * 2))
+        f.write('],\n' if first else '\n%s],\n' % indent)
+        summary = test_result.summary_dict()
+        summary.update(counts)
+        f.write('%s"Summary": %s\n' % (indent, _indent(
+            json.dumps(summary, indent=4, sort_keys=True),
+            indent)[len(indent):]))
+        f.write('}')
+    os.rename(tmp_path, summary_path)
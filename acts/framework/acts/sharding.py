@@ -0,0 +1,562 @@
+#!/usr/bin/env python3.4
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Distributes the units of a test run across several testbeds.
+
+The requested tests are split into units, one per test case where the run
+list names test cases and one per test class otherwise. Generated test cases
+run as part of the test case that generates them. Each testbed runs in its own
+process and is handed the next unit whenever it becomes idle, so faster
+testbeds take on more of the run.
+
+A unit whose records show that the testbed itself is broken (the test runner
+raised, or every test was blocked because setup_class failed) is retried on
+another testbed, and a testbed that breaks max_consecutive_failures units in
+a row is retired.
+
+Preflight and Postflight classes prepare and clean up a testbed, so they are
+not sharded: every testbed runs them before its first and after its last
+unit.
+"""
+
+import collections
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import time
+import traceback
+
+from acts import config_parser
+from acts import keys
+from acts import records
+from acts import signals
+from acts import test_runner
+
+DEFAULT_MAX_ATTEMPTS = 2
+DEFAULT_MAX_CONSECUTIVE_FAILURES = 2
+# Seconds to wait for a message before checking on the worker processes.
+POLL_INTERVAL = 5
+SUMMARY_FILE_NAME = "sharded_run_summary.json"
+
+_MSG_READY = "ready"
+_MSG_RESULT = "result"
+_MSG_FAILED = "failed"
+
+
+class TestUnit(object):
+    """A piece of a test run that can be executed on any testbed.
+
+    Attributes:
+        index: The position of the unit in the requested run, used to report
+               the results in the requested order.
+        test_class: The name of the test class.
+        test_cases: A list of test case names, or None for the whole class.
+        attempts: The number of times the unit was handed to a testbed.
+        failed_testbeds: The names of the testbeds the unit broke on.
+    """
+
+    def __init__(self, index, test_class, test_cases=None):
+        self.index = index
+        self.test_class = test_class
+        self.test_cases = test_cases
+        self.attempts = 0
+        self.failed_testbeds = []
+
+    @property
+    def run_list(self):
+        """The unit as a TestRunner run list."""
+        return [(self.test_class, self.test_cases)]
+
+    def __str__(self):
+        if self.test_cases:
+            return "%s:%s" % (self.test_class, ",".join(self.test_cases))
+        return self.test_class
+
+
+class UnitResult(object):
+    """The outcome of executing a unit on a testbed.
+
+    Attributes:
+        testbed: The name of the testbed that ran the unit.
+        index: The index of the unit.
+        records: A list of record dictionaries, see TestResultRecord.to_dict.
+        duration: Seconds spent running the unit.
+        broken: True if the records indicate the testbed is broken.
+        aborted: True if a test requested to abort the whole run.
+        error: A string describing the exception that broke the testbed.
+    """
+
+    def __init__(self, testbed, index, records=None, duration=0,
+                 broken=False, aborted=False, error=None):
+        self.testbed = testbed
+        self.index = index
+        self.records = records or []
+        self.duration = duration
+        self.broken = broken
+        self.aborted = aborted
+        self.error = error
+
+
+class TestbedStats(object):
+    """Bookkeeping of the work done by one testbed."""
+
+    def __init__(self, name):
+        self.name = name
+        self.units = 0
+        self.busy_time = 0
+        self.broken_units = 0
+        self.consecutive_failures = 0
+        self.retired = False
+
+    def to_dict(self, wall_time):
+        return {
+            'Units': self.units,
+            'Busy Time': round(self.busy_time, 3),
+            'Utilization': round(self.busy_time / wall_time, 3)
+            if wall_time else 0,
+            'Broken Units': self.broken_units,
+            'Retired': self.retired,
+        }
+
+
+def split_test_identifiers(test_identifiers, repeat=1):
+    """Splits a run list into shardable units.
+
+    Args:
+        test_identifiers: A list of (test class name, test case names) tuples,
+                          see config_parser.parse_test_list.
+        repeat: Number of times to run the whole list.
+
+    Returns:
+        A tuple of (preflight list, list of TestUnit, postflight list). The
+        preflight and postflight lists are run lists for each testbed.
+    """
+    preflight = [(c, t) for c, t in test_identifiers if "Preflight" in c]
+    postflight = [(c, t) for c, t in test_identifiers if "Postflight" in c]
+    units = []
+    for _ in range(repeat):
+        for test_class, test_cases in test_identifiers:
+            if "Preflight" in test_class or "Postflight" in test_class:
+                continue
+            if test_cases:
+                for test_case in test_cases:
+                    units.append(TestUnit(len(units), test_class, [test_case]))
+            else:
+                units.append(TestUnit(len(units), test_class))
+    return preflight, units, postflight
+
+
+class ShardScheduler(object):
+    """Decides which testbed runs which unit.
+
+    The scheduler does not run anything itself. The caller asks for the next
+    unit of an idle testbed with next_unit and hands the outcome back with
+    report.
+
+    Attributes:
+        max_attempts: The number of testbeds a unit may be tried on.
+        max_consecutive_failures: The number of broken units in a row after
+                                  which a testbed is retired.
+        testbeds: An OrderedDict mapping testbed names to TestbedStats.
+        results: A dict mapping unit indices to their accepted UnitResult.
+        aborted: True once a unit requested to abort the run.
+    """
+
+    def __init__(self,
+                 units,
+                 testbed_names,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 max_consecutive_failures=DEFAULT_MAX_CONSECUTIVE_FAILURES):
+        self.units = list(units)
+        self.max_attempts = max_attempts
+        self.max_consecutive_failures = max_consecutive_failures
+        self.testbeds = collections.OrderedDict(
+            (name, TestbedStats(name)) for name in testbed_names)
+        self.results = {}
+        self.aborted = False
+        self._pending = collections.deque(self.units)
+        self._in_flight = {}
+        # The results of broken attempts of units that are being retried.
+        self._last_results = {}
+        self._start_time = time.time()
+        self._end_time = None
+
+    @property
+    def live_testbeds(self):
+        return [t.name for t in self.testbeds.values() if not t.retired]
+
+    @property
+    def is_done(self):
+        """True when no unit is left to run or running."""
+        return not self._pending and not self._in_flight
+
+    def next_unit(self, testbed):
+        """Gets the next unit for an idle testbed.
+
+        Args:
+            testbed: The name of the idle testbed.
+
+        Returns:
+            A TestUnit, or None if there is nothing the testbed may run now.
+        """
+        if self.aborted or self.testbeds[testbed].retired:
+            return None
+        for unit in self._pending:
+            if testbed not in unit.failed_testbeds:
+                self._pending.remove(unit)
+                unit.attempts += 1
+                self._in_flight[unit.index] = unit
+                return unit
+        return None
+
+    def _can_retry(self, unit):
+        if unit.attempts >= self.max_attempts:
+            return False
+        return any(t not in unit.failed_testbeds for t in self.live_testbeds)
+
+    def report(self, result):
+        """Records the outcome of a unit.
+
+        Args:
+            result: The UnitResult of the unit.
+
+        Returns:
+            True if the unit was queued again to be retried elsewhere.
+        """
+        unit = self._in_flight.pop(result.index)
+        stats = self.testbeds[result.testbed]
+        stats.units += 1
+        stats.busy_time += result.duration
+        if result.aborted:
+            self.aborted = True
+        if not result.broken:
+            stats.consecutive_failures = 0
+            self.results[unit.index] = result
+            return False
+        stats.broken_units += 1
+        stats.consecutive_failures += 1
+        if stats.consecutive_failures >= self.max_consecutive_failures:
+            self.retire(result.testbed)
+        unit.failed_testbeds.append(result.testbed)
+        if not self.aborted and self._can_retry(unit):
+            self._last_results[unit.index] = result
+            self._pending.appendleft(unit)
+            return True
+        self.results[unit.index] = result
+        return False
+
+    def retire(self, testbed):
+        """Stops handing units to a testbed."""
+        self.testbeds[testbed].retired = True
+
+    def abandon_pending(self, reason):
+        """Gives up on the units no testbed can run.
+
+        Each abandoned unit keeps the records of its last attempt. A unit that
+        never ran gets a blocked record instead.
+
+        Args:
+            reason: A string explaining why the units were abandoned.
+        """
+        while self._pending:
+            unit = self._pending.popleft()
+            if unit.index in self._last_results:
+                self.results[unit.index] = self._last_results[unit.index]
+                continue
+            record = records.TestResultRecord(
+                unit.test_cases[0] if unit.test_cases else "*all*",
+                unit.test_class)
+            record.test_begin()
+            record.test_blocked(signals.TestBlocked(reason))
+            self.results[unit.index] = UnitResult(
+                None, unit.index, records=[record.to_dict()])
+        self._end_time = time.time()
+
+    def get_merged_result(self):
+        """Merges the accepted records of all units into one TestResult.
+
+        Records are added in the order of the units in the requested run, not
+        in the order they finished.
+
+        Returns:
+            A records.TestResult object.
+        """
+        merged = records.TestResult()
+        for unit in self.units:
+            result = self.results.get(unit.index)
+            if result is None:
+                continue
+            for d in result.records:
+                record = records.TestResultRecord.from_dict(d)
+                merged.requested.append(record.test_name)
+                merged.add_record(record)
+        return merged
+
+    def utilization_dict(self):
+        """Gets a dictionary describing how busy each testbed was.
+
+        Returns:
+            A json serializable dictionary keyed by testbed name.
+        """
+        wall_time = (self._end_time or time.time()) - self._start_time
+        d = collections.OrderedDict()
+        for name, stats in self.testbeds.items():
+            d[name] = stats.to_dict(wall_time)
+        return d
+
+    def retry_dict(self):
+        """Gets the units that broke on at least one testbed."""
+        return {
+            str(u): list(u.failed_testbeds)
+            for u in self.units if u.failed_testbeds
+        }
+
+
+def _new_records(results, marks):
+    """Gets the records added to a TestResult since marks were taken."""
+    new = []
+    for name, mark in zip(('executed', 'skipped', 'blocked'), marks):
+        new.extend(getattr(results, name)[mark:])
+    new.sort(key=lambda r: r.begin_time or 0)
+    return new
+
+
+def _record_marks(results):
+    return (len(results.executed), len(results.skipped), len(results.blocked))
+
+
+def execute_unit(runner, unit):
+    """Runs one unit with an existing TestRunner.
+
+    Args:
+        runner: The test_runner.TestRunner of the testbed.
+        unit: The TestUnit to run.
+
+    Returns:
+        A UnitResult.
+    """
+    marks = _record_marks(runner.results)
+    runner.run_list = unit.run_list
+    start = time.time()
+    aborted = False
+    error = None
+    try:
+        runner.run()
+    except signals.TestAbortAll:
+        aborted = True
+    except Exception:
+        error = traceback.format_exc()
+    duration = time.time() - start
+    new = _new_records(runner.results, marks)
+    all_blocked = bool(new) and all(
+        r.result == records.TestResultEnums.TEST_RESULT_BLOCKED for r in new)
+    return UnitResult(
+        runner.testbed_name,
+        unit.index,
+        records=[r.to_dict() for r in new],
+        duration=duration,
+        broken=error is not None or all_blocked,
+        aborted=aborted,
+        error=error)
+
+
+def _exited_unit_result(testbed, unit, exitcode):
+    """Gets the result of a unit whose testbed process exited while running
+    it, with an error record for the unit."""
+    error = "Testbed process exited with code %s." % exitcode
+    record = records.TestResultRecord(
+        unit.test_cases[0] if unit.test_cases else "*all*", unit.test_class)
+    record.test_begin()
+    record.test_unknown(error)
+    return UnitResult(
+        testbed, unit.index, records=[record.to_dict()], broken=True,
+        error=error)
+
+
+def _run_flight_list(runner, run_list):
+    if not run_list:
+        return
+    runner.run_list = run_list
+    try:
+        runner.run()
+    except Exception:
+        print("Exception when executing %s on %s." % (run_list,
+                                                      runner.testbed_name))
+        print(traceback.format_exc())
+
+
+def _shard_worker(worker_id, parsed_config, preflight, postflight, unit_queue,
+                  result_queue):
+    """The main function of a testbed process.
+
+    Runs the units received on unit_queue until it receives None.
+    """
+    try:
+        runner = test_runner.TestRunner(parsed_config, [])
+    except Exception:
+        result_queue.put((_MSG_FAILED, worker_id, traceback.format_exc()))
+        return
+    handler = config_parser.gen_term_signal_handler([runner])
+    signal.signal(signal.SIGTERM, handler)
+    signal.signal(signal.SIGINT, handler)
+    try:
+        _run_flight_list(runner, preflight)
+        result_queue.put((_MSG_READY, worker_id, None))
+        while True:
+            unit = unit_queue.get()
+            if unit is None:
+                break
+            result_queue.put((_MSG_RESULT, worker_id, execute_unit(runner,
+                                                                   unit)))
+        _run_flight_list(runner, postflight)
+    finally:
+        runner.stop()
+
+
+def _write_summary(path, merged, scheduler):
+    merged.extras["Sharding"] = {
+        "Utilization": scheduler.utilization_dict(),
+        "Retried Units": scheduler.retry_dict(),
+    }
+    with open(path, 'w') as f:
+        f.write(merged.json_str())
+
+
+def run_sharded(parsed_configs,
+                test_identifiers,
+                repeat=1,
+                max_attempts=DEFAULT_MAX_ATTEMPTS,
+                max_consecutive_failures=DEFAULT_MAX_CONSECUTIVE_FAILURES):
+    """Runs the requested tests once, spread over all testbeds.
+
+    Each testbed still writes its own logs and summary. The merged summary of
+    the run is written to SUMMARY_FILE_NAME in the root log path.
+
+    Args:
+        parsed_configs: A list of dicts, each is a set of configs for one
+                        test_runner.TestRunner.
+        test_identifiers: A list of tuples, each identifies what test case to
+                          run on what test class.
+        repeat: Number of times to run the requested tests.
+        max_attempts: The number of testbeds a unit may be tried on.
+        max_consecutive_failures: The number of broken units in a row after
+                                  which a testbed is retired.
+
+    Returns:
+        The merged records.TestResult.
+    """
+    preflight, units, postflight = split_test_identifiers(test_identifiers,
+                                                          repeat)
+    names = [
+        c[keys.Config.key_testbed.value][keys.Config.key_testbed_name.value]
+        for c in parsed_configs
+    ]
+    scheduler = ShardScheduler(units, names, max_attempts,
+                               max_consecutive_failures)
+    result_queue = multiprocessing.Queue()
+    unit_queues = [multiprocessing.Queue() for _ in parsed_configs]
+    workers = []
+    for i, config in enumerate(parsed_configs):
+        p = multiprocessing.Process(
+            target=_shard_worker,
+            args=(i, config, preflight, postflight, unit_queues[i],
+                  result_queue))
+        p.start()
+        workers.append(p)
+    idle = set()
+    running = {}
+    finished = set()
+
+    def dispatch():
+        for i in sorted(idle):
+            unit = scheduler.next_unit(names[i])
+            if unit:
+                idle.remove(i)
+                running[i] = unit
+                unit_queues[i].put(unit)
+
+    def report_exited(i):
+        unit = running.pop(i, None)
+        if unit:
+            scheduler.report(
+                _exited_unit_result(names[i], unit, workers[i].exitcode))
+
+    while not scheduler.is_done and not scheduler.aborted:
+        dispatch()
+        if not running:
+            if len(idle) + len(finished) == len(workers):
+                # Every live testbed is idle, but none may run what is left.
+                break
+        try:
+            msg, worker_id, payload = result_queue.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            for i, p in enumerate(workers):
+                if i in finished or p.is_alive():
+                    continue
+                finished.add(i)
+                idle.discard(i)
+                scheduler.retire(names[i])
+                report_exited(i)
+            continue
+        if msg == _MSG_READY:
+            idle.add(worker_id)
+        elif msg == _MSG_FAILED:
+            print("Testbed %s could not start:\n%s" % (names[worker_id],
+                                                       payload))
+            finished.add(worker_id)
+            scheduler.retire(names[worker_id])
+        else:
+            running.pop(worker_id)
+            if payload.broken:
+                print("Unit %s broke on testbed %s." %
+                      (scheduler.units[payload.index], names[worker_id]))
+            scheduler.report(payload)
+            if scheduler.testbeds[names[worker_id]].retired:
+                finished.add(worker_id)
+                unit_queues[worker_id].put(None)
+            else:
+                idle.add(worker_id)
+    if scheduler.aborted:
+        reason = "Test run aborted."
+    else:
+        reason = "No healthy testbed left to run the test."
+    # Let the units still running on other testbeds finish when aborting.
+    while running:
+        try:
+            msg, worker_id, payload = result_queue.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            dead = [i for i in running if not workers[i].is_alive()]
+            for i in dead:
+                report_exited(i)
+            continue
+        if msg == _MSG_RESULT:
+            running.pop(worker_id)
+            scheduler.report(payload)
+    scheduler.abandon_pending(reason)
+    for i, p in enumerate(workers):
+        if p.is_alive():
+            unit_queues[i].put(None)
+    for p in workers:
+        p.join()
+    merged = scheduler.get_merged_result()
+    log_path = parsed_configs[0][keys.Config.key_log_path.value]
+    _write_summary(
+        os.path.join(log_path, SUMMARY_FILE_NAME), merged, scheduler)
+    print("Summary for sharded run: %s" % merged.summary_str())
+    print("Testbed utilization: %s" %
+          json.dumps(scheduler.utilization_dict(), indent=4))
+    return merged
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3.4
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""An index of the test classes defined in test scripts.
+
+Importing every test script to find one test class pulls in all the heavy
+libraries used by any test. Instead, the index parses the scripts with the
+ast module, without running them, and records the test classes each one
+defines along with their test_* methods. Entries are cached on disk and
+reused as long as the file's mtime and size are unchanged, or, if the mtime
+changed, as long as its content hash is unchanged. The test runner keeps
+the cache in the log path of the config, see INDEX_FILE_NAME.
+"""
+
+import ast
+import hashlib
+import json
+import logging
+import os
+
+from acts import utils
+
+# Bump this when the format of the cached entries changes.
+INDEX_VERSION = 1
+# The name of the cache file in the log path, unless the config has a
+# test_index_path.
+INDEX_FILE_NAME = "test_index.json"
+
+
+def is_test_file_name(name, ext):
+    """The predicate for test script file names, see utils.find_files."""
+    if ext == ".py":
+        if name.endswith("Test") or name.endswith("_test"):
+            return True
+    return False
+
+
+def _hash_file(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def parse_test_classes(path):
+    """Finds the test classes defined at the top level of a test script.
+
+    Args:
+        path: The path of a python source file.
+
+    Returns:
+        A dict mapping the names of classes ending in "Test" to the list of
+        test_* methods defined in their bodies. Inherited methods are not
+        included.
+
+    Raises:
+        SyntaxError if the file can not be parsed.
+    """
+    with open(path, 'rb') as f:
+        tree = ast.parse(f.read(), filename=path)
+    classes = {}
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name.endswith("Test"):
+            classes[node.name] = [
+                n.name for n in node.body
+                if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))
+                and n.name.startswith("test_")
+            ]
+    return classes
+
+
+class TestScript(object):
+    """A test script found in the test paths.
+
+    Attributes:
+        path: The absolute path of the file.
+        directory: The directory of the file, which is added to sys.path to
+                   import it.
+        module_name: The name to import the file with.
+        classes: A dict mapping test class names to their test_* methods, or
+                 None if the file could not be parsed.
+    """
+
+    def __init__(self, directory, module_name, classes):
+        self.directory = directory
+        self.module_name = module_name
+        self.path = os.path.join(directory, module_name + ".py")
+        self.classes = classes
+
+
+class TestIndex(object):
+    """An on-disk cache of the test classes defined in test scripts.
+
+    Attributes:
+        path: The path of the cache file, or None to keep it in memory only.
+        hits: The number of files whose entry was reused during the last
+              call to scan.
+        misses: The number of files that were parsed during the last call
+                to scan.
+    """
+
+    def __init__(self, path=None):
+        self.path = os.path.expanduser(path) if path else None
+        self.hits = 0
+        self.misses = 0
+        self._entries = None
+        self._dirty = False
+
+    def _load(self):
+        self._entries = {}
+        if not self.path or not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                content = json.load(f)
+        except (IOError, OSError, ValueError):
+            logging.warning("Ignoring unreadable test index %s.", self.path)
+            return
+        if content.get("version") == INDEX_VERSION:
+            self._entries = content.get("files", {})
+
+    def save(self):
+        """Writes the index to disk if it changed."""
+        if not self.path or not self._dirty:
+            return
+        utils.create_dir(os.path.dirname(self.path))
+        tmp_path = "%s.%s.tmp" % (self.path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump({"version": INDEX_VERSION, "files": self._entries}, f)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+    def get_classes(self, path):
+        """Gets the test classes defined in a file, using the cache if valid.
+
+        Args:
+            path: The absolute path of a test script.
+
+        Returns:
+            A dict mapping test class names to their test_* methods, or None
+            if the file could not be parsed.
+        """
+        if self._entries is None:
+            self._load()
+        stat = os.stat(path)
+        entry = self._entries.get(path)
+        if entry and entry["mtime"] == stat.st_mtime and (
+                entry["size"] == stat.st_size):
+            self.hits += 1
+            return entry["classes"]
+        file_hash = _hash_file(path)
+        if entry and entry["hash"] == file_hash:
+            # Touched but not modified, e.g. by a fresh checkout.
+            self.hits += 1
+        else:
+            self.misses += 1
+            try:
+                classes = parse_test_classes(path)
+            except (SyntaxError, ValueError):
+                # Leave it to the import to report the error.
+                classes = None
+            entry = {"hash": file_hash, "classes": classes}
+        entry["mtime"] = stat.st_mtime
+        entry["size"] = stat.st_size
+        self._entries[path] = entry
+        self._dirty = True
+        return entry["classes"]
+
+    def scan(self, test_paths):
+        """Indexes all test scripts under the test paths.
+
+        Args:
+            test_paths: A list of directory paths where the test files reside.
+
+        Returns:
+            A list of TestScript objects.
+        """
+        self.hits = 0
+        self.misses = 0
+        scripts = []
+        for directory, name, ext in utils.find_files(test_paths,
+                                                     is_test_file_name):
+            path = os.path.abspath(os.path.join(directory, name + ext))
+            scripts.append(
+                TestScript(directory, name, self.get_classes(path)))
+        try:
+            self.save()
+        except (IOError, OSError) as e:
+            logging.warning("Failed to save test index %s: %s", self.path, e)
+        return scripts
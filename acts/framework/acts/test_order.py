@@ -0,0 +1,207 @@
+#!/usr/bin/env python3.4
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Reorders test cases to reduce the cost of device reconfiguration.
+
+A test class can describe the device state each test case needs as a tuple
+of "setup keys", ordered from the most to the least expensive to change, e.g.
+(AP configuration, attenuator path). Running test cases with equal leading
+keys back to back saves the reconfiguration between them.
+
+The tests are grouped on the first key, groups ordered by their first
+appearance in the canonical order, then recursively on the following keys.
+The canonical order is kept within a group, so the reordering is stable and
+a no-op for lists that are already grouped. Tests that declare no keys run
+first.
+"""
+
+import collections
+
+# The cost assumed for a key level without a configured cost.
+DEFAULT_KEY_COST = 1
+
+
+def _group(indices, keys, level):
+    groups = collections.OrderedDict()
+    done = []
+    for i in indices:
+        if keys[i] is None or level >= len(keys[i]):
+            done.append(i)
+        else:
+            groups.setdefault(keys[i][level], []).append(i)
+    # Tests without a value at this level have no setup to share with the
+    # others, so they run before the groups.
+    for group in groups.values():
+        done.extend(_group(group, keys, level + 1))
+    return done
+
+
+def order_by_setup_keys(keys):
+    """Computes an execution order that groups tests with equal setup keys.
+
+    Args:
+        keys: A list with, for each test in canonical order, a tuple of
+              hashable setup keys, or None if the test declares none.
+
+    Returns:
+        A list of indices into keys, in execution order.
+    """
+    return _group(list(range(len(keys))), keys, 0)
+
+
+def transition_cost(previous, current, key_costs=()):
+    """Estimates the cost of going from one setup to the next.
+
+    Args:
+        previous: The setup keys of the previous test, or None.
+        current: The setup keys of the next test, or None.
+        key_costs: The cost of changing each key level, e.g. in seconds.
+
+    Returns:
+        The sum of the costs of the key levels whose values differ.
+    """
+    if previous is None or current is None:
+        return 0
+    cost = 0
+    for level in range(max(len(previous), len(current))):
+        prev_value = previous[level] if level < len(previous) else None
+        value = current[level] if level < len(current) else None
+        if prev_value != value:
+            cost += (key_costs[level]
+                     if level < len(key_costs) else DEFAULT_KEY_COST)
+    return cost
+
+
+def total_setup_cost(keys, order, key_costs=()):
+    """Estimates the reconfiguration cost of running tests in an order.
+
+    The setup of the first test is not counted, as every order pays for it.
+
+    Args:
+        keys: A list of setup key tuples, see order_by_setup_keys.
+        order: A list of indices into keys, in execution order.
+        key_costs: The cost of changing each key level.
+
+    Returns:
+        The sum of the transition costs between consecutive tests.
+    """
+    return sum(
+        transition_cost(keys[a], keys[b], key_costs)
+        for a, b in zip(order, order[1:]))
+
+
+def summarize(names, keys, order, key_costs=()):
+    """Gets a json serializable summary of a reordering.
+
+    Args:
+        names: The test names, in canonical order.
+        keys: The setup keys of the tests, in canonical order.
+        order: The execution order, see order_by_setup_keys.
+        key_costs: The cost of changing each key level.
+
+    Returns:
+        A dictionary with the execution order and the estimated saving.
+    """
+    canonical = list(range(len(keys)))
+    before = total_setup_cost(keys, canonical, key_costs)
+    after = total_setup_cost(keys, order, key_costs)
+    return {
+        "Execution Order": [names[i] for i in order],
+        "Canonical Setup Cost": before,
+        "Reordered Setup Cost": after,
+        "Estimated Setup Time Saved": before - after,
+    }
+
+
+class CanonicalOrderBuffer(object):
+    """Restores the canonical order of the records of reordered tests.
+
+    While active, the buffer notes the canonical index of each record added
+    to a TestResult, and passes the record on to the stream writer of the
+    TestResult right away, so the stream stays live and a crash loses no
+    record. On exit, the record lists of the TestResult are sorted back into
+    canonical order, and the stream writer is told the canonical order of
+    the records it streamed, for the summary of the run.
+
+    Buffers can be nested, e.g. for generated tests run by a reordered test.
+    A nested buffer tells the enclosing one the order it restored.
+
+    Attributes:
+        current_index: The canonical index of the test being executed. Records
+                       added while it is set are reported at that position.
+    """
+
+    _LISTS = ('executed', 'passed', 'failed', 'skipped', 'blocked',
+              'unknown')
+
+    def __init__(self, test_result):
+        self.current_index = 0
+        self._result = test_result
+        self._stream_writer = None
+        # (canonical index, sequence number, record, line number) tuples.
+        self._entries = []
+
+    def start(self):
+        """Starts noting the order of the records added to the TestResult."""
+        self._stream_writer = self._result.stream_writer
+        self._result.stream_writer = self
+
+    def write_record(self, record):
+        line = None
+        if self._stream_writer:
+            line = self._stream_writer.write_record(record)
+        self._entries.append((self.current_index, len(self._entries),
+                              record, line))
+        return line
+
+    def reorder(self, entries):
+        """Restores the order of records a nested buffer restored.
+
+        Args:
+            entries: A list of (record, line number) tuples, in canonical
+                     order.
+        """
+        rank = {id(record): n for n, (record, _) in enumerate(entries)}
+        positions = [
+            n for n, entry in enumerate(self._entries)
+            if id(entry[2]) in rank
+        ]
+        reordered = sorted((self._entries[n] for n in positions),
+                           key=lambda entry: rank[id(entry[2])])
+        # The records take the canonical indices and sequence numbers of the
+        # positions they are moved to.
+        for n, entry in zip(positions, reordered):
+            self._entries[n] = self._entries[n][:2] + entry[2:]
+
+    def stop(self):
+        """Sorts the record lists of the TestResult into canonical order."""
+        self._result.stream_writer = self._stream_writer
+        self._entries.sort(key=lambda entry: entry[:2])
+        rank = {id(entry[2]): n for n, entry in enumerate(self._entries)}
+        for name in self._LISTS:
+            records = getattr(self._result, name)
+            # Records added before the buffer was started keep their place.
+            records.sort(key=lambda r: rank.get(id(r), -1))
+        reorder = getattr(self._stream_writer, "reorder", None)
+        if reorder and self._entries:
+            reorder([entry[2:] for entry in self._entries])
+        self._entries = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
@@ -28,13 +28,19 @@ import pkgutil
 import sys
 
 from acts import base_test
+from acts import checkpoint
 from acts import config_parser
 from acts import keys
 from acts import logger
+from acts import profiler
 from acts import records
 from acts import signals
+from acts import test_index
 from acts import utils
 
+# Name of the file test records are streamed to as they finish.
+RESULT_STREAM_FILE_NAME = "test_run_records.jsonl"
+
 
 def _find_test_class():
     """Finds the test class in a test script.
@@ -129,7 +135,17 @@ class TestRunner(object):
             self.test_configs[keys.Config.key_log_path.value],
             self.testbed_name, start_time)
         self.log_path = os.path.abspath(l_path)
-        logger.setup_test_logger(self.log_path, self.testbed_name)
+        logger.setup_test_logger(
+            self.log_path,
+            self.testbed_name,
+            async_logging=self.test_configs.get(
+                keys.Config.key_async_logging.value, False),
+            queue_size=self.test_configs.get(
+                keys.Config.key_log_queue_size.value,
+                logger.DEFAULT_LOG_QUEUE_SIZE),
+            overflow_policy=self.test_configs.get(
+                keys.Config.key_log_overflow_policy.value,
+                logger.OVERFLOW_BLOCK))
         self.log = logging.getLogger()
         self.controller_registry = {}
         if self.test_configs.get(keys.Config.key_random.value):
@@ -143,9 +159,43 @@ class TestRunner(object):
             self.write_test_campaign()
         else:
             self.run_list = run_list
+        self.result_stream = records.TestResultStreamWriter(
+            os.path.join(self.log_path, RESULT_STREAM_FILE_NAME))
         self.results = records.TestResult()
+        self.results.stream_writer = self.result_stream
+        self.checkpoint = self._create_checkpoint()
         self.running = False
 
+    def _create_checkpoint(self):
+        """Creates the checkpoint of this run, in checkpoint mode.
+
+        If this run resumes a previous run, the records of the test cases
+        completed by the previous run are added to the results of this run.
+
+        Returns:
+            A checkpoint.Checkpoint, or None if checkpoint mode is off.
+        """
+        resume_from = self.test_configs.get(keys.Config.key_resume_from.value)
+        if not resume_from and not self.test_configs.get(
+                keys.Config.key_checkpoint.value):
+            return None
+        inherited = []
+        if resume_from:
+            path = checkpoint.find_checkpoint(resume_from, self.testbed_name)
+            if path:
+                inherited = checkpoint.load_checkpoint(path)
+                self.log.info("Resuming from %s, %d test cases completed.",
+                              path, len(inherited))
+            else:
+                self.log.warning("No checkpoint found in %s, executing all "
+                                 "test cases.", resume_from)
+        test_checkpoint = checkpoint.Checkpoint(
+            os.path.join(self.log_path, checkpoint.CHECKPOINT_FILE_NAME),
+            inherited)
+        for _, record in inherited:
+            self.results.add_record(record)
+        return test_checkpoint
+
     def import_test_modules(self, test_paths):
         """Imports test classes from test scripts.
 
@@ -154,6 +204,13 @@ class TestRunner(object):
         3. Find the module members that are test classes.
         4. Categorize the test classes by name.
 
+        Unless lazy test discovery is disabled in the config, the test scripts
+        are first indexed without importing them (see acts.test_index), and
+        only the scripts that define the test classes on the run list are
+        imported. If a class on the run list is not defined by any script,
+        e.g. because a script imports it from elsewhere, all scripts are
+        imported.
+
         Args:
             test_paths: A list of directory paths where the test files reside.
 
@@ -161,43 +218,86 @@ class TestRunner(object):
             A dictionary where keys are test class name strings, values are
             actual test classes that can be instantiated.
         """
+        if not self.test_configs.get(
+                keys.Config.key_lazy_test_discovery.value, True):
+            return self._import_all_test_modules(test_paths)
+        index = test_index.TestIndex(
+            self.test_configs.get(
+                keys.Config.key_test_index_path.value,
+                os.path.join(self.test_configs[keys.Config.key_log_path.value],
+                             test_index.INDEX_FILE_NAME)))
+        scripts = index.scan(test_paths)
+        selected = []
+        for test_cls_name, _ in self.run_list:
+            matches = [
+                s for s in scripts
+                if s.classes and fnmatch.filter(s.classes, test_cls_name)
+            ]
+            if not matches:
+                self.log.debug("Test class %s is not in the test index, "
+                               "importing all test scripts.", test_cls_name)
+                return self._import_all_test_modules(test_paths)
+            selected.extend(s for s in matches if s not in selected)
+        test_classes = {}
+        for script in selected:
+            self._import_test_module(script.directory, script.module_name,
+                                     test_classes)
+        return test_classes
 
-        def is_testfile_name(name, ext):
-            if ext == ".py":
-                if name.endswith("Test") or name.endswith("_test"):
-                    return True
-            return False
+    def _import_all_test_modules(self, test_paths):
+        """Imports every test script under test_paths.
 
-        file_list = utils.find_files(test_paths, is_testfile_name)
+        Args:
+            test_paths: A list of directory paths where the test files reside.
+
+        Returns:
+            A dictionary where keys are test class name strings, values are
+            actual test classes that can be instantiated.
+        """
+        file_list = utils.find_files(test_paths, test_index.is_test_file_name)
         test_classes = {}
         for path, name, _ in file_list:
-            sys.path.append(path)
-            try:
-                module = importlib.import_module(name)
-            except:
-                for test_cls_name, _ in self.run_list:
-                    alt_name = name.replace('_', '').lower()
-                    alt_cls_name = test_cls_name.lower()
-                    # Only block if a test class on the run list causes an
-                    # import error. We need to check against both naming
-                    # conventions: AaaBbb and aaa_bbb.
-                    if name == test_cls_name or alt_name == alt_cls_name:
-                        msg = ("Encountered error importing test class %s, "
-                               "abort.") % test_cls_name
-                        # This exception is logged here to help with debugging
-                        # under py2, because "raise X from Y" syntax is only
-                        # supported under py3.
-                        self.log.exception(msg)
-                        raise ValueError(msg)
-                continue
-            for member_name in dir(module):
-                if not member_name.startswith("__"):
-                    if member_name.endswith("Test"):
-                        test_class = getattr(module, member_name)
-                        if inspect.isclass(test_class):
-                            test_classes[member_name] = test_class
+            self._import_test_module(path, name, test_classes)
         return test_classes
 
+    def _import_test_module(self, path, name, test_classes):
+        """Imports one test script and adds its test classes to test_classes.
+
+        Args:
+            path: The directory of the test script.
+            name: The module name of the test script.
+            test_classes: A dictionary of test classes keyed by name.
+
+        Raises:
+            ValueError if the import fails and a test class on the run list
+            has the name of the test script.
+        """
+        sys.path.append(path)
+        try:
+            module = importlib.import_module(name)
+        except:
+            for test_cls_name, _ in self.run_list:
+                alt_name = name.replace('_', '').lower()
+                alt_cls_name = test_cls_name.lower()
+                # Only block if a test class on the run list causes an
+                # import error. We need to check against both naming
+                # conventions: AaaBbb and aaa_bbb.
+                if name == test_cls_name or alt_name == alt_cls_name:
+                    msg = ("Encountered error importing test class %s, "
+                           "abort.") % test_cls_name
+                    # This exception is logged here to help with debugging
+                    # under py2, because "raise X from Y" syntax is only
+                    # supported under py3.
+                    self.log.exception(msg)
+                    raise ValueError(msg)
+            return
+        for member_name in dir(module):
+            if not member_name.startswith("__"):
+                if member_name.endswith("Test"):
+                    test_class = getattr(module, member_name)
+                    if inspect.isclass(test_class):
+                        test_classes[member_name] = test_class
+
     def _import_builtin_controllers(self):
         """Import built-in controller modules.
 
@@ -357,7 +457,8 @@ class TestRunner(object):
             # in case the controller module modifies the config internally.
             original_config = self.testbed_configs[module_config_name]
             controller_config = copy.deepcopy(original_config)
-            controllers = controller_module.create(controller_config)
+            with profiler.span("create %s" % module_config_name):
+                controllers = controller_module.create(controller_config)
         except:
             self.log.exception(
                 "Failed to initialize objects for controller %s, abort!",
@@ -371,7 +472,8 @@ class TestRunner(object):
         # Collect controller information and write to test result.
         # Implementation of "get_info" is optional for a controller module.
         if hasattr(controller_module, "get_info"):
-            controller_info = controller_module.get_info(controllers)
+            with profiler.span("get_info %s" % module_config_name):
+                controller_info = controller_module.get_info(controllers)
             self.log.info("Controller %s: %s", module_config_name,
                           controller_info)
             self.results.add_controller_info(module_config_name,
@@ -417,6 +519,9 @@ class TestRunner(object):
             keys.Config.ikey_testbed_name.value] = self.testbed_name
         # Unpack other params.
         self.test_run_info["register_controller"] = self.register_controller
+        self.test_run_info["result_stream_writer"] = self.result_stream
+        self.test_run_info[
+            keys.Config.ikey_run_checkpoint.value] = self.checkpoint
         self.test_run_info[keys.Config.ikey_logpath.value] = self.log_path
         self.test_run_info[keys.Config.ikey_logger.value] = self.log
         cli_args = test_configs.get(keys.Config.ikey_cli_args.value)
@@ -558,6 +663,9 @@ class TestRunner(object):
             msg = "\nSummary for test run %s: %s\n" % (
                 self.id, self.results.summary_str())
             self._write_results_json_str()
+            self.result_stream.close()
+            if self.checkpoint:
+                self.checkpoint.close()
             self.log.info(msg.strip())
             logger.kill_test_logger(self.log)
             self.running = False
@@ -565,11 +673,13 @@ class TestRunner(object):
     def _write_results_json_str(self):
         """Writes out a json file with the test result info for easy parsing.
 
-        TODO(angli): This should be replaced by standard log record mechanism.
+        The records are read back from the record stream, so this does not
+        need to serialize all of them in memory.
         """
         path = os.path.join(self.log_path, "test_run_summary.json")
-        with open(path, 'w') as f:
-            f.write(self.results.json_str())
+        records.write_summary_from_stream(
+            self.result_stream.path, path, self.results,
+            canonical_orders=self.result_stream.canonical_orders)
 
     def write_test_campaign(self):
         """Log test campaign file."""
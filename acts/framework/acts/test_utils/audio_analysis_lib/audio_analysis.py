@@ -126,12 +126,10 @@ def spectral_analysis(signal,
 
     # y_f is complex so consider its absolute value for magnitude.
     abs_y_f = numpy.abs(y_f)
-    threshold = max(abs_y_f) * min_peak_ratio
+    threshold = abs_y_f.max() * min_peak_ratio
 
     # Suppresses all coefficients that are below threshold.
-    for i in range(len(abs_y_f)):
-        if abs_y_f[i] < threshold:
-            abs_y_f[i] = 0
+    abs_y_f[abs_y_f < threshold] = 0
 
     # Gets the peak detection window size in indice.
     # x_f[1] is the frequency difference per index.
@@ -167,6 +165,33 @@ def _rfft_freq(length, rate):
     return numpy.linspace(0, (result_length - 1) * val, result_length)
 
 
+def _sliding_max(array, window_size):
+    """Gets the maximum of each window of an array.
+
+    Uses the van Herk/Gil-Werman algorithm: with the array split in blocks
+    of window_size, every window spans the end of a block and the start of
+    the next, so its maximum is the maximum of a suffix maximum and a prefix
+    maximum of those blocks. This takes linear time whatever the window.
+
+    Args:
+        array: A numpy array of floats.
+        window_size: The length of the windows, at least 1.
+
+    Returns:
+        A numpy array of the maximum of array[i:i + window_size] at each
+        index i, windows past the end of the array being cut short.
+    """
+    length = len(array)
+    num_blocks = -(-length // window_size) + 1
+    padded = numpy.full(num_blocks * window_size, -numpy.inf)
+    padded[:length] = array
+    blocks = padded.reshape(num_blocks, window_size)
+    prefix = numpy.maximum.accumulate(blocks, axis=1).ravel()
+    suffix = numpy.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    return numpy.maximum(suffix[:length],
+                         prefix[window_size - 1:window_size - 1 + length])
+
+
 def peak_detection(array, window_size):
     """Detects peaks in an array.
 
@@ -176,6 +201,10 @@ def peak_detection(array, window_size):
     then there is no peak in this window.
     Note that we only consider peak with value greater than 0.
 
+    The half window is window_size / 2. When window_size is odd, the window
+    reaches one more point on the left, e.g. array[i - 2] to array[i + 1]
+    for a window_size of 3. The comparisons are done with numpy.
+
     Args:
         array: The input array to detect peaks in. Array is a list of
         absolute values of the magnitude of transformed coefficient.
@@ -185,82 +214,28 @@ def peak_detection(array, window_size):
     Returns:
         A list of tuples:
               [(peak_index_1, peak_value_1), (peak_index_2, peak_value_2), ...]
-              where the tuples are sorted by peak values.
+              where the tuples are sorted by peak values, peaks of equal
+              values by index.
 
     """
-    half_window_size = window_size / 2
-    length = len(array)
-
-    def mid_is_peak(array, mid, left, right):
-        """Checks if value at mid is the largest among left to right in array.
-
-        Args:
-            array: A list of numbers.
-            mid: The mid index.
-            left: The left index.
-            rigth: The right index.
-
-        Returns:
-            A tuple (is_peak, next_candidate)
-                  is_peak is True if array[index] is the maximum among numbers
-                  in array between index [left, right] inclusively.
-                  next_candidate is the index of next candidate for peak if
-                  is_peak is False. It is the index of maximum value in
-                  [mid + 1, right]. If is_peak is True, next_candidate is
-                  right + 1.
-
-        """
-        value_mid = array[int(mid)]
-        is_peak = True
-        next_peak_candidate_index = None
-
-        # Check the left half window.
-        for index in range(int(left), int(mid)):
-            if array[index] >= value_mid:
-                is_peak = False
-                break
-
-        # Mid is at the end of array.
-        if mid == right:
-            return is_peak, right + 1
-
-        # Check the right half window and also record next candidate.
-        # Favor the larger index for next_peak_candidate_index.
-        for index in range(int(right), int(mid), -1):
-            if (next_peak_candidate_index is None or
-                    array[index] > array[next_peak_candidate_index]):
-                next_peak_candidate_index = index
-
-        if array[next_peak_candidate_index] >= value_mid:
-            is_peak = False
-
-        if is_peak:
-            next_peak_candidate_index = right + 1
-
-        return is_peak, next_peak_candidate_index
-
-    results = []
-    mid = 0
-    next_candidate_idx = None
-    while mid < length:
-        left = max(0, mid - half_window_size)
-        right = min(length - 1, mid + half_window_size)
-
-        # Only consider value greater than 0.
-        if array[int(mid)] == 0:
-            mid = mid + 1
-            continue
-
-        is_peak, next_candidate_idx = mid_is_peak(array, mid, left, right)
-
-        if is_peak:
-            results.append((mid, array[int(mid)]))
-
-        # Use the next candidate found in [mid + 1, right], or right + 1.
-        mid = next_candidate_idx
-
-    # Sort the peaks by values.
-    return sorted(results, key=lambda x: x[1], reverse=True)
+    values = numpy.asarray(array, dtype=numpy.float64)
+    length = len(values)
+    left_size = (window_size + 1) // 2
+    right_size = window_size // 2
+    is_peak = values > 0
+    if left_size:
+        # The window of index i in the padded array ends at i - 1.
+        padded = numpy.concatenate((numpy.full(left_size, -numpy.inf),
+                                    values[:-1]))
+        is_peak &= values > _sliding_max(padded, left_size)[:length]
+    if right_size:
+        right_max = numpy.full(length, -numpy.inf)
+        right_max[:-1] = _sliding_max(values[1:], right_size)
+        is_peak &= values > right_max
+    indices = numpy.flatnonzero(is_peak)
+    # A stable sort keeps peaks of equal values in index order.
+    order = numpy.argsort(-values[indices], kind='stable')
+    return [(int(i), array[int(i)]) for i in indices[order]]
 
 
 def anomaly_detection(signal,
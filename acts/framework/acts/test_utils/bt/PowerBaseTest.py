@@ -293,6 +293,8 @@ class BtMonsoonData(monsoon.MonsoonData):
         # Change timestamp to use small granularity of time
         # Monsoon libray uses the seconds as the time unit
         # Using sample rate to calculate timestamps between the seconds
+        # The timestamps may be an integer array, which cannot hold them.
+        self.timestamps = list(self.timestamps)
         t0 = self.timestamps[0]
         dt = 1.0 / monsoon_data.hz
         index = 0
@@ -21,11 +21,11 @@ import os
 import re
 import subprocess
 import time
-import xlsxwriter
 
 from acts.controllers.ap_lib import hostapd_config
 from acts.controllers.ap_lib import hostapd_constants
 from acts.controllers.ap_lib import hostapd_security
+from acts.libs import lazy_import
 from acts.test_utils.bt.bt_constants import \
     bluetooth_profile_connection_state_changed
 from acts.test_utils.bt.bt_constants import bt_default_timeout
@@ -57,6 +57,9 @@ from acts.test_utils.wifi.wifi_test_utils import wifi_test_device_init
 from acts.test_utils.wifi.wifi_test_utils import wifi_toggle_state
 from acts.utils import exe_cmd, create_dir
 
+# Only needed to write result spreadsheets, see xlsheet.
+xlsxwriter = lazy_import.lazy_import('xlsxwriter')
+
 THROUGHPUT_THRESHOLD = 100
 AP_START_TIME = 10
 DISCOVERY_TIME = 10
@@ -24,6 +24,8 @@ from acts import asserts
 from acts import base_test
 from acts import utils
 from acts.controllers import monsoon
+from acts.controllers.monsoon_lib import convergence
+from acts.controllers.monsoon_lib import downsampling
 from acts.test_utils.wifi import wifi_test_utils as wutils
 from acts.test_utils.wifi import wifi_power_test_utils as wputils
 
@@ -94,6 +96,9 @@ class PowerBaseTest(base_test.BaseTestClass):
     def __init__(self, controllers):
 
         base_test.BaseTestClass.__init__(self, controllers)
+        # The precision reached by an adaptive measurement, for the extras of
+        # the test result.
+        self.measurement_extras = {}
 
     def setup_class(self):
 
@@ -292,7 +297,8 @@ class PowerBaseTest(base_test.BaseTestClass):
         """Check the test result and decide if it passed or failed.
 
         The threshold is provided in the config file. In this class, result is
-        current in mA.
+        current in mA. The precision of adaptive measurements is reported in
+        the extras.
         """
         current_threshold = self.threshold[self.test_name]
         if self.test_result:
@@ -302,9 +308,11 @@ class PowerBaseTest(base_test.BaseTestClass):
                 ('Measured average current in [{}]: {}, which is '
                  'more than {} percent off than acceptable threshold {:.2f}mA'
                  ).format(self.test_name, self.test_result,
-                          self.pass_fail_tolerance * 100, current_threshold))
-            asserts.explicit_pass('Measurement finished for {}.'.format(
-                self.test_name))
+                          self.pass_fail_tolerance * 100, current_threshold),
+                extras=self.measurement_extras or None)
+            asserts.explicit_pass(
+                'Measurement finished for {}.'.format(self.test_name),
+                extras=self.measurement_extras or None)
         else:
             asserts.fail(
                 'Something happened, measurement is not complete, test failed')
@@ -322,7 +330,13 @@ class PowerBaseTest(base_test.BaseTestClass):
             freq=self.mon_freq,
             duration=self.mon_duration,
             offset=self.mon_offset,
-            data_path=self.mon_data_path)
+            data_path=self.mon_data_path,
+            plot_points=getattr(self, 'mon_plot_points',
+                                wputils.DEFAULT_PLOT_POINTS),
+            plot_method=getattr(self, 'mon_plot_method',
+                                downsampling.MIN_MAX),
+            plot_tiles=getattr(self, 'mon_plot_tiles', True),
+            precision=getattr(self, 'mon_precision', None))
         return mon_info
 
     def monsoon_recover(self):
@@ -352,6 +366,10 @@ class PowerBaseTest(base_test.BaseTestClass):
         Collect current data using Monsoon box and return the path of the
         log file. Take bug report if requested.
 
+        If the mon_precision test parameter is set, e.g. 0.01 for +-1%, the
+        measurement stops as soon as the confidence interval of the average
+        current is that precise, with the duration as the maximum.
+
         Returns:
             data_path: the absolute path to the log file of monsoon current
                        measurement
@@ -369,6 +387,8 @@ class PowerBaseTest(base_test.BaseTestClass):
         # Indicator that need to re-collect data
         need_collect_data = 1
         result = None
+        monitor = None
+        self.measurement_extras = {}
         while retry_measure <= MEASUREMENT_RETRY_COUNT:
             try:
                 # If need to retake data
@@ -378,19 +398,27 @@ class PowerBaseTest(base_test.BaseTestClass):
                     self.log.info(
                         'Starting power measurement with monsoon box, try #{}'.
                         format(retry_measure))
+                    if self.mon_info.precision:
+                        monitor = convergence.ConvergenceMonitor(
+                            self.mon_info.freq, self.mon_info.precision)
                     #Start the power measurement using monsoon
                     self.mon_info.dut.monsoon_usb_auto()
                     result = self.mon_info.dut.measure_power(
                         self.mon_info.freq,
                         self.mon_info.duration,
                         tag=tag,
-                        offset=self.mon_info.offset)
+                        offset=self.mon_info.offset,
+                        until=monitor)
                     self.mon_info.dut.reconnect_dut()
                 # Reconnect to dut
                 else:
                     self.mon_info.dut.reconnect_dut()
                 # Reconnect and return measurement results if no error happens
                 avg_current = result.average_current
+                if monitor:
+                    self.measurement_extras = monitor.summary()
+                    self.log.info('Measurement precision: {}'.format(
+                        self.measurement_extras))
                 monsoon.MonsoonData.save_to_text_file([result], data_path)
                 self.log.info('Power measurement done within {} try'.format(
                     retry_measure))
@@ -428,7 +456,8 @@ class PowerBaseTest(base_test.BaseTestClass):
                     # required, re-take
                     if not result:
                         self.log.warning('No data taken, need to remeasure')
-                    elif len(result._data_points) <= min_required_samples:
+                    elif (len(result._data_points) <= min_required_samples
+                          and not (monitor and monitor.converged)):
                         self.log.warning(
                             'More than {} percent of samples are missing due to monsoon error. Need to remeasure'.
                             format(100 - MIN_PERCENT_SAMPLE))
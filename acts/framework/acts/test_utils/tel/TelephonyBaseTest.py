@@ -26,6 +26,7 @@ import traceback
 import acts.controllers.diag_logger
 
 from acts import asserts
+from acts import log_accounting
 from acts import logger as acts_logger
 from acts.base_test import BaseTestClass
 from acts.controllers.android_device import DEFAULT_QXDM_LOG_PATH
@@ -151,8 +152,11 @@ class TelephonyBaseTest(BaseTestClass):
                         refresh_sl4a_session(ad)
                 if result: break
             if self.user_params.get("check_crash", True):
-                new_crash = ad.check_crash_report(self.test_name,
-                                                  self.begin_time, True)
+                new_crash = ad.check_crash_report(
+                    self.test_name,
+                    self.begin_time,
+                    True,
+                    since_last_check=True)
                 if new_crash:
                     msg = "Find new crash reports %s" % new_crash
                     ad.log.error(msg)
@@ -347,6 +351,7 @@ class TelephonyBaseTest(BaseTestClass):
             ad.adb.logcat(
                 'b all -d -v year -t "%s" > %s' % (log_begin_time, log_path),
                 timeout=120)
+            log_accounting.account_path(log_path)
         except Exception as e:
             ad.log.error("Failed to get logcat with error %s", e)
             result = False
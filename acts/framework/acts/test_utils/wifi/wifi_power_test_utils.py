@@ -14,29 +14,110 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
+import json
 import logging
+import os
 import time
+import numpy as np
 from acts import utils
 from acts.controllers import monsoon
+from acts.controllers.monsoon_lib import downsampling
 from acts.libs.proc import job
 from acts.controllers.ap_lib import bridge_interface as bi
+from acts.libs import lazy_import
 from acts.test_utils.wifi import wifi_test_utils as wutils
-from bokeh.layouts import layout
-from bokeh.models import CustomJS, ColumnDataSource
-from bokeh.models import tools as bokeh_tools
-from bokeh.models.widgets import DataTable, TableColumn
-from bokeh.plotting import figure, output_file, save
 from acts.controllers.ap_lib import hostapd_security
 from acts.controllers.ap_lib import hostapd_ap_preset
 
+# bokeh and scapy take seconds to import and are only needed by some of the
+# helpers below, so they are imported on first use.
+bokeh_layouts = lazy_import.lazy_import('bokeh.layouts')
+bokeh_models = lazy_import.lazy_import('bokeh.models')
+bokeh_tools = lazy_import.lazy_import('bokeh.models.tools')
+bokeh_widgets = lazy_import.lazy_import('bokeh.models.widgets')
+bokeh_plotting = lazy_import.lazy_import('bokeh.plotting')
 # http://www.secdev.org/projects/scapy/
 # On ubuntu, sudo pip3 install scapy-python3
-import scapy.all as scapy
+scapy = lazy_import.lazy_import('scapy.all')
 
 GET_FROM_PHONE = 'get_from_dut'
 GET_FROM_AP = 'get_from_ap'
 ENABLED_MODULATED_DTIM = 'gEnableModulatedDTIM='
 MAX_MODULATED_DTIM = 'gMaxLIModulatedDTIM='
+# The default number of points plotted by monsoon_data_plot, and of each of
+# its zoom tiles.
+DEFAULT_PLOT_POINTS = 20000
+
+# Replaces the plotted points by the finest tiles covering the visible range
+# when the x range changes, see downsampling.write_tiles. The settings of the
+# tiles are formatted in as a json object.
+TILE_LOADER_JS = """
+var tiles = %s;
+var plot_source = source;
+window.monsoonTiles = window.monsoonTiles || {};
+if (!window.monsoonOverview) {
+    window.monsoonOverview = plot_source.data;
+}
+clearTimeout(window.monsoonTileTimer);
+window.monsoonTileTimer = setTimeout(function() {
+    var start = Math.max(Math.floor(cb_obj.start * tiles.hz), 0);
+    var end = Math.min(Math.ceil(cb_obj.end * tiles.hz), tiles.samples);
+    var level = 0;
+    for (var l = 0; l < tiles.spans.length; l++) {
+        if (tiles.spans[l] * 2 >= end - start) {
+            level = l + 1;
+        }
+    }
+    function show(keys) {
+        var data = {x0: [], y0: [], mean: [], color: []};
+        for (var k = 0; k < keys.length; k++) {
+            var tile = window.monsoonTiles[keys[k]];
+            if (!tile.x0) {
+                tile.x0 = [];
+                for (var j = 0; j < tile.y0.length; j++) {
+                    tile.x0.push(tile.start + j / tiles.hz);
+                }
+                tile.mean = tile.y0;
+            }
+            data.x0 = data.x0.concat(tile.x0);
+            data.y0 = data.y0.concat(tile.y0);
+            data.mean = data.mean.concat(tile.mean);
+        }
+        for (var c = 0; c < data.x0.length; c++) {
+            data.color.push('navy');
+        }
+        plot_source.data = data;
+        plot_source.trigger('change');
+    }
+    if (level == 0) {
+        plot_source.data = window.monsoonOverview;
+        plot_source.trigger('change');
+        return;
+    }
+    var span = tiles.spans[level - 1];
+    var last = Math.min(Math.floor(end / span), tiles.counts[level - 1] - 1);
+    var keys = [];
+    var pending = 0;
+    for (var i = Math.floor(start / span); i <= last; i++) {
+        var key = tiles.dir + '/' + level + '_' + i;
+        keys.push(key);
+        if (!(key in window.monsoonTiles)) {
+            pending++;
+            var script = document.createElement('script');
+            script.src = key + '.js';
+            script.onload = function() {
+                if (--pending == 0) {
+                    show(keys);
+                }
+            };
+            document.head.appendChild(script);
+        }
+    }
+    if (pending == 0) {
+        show(keys);
+    }
+}, 200);
+"""
 
 
 def monsoon_data_plot(mon_info, file_path, tag=""):
@@ -54,6 +135,14 @@ def monsoon_data_plot(mon_info, file_path, tag=""):
                   offset etc.
         file_path: the path to the monsoon log file with current data
 
+    The trace is downsampled to mon_info.plot_points points, if set, or to
+    DEFAULT_PLOT_POINTS, with the method in mon_info.plot_method, one of
+    downsampling.METHODS, min_max by default. Unless mon_info.plot_tiles is
+    False, the trace is also written at increasing resolutions as tiles to a
+    directory next to the html file, which the plot loads when zoomed in.
+    The averages in the data table are those of the samples represented by
+    the selected points.
+
     Returns:
         plot: the plotting object of bokeh, optional, will be needed if multiple
            plots will be combined to one html file.
@@ -63,25 +152,29 @@ def monsoon_data_plot(mon_info, file_path, tag=""):
 
     log = logging.getLogger()
     log.info("Plot the power measurement data")
+    begin_time = time.time()
+    num_points = getattr(mon_info, 'plot_points', DEFAULT_PLOT_POINTS)
+    method = getattr(mon_info, 'plot_method', downsampling.MIN_MAX)
     #Get results as monsoon data object from the input file
     results = monsoon.MonsoonData.from_text_file(file_path)
     #Decouple current and timestamp data from the monsoon object
-    current_data = []
-    timestamps = []
     voltage = results[0].voltage
-    [current_data.extend(x.data_points) for x in results]
-    [timestamps.extend(x.timestamps) for x in results]
+    current_data = np.concatenate([x.data_points for x in results]) * 1000
     period = 1 / float(mon_info.freq)
-    time_relative = [x * period for x in range(len(current_data))]
     #Calculate the average current for the test
-    current_data = [x * 1000 for x in current_data]
-    avg_current = sum(current_data) / len(current_data)
-    color = ['navy'] * len(current_data)
+    avg_current = float(current_data.mean())
+    trace = downsampling.downsample(current_data, num_points, method)
+    time_relative = trace.indices * period
+    color = ['navy'] * len(trace.indices)
 
     #Preparing the data and source link for bokehn java callback
-    source = ColumnDataSource(
-        data=dict(x0=time_relative, y0=current_data, color=color))
-    s2 = ColumnDataSource(
+    source = bokeh_models.ColumnDataSource(
+        data=dict(
+            x0=time_relative.tolist(),
+            y0=current_data[trace.indices].tolist(),
+            mean=trace.means.tolist(),
+            color=color))
+    s2 = bokeh_models.ColumnDataSource(
         data=dict(
             z0=[mon_info.duration],
             y0=[round(avg_current, 2)],
@@ -89,21 +182,23 @@ def monsoon_data_plot(mon_info, file_path, tag=""):
             z1=[round(avg_current * voltage * mon_info.duration, 2)],
             z2=[round(avg_current * mon_info.duration, 2)]))
     #Setting up data table for the output
+    table_column = bokeh_widgets.TableColumn
     columns = [
-        TableColumn(field='z0', title='Total Duration (s)'),
-        TableColumn(field='y0', title='Average Current (mA)'),
-        TableColumn(field='x0', title='Average Power (4.2v) (mW)'),
-        TableColumn(field='z1', title='Average Energy (mW*s)'),
-        TableColumn(field='z2', title='Normalized Average Energy (mA*s)')
+        table_column(field='z0', title='Total Duration (s)'),
+        table_column(field='y0', title='Average Current (mA)'),
+        table_column(field='x0', title='Average Power (4.2v) (mW)'),
+        table_column(field='z1', title='Average Energy (mW*s)'),
+        table_column(field='z2', title='Normalized Average Energy (mA*s)')
     ]
-    dt = DataTable(
+    dt = bokeh_widgets.DataTable(
         source=s2, columns=columns, width=1300, height=60, editable=True)
 
     plot_title = file_path[file_path.rfind('/') + 1:-4] + tag
-    output_file("%s/%s.html" % (mon_info.data_path, plot_title))
+    html_path = "%s/%s.html" % (mon_info.data_path, plot_title)
+    bokeh_plotting.output_file(html_path)
     TOOLS = ('box_zoom,box_select,pan,crosshair,redo,undo,reset,hover,save')
     # Create a new plot with the datatable above
-    plot = figure(
+    plot = bokeh_plotting.figure(
         plot_width=1300,
         plot_height=700,
         title=plot_title,
@@ -118,7 +213,7 @@ def monsoon_data_plot(mon_info, file_path, tag=""):
     plot.title.text_font_size = {'value': '15pt'}
 
     #Callback Java scripting
-    source.callback = CustomJS(
+    source.callback = bokeh_models.CustomJS(
         args=dict(mytable=dt),
         code="""
     var inds = cb_obj.get('selected')['1d'].indices;
@@ -134,7 +229,7 @@ def monsoon_data_plot(mon_info, file_path, tag=""):
     min=max=d1['x0'][inds[0]]
     if (inds.length==0) {return;}
     for (i = 0; i < inds.length; i++) {
-    ym += d1['y0'][inds[i]]
+    ym += d1['mean'][inds[i]]
     d1['color'][inds[i]] = "red"
     if (d1['x0'][inds[i]] < min) {
       min = d1['x0'][inds[i]]}
@@ -156,9 +251,32 @@ def monsoon_data_plot(mon_info, file_path, tag=""):
     mytable.trigger('change');
     """)
 
+    tile_dir = None
+    num_tiles = 0
+    if getattr(mon_info, 'plot_tiles', True) and len(current_data) > len(
+            trace.indices):
+        tile_dir = os.path.join(mon_info.data_path, plot_title + '_tiles')
+        tiles = downsampling.write_tiles(current_data, mon_info.freq,
+                                         tile_dir, num_points, method)
+        num_tiles = sum(tiles['counts'])
+        tiles['dir'] = os.path.basename(tile_dir)
+        plot.x_range.callback = bokeh_models.CustomJS(
+            args=dict(source=source),
+            code=TILE_LOADER_JS % json.dumps(tiles))
+
     #Layout the plot and the datatable bar
-    l = layout([[dt], [plot]])
-    save(l)
+    l = bokeh_layouts.layout([[dt], [plot]])
+    bokeh_plotting.save(l)
+    tile_size = 0
+    if tile_dir:
+        tile_size = sum(
+            os.path.getsize(os.path.join(tile_dir, name))
+            for name in os.listdir(tile_dir))
+    log.info(
+        "Plotted %d of %d samples in %.2fs. The html file is %.2fMB, "
+        "%d zoom tiles are %.2fMB.", len(trace.indices), len(current_data),
+        time.time() - begin_time,
+        os.path.getsize(html_path) / 2.0**20, num_tiles, tile_size / 2.0**20)
     return [plot, dt]
 
 
@@ -290,7 +408,7 @@ def bokeh_plot(data_sets,
             plot: bokeh plot figure object
     """
     TOOLS = ('box_zoom,box_select,pan,crosshair,redo,undo,reset,hover,save')
-    plot = figure(
+    plot = bokeh_plotting.figure(
         plot_width=1300,
         plot_height=700,
         title=fig_property['title'],
@@ -325,8 +443,8 @@ def bokeh_plot(data_sets,
     plot.legend.click_policy = "hide"
     plot.title.text_font_size = {'value': '15pt'}
     if output_file_path is not None:
-        output_file(output_file_path)
-        save(plot)
+        bokeh_plotting.output_file(output_file_path)
+        bokeh_plotting.save(plot)
     return plot
 
 
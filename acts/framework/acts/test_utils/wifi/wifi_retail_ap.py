@@ -14,15 +14,18 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
-import fcntl
-import selenium
-import splinter
 import time
 from acts import logger
 from acts.controllers import access_point
 from acts.controllers.ap_lib import bridge_interface
 from acts.controllers.ap_lib import hostapd_security
 from acts.controllers.ap_lib import hostapd_ap_preset
+from acts.libs import lazy_import
+
+# selenium and splinter take seconds to import and are only needed once an AP
+# is configured.
+blocking_browser = lazy_import.lazy_import(
+    'acts.test_utils.wifi.blocking_browser')
 
 BROWSER_WAIT_SHORT = 1
 BROWSER_WAIT_MED = 3
@@ -59,107 +62,6 @@ def detroy(objs):
     return
 
 
-class BlockingBrowser(splinter.driver.webdriver.chrome.WebDriver):
-    """Class that implements a blocking browser session on top of selenium.
-
-    The class inherits from and builds upon splinter/selenium's webdriver class
-    and makes sure that only one such webdriver is active on a machine at any
-    single time. The class ensures single session operation using a lock file.
-    The class is to be used within context managers (e.g. with statements) to
-    ensure locks are always properly released.
-    """
-
-    def __init__(self, headless, timeout):
-        """Constructor for BlockingBrowser class.
-
-        Args:
-            headless: boolean to control visible/headless browser operation
-            timeout: maximum time allowed to launch browser
-        """
-        self.log = logger.create_tagged_trace_logger("ChromeDriver")
-        self.chrome_options = splinter.driver.webdriver.chrome.Options()
-        self.chrome_options.add_argument("--no-proxy-server")
-        self.chrome_options.add_argument("--no-sandbox")
-        self.chrome_options.add_argument("--allow-running-insecure-content")
-        self.chrome_options.add_argument("--ignore-certificate-errors")
-        self.chrome_capabilities = selenium.webdriver.common.desired_capabilities.DesiredCapabilities.CHROME.copy(
-        )
-        self.chrome_capabilities["acceptSslCerts"] = True
-        self.chrome_capabilities["acceptInsecureCerts"] = True
-        if headless:
-            self.chrome_options.add_argument("--headless")
-            self.chrome_options.add_argument("--disable-gpu")
-        self.lock_file_path = "/usr/local/bin/chromedriver"
-        self.timeout = timeout
-
-    def __enter__(self):
-        self.lock_file = open(self.lock_file_path, "r")
-        start_time = time.time()
-        while time.time() < start_time + self.timeout:
-            try:
-                fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
-                self.driver = selenium.webdriver.Chrome(
-                    options=self.chrome_options,
-                    desired_capabilities=self.chrome_capabilities)
-                self.element_class = splinter.driver.webdriver.WebDriverElement
-                self._cookie_manager = splinter.driver.webdriver.cookie_manager.CookieManager(
-                    self.driver)
-                super(splinter.driver.webdriver.chrome.WebDriver,
-                      self).__init__(2)
-                return super(BlockingBrowser, self).__enter__()
-            except BlockingIOError:
-                time.sleep(BROWSER_WAIT_SHORT)
-        raise TimeoutError("Could not start chrome browser in time.")
-
-    def __exit__(self, exc_type, exc_value, traceback):
-        try:
-            super(BlockingBrowser, self).__exit__(exc_type, exc_value,
-                                                  traceback)
-        except:
-            raise RuntimeError("Failed to quit browser. Releasing lock file.")
-        finally:
-            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
-            self.lock_file.close()
-
-    def restart(self):
-        """Method to restart browser session without releasing lock file."""
-        self.quit()
-        self.__enter__()
-
-    def visit_persistent(self,
-                         url,
-                         page_load_timeout,
-                         num_tries,
-                         backup_url="about:blank"):
-        """Method to visit webpages and retry upon failure.
-
-        The function visits a web page and checks the the resulting URL matches
-        the intended URL, i.e. no redirects have happened
-
-        Args:
-            url: the intended url
-            page_load_timeout: timeout for page visits
-            num_tries: number of tries before url is declared unreachable
-            backup_url: url to visit if first url is not reachable. This can be
-            use to simply refresh the browser and try again or to re-login to
-            the AP
-        """
-        self.driver.set_page_load_timeout(page_load_timeout)
-        for idx in range(num_tries):
-            try:
-                self.visit(url)
-                if self.url.split("/")[-1] == url.split("/")[-1]:
-                    break
-                else:
-                    self.visit(backup_url)
-            except:
-                self.restart()
-            if idx == num_tries - 1:
-                self.log.error("URL unreachable. Current URL: {}".format(
-                    self.url))
-                raise RuntimeError("URL unreachable.")
-
-
 class WifiRetailAP(object):
     """Base class implementation for retail ap.
 
@@ -441,8 +343,8 @@ class NetgearR7000AP(WifiRetailAP):
 
     def read_ap_settings(self):
         """Function to read ap settings."""
-        with BlockingBrowser(self.ap_settings["headless_browser"],
-                             600) as browser:
+        with blocking_browser.BlockingBrowser(
+                self.ap_settings["headless_browser"], 600) as browser:
             # Visit URL
             browser.visit_persistent(self.config_page, BROWSER_WAIT_MED, 10)
 
@@ -483,8 +385,8 @@ class NetgearR7000AP(WifiRetailAP):
         # Turn radios on or off
         self.configure_radio_on_off()
         # Configure radios
-        with BlockingBrowser(self.ap_settings["headless_browser"],
-                             600) as browser:
+        with blocking_browser.BlockingBrowser(
+                self.ap_settings["headless_browser"], 600) as browser:
             # Visit URL
             browser.visit_persistent(self.config_page, BROWSER_WAIT_MED, 10)
             browser.visit_persistent(self.config_page_nologin,
@@ -561,8 +463,8 @@ class NetgearR7000AP(WifiRetailAP):
 
     def configure_radio_on_off(self):
         """Helper configuration function to turn radios on/off."""
-        with BlockingBrowser(self.ap_settings["headless_browser"],
-                             600) as browser:
+        with blocking_browser.BlockingBrowser(
+                self.ap_settings["headless_browser"], 600) as browser:
             # Visit URL
             browser.visit_persistent(self.config_page, BROWSER_WAIT_MED, 10)
             browser.visit_persistent(self.config_page_advanced,
@@ -687,8 +589,8 @@ class NetgearR7500AP(WifiRetailAP):
         self.read_radio_on_off()
         # Get radio configuration. Note that if both radios are off, the below
         # code will result in an error
-        with BlockingBrowser(self.ap_settings["headless_browser"],
-                             600) as browser:
+        with blocking_browser.BlockingBrowser(
+                self.ap_settings["headless_browser"], 600) as browser:
             browser.visit_persistent(self.config_page, BROWSER_WAIT_MED, 10)
             browser.visit_persistent(self.config_page, BROWSER_WAIT_MED, 10)
             time.sleep(BROWSER_WAIT_SHORT)
@@ -732,8 +634,8 @@ class NetgearR7500AP(WifiRetailAP):
         # Turn radios on or off
         self.configure_radio_on_off()
         # Configure radios
-        with BlockingBrowser(self.ap_settings["headless_browser"],
-                             600) as browser:
+        with blocking_browser.BlockingBrowser(
+                self.ap_settings["headless_browser"], 600) as browser:
             browser.visit_persistent(self.config_page, BROWSER_WAIT_MED, 10)
             browser.visit_persistent(self.config_page, BROWSER_WAIT_MED, 10)
             time.sleep(BROWSER_WAIT_SHORT)
@@ -819,8 +721,8 @@ class NetgearR7500AP(WifiRetailAP):
 
     def configure_radio_on_off(self):
         """Helper configuration function to turn radios on/off."""
-        with BlockingBrowser(self.ap_settings["headless_browser"],
-                             600) as browser:
+        with blocking_browser.BlockingBrowser(
+                self.ap_settings["headless_browser"], 600) as browser:
             browser.visit_persistent(self.config_page, BROWSER_WAIT_MED, 10)
             browser.visit_persistent(self.config_page_advanced,
                                      BROWSER_WAIT_MED, 10)
@@ -857,8 +759,8 @@ class NetgearR7500AP(WifiRetailAP):
 
     def read_radio_on_off(self):
         """Helper configuration function to read radio status."""
-        with BlockingBrowser(self.ap_settings["headless_browser"],
-                             600) as browser:
+        with blocking_browser.BlockingBrowser(
+                self.ap_settings["headless_browser"], 600) as browser:
             browser.visit_persistent(self.config_page, BROWSER_WAIT_MED, 10)
             browser.visit_persistent(self.config_page_advanced,
                                      BROWSER_WAIT_MED, 10)
@@ -16,20 +16,31 @@
 
 import inspect
 import os
+import sys
 
 
 class TraceLogger():
+    """A logger wrapper that appends the callers of a log call to the message.
+
+    Attributes:
+        use_inspect: If True, callers are found with inspect.stack(), which
+                     builds frame info for the whole stack and reads source
+                     context. Otherwise the frames are walked directly, which
+                     gives the same output at a fraction of the cost.
+    """
+    use_inspect = False
+
     def __init__(self, logger):
         self._logger = logger
 
     @staticmethod
-    def _get_trace_info(level=1):
+    def _get_trace_info_from_inspect(level=1):
         # We want the stack frame above this and above the error/warning/info
         inspect_stack = inspect.stack()
         trace_info = ""
         for i in range(level):
             try:
-                stack_frames = inspect_stack[2 + i]
+                stack_frames = inspect_stack[3 + i]
                 info = inspect.getframeinfo(stack_frames[0])
                 trace_info = "%s[%s:%s:%s]" % (trace_info,
                                                os.path.basename(info.filename),
@@ -38,6 +49,26 @@ class TraceLogger():
                 break
         return trace_info
 
+    @staticmethod
+    def _get_trace_info(level=1):
+        if TraceLogger.use_inspect:
+            return TraceLogger._get_trace_info_from_inspect(level)
+        # We want the stack frame above this and above the error/warning/info
+        try:
+            frame = sys._getframe(2)
+        except ValueError:
+            return ""
+        trace_info = ""
+        for _ in range(level):
+            if frame is None:
+                break
+            code = frame.f_code
+            trace_info = "%s[%s:%s:%s]" % (trace_info,
+                                           os.path.basename(code.co_filename),
+                                           code.co_name, frame.f_lineno)
+            frame = frame.f_back
+        return trace_info
+
     def debug(self, msg, *args, **kwargs):
         trace_info = TraceLogger._get_trace_info(level=3)
         self._logger.debug("%s %s" % (msg, trace_info), *args, **kwargs)
@@ -388,6 +388,88 @@ class ActsAndroidDeviceTest(unittest.TestCase):
             logging.log_path, "AndroidDevice%s" % ad.serial, "test_something")
         create_dir_mock.assert_called_with(expected_path)
 
+    @mock.patch(
+        'acts.controllers.adb.AdbProxy',
+        return_value=MockAdbProxy(MOCK_SERIAL))
+    @mock.patch(
+        'acts.controllers.fastboot.FastbootProxy',
+        return_value=MockFastbootProxy(MOCK_SERIAL))
+    @mock.patch('acts.utils.create_dir')
+    @mock.patch('acts.utils.wait_for_standing_subprocess')
+    def test_AndroidDevice_start_and_finish_bug_report(
+            self, wait_mock, create_dir_mock, FastbootProxy, MockAdbProxy):
+        """Verifies AndroidDevice.start_bug_report starts bugreportz without
+        waiting for it, and finish_bug_report pulls the report it took.
+        """
+        ad = android_device.AndroidDevice(serial=MOCK_SERIAL)
+        with mock.patch.object(ad.adb, "shell_nb") as shell_nb_mock:
+            capture = ad.start_bug_report("test_something",
+                                          MOCK_ADB_EPOCH_BEGIN_TIME)
+        shell_nb_mock.assert_called_once_with(
+            "bugreportz > %s" % capture.status_path)
+        self.assertFalse(wait_mock.called)
+        self.assertTrue(capture.out_path.endswith(".zip"))
+
+        ad.adb.return_value = "OK:/path/bugreport.zip\n"
+        with mock.patch.object(ad.adb, "pull") as pull_mock:
+            ad.finish_bug_report(capture)
+        wait_mock.assert_called_once_with(shell_nb_mock.return_value,
+                                          mock.ANY)
+        pull_mock.assert_called_once_with(
+            "/path/bugreport.zip %s" % capture.out_path)
+
+    @mock.patch(
+        'acts.controllers.adb.AdbProxy',
+        return_value=MockAdbProxy(MOCK_SERIAL))
+    @mock.patch(
+        'acts.controllers.fastboot.FastbootProxy',
+        return_value=MockFastbootProxy(MOCK_SERIAL))
+    @mock.patch('acts.utils.create_dir')
+    @mock.patch('acts.utils.wait_for_standing_subprocess')
+    def test_AndroidDevice_bug_reports_do_not_overlap(
+            self, wait_mock, create_dir_mock, FastbootProxy, MockAdbProxy):
+        """Verifies AndroidDevice.start_bug_report waits for the bug report
+        started before it, and gives each its own status file.
+        """
+        ad = android_device.AndroidDevice(serial=MOCK_SERIAL)
+        calls = mock.Mock()
+        calls.attach_mock(wait_mock, "wait")
+        with mock.patch.object(ad.adb, "shell_nb") as shell_nb_mock:
+            calls.attach_mock(shell_nb_mock, "shell_nb")
+            shell_nb_mock.side_effect = ["first", "second"]
+            first = ad.start_bug_report("test_something",
+                                        MOCK_ADB_EPOCH_BEGIN_TIME)
+            second = ad.start_bug_report("test_something",
+                                         MOCK_ADB_EPOCH_BEGIN_TIME)
+        self.assertNotEqual(first.status_path, second.status_path)
+        self.assertEqual(calls.mock_calls, [
+            mock.call.shell_nb("bugreportz > %s" % first.status_path),
+            mock.call.wait("first", mock.ANY),
+            mock.call.shell_nb("bugreportz > %s" % second.status_path)
+        ])
+
+    @mock.patch(
+        'acts.controllers.adb.AdbProxy',
+        return_value=MockAdbProxy(MOCK_SERIAL))
+    @mock.patch(
+        'acts.controllers.fastboot.FastbootProxy',
+        return_value=MockFastbootProxy(MOCK_SERIAL))
+    @mock.patch('acts.utils.create_dir')
+    @mock.patch('acts.utils.wait_for_standing_subprocess')
+    def test_AndroidDevice_finish_bug_report_fail(
+            self, wait_mock, create_dir_mock, FastbootProxy, MockAdbProxy):
+        """Verifies AndroidDevice.finish_bug_report raises the error reported
+        by bugreportz.
+        """
+        ad = android_device.AndroidDevice(serial=MOCK_SERIAL)
+        capture = ad.start_bug_report("test_something",
+                                      MOCK_ADB_EPOCH_BEGIN_TIME)
+        ad.adb.return_value = "OMG I died!\n"
+        expected_msg = "Failed to take bugreport on 1: OMG I died!"
+        with self.assertRaisesRegex(android_device.AndroidDeviceError,
+                                    expected_msg):
+            ad.finish_bug_report(capture)
+
     @mock.patch(
         'acts.controllers.adb.AdbProxy',
         return_value=MockAdbProxy(MOCK_SERIAL))
@@ -15,10 +15,15 @@
 #   limitations under the License.
 
 import mock
+import os
+import shutil
+import tempfile
+import time
 import unittest
 
 from acts import asserts
 from acts import base_test
+from acts import profiler
 from acts import signals
 from acts import test_runner
 
@@ -1000,6 +1005,151 @@ class ActsBaseClassTest(unittest.TestCase):
         self.assertEqual(fail_record.details, MSG_EXPECTED_EXCEPTION)
         self.assertEqual(fail_record.extras, MOCK_EXTRA)
 
+    def test_reorder_by_setup_keys(self):
+        executed = []
+
+        class MockBaseTest(base_test.BaseTestClass):
+            setup_key_costs = (60, )
+
+            def get_setup_keys(self, test_name):
+                return (test_name.split("_")[1], )
+
+            def test_ch1_a(self):
+                executed.append("test_ch1_a")
+
+            def test_ch6_b(self):
+                executed.append("test_ch6_b")
+
+            def test_ch1_c(self):
+                executed.append("test_ch1_c")
+
+        self.mock_test_cls_configs["user_params"]["reorder_by_setup_keys"] = (
+            True)
+        bt_cls = MockBaseTest(self.mock_test_cls_configs)
+        canonical = ["test_ch1_a", "test_ch6_b", "test_ch1_c"]
+        bt_cls.run(test_names=canonical)
+        self.assertEqual(executed, ["test_ch1_a", "test_ch1_c", "test_ch6_b"])
+        self.assertEqual([r.test_name for r in bt_cls.results.passed],
+                         canonical)
+        summary = bt_cls.results.extras["MockBaseTest Test Order"]
+        self.assertEqual(summary["Estimated Setup Time Saved"], 60)
+
+    def test_setup_keys_from_setup_class(self):
+        executed = []
+
+        class MockBaseTest(base_test.BaseTestClass):
+            def setup_class(self):
+                self.channels = {"test_a": 6, "test_b": 1, "test_c": 6}
+
+            def get_setup_keys(self, test_name):
+                return (self.channels[test_name], )
+
+            def test_a(self):
+                executed.append("test_a")
+
+            def test_b(self):
+                executed.append("test_b")
+
+            def test_c(self):
+                executed.append("test_c")
+
+        self.mock_test_cls_configs["user_params"]["reorder_by_setup_keys"] = (
+            True)
+        bt_cls = MockBaseTest(self.mock_test_cls_configs)
+        bt_cls.run(test_names=["test_a", "test_b", "test_c"])
+        self.assertEqual(executed, ["test_a", "test_c", "test_b"])
+
+    def test_setup_keys_error_runs_canonical_order(self):
+        executed = []
+        teardown_class = mock.MagicMock()
+
+        class MockBaseTest(base_test.BaseTestClass):
+            def get_setup_keys(self, test_name):
+                raise Exception("No setup keys.")
+
+            def teardown_class(self):
+                teardown_class()
+
+            def test_b(self):
+                executed.append("test_b")
+
+            def test_a(self):
+                executed.append("test_a")
+
+        self.mock_test_cls_configs["user_params"]["reorder_by_setup_keys"] = (
+            True)
+        bt_cls = MockBaseTest(self.mock_test_cls_configs)
+        bt_cls.run(test_names=["test_b", "test_a"])
+        self.assertEqual(executed, ["test_b", "test_a"])
+        self.assertEqual(len(bt_cls.results.passed), 2)
+        self.assertTrue(teardown_class.called)
+        self.assertNotIn("MockBaseTest Test Order", bt_cls.results.extras)
+
+    def test_reorder_generated_tests_by_setup_keys(self):
+        executed = []
+
+        class MockBaseTest(base_test.BaseTestClass):
+            def logic(self, setting):
+                executed.append(setting)
+                asserts.assert_true(setting != "5g_fail", "Expected failure.")
+
+            def test_func(self):
+                failed = self.run_generated_testcases(
+                    test_func=self.logic,
+                    settings=["2g_a", "5g_fail", "2g_b"],
+                    name_func=lambda setting: "test_%s" % setting,
+                    setup_key_func=lambda setting: (setting[:2], ))
+                asserts.assert_equal(failed, ["5g_fail"])
+                raise signals.TestSilent("Generated tests done.")
+
+        self.mock_test_cls_configs["user_params"]["reorder_by_setup_keys"] = (
+            True)
+        bt_cls = MockBaseTest(self.mock_test_cls_configs)
+        bt_cls.run(test_names=["test_func"])
+        self.assertEqual(executed, ["2g_a", "2g_b", "5g_fail"])
+        self.assertEqual([r.test_name for r in bt_cls.results.executed],
+                         ["test_2g_a", "test_5g_fail", "test_2g_b"])
+
+    def test_profile_tests(self):
+        class MockBaseTest(base_test.BaseTestClass):
+            def setup_class(self):
+                with profiler.span("load_config"):
+                    pass
+
+            def logic(self, setting):
+                time.sleep(0.001)
+
+            def test_func(self):
+                self.run_generated_testcases(
+                    test_func=self.logic,
+                    settings=["a", "b"],
+                    name_func=lambda setting: "test_%s" % setting)
+                raise signals.TestSilent("Generated tests done.")
+
+        log_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_path)
+        self.mock_test_cls_configs["log_path"] = log_path
+        self.mock_test_cls_configs["user_params"]["profile_tests"] = True
+        real_sleep = time.sleep
+        bt_cls = MockBaseTest(self.mock_test_cls_configs)
+        bt_cls.run(test_names=["test_func"])
+        self.assertIs(time.sleep, real_sleep)
+        profile = bt_cls.results.extras["MockBaseTest Profile"]
+        # The trigger test is not reported.
+        self.assertEqual(
+            sorted(profile),
+            ["setup_class", "teardown_class", "test_a", "test_b"])
+        self.assertEqual(profile["setup_class"][0]["children"][0]["name"],
+                         "load_config")
+        tree = profile["test_a"][0]
+        self.assertEqual([node["name"] for node in tree["children"]],
+                         ["setup_test", "test", "teardown_test", "on_pass"])
+        self.assertEqual(tree["children"][1]["children"][0]["name"],
+                         profiler.SLEEP_SPAN_NAME)
+        with open(os.path.join(log_path, base_test.PROFILE_FILE_NAME)) as f:
+            stacks = [line.rsplit(" ", 1)[0] for line in f]
+        self.assertIn("MockBaseTest;test_b;test;sleep", stacks)
+
 
 if __name__ == "__main__":
     unittest.main()
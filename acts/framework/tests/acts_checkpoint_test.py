@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from acts import asserts
+from acts import base_test
+from acts import checkpoint
+from acts import records
+from acts import signals
+from acts import test_runner
+
+# The settings of the generated test cases that fail or are skipped, set by
+# each test.
+FAILING = set()
+SKIPPING = set()
+EXECUTED = []
+# The settings run_generated_testcases returned as not passed.
+NOT_PASSED = []
+
+
+class CheckpointedTest(base_test.BaseTestClass):
+    def test_plain(self):
+        EXECUTED.append("test_plain")
+        asserts.assert_true("test_plain" not in FAILING, "Expected failure.")
+
+    def test_generated(self):
+        NOT_PASSED[:] = self.run_generated_testcases(
+            self._logic, [{"band": "2g"}, {"band": "5g"}],
+            name_func=lambda setting: "test_%s" % setting["band"])
+        raise signals.TestSilent("Generated tests done.")
+
+    def _logic(self, setting):
+        EXECUTED.append(setting["band"])
+        if setting["band"] in SKIPPING:
+            raise signals.TestSkip("Expected skip.")
+        asserts.assert_true(setting["band"] not in FAILING,
+                            "Expected failure.")
+
+
+class Opaque(object):
+    pass
+
+
+class ActsCheckpointTest(unittest.TestCase):
+    """Tests for acts.checkpoint and resuming runs in TestRunner."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        del EXECUTED[:]
+        del NOT_PASSED[:]
+        FAILING.clear()
+        SKIPPING.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_params_digest_is_stable(self):
+        self.assertIsNone(checkpoint.params_digest(None))
+        self.assertEqual(
+            checkpoint.params_digest({"a": 1, "b": {"x", "y"}}),
+            checkpoint.params_digest({"b": {"y", "x"}, "a": 1}))
+        self.assertEqual(
+            checkpoint.params_digest([Opaque()]),
+            checkpoint.params_digest([Opaque()]))
+        self.assertNotEqual(
+            checkpoint.params_digest(("2g", 1)),
+            checkpoint.params_digest(("2g", 2)))
+
+    def test_stable_str(self):
+        self.assertEqual(checkpoint.stable_str(Opaque()),
+                         checkpoint.stable_str(Opaque()))
+        self.assertEqual(checkpoint.stable_str("ch 6"), "ch 6")
+
+    def test_checkpoint_counts_completions(self):
+        path = os.path.join(self.tmp_dir, checkpoint.CHECKPOINT_FILE_NAME)
+        test_checkpoint = checkpoint.Checkpoint(path)
+        for result in ("pass", "pass", "fail"):
+            record = records.TestResultRecord("test_a", "SomeTest")
+            getattr(record, "test_%s" % result)()
+            test_checkpoint.add_record(record, params=1)
+        test_checkpoint.close()
+        entries = checkpoint.load_checkpoint(path)
+        self.assertEqual(len(entries), 2)
+        resumed = checkpoint.Checkpoint(
+            os.path.join(self.tmp_dir, "resumed.jsonl"), entries)
+        self.assertFalse(resumed.is_completed("SomeTest", "test_a"))
+        self.assertTrue(resumed.is_completed("SomeTest", "test_a", 1))
+        self.assertEqual(resumed.completed_result("SomeTest", "test_a", 1),
+                         records.TestResultEnums.TEST_RESULT_PASS)
+        self.assertFalse(resumed.is_completed("SomeTest", "test_a", 1))
+        resumed.close()
+
+    def test_load_checkpoint_skips_partial_line(self):
+        path = os.path.join(self.tmp_dir, checkpoint.CHECKPOINT_FILE_NAME)
+        test_checkpoint = checkpoint.Checkpoint(path)
+        record = records.TestResultRecord("test_a", "SomeTest")
+        record.test_pass()
+        test_checkpoint.add_record(record)
+        test_checkpoint.close()
+        with open(path, "a") as f:
+            f.write('{"Params": null, "Rec')
+        self.assertEqual(len(checkpoint.load_checkpoint(path)), 1)
+
+    def _run(self, log_dir, resume_from=None):
+        config = {
+            "testbed": {
+                "name": "CheckpointTestBed"
+            },
+            "logpath": os.path.join(self.tmp_dir, log_dir),
+            "cli_args": None,
+            "testpaths": ["./"],
+            "checkpoint": True,
+        }
+        if resume_from:
+            config["resume_from"] = resume_from
+        runner = test_runner.TestRunner(config, [("CheckpointedTest", None)])
+        try:
+            runner.run(CheckpointedTest)
+        finally:
+            runner.stop()
+        return runner
+
+    def test_resume_run(self):
+        FAILING.update(("test_plain", "5g"))
+        first = self._run("first")
+        self.assertEqual(EXECUTED, ["2g", "5g", "test_plain"])
+
+        del EXECUTED[:]
+        FAILING.clear()
+        # Resuming from the root log path uses the latest run of the testbed.
+        second = self._run("second", os.path.join(self.tmp_dir, "first"))
+        self.assertEqual(EXECUTED, ["5g", "test_plain"])
+        with open(os.path.join(second.log_path,
+                               "test_run_summary.json")) as f:
+            summary = json.load(f)
+        self.assertEqual(summary["Summary"]["Passed"], 3)
+        self.assertEqual(summary["Summary"]["Failed"], 0)
+
+        del EXECUTED[:]
+        self._run("third", second.log_path)
+        self.assertEqual(EXECUTED, [])
+
+    def test_resumed_skip_is_not_passed(self):
+        SKIPPING.add("5g")
+        self._run("first")
+        self.assertEqual(NOT_PASSED, [{"band": "5g"}])
+
+        del EXECUTED[:]
+        SKIPPING.clear()
+        self._run("second", os.path.join(self.tmp_dir, "first"))
+        self.assertEqual(EXECUTED, [])
+        self.assertEqual(NOT_PASSED, [{"band": "5g"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import mock
+import unittest
+
+from acts.controllers import crash_tracker
+
+CRASH_PATHS = ("/data/tombstones/", "/data/vendor/ramdump/",
+               "/data/vendor/ramdump/bluetooth")
+DEVICE_TIME = 1000
+
+
+class FakeAdb(object):
+    """Answers the crash tracker's shell commands from a fake file list."""
+
+    def __init__(self):
+        # Maps a path to (mtime, inode, content).
+        self.files = {}
+        self.commands = []
+
+    def shell(self, cmd, ignore_status=False, timeout=60):
+        self.commands.append(cmd)
+        if cmd.startswith('date'):
+            lines = [str(DEVICE_TIME)]
+            for path, (mtime, inode, _) in sorted(self.files.items()):
+                lines.append('%s %s %s' % (mtime, inode, path))
+                # The bluetooth directory is nested in the ramdump directory,
+                # so find lists its files twice.
+                if 'bluetooth' in path:
+                    lines.append('%s %s %s' % (mtime, inode, path))
+            return '\n'.join(lines)
+        if cmd.startswith('grep -l'):
+            return '\n'.join(path for path, (_, _, content) in
+                             sorted(self.files.items())
+                             if path in cmd and 'crash_dump failed' in content)
+        raise ValueError('Unexpected command %s' % cmd)
+
+
+class ActsCrashTrackerTest(unittest.TestCase):
+    def setUp(self):
+        self.adb = FakeAdb()
+        self.tracker = crash_tracker.CrashTracker(
+            self.adb, CRASH_PATHS, skip_files=("RAMDUMP_STATUS", ))
+
+    def test_no_crashes_costs_one_call(self):
+        self.assertEqual(self.tracker.get_crash_reports(), [])
+        self.assertEqual(len(self.adb.commands), 1)
+        self.assertIn('! -iname RAMDUMP_STATUS', self.adb.commands[0])
+
+    def test_scan_deduplicates_nested_directories(self):
+        self.adb.files['/data/vendor/ramdump/bluetooth/bt_dump'] = (1, 7, '')
+        _, files = self.tracker.scan()
+        self.assertEqual(len(files), 1)
+        self.assertEqual(files[0].directory, '/data/vendor/ramdump/bluetooth')
+
+    def test_tombstones_filtered_in_one_call(self):
+        self.adb.files['/data/tombstones/tombstone_00'] = (1, 1, 'SIGSEGV')
+        self.adb.files['/data/tombstones/tombstone_01'] = (
+            1, 2, 'crash_dump failed to dump process')
+        self.adb.files['/data/vendor/ramdump/modem'] = (1, 3, '')
+        reports = self.tracker.get_crash_reports()
+        self.assertEqual(
+            reports,
+            ['/data/tombstones/tombstone_00', '/data/vendor/ramdump/modem'])
+        self.assertEqual(len(self.adb.commands), 2)
+
+    @mock.patch('acts.utils.get_current_epoch_time', return_value=100000)
+    def test_begin_time_uses_device_clock(self, _):
+        self.adb.files['/data/vendor/ramdump/old'] = (DEVICE_TIME - 60, 1, '')
+        self.adb.files['/data/vendor/ramdump/new'] = (DEVICE_TIME - 5, 2, '')
+        reports = self.tracker.get_crash_reports(begin_time=100000 - 10000)
+        self.assertEqual(reports, ['/data/vendor/ramdump/new'])
+
+    def test_since_last_check(self):
+        self.adb.files['/data/vendor/ramdump/a'] = (5, 1, '')
+        self.tracker.reset()
+        self.assertEqual(
+            self.tracker.get_crash_reports(since_last_check=True), [])
+        # A new file in the same second as the mark and a newer file.
+        self.adb.files['/data/vendor/ramdump/b'] = (5, 2, '')
+        self.adb.files['/data/vendor/ramdump/c'] = (6, 3, '')
+        self.assertEqual(
+            self.tracker.get_crash_reports(since_last_check=True),
+            ['/data/vendor/ramdump/b', '/data/vendor/ramdump/c'])
+        self.assertEqual(
+            self.tracker.get_crash_reports(since_last_check=True), [])
+        # Stateless checks still report everything.
+        self.assertEqual(len(self.tracker.get_crash_reports()), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import logging
+import mock
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from acts import asserts
+from acts import base_test
+from acts import device_pool
+from acts import records
+from acts import signals
+
+NUM_TESTS = 6
+
+
+class PoolTest(base_test.BaseTestClass):
+    def __init__(self, configs):
+        super(PoolTest, self).__init__(configs)
+        self.tests = ["test_%d" % i for i in range(NUM_TESTS)]
+        self.executed = {}
+        self.device_calls = []
+        self.lock = threading.Lock()
+        # Devices whose setup fails.
+        self.bad_devices = ()
+
+    def setup_class(self):
+        self.dut = self.android_devices[0]
+
+    def setup_device(self, ad):
+        self.device_calls.append(("setup", ad.serial))
+        return ad.serial not in self.bad_devices
+
+    def teardown_device(self, ad):
+        self.device_calls.append(("teardown", ad.serial))
+
+    def _run_test(self, name):
+        self.log.info("Running %s.", name)
+        with self.lock:
+            self.executed[name] = self.dut.serial
+        time.sleep(0.02)
+        asserts.assert_true(name != "test_3", "Expected failure.")
+
+    for i in range(NUM_TESTS):
+        locals()["test_%d" % i] = (
+            lambda self, name="test_%d" % i: self._run_test(name))
+
+
+class ReorderedPoolTest(PoolTest):
+    """Runs the even test cases first, and notes the number of records
+    streamed before each test case."""
+
+    def __init__(self, configs):
+        super(ReorderedPoolTest, self).__init__(configs)
+        self.user_params["reorder_by_setup_keys"] = True
+        self.streamed = {}
+        self.stream_path = None
+
+    def get_setup_keys(self, test_name):
+        return (int(test_name[-1]) % 2, )
+
+    def _run_test(self, name):
+        if self.stream_path:
+            self.streamed[name] = len(
+                list(records.iter_streamed_records(self.stream_path)))
+        super(ReorderedPoolTest, self)._run_test(name)
+
+
+class ActsDevicePoolTest(unittest.TestCase):
+    """Tests for acts.device_pool and device pools in BaseTestClass."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.devices = [
+            mock.MagicMock(serial="serial%d" % i, droid=None)
+            for i in range(3)
+        ]
+        self.configs = {
+            "reporter": mock.MagicMock(),
+            "log": mock.MagicMock(),
+            "log_path": self.tmp_dir,
+            "cli_args": None,
+            "android_devices": self.devices,
+            "user_params": {
+                "parallel_device_pool": True
+            }
+        }
+
+        # The test logger of a test run logs everything.
+        root_logger = logging.getLogger()
+        self.addCleanup(root_logger.setLevel, root_logger.level)
+        root_logger.setLevel(logging.DEBUG)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_run_on_device_pool(self):
+        test_cls = PoolTest(self.configs)
+        test_cls.run()
+        self.assertEqual(sorted(test_cls.executed), test_cls.tests)
+        self.assertEqual(
+            set(test_cls.executed.values()), {"serial0", "serial1", "serial2"})
+        # Records are reported in the order of the tests.
+        self.assertEqual([r.test_name for r in test_cls.results.executed],
+                         test_cls.tests)
+        self.assertEqual([r.test_name for r in test_cls.results.failed],
+                         ["test_3"])
+        self.assertEqual(
+            sorted(test_cls.device_calls),
+            sorted([(call, ad.serial) for ad in self.devices
+                    for call in ("setup", "teardown")]))
+        for ad in self.devices:
+            log_path = os.path.join(
+                self.tmp_dir, device_pool.WORKER_LOG_FILE_NAME_FORMAT %
+                ("PoolTest", ad.serial))
+            with open(log_path) as f:
+                content = f.read()
+            for name, serial in test_cls.executed.items():
+                self.assertEqual("[%s] Running %s." % (ad.serial, name)
+                                 in content, serial == ad.serial)
+
+    def test_reordered_on_device_pool(self):
+        stream_path = os.path.join(self.tmp_dir, "records.jsonl")
+        writer = records.TestResultStreamWriter(stream_path)
+        self.addCleanup(writer.close)
+        test_cls = ReorderedPoolTest(self.configs)
+        # A single worker executes all the test cases.
+        test_cls.bad_devices = ("serial1", "serial2")
+        test_cls.results.stream_writer = writer
+        test_cls.stream_path = stream_path
+        test_cls.run()
+        # Executed in the order of the setup keys, reported in canonical
+        # order.
+        self.assertEqual(
+            [name for name, _ in sorted(
+                test_cls.streamed.items(), key=lambda item: item[1])],
+            ["test_0", "test_2", "test_4", "test_1", "test_3", "test_5"])
+        self.assertEqual([r.test_name for r in test_cls.results.executed],
+                         test_cls.tests)
+        # Records are streamed as the test cases finish.
+        self.assertEqual(test_cls.streamed["test_5"], NUM_TESTS - 1)
+        self.assertIs(test_cls.results.stream_writer, writer)
+        summary_path = os.path.join(self.tmp_dir, "summary.json")
+        records.write_summary_from_stream(stream_path, summary_path,
+                                          test_cls.results,
+                                          writer.canonical_orders)
+        with open(summary_path) as f:
+            self.assertEqual(f.read(), test_cls.results.json_str())
+
+    def test_reordered_on_several_devices(self):
+        test_cls = ReorderedPoolTest(self.configs)
+        test_cls.results.stream_writer = records.TestResultStreamWriter(
+            os.path.join(self.tmp_dir, "records.jsonl"))
+        self.addCleanup(test_cls.results.stream_writer.close)
+        test_cls.run()
+        self.assertEqual([r.test_name for r in test_cls.results.executed],
+                         test_cls.tests)
+
+    def test_async_diagnostics_on_device_pool(self):
+        finished = []
+
+        def finish_bug_report(capture):
+            time.sleep(0.05)
+            finished.append(capture)
+
+        for ad in self.devices:
+            ad.finish_bug_report.side_effect = finish_bug_report
+        self.configs["user_params"]["async_diagnostics"] = True
+
+        class DiagnosedPoolTest(PoolTest):
+            def on_fail(self, test_name, begin_time):
+                self._take_bug_report(test_name, begin_time)
+
+        test_cls = DiagnosedPoolTest(self.configs)
+        test_cls.run()
+        serial = test_cls.executed["test_3"]
+        ad = [ad for ad in self.devices if ad.serial == serial][0]
+        self.assertEqual(finished, [ad.start_bug_report.return_value])
+        self.assertIsNone(test_cls.diagnostics_queue)
+        summary = test_cls.results.extras["DiagnosedPoolTest Diagnostics"]
+        self.assertEqual(len(summary["Tasks"]), 2)
+        self.assertEqual(summary["Unfinished"], 0)
+        self.assertEqual({task["device"] for task in summary["Tasks"]},
+                         {serial})
+
+    def test_pool_size(self):
+        self.configs["user_params"]["parallel_device_pool"] = 2
+        test_cls = PoolTest(self.configs)
+        test_cls.run()
+        self.assertEqual(
+            set(test_cls.executed.values()), {"serial0", "serial1"})
+
+    def test_device_setup_failure(self):
+        test_cls = PoolTest(self.configs)
+        test_cls.bad_devices = ("serial0", "serial2")
+        test_cls.run()
+        self.assertEqual(set(test_cls.executed.values()), {"serial1"})
+        self.assertEqual(len(test_cls.results.executed), NUM_TESTS)
+
+    def test_all_device_setups_fail(self):
+        test_cls = PoolTest(self.configs)
+        test_cls.bad_devices = [ad.serial for ad in self.devices]
+        test_cls.run()
+        self.assertEqual(test_cls.executed, {})
+        self.assertEqual([r.test_name for r in test_cls.results.blocked],
+                         test_cls.tests)
+
+    def test_abort_all(self):
+        class AbortTest(PoolTest):
+            def test_0(self):
+                raise signals.TestAbortAll("Abort.")
+
+        test_cls = AbortTest(self.configs)
+        with self.assertRaises(signals.TestAbortAll) as context:
+            test_cls.run()
+        self.assertIn("test_0",
+                      [r.test_name for r in context.exception.results.failed])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import mock
+import threading
+import unittest
+
+from acts import base_test
+from acts import diagnostics_queue
+
+
+class ActsDiagnosticsQueueTest(unittest.TestCase):
+    """Tests for acts.diagnostics_queue."""
+
+    def test_drain_waits_for_all_tasks(self):
+        queue = diagnostics_queue.DiagnosticsQueue(log=mock.MagicMock())
+        done = []
+        for i in range(5):
+            queue.submit('serial%s' % (i % 2), 'task%s' % i, done.append, i)
+        self.assertTrue(queue.shutdown())
+        self.assertEqual(sorted(done), list(range(5)))
+        self.assertEqual(queue.pending, 0)
+
+    def test_concurrency_is_bounded_per_device(self):
+        queue = diagnostics_queue.DiagnosticsQueue(
+            max_tasks_per_device=1, log=mock.MagicMock())
+        lock = threading.Lock()
+        running = {'count': 0, 'max': 0}
+        release = threading.Event()
+
+        def task():
+            with lock:
+                running['count'] += 1
+                running['max'] = max(running['max'], running['count'])
+            release.wait(5)
+            with lock:
+                running['count'] -= 1
+
+        for i in range(3):
+            queue.submit('serial', 'task%s' % i, task)
+        release.set()
+        queue.shutdown()
+        self.assertEqual(running['max'], 1)
+
+    def test_devices_run_in_parallel(self):
+        queue = diagnostics_queue.DiagnosticsQueue(
+            max_tasks_per_device=1, log=mock.MagicMock())
+        barrier = threading.Barrier(2, timeout=5)
+        queue.submit('serial1', 'task1', barrier.wait)
+        queue.submit('serial2', 'task2', barrier.wait)
+        queue.shutdown()
+        self.assertEqual(queue.summary_dict()['Failed'], 0)
+
+    def test_failed_task_is_reported(self):
+        queue = diagnostics_queue.DiagnosticsQueue(log=mock.MagicMock())
+
+        def fail():
+            raise Exception('no device')
+
+        queue.submit('serial', 'bugreport', fail)
+        queue.shutdown()
+        summary = queue.summary_dict()
+        self.assertEqual(summary['Failed'], 1)
+        self.assertEqual(summary['Tasks'][0]['error'], 'no device')
+        self.assertTrue(summary['Tasks'][0]['finished'])
+
+    def test_drain_timeout(self):
+        queue = diagnostics_queue.DiagnosticsQueue(log=mock.MagicMock())
+        release = threading.Event()
+        queue.submit('serial', 'slow', release.wait, 5)
+        self.assertFalse(queue.drain(timeout=0.01))
+        self.assertEqual(queue.summary_dict()['Unfinished'], 1)
+        release.set()
+        self.assertTrue(queue.shutdown())
+
+    def test_base_test_queues_bug_reports(self):
+        ad = mock.MagicMock()
+        ad.serial = 'serial'
+        configs = {
+            'log': mock.MagicMock(),
+            'log_path': '/tmp',
+            'cli_args': None,
+            'android_devices': [ad],
+            'user_params': {
+                'async_diagnostics': True
+            }
+        }
+
+        class MockBaseTest(base_test.BaseTestClass):
+            def on_fail(self, test_name, begin_time):
+                self._take_bug_report(test_name, begin_time)
+
+            def test_something(self):
+                self.fail_me()
+
+        with mock.patch.object(base_test.utils, 'set_location_service'):
+            with mock.patch.object(base_test.utils, 'sync_device_time'):
+                bt_cls = MockBaseTest(configs)
+        bt_cls.run(test_names=['test_something'])
+        ad.finish_bug_report.assert_called_once_with(
+            ad.start_bug_report.return_value)
+        self.assertFalse(ad.take_bug_report.called)
+        self.assertTrue(ad.check_crash_report.called)
+        self.assertIsNone(bt_cls.diagnostics_queue)
+        summary = bt_cls.results.extras['MockBaseTest Diagnostics']
+        self.assertEqual(len(summary['Tasks']), 2)
+
+    def test_base_test_starts_bug_reports_before_queueing(self):
+        ad = mock.MagicMock()
+        ad.serial = 'serial'
+        configs = {
+            'log': mock.MagicMock(),
+            'log_path': '/tmp',
+            'cli_args': None,
+            'android_devices': [ad],
+            'user_params': {
+                'async_diagnostics': True,
+                'diagnostics_max_tasks_per_device': 1
+            }
+        }
+        with mock.patch.object(base_test.utils, 'set_location_service'):
+            with mock.patch.object(base_test.utils, 'sync_device_time'):
+                bt_cls = base_test.BaseTestClass(configs)
+        release = threading.Event()
+        queue = bt_cls._get_diagnostics_queue()
+        queue.submit('serial', 'earlier', release.wait, 5)
+
+        bt_cls._take_bug_report('test_a', 1000)
+        ad.start_bug_report.assert_called_once_with('test_a', 1000)
+        self.assertFalse(ad.finish_bug_report.called)
+
+        ad.start_bug_report.side_effect = Exception('offline')
+        bt_cls._take_bug_report('test_b', 2000)
+        release.set()
+        bt_cls._drain_diagnostics()
+        ad.finish_bug_report.assert_called_once_with(
+            ad.start_bug_report.return_value)
+        ad.take_bug_report.assert_called_once_with('test_b', 2000)
+
+
+if __name__ == "__main__":
+    unittest.main()
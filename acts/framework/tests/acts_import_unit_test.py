@@ -50,9 +50,8 @@ PY_FILE_REGEX = re.compile('.+\.py$')
 BLACKLIST = [
     'acts/controllers/native.py',
     'acts/controllers/native_android_device.py',
-    'acts/test_utils/wifi/wifi_power_test_utils.py',
     'acts/controllers/packet_sender.py',
-    'acts/test_utils/wifi/wifi_retail_ap.py',
+    'acts/test_utils/wifi/blocking_browser.py',
     'acts/test_utils/bt/bt_power_test_utils.py',
 ]
 
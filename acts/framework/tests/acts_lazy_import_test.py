@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import sys
+import unittest
+
+from acts.libs import lazy_import
+
+
+class ActsLazyImportTest(unittest.TestCase):
+    """Tests for acts.libs.lazy_import."""
+
+    def setUp(self):
+        sys.modules.pop("colorsys", None)
+
+    def test_import_deferred_until_first_use(self):
+        colorsys = lazy_import.lazy_import("colorsys")
+        self.assertNotIn("colorsys", sys.modules)
+        self.assertEqual(colorsys.rgb_to_hsv(1.0, 0.0, 0.0), (0.0, 1.0, 1.0))
+        self.assertIn("colorsys", sys.modules)
+        self.assertIs(colorsys.rgb_to_hsv, sys.modules["colorsys"].rgb_to_hsv)
+
+    def test_imported_module_returned_directly(self):
+        self.assertIs(lazy_import.lazy_import("sys"), sys)
+
+    def test_missing_module_fails_on_use(self):
+        missing = lazy_import.lazy_import("acts_lazy_import_missing_module")
+        with self.assertRaises(ImportError):
+            missing.anything
+
+
+if __name__ == "__main__":
+    unittest.main()
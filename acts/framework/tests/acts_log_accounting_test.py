@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from acts import log_accounting
+
+
+def write_file(path, size):
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+
+
+class ActsLogAccountingTest(unittest.TestCase):
+    def setUp(self):
+        self.log_root = tempfile.mkdtemp()
+        self.accountant = log_accounting.get_accountant(
+            self.log_root, reconcile_interval=3600)
+
+    def tearDown(self):
+        shutil.rmtree(self.log_root)
+        log_accounting._accountants.pop(self.accountant.log_root, None)
+
+    def test_first_size_reconciles(self):
+        write_file(os.path.join(self.log_root, 'a'), 10)
+        self.assertEqual(self.accountant.size, 10)
+
+    def test_accounted_paths_do_not_walk(self):
+        self.assertEqual(self.accountant.size, 0)
+        sub_dir = os.path.join(self.log_root, 'test_foo')
+        os.makedirs(sub_dir)
+        write_file(os.path.join(sub_dir, 'bugreport.zip'), 100)
+        log_accounting.account_path(os.path.join(sub_dir, 'bugreport.zip'))
+        with mock.patch('os.walk') as walk:
+            self.assertEqual(self.accountant.size, 100)
+            self.assertFalse(walk.called)
+
+    def test_account_directory(self):
+        self.assertEqual(self.accountant.size, 0)
+        sub_dir = os.path.join(self.log_root, 'Crashes')
+        os.makedirs(sub_dir)
+        write_file(os.path.join(sub_dir, 'tombstone_00'), 5)
+        write_file(os.path.join(sub_dir, 'tombstone_01'), 7)
+        log_accounting.account_path(sub_dir)
+        self.assertEqual(self.accountant.size, 12)
+
+    def test_paths_outside_root_are_ignored(self):
+        self.assertEqual(self.accountant.size, 0)
+        self.accountant.add_path(os.path.dirname(self.log_root))
+        self.assertEqual(self.accountant.size, 0)
+
+    def test_stale_total_picks_up_external_files(self):
+        self.assertEqual(self.accountant.size, 0)
+        write_file(os.path.join(self.log_root, 'adblog.txt'), 50)
+        self.assertEqual(self.accountant.size, 0)
+        self.accountant.reconcile_interval = 0
+        self.assertEqual(self.accountant.size, 50)
+
+    def test_exceeds_confirms_with_reconcile(self):
+        write_file(os.path.join(self.log_root, 'a'), 10)
+        self.assertFalse(self.accountant.exceeds(20))
+        # Accounted bytes of an artifact that was deleted afterwards.
+        self.accountant.add_bytes(100)
+        self.assertFalse(self.accountant.exceeds(20))
+        self.assertEqual(self.accountant.size, 10)
+        self.accountant.add_bytes(100)
+        write_file(os.path.join(self.log_root, 'b'), 100)
+        self.assertTrue(self.accountant.exceeds(20))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -14,6 +14,11 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
+import logging
+import os
+import queue
+import shutil
+import tempfile
 import unittest
 
 from acts import logger
@@ -27,6 +32,93 @@ class ActsLoggerTest(unittest.TestCase):
         actual_stamp = logger.epoch_to_log_line_timestamp(1469134262116)
         self.assertEqual("2016-07-21 13:51:02.116", actual_stamp)
 
+    def test_logline_timestamp_to_int(self):
+        self.assertEqual(20160721135102116,
+                         logger.logline_timestamp_to_int(
+                             "2016-07-21 13:51:02.116"))
+        self.assertEqual(721135102116,
+                         logger.logline_timestamp_to_int("07-21 13:51:02.116"))
+        # Unpadded milliseconds, as written by epoch_to_log_line_timestamp.
+        self.assertEqual(20160721135102016,
+                         logger.logline_timestamp_to_int(
+                             "2016-07-21 13:51:02.16"))
+
+    def test_logline_timestamp_comparator(self):
+        stamps = ["2016-07-21 13:51:02.116", "2016-07-21 13:51:02.117",
+                  "2016-07-21 13:52:01.000", "2017-01-01 00:00:00.000"]
+        for i, t1 in enumerate(stamps):
+            for j, t2 in enumerate(stamps):
+                expected = (i > j) - (i < j)
+                self.assertEqual(expected,
+                                 logger.logline_timestamp_comparator(t1, t2))
+
+    def test_async_logging_keeps_content_and_order(self):
+        log_path = tempfile.mkdtemp()
+        try:
+            logger.setup_test_logger(log_path, async_logging=True)
+            log = logging.getLogger()
+            for i in range(500):
+                log.debug("debug %s", i)
+                if i % 100 == 0:
+                    log.warning("warning %s", i)
+            logger.flush_test_logger()
+            with open(os.path.join(log_path, "test_run_details.txt")) as f:
+                lines = f.read().splitlines()
+            messages = [l.split(" ", 3)[3] for l in lines]
+            expected = []
+            for i in range(500):
+                expected.append("debug %s" % i)
+                if i % 100 == 0:
+                    expected.append("warning %s" % i)
+            self.assertEqual(messages, expected)
+            logger.kill_test_logger(log)
+            with open(os.path.join(log_path, "test_run_error.txt")) as f:
+                self.assertEqual(len(f.read().splitlines()), 5)
+        finally:
+            logger.kill_test_logger(logging.getLogger())
+            shutil.rmtree(log_path)
+
+    def test_bounded_queue_handler_drop_policies(self):
+        log_queue = queue.Queue(maxsize=1)
+        handler = logger._BoundedQueueHandler(log_queue, logger.OVERFLOW_DROP)
+        record = logging.LogRecord("test", logging.INFO, __file__, 1, "msg",
+                                   None, None)
+        handler.emit(record)
+        handler.emit(record)
+        self.assertEqual(handler.dropped, 1)
+        self.assertEqual(log_queue.qsize(), 1)
+
+        handler = logger._BoundedQueueHandler(log_queue,
+                                              logger.OVERFLOW_DROP_DEBUG)
+        debug_record = logging.LogRecord("test", logging.DEBUG, __file__, 1,
+                                         "msg", None, None)
+        handler.emit(debug_record)
+        self.assertEqual(handler.dropped, 1)
+
+    def test_dropped_records_reported_at_shutdown(self):
+        log_path = tempfile.mkdtemp()
+        try:
+            logger.setup_test_logger(
+                log_path,
+                async_logging=True,
+                overflow_policy=logger.OVERFLOW_DROP)
+            log = logging.getLogger()
+            handler = [
+                h for h in log.handlers
+                if isinstance(h, logger._BoundedQueueHandler)
+            ][0]
+            handler.dropped = 3
+            logger.kill_test_logger(log)
+            with open(os.path.join(log_path, "test_run_error.txt")) as f:
+                self.assertIn("Dropped 3 log records", f.read())
+        finally:
+            logger.kill_test_logger(logging.getLogger())
+            shutil.rmtree(log_path)
+
+    def test_bounded_queue_handler_bad_policy(self):
+        with self.assertRaises(ValueError):
+            logger._BoundedQueueHandler(queue.Queue(), "explode")
+
 
 if __name__ == "__main__":
     unittest.main()
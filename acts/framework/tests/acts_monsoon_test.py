@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import collections
+import logging
+import mock
+import numpy as np
+import os
+import random
+import shutil
+import struct
+import tempfile
+import unittest
+
+from acts.controllers import monsoon
+
+
+class FakeSerial(object):
+    """Replays raw bytes as if received on a serial port.
+
+    Attributes:
+        chunk_size: The number of bytes that arrive at a time. Bytes are read
+                    by in_waiting in chunks, by read() at once.
+    """
+
+    def __init__(self, data, chunk_size=None):
+        self.name = "fake"
+        self.chunk_size = chunk_size
+        self._data = bytearray(data)
+
+    @property
+    def in_waiting(self):
+        if self.chunk_size is None:
+            return len(self._data)
+        return min(len(self._data), self.chunk_size)
+
+    def read(self, size=1):
+        result = bytes(self._data[:size])
+        del self._data[:size]
+        return result
+
+    def write(self, data):
+        pass
+
+    def reset_input_buffer(self):
+        pass
+
+
+def encode_packet(payload):
+    """Frames a packet with its length and checksum."""
+    data_len = len(payload) + 1
+    checksum = (data_len + sum(payload)) % 256
+    return bytes([data_len]) + bytes(payload) + bytes([checksum])
+
+
+def data_packet(seq, packet_type, samples, trailing=b""):
+    payload = bytes([0x20 | (seq & 0xF), packet_type, 0, 0])
+    for sample in samples:
+        payload += struct.pack(">hhhh", *sample)
+    return encode_packet(payload + trailing)
+
+
+def record_capture(seed, num_packets):
+    """Generates the raw bytes of a data collection.
+
+    The capture starts with data received before calibration, recalibrates
+    along the way, and contains status and unknown packets, skipped sequence
+    numbers and packets with and without trailing bytes.
+    """
+    rand = random.Random(seed)
+    seq = 0
+    packets = []
+
+    def add(packet_type, samples, trailing=b""):
+        nonlocal seq
+        packets.append(data_packet(seq, packet_type, samples, trailing))
+        seq += 1
+
+    def sample():
+        return tuple(rand.randint(-32768, 32767) for _ in range(4))
+
+    add(0, [sample() for _ in range(5)], b"\x00")
+    for i in range(num_packets):
+        if i % 500 == 0:
+            add(1, [(rand.randint(-100, 100), 0, 0, 0),
+                    (rand.randint(-100, 100), 0, 0, 0)], b"\x00")
+            add(2, [(rand.randint(1000, 30000), 0, 0, 0),
+                    (rand.randint(1000, 30000), 0, 0, 0)], b"\x00")
+        elif i % 97 == 0:
+            packets.append(encode_packet(bytes([0x10] + [0] * 20)))
+        elif i % 131 == 0:
+            add(5, [sample() for _ in range(2)], b"\x00")
+        elif i % 211 == 0:
+            seq += 2
+        num_samples = rand.randint(1, 8)
+        trailing = b"\x00" * rand.choice((0, 1, 3))
+        add(0, [sample() for _ in range(num_samples)], trailing)
+    return b"".join(packets)
+
+
+def legacy_collect_data(proxy):
+    """The sample by sample decoder CollectData replaced, as a reference."""
+    while 1:
+        _bytes = proxy._ReadPacket()
+        if not _bytes:
+            raise monsoon.MonsoonError("Data collection failed")
+        if len(_bytes) < 4 + 8 + 1 or _bytes[0] < 0x20 or _bytes[0] > 0x2F:
+            continue
+        seq, _type, x, y = struct.unpack("BBBB", _bytes[:4])
+        data = [
+            struct.unpack(">hhhh", _bytes[x:x + 8])
+            for x in range(4, len(_bytes) - 8, 8)
+        ]
+        proxy._last_seq = seq
+        if _type == 0:
+            if not proxy._coarse_scale or not proxy._fine_scale:
+                continue
+            out = []
+            for main, usb, aux, voltage in data:
+                if main & 1:
+                    coarse = ((main & ~1) - proxy._coarse_zero)
+                    out.append(coarse * proxy._coarse_scale)
+                else:
+                    out.append((main - proxy._fine_zero) * proxy._fine_scale)
+            return out
+        elif _type == 1:
+            proxy._fine_zero = data[0][0]
+            proxy._coarse_zero = data[1][0]
+        elif _type == 2:
+            proxy._fine_ref = data[0][0]
+            proxy._coarse_ref = data[1][0]
+        else:
+            continue
+        if proxy._coarse_ref != proxy._coarse_zero:
+            proxy._coarse_scale = 2.88 / (
+                proxy._coarse_ref - proxy._coarse_zero)
+        if proxy._fine_ref != proxy._fine_zero:
+            proxy._fine_scale = 0.0332 / (proxy._fine_ref - proxy._fine_zero)
+
+
+def legacy_resample(batches, native_hz, sample_hz, sample_num):
+    """The list based averaging take_samples used to do, as a reference."""
+    batches = iter(batches)
+    emitted = offset = 0
+    collected = []
+    current_values = []
+    while emitted < sample_num:
+        need = int((native_hz - offset + sample_hz - 1) / sample_hz)
+        if need > len(collected):
+            samples = next(batches, None)
+            if not samples:
+                break
+            collected.extend(samples)
+        else:
+            offset += need * sample_hz
+            while offset >= native_hz:
+                current_values.append(sum(collected[:need]) / need)
+                offset -= native_hz
+                emitted += 1
+            collected = collected[need:]
+    return current_values
+
+
+def legacy_average_record(data_points, n):
+    """The deque based get_average_record, as a reference."""
+    history_deque = collections.deque()
+    averages = []
+    for d in data_points:
+        history_deque.appendleft(d)
+        if len(history_deque) > n:
+            history_deque.pop()
+        avg = sum(history_deque) / len(history_deque)
+        averages.append(round(avg, monsoon.MonsoonData.lr))
+    return averages
+
+
+def create_proxy(fake_serial):
+    with mock.patch("serial.Serial", return_value=fake_serial):
+        return monsoon.MonsoonProxy(device=fake_serial.name)
+
+
+def collect_all(collect, proxy):
+    """Collects samples until the replayed data runs out."""
+    samples = []
+    calls = 0
+    while True:
+        try:
+            samples.extend(collect(proxy))
+        except monsoon.MonsoonError:
+            return samples, calls
+        calls += 1
+
+
+class ActsMonsoonTest(unittest.TestCase):
+    """Tests for the monsoon controller."""
+
+    def setUp(self):
+        logging.disable(logging.WARNING)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        self.capture = record_capture(seed=0, num_packets=2000)
+        self.expected, self.expected_calls = collect_all(
+            legacy_collect_data, create_proxy(FakeSerial(self.capture)))
+
+    def test_collect_data_matches_legacy_decoder(self):
+        samples, calls = collect_all(monsoon.MonsoonProxy.CollectData,
+                                     create_proxy(FakeSerial(self.capture)))
+        self.assertEqual(samples, self.expected)
+        # Packets already received are decoded together.
+        self.assertLess(calls, self.expected_calls / 10)
+
+    def test_collect_data_without_numpy(self):
+        proxy = create_proxy(FakeSerial(self.capture))
+        proxy.use_numpy = False
+        samples, _ = collect_all(monsoon.MonsoonProxy.CollectData, proxy)
+        self.assertEqual(samples, self.expected)
+
+    def test_collect_data_with_partial_packets(self):
+        samples, _ = collect_all(
+            monsoon.MonsoonProxy.CollectData,
+            create_proxy(FakeSerial(self.capture, chunk_size=37)))
+        self.assertEqual(samples, self.expected)
+
+    def test_collect_data_defers_read_errors(self):
+        capture = (record_capture(seed=1, num_packets=3) +
+                   b"\x02\x20\x00")  # Invalid checksum.
+        proxy = create_proxy(FakeSerial(capture))
+        samples = proxy.CollectData()
+        self.assertTrue(samples)
+        with self.assertRaisesRegex(monsoon.MonsoonError, "checksum"):
+            proxy.CollectData()
+
+    def test_sample_accumulator(self):
+        values = np.random.RandomState(0).rand(1000)
+        accumulator = monsoon.SampleAccumulator(chunk_size=64)
+        accumulator.extend(values[:500])
+        for value in values[500:]:
+            accumulator.append(value)
+        self.assertEqual(len(accumulator), 1000)
+        self.assertFalse(accumulator.spilled)
+        np.testing.assert_array_equal(accumulator.to_array(), values)
+
+    def test_sample_accumulator_spills_to_disk(self):
+        values = np.arange(1000, dtype=np.int64)
+        accumulator = monsoon.SampleAccumulator(
+            dtype=np.int64, chunk_size=64, memory_cap=1024)
+        accumulator.extend(values[:700])
+        self.assertTrue(accumulator.spilled)
+        self.assertLessEqual(len(accumulator._chunks) * 64 * 8, 1024)
+        array = accumulator.to_array()
+        self.assertIsInstance(array, np.memmap)
+        np.testing.assert_array_equal(array, values[:700])
+        accumulator.extend(values[700:])
+        array = accumulator.to_array()
+        accumulator.close()
+        np.testing.assert_array_equal(array, values)
+
+    def take_samples(self,
+                     sample_hz,
+                     sample_num,
+                     batches,
+                     memory_cap=None,
+                     **kwargs):
+        proxy = mock.Mock()
+        proxy.GetVoltage.return_value = 4.2
+        proxy.GetStatus.return_value = {"sampleRate": 5}
+        proxy.CollectData.side_effect = batches + [[]]
+        with mock.patch.object(monsoon, "MonsoonProxy", return_value=proxy):
+            mon = monsoon.Monsoon(serial=1)
+        mon.sample_memory_cap = memory_cap
+        return mon.take_samples(sample_hz, sample_num, **kwargs)
+
+    def test_take_samples_matches_legacy_averaging(self):
+        rand = random.Random(0)
+        batches = [[rand.random() for _ in range(rand.randint(1, 300))]
+                   for _ in range(200)]
+        for sample_hz in (1, 7, 1000, 3333, 5000, 7000):
+            expected = legacy_resample(batches, 5000, sample_hz, 10**9)
+            result = self.take_samples(sample_hz, -1, batches)
+            np.testing.assert_allclose(result.data_points, expected,
+                                       rtol=1e-12)
+            self.assertEqual(len(result.timestamps), len(expected))
+
+    def test_take_samples_stops_at_sample_num(self):
+        batches = [[0.5] * 100 for _ in range(100)]
+        result = self.take_samples(1000, 150, batches)
+        self.assertEqual(len(result), 150)
+        self.assertEqual(len(batches), 100)
+
+    def test_take_samples_until(self):
+        batches = [[i / 1000] * 100 for i in range(100)]
+        seen = []
+
+        def until(values):
+            seen.append(values.copy())
+            return sum(len(v) for v in seen) >= 250
+
+        result = self.take_samples(
+            5000, 10000, batches, sample_offset=150, until=until)
+        # The offset samples are not passed to until, and sampling stops
+        # after the batch that satisfied it.
+        self.assertEqual([len(v) for v in seen], [50, 100, 100])
+        self.assertEqual(seen[0][0], 0.001)
+        self.assertEqual(len(result), 250)
+        self.assertEqual(len(result._data_points), 400)
+
+    def test_take_samples_with_memory_cap(self):
+        rand = random.Random(1)
+        batches = [[rand.random() for _ in range(250)] for _ in range(2000)]
+        expected = legacy_resample(batches, 5000, 5000, 10**9)
+        result = self.take_samples(5000, -1, batches, memory_cap=2**20)
+        self.assertIsInstance(result.data_points, np.memmap)
+        np.testing.assert_allclose(result.data_points, expected, rtol=1e-12)
+
+    def create_monsoon_data(self, num_samples=1000, offset=10):
+        rand = random.Random(2)
+        data = monsoon.MonsoonData(
+            [rand.uniform(0, 0.5) for _ in range(num_samples)],
+            [1500000000 + i // 100 for i in range(num_samples)],
+            100,
+            4.2,
+            offset=offset)
+        data.tag = "test_tag"
+        return data
+
+    def test_monsoon_data_statistics(self):
+        data = self.create_monsoon_data()
+        points = data.data_points.tolist()
+        self.assertAlmostEqual(
+            data.average_current, sum(points) * 1000 / len(points), places=5)
+        self.assertAlmostEqual(
+            data.total_charge, sum(points) / 100 * 1000 / 3600, places=5)
+        self.assertEqual(len(data), 990)
+
+    def test_get_average_record_matches_legacy(self):
+        rand = random.Random(3)
+        data = monsoon.MonsoonData(
+            [rand.uniform(0, 2) for _ in range(5000)], [0] * 5000, 500, 4.2)
+        for n in (1, 2, 7, 100, 4999, 10000):
+            np.testing.assert_allclose(
+                data.get_average_record(n),
+                legacy_average_record(data.data_points.tolist(), n),
+                atol=2e-8)
+
+    def test_rolling_averager_across_batches(self):
+        values = np.random.RandomState(4).rand(1000)
+        averager = monsoon.RollingAverager(50)
+        averages = np.concatenate(
+            [averager.feed(values[i:i + 37]) for i in range(0, 1000, 37)])
+        np.testing.assert_allclose(
+            averages, legacy_average_record(values.tolist(), 50), atol=2e-8)
+
+    def test_monsoon_data_slicing(self):
+        data = self.create_monsoon_data()
+        part = data[100:200]
+        self.assertEqual(len(part), 100)
+        self.assertEqual(part.tag, "test_tag")
+        np.testing.assert_array_equal(part.data_points,
+                                      data.data_points[100:200])
+        self.assertAlmostEqual(
+            part.average_current,
+            sum(data.data_points[100:200].tolist()) * 1000 / 100,
+            places=5)
+
+    def test_monsoon_data_text_file(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, "data.txt")
+        data = self.create_monsoon_data()
+        monsoon.MonsoonData.save_to_text_file([data, data], path)
+        loaded = monsoon.MonsoonData.from_text_file(path)
+        self.assertEqual(len(loaded), 2)
+        self.assertEqual(str(loaded[0]).split("\n")[6:],
+                         str(data).split("\n")[6:])
+        np.testing.assert_allclose(loaded[0].data_points, data.data_points,
+                                   atol=1e-6)
+
+    def test_monsoon_data_binary_file(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, "data.bin")
+        data = self.create_monsoon_data()
+        other = self.create_monsoon_data(num_samples=7, offset=0)
+        other._timestamps = other._timestamps + 0.5
+        other.update_offset(0)
+        monsoon.MonsoonData.save_to_binary_file([data, other], path)
+        for mmap in (True, False):
+            loaded = monsoon.MonsoonData.from_binary_file(path, mmap=mmap)
+            self.assertEqual(len(loaded), 2)
+            for original, copy in zip((data, other), loaded):
+                self.assertEqual(copy.tag, original.tag)
+                self.assertEqual(copy.hz, original.hz)
+                self.assertEqual(copy.voltage, original.voltage)
+                self.assertEqual(copy.offset, original.offset)
+                np.testing.assert_allclose(
+                    copy.data_points, original.data_points, rtol=1e-7)
+                np.testing.assert_array_equal(copy.timestamps,
+                                              original.timestamps)
+                self.assertAlmostEqual(copy.average_current,
+                                       original.average_current, places=4)
+            # The text format of a loaded record is still available.
+            text = monsoon.MonsoonData.from_string(str(loaded[0]))
+            np.testing.assert_allclose(
+                text.data_points, data.data_points, atol=1.1e-6)
+        self.assertIsInstance(
+            monsoon.MonsoonData.from_binary_file(path)[0].data_points,
+            np.memmap)
+
+    def test_monsoon_data_binary_file_rejects_other_files(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, "data.txt")
+        monsoon.MonsoonData.save_to_text_file([self.create_monsoon_data()],
+                                              path)
+        with self.assertRaisesRegex(monsoon.MonsoonError, "not a binary"):
+            monsoon.MonsoonData.from_binary_file(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
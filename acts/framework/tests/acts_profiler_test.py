@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from concurrent import futures
+
+from acts import profiler
+
+
+class ActsProfilerTest(unittest.TestCase):
+    """Tests for acts.profiler."""
+
+    def setUp(self):
+        self.profiler = profiler.Profiler()
+        self.profiler.start()
+        self.addCleanup(self.profiler.stop)
+
+    def test_span_without_profiler(self):
+        self.profiler.stop()
+        with profiler.span("ignored") as span:
+            self.assertIsNone(span)
+
+    def test_span_outside_of_tree(self):
+        with profiler.span("ignored") as span:
+            self.assertIsNone(span)
+        self.assertEqual(self.profiler.to_dict(), {})
+
+    def test_spans_are_merged_by_name(self):
+        root = self.profiler.begin_tree("test_a")
+        for _ in range(3):
+            with profiler.span("setup_test"):
+                with profiler.span("adb shell"):
+                    pass
+        self.profiler.end_tree(root)
+        tree = self.profiler.to_dict()["test_a"][0]
+        self.assertEqual(tree["count"], 1)
+        setup = tree["children"][0]
+        self.assertEqual((setup["name"], setup["count"]), ("setup_test", 3))
+        self.assertEqual(setup["children"][0]["count"], 3)
+
+    def test_nested_trees(self):
+        outer = self.profiler.begin_tree("test_trigger")
+        inner = self.profiler.begin_tree("test_generated")
+        with profiler.span("test"):
+            pass
+        self.profiler.end_tree(inner)
+        with profiler.span("after"):
+            pass
+        self.profiler.end_tree(outer, keep=False)
+        self.assertEqual(list(self.profiler.trees), ["test_generated"])
+        self.assertEqual(outer.children[0].name, "after")
+
+    def test_spans_of_other_threads(self):
+        root = self.profiler.begin_tree("test_a")
+        with profiler.span("take_bug_report"):
+            worker = threading.Thread(target=self._worker)
+            worker.start()
+            worker.join()
+        self.profiler.end_tree(root)
+        tree = self.profiler.to_dict()["test_a"][0]
+        node = tree["children"][0]["children"][0]
+        self.assertEqual(node["name"], "adb bugreport")
+        self.assertEqual(node["children"][0]["name"],
+                         profiler.SLEEP_SPAN_NAME)
+
+    def _worker(self):
+        # Idle sleeps of background threads are not recorded.
+        profiler.time.sleep(0)
+        with profiler.span("adb bugreport"):
+            profiler.time.sleep(0)
+
+    def test_spans_of_threads_not_started_by_test(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def background():
+            started.set()
+            release.wait()
+            with profiler.span("adb bugreport"):
+                pass
+
+        worker = threading.Thread(target=background)
+        worker.start()
+        started.wait()
+        root = self.profiler.begin_tree("test_b")
+        with profiler.span("test"):
+            release.set()
+            worker.join()
+        self.profiler.end_tree(root)
+        trees = self.profiler.to_dict()
+        self.assertNotIn("children", trees["test_b"][0]["children"][0])
+        background = trees[profiler.BACKGROUND_TREE_NAME]
+        self.assertEqual(len(background), 1)
+        self.assertEqual(background[0]["children"][0]["name"],
+                         "adb bugreport")
+
+    def test_propagate(self):
+        executor = futures.ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        release = threading.Event()
+
+        def task(name):
+            release.wait()
+            with profiler.span(name):
+                pass
+
+        root_a = self.profiler.begin_tree("test_a")
+        with profiler.span("on_fail"):
+            # The worker thread of the executor is started from test_a.
+            queued = executor.submit(profiler.propagate(task), "bugreport a")
+        self.profiler.end_tree(root_a)
+        root_b = self.profiler.begin_tree("test_b")
+        with profiler.span("on_fail"):
+            later = executor.submit(profiler.propagate(task), "bugreport b")
+        release.set()
+        queued.result()
+        later.result()
+        self.profiler.end_tree(root_b)
+        executor.submit(profiler.propagate(task), "bugreport c").result()
+
+        trees = self.profiler.to_dict()
+        for name in ("a", "b"):
+            on_fail = trees["test_%s" % name][0]["children"][0]
+            self.assertEqual([c["name"] for c in on_fail["children"]],
+                             ["bugreport %s" % name])
+        background = trees[profiler.BACKGROUND_TREE_NAME][0]
+        self.assertEqual(background["children"][0]["name"], "bugreport c")
+
+    def test_write_collapsed(self):
+        root = self.profiler.begin_tree("test_a")
+        with profiler.span("sleep;1"):
+            profiler.time.sleep(0.002)
+        self.profiler.end_tree(root)
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, "profile.collapsed")
+        self.profiler.write_collapsed(path, prefix=("MockTest", ))
+        with open(path) as f:
+            lines = dict(line.split() for line in f)
+        self.assertGreaterEqual(int(lines["MockTest;test_a;sleep:1;sleep"]),
+                                2000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -14,8 +14,13 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
+import json
+import os
+import shutil
+import tempfile
 import unittest
 
+from acts import logger
 from acts import records
 from acts import signals
 
@@ -180,6 +185,41 @@ class ActsRecordsTest(unittest.TestCase):
         self.assertTrue(tr2.passed, [tr1, tr2])
         self.assertTrue(tr2.controller_info, {"MockDevice": ["magicC"]})
 
+    def test_result_iadd_operator_in_place(self):
+        record1 = records.TestResultRecord(self.tn)
+        record1.test_begin()
+        record1.test_pass()
+        record2 = records.TestResultRecord(self.tn)
+        record2.test_begin()
+        record2.test_fail()
+        tr1 = records.TestResult()
+        tr1.add_record(record1)
+        tr1.set_extra_data("a", 1)
+        tr2 = records.TestResult()
+        tr2.add_record(record2)
+        tr2.set_extra_data("b", 2)
+        passed = tr1.passed
+        tr = tr1
+        tr += tr2
+        self.assertIs(tr, tr1)
+        self.assertIs(tr.passed, passed)
+        self.assertEqual(tr.executed, [record1, record2])
+        self.assertEqual(tr.failed, [record2])
+        self.assertEqual(tr.extras, {"a": 1, "b": 2})
+        self.assertEqual(tr.summary_dict()["Executed"], 2)
+
+    def test_result_record_is_compact(self):
+        record = records.TestResultRecord(self.tn, "".join(["Some", "Test"]))
+        self.assertFalse(hasattr(record, "__dict__"))
+        self.assertIs(record.test_class, "SomeTest")
+        self.assertIsNone(record.log_begin_time)
+        record.test_begin()
+        self.assertEqual(record.log_begin_time,
+                         logger.epoch_to_log_line_timestamp(record.begin_time))
+        self.assertEqual(record.additional_errors, {})
+        record.add_error("teardown_test", Exception("oops"))
+        self.assertEqual(record.additional_errors, {"teardown_test": "oops"})
+
     def test_result_add_operator_type_mismatch(self):
         record1 = records.TestResultRecord(self.tn)
         record1.test_begin()
@@ -220,6 +260,97 @@ class ActsRecordsTest(unittest.TestCase):
         tr.add_record(record2)
         self.assertFalse(tr.is_all_pass)
 
+    def _make_streamed_result(self, stream_path):
+        tr = records.TestResult()
+        tr.stream_writer = records.TestResultStreamWriter(
+            stream_path, fsync_batch_size=2)
+        tr.requested = ["a", "b", "c", "d", "e"]
+        tr.add_controller_info("MockDevice", ["magicA"])
+        tr.set_extra_data("Extra", {"nested": [1, 2]})
+        signal_results = [
+            (signals.TestPass, "test_pass"),
+            (signals.TestFailure, "test_fail"),
+            (signals.TestSkip, "test_skip"),
+            (signals.TestBlocked, "test_blocked"),
+            (signals.TestFailure, "test_unknown"),
+        ]
+        for signal, end_func in signal_results:
+            record = records.TestResultRecord(self.tn)
+            record.test_begin()
+            getattr(record, end_func)(signal(self.details, self.json_extra))
+            tr.add_record(record)
+        return tr
+
+    def test_result_stream_matches_json_str(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            stream_path = os.path.join(tmp_dir, "records.jsonl")
+            summary_path = os.path.join(tmp_dir, "summary.json")
+            tr = self._make_streamed_result(stream_path)
+            streamed = list(records.iter_streamed_records(stream_path))
+            self.assertEqual(len(streamed), 5)
+            records.write_summary_from_stream(stream_path, summary_path, tr)
+            with open(summary_path, 'r') as f:
+                self.assertEqual(f.read(), tr.json_str())
+            tr.stream_writer.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_result_stream_empty(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            stream_path = os.path.join(tmp_dir, "records.jsonl")
+            summary_path = os.path.join(tmp_dir, "summary.json")
+            tr = records.TestResult()
+            tr.stream_writer = records.TestResultStreamWriter(stream_path)
+            records.write_summary_from_stream(stream_path, summary_path, tr)
+            with open(summary_path, 'r') as f:
+                self.assertEqual(f.read(), tr.json_str())
+            tr.stream_writer.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_result_stream_skips_truncated_line(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            stream_path = os.path.join(tmp_dir, "records.jsonl")
+            tr = self._make_streamed_result(stream_path)
+            tr.stream_writer.close()
+            with open(stream_path, 'a') as f:
+                f.write('{"Test Name": "test_cut')
+            streamed = list(records.iter_streamed_records(stream_path))
+            self.assertEqual(len(streamed), 5)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_result_stream_summary_of_crashed_reordered_run(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            stream_path = os.path.join(tmp_dir, "records.jsonl")
+            summary_path = os.path.join(tmp_dir, "summary.json")
+            tr = self._make_streamed_result(stream_path)
+            # Line 5 of the reordered records was lost in a crash.
+            records.write_summary_from_stream(
+                stream_path, summary_path, tr, canonical_orders=[[5, 4, 1]])
+            with open(summary_path, 'r') as f:
+                summary = json.load(f)
+            self.assertEqual(
+                [r["Result"] for r in summary["Results"]],
+                ["PASS", "UNKNOWN", "FAIL"])
+            self.assertEqual(summary["Summary"]["Executed"], 3)
+            tr.stream_writer.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_result_record_from_dict(self):
+        record = records.TestResultRecord(self.tn, "SomeTest")
+        record.test_begin()
+        s = signals.TestFailure(self.details, self.json_extra)
+        record.test_fail(s)
+        record.add_error("teardown_test", Exception("boom"))
+        copy = records.TestResultRecord.from_dict(record.to_dict())
+        self.assertEqual(copy.to_dict(), record.to_dict())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import functools
+import json
+import mock
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from acts import records
+from acts import sharding
+from acts import signals
+
+SAMPLE_TEST_MODULE = """
+from acts import base_test
+
+
+class ShardSampleTest(base_test.BaseTestClass):
+    def test_a(self):
+        pass
+
+    def test_b(self):
+        pass
+
+    def test_c(self):
+        pass
+"""
+
+
+PASS = records.TestResultEnums.TEST_RESULT_PASS
+BLOCKED = records.TestResultEnums.TEST_RESULT_BLOCKED
+
+
+def _make_records(unit, result):
+    record = records.TestResultRecord(
+        unit.test_cases[0] if unit.test_cases else "*all*", unit.test_class)
+    record.test_begin()
+    if result == BLOCKED:
+        record.test_blocked(signals.TestBlocked("Failed class setup"))
+    else:
+        record.test_pass()
+    return [record.to_dict()]
+
+
+def _abort_or_exit_worker(running, worker_id, parsed_config, preflight,
+                          postflight, unit_queue, result_queue):
+    """A testbed process whose first unit aborts the run on testbed 0, and
+    which exits while running its first unit on testbed 1."""
+    result_queue.put((sharding._MSG_READY, worker_id, None))
+    unit = unit_queue.get()
+    if worker_id == 1:
+        running.set()
+        time.sleep(0.5)
+        os._exit(3)
+    running.wait(10)
+    result_queue.put((sharding._MSG_RESULT, worker_id,
+                      sharding.UnitResult(
+                          "tb0",
+                          unit.index,
+                          records=_make_records(unit, PASS),
+                          aborted=True)))
+    unit_queue.get()
+
+
+class ActsShardingTest(unittest.TestCase):
+    """Tests for acts.sharding."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_split_test_identifiers(self):
+        identifiers = [("PreflightTest", None), ("FooTest", ["test_a",
+                                                              "test_b"]),
+                       ("BarTest", None), ("PostflightTest", None)]
+        preflight, units, postflight = sharding.split_test_identifiers(
+            identifiers, repeat=2)
+        self.assertEqual(preflight, [("PreflightTest", None)])
+        self.assertEqual(postflight, [("PostflightTest", None)])
+        self.assertEqual([str(u) for u in units], [
+            "FooTest:test_a", "FooTest:test_b", "BarTest", "FooTest:test_a",
+            "FooTest:test_b", "BarTest"
+        ])
+        self.assertEqual([u.index for u in units], list(range(6)))
+
+    def test_idle_testbeds_pull_units(self):
+        _, units, _ = sharding.split_test_identifiers(
+            [("FooTest", ["test_a", "test_b", "test_c"])])
+        scheduler = sharding.ShardScheduler(units, ["tb1", "tb2"])
+        first = scheduler.next_unit("tb1")
+        second = scheduler.next_unit("tb2")
+        scheduler.report(
+            sharding.UnitResult("tb2", second.index,
+                                _make_records(second, PASS), 1))
+        # tb2 is idle again while tb1 is still busy, so it takes the next one.
+        third = scheduler.next_unit("tb2")
+        self.assertEqual(third.index, 2)
+        scheduler.report(
+            sharding.UnitResult("tb2", third.index,
+                                _make_records(third, PASS), 1))
+        scheduler.report(
+            sharding.UnitResult("tb1", first.index,
+                                _make_records(first, PASS), 3))
+        self.assertTrue(scheduler.is_done)
+        merged = scheduler.get_merged_result()
+        self.assertEqual([r.test_name for r in merged.executed],
+                         ["test_a", "test_b", "test_c"])
+        utilization = scheduler.utilization_dict()
+        self.assertEqual(utilization["tb1"]["Units"], 1)
+        self.assertEqual(utilization["tb2"]["Units"], 2)
+        self.assertEqual(utilization["tb2"]["Busy Time"], 2)
+
+    def test_broken_unit_retried_on_other_testbed(self):
+        _, units, _ = sharding.split_test_identifiers([("FooTest", None)])
+        scheduler = sharding.ShardScheduler(
+            units, ["tb1", "tb2"], max_consecutive_failures=1)
+        unit = scheduler.next_unit("tb1")
+        retried = scheduler.report(
+            sharding.UnitResult("tb1", unit.index,
+                                _make_records(unit, BLOCKED), broken=True))
+        self.assertTrue(retried)
+        self.assertTrue(scheduler.testbeds["tb1"].retired)
+        self.assertIsNone(scheduler.next_unit("tb1"))
+        unit = scheduler.next_unit("tb2")
+        self.assertEqual(unit.attempts, 2)
+        scheduler.report(
+            sharding.UnitResult("tb2", unit.index, _make_records(unit, PASS)))
+        merged = scheduler.get_merged_result()
+        self.assertTrue(merged.is_all_pass)
+        self.assertEqual(scheduler.retry_dict(), {"FooTest": ["tb1"]})
+
+    def test_abandon_pending_without_healthy_testbed(self):
+        _, units, _ = sharding.split_test_identifiers(
+            [("FooTest", ["test_a", "test_b"])])
+        scheduler = sharding.ShardScheduler(
+            units, ["tb1", "tb2"], max_consecutive_failures=1)
+        unit = scheduler.next_unit("tb1")
+        scheduler.report(
+            sharding.UnitResult("tb1", unit.index,
+                                _make_records(unit, BLOCKED), broken=True))
+        scheduler.retire("tb2")
+        self.assertIsNone(scheduler.next_unit("tb2"))
+        scheduler.abandon_pending("No healthy testbed left to run the test.")
+        merged = scheduler.get_merged_result()
+        self.assertEqual([r.test_name for r in merged.blocked],
+                         ["test_a", "test_b"])
+
+    def test_execute_unit_marks_setup_failure_as_broken(self):
+        _, units, _ = sharding.split_test_identifiers([("FooTest", None)])
+        runner = mock.Mock()
+        runner.testbed_name = "tb1"
+        runner.results = records.TestResult()
+
+        def run():
+            record = records.TestResultRecord("test_a", "FooTest")
+            record.test_begin()
+            record.test_blocked(signals.TestBlocked("Failed class setup"))
+            runner.results.add_record(record)
+
+        runner.run.side_effect = run
+        result = sharding.execute_unit(runner, units[0])
+        self.assertTrue(result.broken)
+        self.assertEqual(runner.run_list, [("FooTest", None)])
+        self.assertEqual(len(result.records), 1)
+
+    def test_run_sharded(self):
+        test_path = os.path.join(self.tmp_dir, "tests")
+        os.mkdir(test_path)
+        with open(os.path.join(test_path, "ShardSampleTest.py"), "w") as f:
+            f.write(SAMPLE_TEST_MODULE)
+        configs = []
+        for name in ("tb1", "tb2"):
+            configs.append({
+                "testbed": {
+                    "name": name
+                },
+                "logpath": self.tmp_dir,
+                "testpaths": [test_path],
+                "cli_args": None,
+            })
+        with mock.patch.object(sharding, "POLL_INTERVAL", 1):
+            merged = sharding.run_sharded(
+                configs, [("ShardSampleTest", ["test_a", "test_b",
+                                                "test_c"])])
+        self.assertEqual([r.test_name for r in merged.passed],
+                         ["test_a", "test_b", "test_c"])
+        with open(os.path.join(self.tmp_dir,
+                               sharding.SUMMARY_FILE_NAME)) as f:
+            summary = json.load(f)
+        self.assertEqual(summary["Summary"]["Passed"], 3)
+        utilization = summary["Extras"]["Sharding"]["Utilization"]
+        self.assertEqual(
+            sum(u["Units"] for u in utilization.values()), 3)
+
+    def test_testbed_exits_after_abort(self):
+        configs = [{
+            "testbed": {
+                "name": name
+            },
+            "logpath": self.tmp_dir
+        } for name in ("tb0", "tb1")]
+        with mock.patch.object(sharding, "POLL_INTERVAL", 0.1), \
+                mock.patch.object(sharding, "_shard_worker",
+                                  functools.partial(_abort_or_exit_worker,
+                                                    multiprocessing.Event())):
+            merged = sharding.run_sharded(
+                configs, [("ShardSampleTest", ["test_a", "test_b",
+                                                "test_c"])])
+        self.assertEqual(len(merged.passed), 1)
+        self.assertEqual(len(merged.unknown), 1)
+        self.assertEqual(merged.unknown[0].details,
+                         "Testbed process exited with code 3.")
+        self.assertEqual([r.test_name for r in merged.blocked], ["test_c"])
+
+
+if __name__ == "__main__":
+    unittest.main()
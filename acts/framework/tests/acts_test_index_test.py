@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from acts import logger
+from acts import test_index
+from acts import test_runner
+
+LIGHT_TEST_SCRIPT = """
+from acts import base_test
+
+
+class LightIndexTest(base_test.BaseTestClass):
+    def test_one(self):
+        pass
+
+    def helper(self):
+        pass
+
+    def test_two(self):
+        pass
+
+
+class NotATestClass(object):
+    def test_ignored(self):
+        pass
+"""
+
+HEAVY_TEST_SCRIPT = """
+import acts_test_index_missing_module
+
+from acts import base_test
+
+
+class HeavyIndexTest(base_test.BaseTestClass):
+    def test_heavy(self):
+        pass
+"""
+
+
+class ActsTestIndexTest(unittest.TestCase):
+    """Tests for acts.test_index and lazy test discovery in TestRunner."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.test_path = os.path.join(self.tmp_dir, "tests")
+        os.mkdir(self.test_path)
+        self.index_path = os.path.join(self.tmp_dir, "index.json")
+        self.light_path = self._write("LightIndexTest.py", LIGHT_TEST_SCRIPT)
+        self._write("HeavyIndexTest.py", HEAVY_TEST_SCRIPT)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        for name in ("LightIndexTest", "HeavyIndexTest"):
+            sys.modules.pop(name, None)
+
+    def _write(self, name, content):
+        path = os.path.join(self.test_path, name)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def test_parse_test_classes(self):
+        self.assertEqual(
+            test_index.parse_test_classes(self.light_path),
+            {"LightIndexTest": ["test_one", "test_two"]})
+
+    def test_scan_uses_cache(self):
+        scripts = test_index.TestIndex(self.index_path).scan([self.test_path])
+        self.assertEqual(
+            sorted(s.module_name for s in scripts),
+            ["HeavyIndexTest", "LightIndexTest"])
+        index = test_index.TestIndex(self.index_path)
+        index.scan([self.test_path])
+        self.assertEqual((index.hits, index.misses), (2, 0))
+
+    def test_scan_rehashes_touched_files(self):
+        test_index.TestIndex(self.index_path).scan([self.test_path])
+        stat = os.stat(self.light_path)
+        os.utime(self.light_path, (stat.st_atime, stat.st_mtime + 10))
+        index = test_index.TestIndex(self.index_path)
+        index.scan([self.test_path])
+        self.assertEqual((index.hits, index.misses), (2, 0))
+        self._write("LightIndexTest.py",
+                    LIGHT_TEST_SCRIPT.replace("test_two", "test_three"))
+        os.utime(self.light_path, (stat.st_atime, stat.st_mtime + 20))
+        index = test_index.TestIndex(self.index_path)
+        scripts = index.scan([self.test_path])
+        self.assertEqual((index.hits, index.misses), (1, 1))
+        light = [s for s in scripts if s.module_name == "LightIndexTest"][0]
+        self.assertEqual(light.classes,
+                         {"LightIndexTest": ["test_one", "test_three"]})
+
+    def test_scan_ignores_corrupt_index(self):
+        with open(self.index_path, "w") as f:
+            f.write("{not json")
+        index = test_index.TestIndex(self.index_path)
+        index.scan([self.test_path])
+        self.assertEqual(index.misses, 2)
+
+    def test_lazy_import_skips_unrequested_scripts(self):
+        config = {
+            "testbed": {
+                "name": "IndexTestBed"
+            },
+            "logpath": self.tmp_dir,
+            "testpaths": [self.test_path],
+            "cli_args": None,
+            "test_index_path": self.index_path,
+        }
+        runner = test_runner.TestRunner(config, [("LightIndexTest", None)])
+        test_classes = runner.import_test_modules([self.test_path])
+        self.assertIn("LightIndexTest", test_classes)
+        self.assertNotIn("HeavyIndexTest", sys.modules)
+        runner.result_stream.close()
+        logger.kill_test_logger(runner.log)
+
+    def test_index_defaults_to_log_path(self):
+        config = {
+            "testbed": {
+                "name": "IndexTestBed"
+            },
+            "logpath": self.tmp_dir,
+            "testpaths": [self.test_path],
+            "cli_args": None,
+        }
+        runner = test_runner.TestRunner(config, [("LightIndexTest", None)])
+        runner.import_test_modules([self.test_path])
+        index = test_index.TestIndex(
+            os.path.join(self.tmp_dir, test_index.INDEX_FILE_NAME))
+        index.scan([self.test_path])
+        self.assertEqual((index.hits, index.misses), (2, 0))
+        runner.result_stream.close()
+        logger.kill_test_logger(runner.log)
+
+
+if __name__ == "__main__":
+    unittest.main()
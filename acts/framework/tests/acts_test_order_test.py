@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from acts import records
+from acts import test_order
+
+
+class ActsTestOrderTest(unittest.TestCase):
+    """Tests for acts.test_order."""
+
+    def test_order_groups_by_leading_keys(self):
+        keys = [("ap1", "path1"), ("ap2", "path1"), ("ap1", "path2"),
+                ("ap1", "path1"), None, ("ap2", "path2")]
+        self.assertEqual(test_order.order_by_setup_keys(keys),
+                         [4, 0, 3, 2, 1, 5])
+
+    def test_order_keeps_grouped_list(self):
+        keys = [("ap1", ), ("ap1", ), ("ap2", ), ("ap3", )]
+        self.assertEqual(test_order.order_by_setup_keys(keys), [0, 1, 2, 3])
+
+    def test_total_setup_cost(self):
+        keys = [("ap1", "path1"), ("ap2", "path1"), ("ap1", "path2")]
+        self.assertEqual(
+            test_order.total_setup_cost(keys, [0, 1, 2], (60, 5)), 125)
+        self.assertEqual(
+            test_order.total_setup_cost(keys, [0, 2, 1], (60, 5)), 70)
+        # Levels without a cost count as DEFAULT_KEY_COST.
+        self.assertEqual(test_order.total_setup_cost(keys, [0, 2, 1]), 3)
+
+    def test_canonical_order_buffer(self):
+        streamed = []
+
+        class Writer(object):
+            def write_record(self, record):
+                streamed.append(record.test_name)
+
+        result = records.TestResult()
+        result.stream_writer = Writer()
+        with test_order.CanonicalOrderBuffer(result) as order_buffer:
+            for index, name in [(1, "test_b"), (0, "test_a"), (2, "test_c")]:
+                order_buffer.current_index = index
+                record = records.TestResultRecord(name)
+                record.test_pass()
+                result.add_record(record)
+                # Records are streamed as soon as they are added.
+                self.assertEqual(streamed[-1], name)
+        self.assertEqual([r.test_name for r in result.passed],
+                         ["test_a", "test_b", "test_c"])
+        self.assertEqual(streamed, ["test_b", "test_a", "test_c"])
+        self.assertIs(result.stream_writer.__class__, Writer)
+
+
+    def test_summary_of_nested_buffers(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            stream_path = os.path.join(tmp_dir, "records.jsonl")
+            summary_path = os.path.join(tmp_dir, "summary.json")
+            result = records.TestResult()
+            result.stream_writer = records.TestResultStreamWriter(stream_path)
+
+            def add(name):
+                record = records.TestResultRecord(name)
+                record.test_pass()
+                result.add_record(record)
+
+            add("test_first")
+            with test_order.CanonicalOrderBuffer(result) as outer:
+                outer.current_index = 1
+                add("test_b")
+                outer.current_index = 0
+                # Generated tests, reordered too.
+                with test_order.CanonicalOrderBuffer(result) as inner:
+                    for index, name in [(1, "test_a2"), (0, "test_a1")]:
+                        inner.current_index = index
+                        add(name)
+
+            canonical = ["test_first", "test_a1", "test_a2", "test_b"]
+            self.assertEqual([r.test_name for r in result.executed],
+                             canonical)
+            streamed = [
+                r["Test Name"]
+                for r in records.iter_streamed_records(stream_path)
+            ]
+            self.assertEqual(streamed,
+                             ["test_first", "test_b", "test_a2", "test_a1"])
+            records.write_summary_from_stream(
+                stream_path, summary_path, result,
+                result.stream_writer.canonical_orders)
+            with open(summary_path, "r") as f:
+                summary = f.read()
+            self.assertEqual(summary, result.json_str())
+            self.assertEqual(
+                [r["Test Name"] for r in json.loads(summary)["Results"]],
+                canonical)
+            result.stream_writer.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import mock
+import unittest
+
+from acts import tracelogger
+
+
+class ActsTraceLoggerTest(unittest.TestCase):
+    """Verifies code in acts.tracelogger module."""
+
+    def tearDown(self):
+        tracelogger.TraceLogger.use_inspect = False
+
+    def _log_from_helper(self, log):
+        log.info("info message")
+        log.debug("debug message")
+
+    def _get_messages(self, use_inspect):
+        tracelogger.TraceLogger.use_inspect = use_inspect
+        mock_logger = mock.MagicMock()
+        self._log_from_helper(tracelogger.TraceLogger(mock_logger))
+        return (mock_logger.info.call_args[0][0],
+                mock_logger.debug.call_args[0][0])
+
+    def test_caller_attribution(self):
+        info, debug = self._get_messages(use_inspect=False)
+        self.assertRegex(info, r"^info message "
+                         r"\[acts_tracelogger_test.py:_log_from_helper:\d+\]$")
+        self.assertRegex(debug, r"^debug message "
+                         r"\[acts_tracelogger_test.py:_log_from_helper:\d+\]"
+                         r"\[acts_tracelogger_test.py:_get_messages:\d+\]"
+                         r"\[acts_tracelogger_test.py:test_caller_attribution:"
+                         r"\d+\]$")
+
+    def test_inspect_mode_has_same_output(self):
+        messages = [self._get_messages(use_inspect=u) for u in (False, True)]
+        self.assertEqual(messages[0], messages[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
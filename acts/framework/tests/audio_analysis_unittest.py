@@ -23,6 +23,80 @@ import acts.test_utils.audio_analysis_lib.audio_analysis as audio_analysis
 import acts.test_utils.audio_analysis_lib.audio_data as audio_data
 
 
+def legacy_peak_detection(array, window_size):
+    """The loop peak_detection used to be, as a reference.
+
+    It raises or returns fractional indices for some odd window sizes.
+    """
+    half_window_size = window_size / 2
+    length = len(array)
+
+    def mid_is_peak(array, mid, left, right):
+        value_mid = array[int(mid)]
+        is_peak = True
+        next_peak_candidate_index = None
+        for index in range(int(left), int(mid)):
+            if array[index] >= value_mid:
+                is_peak = False
+                break
+        if mid == right:
+            return is_peak, right + 1
+        for index in range(int(right), int(mid), -1):
+            if (next_peak_candidate_index is None or
+                    array[index] > array[next_peak_candidate_index]):
+                next_peak_candidate_index = index
+        if array[next_peak_candidate_index] >= value_mid:
+            is_peak = False
+        if is_peak:
+            next_peak_candidate_index = right + 1
+        return is_peak, next_peak_candidate_index
+
+    results = []
+    mid = 0
+    while mid < length:
+        left = max(0, mid - half_window_size)
+        right = min(length - 1, mid + half_window_size)
+        if array[int(mid)] == 0:
+            mid = mid + 1
+            continue
+        is_peak, next_candidate_idx = mid_is_peak(array, mid, left, right)
+        if is_peak:
+            results.append((mid, array[int(mid)]))
+        mid = next_candidate_idx
+    return sorted(results, key=lambda x: x[1], reverse=True)
+
+
+def multi_tone_spectrum(rate,
+                        length_in_secs,
+                        tones,
+                        noise=0.005,
+                        min_peak_ratio=audio_analysis.DEFAULT_MIN_PEAK_RATIO):
+    """Gets the thresholded spectrum spectral_analysis detects peaks in.
+
+    Args:
+        rate: The sampling rate.
+        length_in_secs: The length of the signal.
+        tones: A list of (frequency, amplitude) tuples.
+        noise: The amplitude of the gaussian noise.
+        min_peak_ratio: The threshold of the spectrum, relative to its
+                        maximum.
+
+    Returns:
+        The spectrum, and the peak window size of spectral_analysis.
+    """
+    num_samples = int(length_in_secs * rate)
+    x = numpy.arange(num_samples) / rate
+    y = numpy.random.standard_normal(num_samples) * noise
+    for freq, coeff in tones:
+        y += coeff * numpy.sin(freq * 2.0 * numpy.pi * x)
+    y *= numpy.hanning(num_samples)
+    spectrum = numpy.abs(2.0 / num_samples * numpy.fft.rfft(y))
+    spectrum[spectrum < spectrum.max() * min_peak_ratio] = 0
+    window_size = int(audio_analysis.PEAK_WINDOW_SIZE_HZ /
+                      (rate / float(num_samples)))
+    return spectrum, window_size
+
+
 class SpectralAnalysisTest(unittest.TestCase):
     def setUp(self):
         """Uses the same seed to generate noise for each test."""
@@ -99,6 +173,42 @@ class SpectralAnalysisTest(unittest.TestCase):
         logging.debug('Compare the result')
         self.assertEqual(dummy_answer, improved_answer)
 
+    def testPeakDetectionMatchesLegacy(self):
+        """Checks peaks of arrays with ties and zeros, for even windows."""
+        for window_size in range(0, 14, 2):
+            for _ in range(200):
+                array = list(
+                    numpy.random.randint(0, 6, numpy.random.randint(1, 60)))
+                self.assertEqual(
+                    audio_analysis.peak_detection(array, window_size),
+                    legacy_peak_detection(array, window_size))
+
+    def testPeakDetectionOddWindow(self):
+        array = numpy.random.uniform(0, 1, 10000)
+        for window_size in (1, 3, 15, 101):
+            self.assertEqual(
+                audio_analysis.peak_detection(array, window_size),
+                self.dummy_peak_detection(array, window_size))
+
+    def testPeakDetectionMultiTone(self):
+        tones = [(60, 0.3), (490, 1), (1000, 0.5), (1003, 0.45),
+                 (5000, 0.02), (15000, 0.2)]
+        # Even and odd window sizes.
+        for length_in_secs in (0.5, 2, 2.45):
+            spectrum, window_size = multi_tone_spectrum(
+                48000, length_in_secs, tones)
+            result = audio_analysis.peak_detection(spectrum, window_size)
+            if window_size % 2 == 0:
+                self.assertEqual(result,
+                                 legacy_peak_detection(spectrum, window_size))
+            self.assertEqual(result,
+                             self.dummy_peak_detection(spectrum, window_size))
+            frequencies = [
+                round(index * 48000 / (length_in_secs * 48000))
+                for index, _ in result[:4]
+            ]
+            self.assertEqual(frequencies[:2], [490, 1000])
+
     def testSpectralAnalysis(self):
         rate = 48000
         length_in_secs = 0.5
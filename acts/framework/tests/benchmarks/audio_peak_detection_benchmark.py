@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Measures the peak detection of audio_analysis.spectral_analysis.
+
+A multi-tone recording is synthesized for each channel, and the peaks of its
+thresholded spectrum are detected once with the loop peak_detection used to
+be, including the per coefficient thresholding loop spectral_analysis used
+to do, and once with numpy. The results are checked to be the same, and the
+time of each is printed.
+
+Run from the framework directory, with it on the python path.
+
+Usage:
+    python3 tests/benchmarks/audio_peak_detection_benchmark.py \
+        [--minutes M] [--rate HZ] [--channels N]
+"""
+
+import argparse
+import sys
+import time
+
+import numpy
+
+from acts.test_utils.audio_analysis_lib import audio_analysis
+from tests.audio_analysis_unittest import legacy_peak_detection
+from tests.audio_analysis_unittest import multi_tone_spectrum
+
+DEFAULT_MINUTES = 10
+DEFAULT_RATE = 48000
+DEFAULT_CHANNELS = 2
+TONES = [(60, 0.3), (440, 1), (1000, 0.5), (2000, 0.4), (15000, 0.2)]
+
+
+def legacy_threshold(spectrum):
+    """The coefficient by coefficient thresholding of spectral_analysis."""
+    abs_y_f = spectrum.copy()
+    threshold = max(abs_y_f) * audio_analysis.DEFAULT_MIN_PEAK_RATIO
+    for i in range(len(abs_y_f)):
+        if abs_y_f[i] < threshold:
+            abs_y_f[i] = 0
+    return abs_y_f
+
+
+def numpy_threshold(spectrum):
+    abs_y_f = spectrum.copy()
+    threshold = abs_y_f.max() * audio_analysis.DEFAULT_MIN_PEAK_RATIO
+    abs_y_f[abs_y_f < threshold] = 0
+    return abs_y_f
+
+
+def time_peaks(label, threshold, detect, spectrum, window_size):
+    start = time.time()
+    peaks = detect(threshold(spectrum), window_size)
+    elapsed = time.time() - start
+    print('%-8s %4d peaks %9.3fs' % (label, len(peaks), elapsed))
+    return peaks, elapsed
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--minutes', type=float, default=DEFAULT_MINUTES)
+    parser.add_argument('--rate', type=int, default=DEFAULT_RATE)
+    parser.add_argument('--channels', type=int, default=DEFAULT_CHANNELS)
+    args = parser.parse_args(argv)
+    numpy.random.seed(0)
+    total_legacy = total_numpy = 0
+    for channel in range(args.channels):
+        # The thresholding is part of the measurement, the spectrum is
+        # computed unthresholded.
+        spectrum, window_size = multi_tone_spectrum(
+            args.rate, args.minutes * 60, TONES[channel:] + TONES[:channel],
+            min_peak_ratio=0)
+        print('channel %d: %d coefficients, window of %d' %
+              (channel, len(spectrum), window_size))
+        legacy, legacy_time = time_peaks('legacy', legacy_threshold,
+                                         legacy_peak_detection, spectrum,
+                                         window_size)
+        vectorized, numpy_time = time_peaks(
+            'numpy', numpy_threshold, audio_analysis.peak_detection,
+            spectrum, window_size)
+        if legacy != vectorized:
+            print('The peaks differ.')
+            return 1
+        total_legacy += legacy_time
+        total_numpy += numpy_time
+    print('speedup %.0fx' % (total_legacy / total_numpy))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Measures the per-line timestamp filtering done by cat_adb_log.
+
+Synthetic logcat lines are filtered against a time window, once with the
+string comparator on every line (the former cat_adb_log behavior) and once
+with integer keys computed once per line.
+
+Usage:
+    python3 logline_timestamp_benchmark.py [num_lines]
+"""
+
+import sys
+import time
+
+from acts import logger
+
+DEFAULT_NUM_LINES = 10000000
+BEGIN_TIME = 1469134262116
+
+
+def _make_stamp(epoch_time):
+    # epoch_to_log_line_timestamp does not zero-pad the milliseconds.
+    stamp = logger.epoch_to_log_line_timestamp(epoch_time - epoch_time % 1000)
+    return "%s%03d" % (stamp[:-1], epoch_time % 1000)
+
+
+def _make_lines(num_lines):
+    for i in range(num_lines):
+        stamp = _make_stamp(BEGIN_TIME + i)
+        yield "%s  1234  5678 I tag: line %s\n" % (stamp, i)
+
+
+def _legacy_comparator(t1, t2):
+    """The tuple-of-strings comparator cat_adb_log used to call per line."""
+    dt1 = logger._parse_logline_timestamp(t1)
+    dt2 = logger._parse_logline_timestamp(t2)
+    for u1, u2 in zip(dt1, dt2):
+        if u1 < u2:
+            return -1
+        elif u1 > u2:
+            return 1
+    return 0
+
+
+def _filter_with_comparator(lines, begin, end):
+    count = 0
+    for line in lines:
+        line_time = line[:logger.log_line_timestamp_len]
+        if not logger.is_valid_logline_timestamp(line_time):
+            continue
+        if (_legacy_comparator(begin, line_time) <= 0 and
+                _legacy_comparator(end, line_time) >= 0):
+            count += 1
+    return count
+
+
+def _filter_with_int_keys(lines, begin, end):
+    begin_key = logger.logline_timestamp_to_int(begin)
+    end_key = logger.logline_timestamp_to_int(end)
+    count = 0
+    for line in lines:
+        line_time = line[:logger.log_line_timestamp_len]
+        if not logger.is_valid_logline_timestamp(line_time):
+            continue
+        if begin_key <= logger.logline_timestamp_to_int(line_time) <= end_key:
+            count += 1
+    return count
+
+
+def measure(filter_func, num_lines):
+    begin = _make_stamp(BEGIN_TIME + num_lines // 4)
+    end = _make_stamp(BEGIN_TIME + num_lines // 2)
+    start = time.time()
+    count = filter_func(_make_lines(num_lines), begin, end)
+    return count, time.time() - start
+
+
+def main(argv):
+    num_lines = int(argv[0]) if argv else DEFAULT_NUM_LINES
+    _, generate_time = measure(lambda lines, b, e: sum(1 for _ in lines),
+                               num_lines)
+    count_before, before = measure(_filter_with_comparator, num_lines)
+    count_after, after = measure(_filter_with_int_keys, num_lines)
+    assert count_before == count_after, (count_before, count_after)
+    # Report only the filtering, not the generation of the lines.
+    before -= generate_time
+    after -= generate_time
+    print("lines:               %10d (%d in range)" % (num_lines, count_after))
+    print("string comparator:   %10.0f lines/s" % (num_lines / before))
+    print("integer keys:        %10.0f lines/s" % (num_lines / after))
+    print("speedup:             %10.1fx" % (before / after))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
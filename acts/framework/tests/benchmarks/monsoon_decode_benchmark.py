@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Measures the throughput of decoding Monsoon data packets.
+
+A synthesized capture is replayed through a fake serial port, once with the
+sample by sample decoder that MonsoonProxy.CollectData used to be, once with
+the struct decoder (MonsoonProxy.use_numpy = False) and once with the numpy
+decoder. The throughput of each is printed in samples per second.
+
+Run from the framework directory, with it on the python path.
+
+Usage:
+    python3 tests/benchmarks/monsoon_decode_benchmark.py [--packets N]
+"""
+
+import argparse
+import logging
+import sys
+import time
+
+from acts.controllers import monsoon
+from tests.acts_monsoon_test import FakeSerial
+from tests.acts_monsoon_test import collect_all
+from tests.acts_monsoon_test import create_proxy
+from tests.acts_monsoon_test import legacy_collect_data
+from tests.acts_monsoon_test import record_capture
+
+DEFAULT_NUM_PACKETS = 200000
+
+
+def time_decoder(label, collect, capture, use_numpy=True):
+    proxy = create_proxy(FakeSerial(capture))
+    proxy.use_numpy = use_numpy
+    start = time.time()
+    samples, _ = collect_all(collect, proxy)
+    elapsed = time.time() - start
+    print("%-10s %9d samples %7.3fs %12.0f samples/s" %
+          (label, len(samples), elapsed, len(samples) / elapsed))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--packets", type=int, default=DEFAULT_NUM_PACKETS)
+    args = parser.parse_args(argv)
+    logging.disable(logging.WARNING)
+    capture = record_capture(seed=0, num_packets=args.packets)
+    time_decoder("legacy", legacy_collect_data, capture)
+    time_decoder("struct", monsoon.MonsoonProxy.CollectData, capture,
+                 use_numpy=False)
+    time_decoder("numpy", monsoon.MonsoonProxy.CollectData, capture)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
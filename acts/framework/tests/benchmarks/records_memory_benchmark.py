@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Measures the memory used by a large number of test records.
+
+Compares acts.records.TestResultRecord with a record laid out like the
+previous implementation (instance __dict__, eagerly formatted log timestamps
+and an additional_errors dict per record).
+
+Usage:
+    python3 records_memory_benchmark.py [num_records]
+"""
+
+import sys
+import time
+import tracemalloc
+
+from acts import logger
+from acts import records
+
+DEFAULT_NUM_RECORDS = 100000
+
+
+class DictTestResultRecord(object):
+    """A record with the attribute layout of the previous implementation."""
+
+    def __init__(self, t_name, t_class=None):
+        self.test_name = t_name
+        self.test_class = t_class
+        self.begin_time = None
+        self.end_time = None
+        self.log_begin_time = None
+        self.log_end_time = None
+        self.uid = None
+        self.result = None
+        self.extras = None
+        self.details = None
+        self.additional_errors = {}
+
+
+def make_extras(i):
+    """Extras similar to what the RvR and stress tests attach."""
+    return {
+        'throughput': 100.0 + i % 50,
+        'attenuation': i % 90,
+        'rssi': -40 - i % 30,
+    }
+
+
+def make_records(record_cls, num_records, begin_time):
+    result = records.TestResult()
+    for i in range(num_records):
+        # Build the class name at runtime, like TAG is, so it is not a
+        # shared constant.
+        record = record_cls('test_rvr_%s' % i, ''.join(['WifiRvr', 'Test']))
+        record.begin_time = begin_time + i
+        record.end_time = begin_time + i + 1
+        record.result = records.TestResultEnums.TEST_RESULT_PASS
+        record.details = None
+        record.extras = make_extras(i)
+        if record_cls is DictTestResultRecord:
+            record.log_begin_time = logger.epoch_to_log_line_timestamp(
+                record.begin_time)
+            record.log_end_time = logger.epoch_to_log_line_timestamp(
+                record.end_time)
+        result.add_record(record)
+    return result
+
+
+def measure(record_cls, num_records):
+    begin_time = 1500000000000
+    tracemalloc.start()
+    start = time.time()
+    result = make_records(record_cls, num_records, begin_time)
+    elapsed = time.time() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    start = time.time()
+    for _ in range(1000):
+        result.summary_dict()
+    summary_time = (time.time() - start) / 1000
+    return current, elapsed, summary_time
+
+
+def main(argv):
+    num_records = int(argv[0]) if argv else DEFAULT_NUM_RECORDS
+    print('Records: %s' % num_records)
+    for name, record_cls in (('previous layout', DictTestResultRecord),
+                             ('TestResultRecord', records.TestResultRecord)):
+        memory, elapsed, summary_time = measure(record_cls, num_records)
+        print('%-18s %8.1f MB %8.1f bytes/record  build %.2fs  '
+              'summary_dict %.1fus' % (name, memory / 1e6,
+                                       float(memory) / num_records, elapsed,
+                                       summary_time * 1e6))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
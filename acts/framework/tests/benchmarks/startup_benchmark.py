@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Checks that ACTS starts up within a time budget.
+
+Two startups are timed in fresh interpreters: "act.py --help", and importing
+a single test script. Each is run a few times and the fastest run is compared
+against its budget. When a budget is exceeded, the slowest imports reported
+by "python -X importtime" are printed and the exit code is 1, so this can be
+used as a presubmit check against heavy module-level imports.
+
+Usage:
+    python3 startup_benchmark.py [--help_budget SECONDS]
+        [--import_budget SECONDS] [--test_path PATH] [--test_module NAME]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+FRAMEWORK_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
+ACT_PATH = os.path.join(FRAMEWORK_DIR, "acts", "bin", "act.py")
+DEFAULT_TEST_PATH = os.path.join(FRAMEWORK_DIR, os.pardir, "tests", "google",
+                                 "wifi")
+DEFAULT_TEST_MODULE = "WifiManagerTest"
+DEFAULT_HELP_BUDGET = 2.0
+DEFAULT_IMPORT_BUDGET = 3.0
+NUM_RUNS = 3
+NUM_SLOWEST_IMPORTS = 10
+
+
+def _env(extra_path=None):
+    env = dict(os.environ)
+    paths = [FRAMEWORK_DIR]
+    if extra_path:
+        paths.append(extra_path)
+    if env.get("PYTHONPATH"):
+        paths.append(env["PYTHONPATH"])
+    env["PYTHONPATH"] = os.pathsep.join(paths)
+    return env
+
+
+def time_command(args, env):
+    """Returns the fastest wall time of NUM_RUNS runs of a command."""
+    best = None
+    for _ in range(NUM_RUNS):
+        start = time.time()
+        subprocess.check_call(
+            args,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def slowest_imports(args, env):
+    """Gets the slowest imports of a python command, by cumulative time.
+
+    Returns:
+        A list of (cumulative microseconds, module name) tuples.
+    """
+    proc = subprocess.run(
+        [args[0], "-X", "importtime"] + args[1:],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE)
+    imports = []
+    for line in proc.stderr.decode(errors="replace").splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            imports.append((int(fields[1]), fields[2].strip()))
+        except (IndexError, ValueError):
+            continue
+    return sorted(imports, reverse=True)[:NUM_SLOWEST_IMPORTS]
+
+
+def check(label, args, env, budget):
+    elapsed = time_command(args, env)
+    ok = elapsed <= budget
+    print("%-30s %7.3fs (budget %.3fs) %s" % (label, elapsed, budget,
+                                              "OK" if ok else "OVER BUDGET"))
+    if not ok:
+        for cumulative, name in slowest_imports(args, env):
+            print("    %8.3fs  %s" % (cumulative / 1e6, name))
+    return ok
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--help_budget", type=float,
+                        default=DEFAULT_HELP_BUDGET)
+    parser.add_argument("--import_budget", type=float,
+                        default=DEFAULT_IMPORT_BUDGET)
+    parser.add_argument("--test_path", default=DEFAULT_TEST_PATH)
+    parser.add_argument("--test_module", default=DEFAULT_TEST_MODULE)
+    args = parser.parse_args(argv)
+    ok = check("act.py --help", [sys.executable, ACT_PATH, "--help"], _env(),
+               args.help_budget)
+    ok = check("import %s" % args.test_module,
+               [sys.executable, "-c", "import %s" % args.test_module],
+               _env(os.path.abspath(args.test_path)),
+               args.import_budget) and ok
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
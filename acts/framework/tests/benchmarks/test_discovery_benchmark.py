@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Measures the time TestRunner takes to find one test class.
+
+Each measurement runs in a fresh interpreter so modules imported by a
+previous measurement do not make the next one look faster. Three setups are
+compared: importing every test script, lazy discovery with an empty index
+and lazy discovery with a warm index.
+
+Usage:
+    python3 test_discovery_benchmark.py [test path] [test class]
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+FRAMEWORK_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
+DEFAULT_TEST_PATH = os.path.join(FRAMEWORK_DIR, os.pardir, "tests", "google")
+DEFAULT_TEST_CLASS = "WifiManagerTest"
+
+_CHILD_SCRIPT = """
+import sys
+import time
+
+start = time.time()
+from acts import logger
+from acts import test_runner
+
+config = {
+    "testbed": {"name": "DiscoveryBenchmark"},
+    "logpath": sys.argv[1],
+    "testpaths": [sys.argv[2]],
+    "cli_args": None,
+    "lazy_test_discovery": sys.argv[4] == "lazy",
+    "test_index_path": sys.argv[5],
+}
+runner = test_runner.TestRunner(config, [(sys.argv[3], None)])
+classes = runner.import_test_modules(config["testpaths"])
+elapsed = time.time() - start
+runner.result_stream.close()
+logger.kill_test_logger(runner.log)
+print("%s %s" % (elapsed, int(sys.argv[3] in classes)))
+"""
+
+
+def measure(tmp_dir, test_path, test_class, mode, index_path):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [FRAMEWORK_DIR, env.get("PYTHONPATH", "")])
+    out = subprocess.check_output(
+        [
+            sys.executable, "-c", _CHILD_SCRIPT, tmp_dir, test_path,
+            test_class, mode, index_path
+        ],
+        env=env,
+        stderr=subprocess.DEVNULL)
+    elapsed, found = out.decode().split()[-2:]
+    return float(elapsed), found == "1"
+
+
+def main(argv):
+    test_path = os.path.abspath(argv[0] if argv else DEFAULT_TEST_PATH)
+    test_class = argv[1] if len(argv) > 1 else DEFAULT_TEST_CLASS
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        index_path = os.path.join(tmp_dir, "test_index.json")
+        runs = [("import all", "eager"), ("lazy, cold index", "lazy"),
+                ("lazy, warm index", "lazy")]
+        for label, mode in runs:
+            elapsed, found = measure(tmp_dir, test_path, test_class, mode,
+                                     index_path)
+            print("%-18s %8.3fs%s" % (label, elapsed, ""
+                                      if found else " (class not found)"))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
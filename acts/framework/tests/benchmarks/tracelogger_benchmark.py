@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Measures TraceLogger calls per second with both caller attribution modes.
+
+The logger is called from a few frames deep, like the telephony helpers do,
+and the underlying logger discards the messages so only the attribution cost
+is measured.
+
+Usage:
+    python3 tracelogger_benchmark.py [num_calls]
+"""
+
+import logging
+import sys
+import time
+
+from acts import tracelogger
+
+DEFAULT_NUM_CALLS = 20000
+
+
+def _nested_call(log, depth, num_calls):
+    if depth:
+        return _nested_call(log, depth - 1, num_calls)
+    for i in range(num_calls):
+        log.info("message %s", i)
+        log.debug("message %s", i)
+
+
+def measure(use_inspect, num_calls):
+    tracelogger.TraceLogger.use_inspect = use_inspect
+    null_logger = logging.getLogger("tracelogger_benchmark")
+    null_logger.addHandler(logging.NullHandler())
+    null_logger.propagate = False
+    log = tracelogger.TraceLogger(null_logger)
+    start = time.time()
+    _nested_call(log, 10, num_calls)
+    return 2 * num_calls / (time.time() - start)
+
+
+def main(argv):
+    num_calls = int(argv[0]) if argv else DEFAULT_NUM_CALLS
+    before = measure(True, num_calls)
+    after = measure(False, num_calls)
+    print("inspect.stack():  %10.0f calls/s" % before)
+    print("frame walk:       %10.0f calls/s" % after)
+    print("speedup:          %10.1fx" % (after / before))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import time
+import unittest
+
+import mock
+import numpy as np
+
+from acts.controllers import monsoon
+from acts.controllers.monsoon_lib import capture_group
+from acts.controllers.monsoon_lib import fake_serial
+
+HZ = 500
+
+
+def create_monsoon(fake):
+    with mock.patch("serial.Serial", return_value=fake):
+        return monsoon.Monsoon(serial=fake.serial_number, device=fake.name)
+
+
+class FakeMonsoonSerialTest(unittest.TestCase):
+    """Tests the fake_serial.FakeMonsoonSerial class."""
+
+    def setUp(self):
+        self.fake = fake_serial.FakeMonsoonSerial(
+            serial_number=7, current=lambda t: np.full(len(t), 1.5))
+        self.addCleanup(self.fake.close)
+        self.mon = create_monsoon(self.fake)
+
+    def test_status(self):
+        self.mon.mon.SetVoltage(3.7)
+        status = self.mon.status
+        self.assertEqual(status["serialNumber"], 7)
+        self.assertEqual(status["sampleRate"], 5)
+        self.assertAlmostEqual(self.mon.mon.GetVoltage(), 3.7)
+
+    def test_samples(self):
+        self.mon.mon.StartDataCollection()
+        samples = []
+        while len(samples) < 100:
+            samples.extend(self.mon.mon.CollectData())
+        self.mon.mon.StopDataCollection()
+        np.testing.assert_allclose(samples, 1.5)
+
+    def test_encode_currents(self):
+        amps = np.array([0, 0.01234, 0.3, 0.5, 4.2])
+        samples = fake_serial.encode_currents(amps)
+        proxy = self.mon.mon
+        proxy._fine_zero = proxy._coarse_zero = 0
+        proxy._fine_scale = 1e-5
+        proxy._coarse_scale = 1e-3
+        decoded = proxy._CalibrateSamples(samples.tobytes())
+        np.testing.assert_allclose(decoded, amps, atol=1e-3)
+        np.testing.assert_allclose(decoded[:3], amps[:3], atol=2e-5)
+
+
+class CaptureGroupTest(unittest.TestCase):
+    """Tests the capture_group.CaptureGroup class."""
+
+    def test_aligns_skewed_starts(self):
+        edge = time.monotonic() + 0.3
+
+        def current(t):
+            return np.where(t < edge, 0.1, 0.2)
+
+        # The start command of the second Monsoon is two writes of 10ms. The
+        # writes only bound the skew from below, how much later the second
+        # Monsoon starts depends on the load of the machine.
+        fakes = [
+            fake_serial.FakeMonsoonSerial(1, current=current),
+            fake_serial.FakeMonsoonSerial(
+                2, current=current, write_delay=0.01)
+        ]
+        for fake in fakes:
+            self.addCleanup(fake.close)
+        group = capture_group.CaptureGroup(
+            [create_monsoon(fake) for fake in fakes], HZ)
+        capture = group.capture(0.6)
+
+        self.assertGreaterEqual(capture.skew, 0.02)
+        self.assertEqual(capture.offsets[1], 0)
+        self.assertGreaterEqual(capture.offsets[0], 10)
+        self.assertEqual(capture.values.shape, (2, len(capture)))
+        edges = [int(np.argmax(row > 0.15)) for row in capture.values]
+        self.assertGreater(edges[1], 0)
+        self.assertLessEqual(abs(edges[0] - edges[1]), 1)
+
+    def test_estimate_start_time(self):
+        stream = mock.Mock(
+            hz=HZ,
+            start_time=10.0,
+            block_ends=np.array([200, 400]),
+            block_times=np.array([10.5, 10.9]))
+        self.assertEqual(capture_group.estimate_start_time(stream), 10.0)
+        stream.start_time = 10.3
+        self.assertAlmostEqual(capture_group.estimate_start_time(stream), 10.1)
+
+    def test_stop_stops_every_stream(self):
+        group = capture_group.CaptureGroup([mock.Mock(), mock.Mock()], HZ)
+        group.streams = [mock.Mock(), mock.Mock()]
+        group.streams[0].stop.side_effect = monsoon.MonsoonError("Broken.")
+        with self.assertRaises(monsoon.MonsoonError):
+            group.stop()
+        group.streams[1].stop.assert_called_once_with()
+
+    def test_failed_start_stops_started_streams(self):
+        group = capture_group.CaptureGroup([mock.Mock()] * 3, HZ)
+        group.streams = [mock.Mock() for _ in range(3)]
+        group.streams[1].start.side_effect = monsoon.MonsoonError("Broken.")
+        with self.assertRaises(monsoon.MonsoonError):
+            group.start()
+        group.streams[0].stop.assert_called_once_with()
+        group.streams[1].stop.assert_not_called()
+        group.streams[2].start.assert_not_called()
+
+    def test_no_monsoons(self):
+        with self.assertRaises(monsoon.MonsoonError):
+            capture_group.CaptureGroup([], HZ)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import math
+import unittest
+
+import numpy as np
+
+from acts.controllers.monsoon_lib import convergence
+
+HZ = 500
+
+
+def idle_trace(rand, seconds, mean=0.01):
+    """An idle device: noise, and a wakeup every 300ms at a random phase."""
+    values = mean + rand.randn(seconds * HZ) * 0.001
+    first = rand.randint(150)
+    for start in range(first, len(values), 150):
+        values[start:start + 5] += 0.1
+    return values
+
+
+class ConvergenceTest(unittest.TestCase):
+    """Tests the convergence module."""
+
+    def test_t_quantile(self):
+        # Quantiles of the exact distributions.
+        self.assertAlmostEqual(
+            convergence.normal_quantile(0.975), 1.959964, places=6)
+        for p, df, exact in ((0.975, 5, 2.570582), (0.975, 19, 2.093024),
+                             (0.95, 30, 1.697261), (0.995, 10, 3.169273)):
+            self.assertAlmostEqual(
+                convergence.t_quantile(p, df), exact, delta=exact * 0.005)
+
+    def test_batch_means_in_chunks(self):
+        values = np.random.RandomState(0).rand(1050)
+        stats = convergence.BatchMeans(100)
+        for chunk in np.array_split(values, 37):
+            stats.feed(chunk)
+
+        self.assertEqual(stats.count, 1050)
+        self.assertEqual(stats.num_batches, 10)
+        self.assertAlmostEqual(stats.mean, values.mean())
+        means = values[:1000].reshape(10, 100).mean(axis=1)
+        expected = (convergence.t_quantile(0.975, 9) * means.std(ddof=1) /
+                    math.sqrt(10))
+        self.assertAlmostEqual(stats.half_width, expected)
+
+    def test_batch_means_without_batches(self):
+        stats = convergence.BatchMeans(100)
+        stats.feed(np.ones(150))
+        self.assertEqual(stats.half_width, math.inf)
+
+    def test_interval_coverage(self):
+        rand = np.random.RandomState(0)
+        covered = 0
+        trials = 200
+        for _ in range(trials):
+            stats = convergence.BatchMeans(HZ)
+            stats.feed(idle_trace(rand, 30))
+            # The mean of the trace is 0.01 + 0.1 * 5 / 150.
+            true_mean = 0.01 + 0.1 / 30
+            covered += abs(stats.mean - true_mean) <= stats.half_width
+        self.assertGreater(covered / trials, 0.9)
+
+    def test_monitor_stops_at_precision(self):
+        rand = np.random.RandomState(1)
+        monitor = convergence.ConvergenceMonitor(HZ, precision=0.01)
+        values = idle_trace(rand, 600)
+        stop = None
+        for i in range(0, len(values), 100):
+            if monitor(values[i:i + 100]):
+                stop = i + 100
+                break
+
+        self.assertIsNotNone(stop)
+        self.assertGreaterEqual(stop, convergence.DEFAULT_MIN_BATCHES * HZ)
+        self.assertLess(stop, len(values))
+        summary = monitor.summary()
+        self.assertTrue(summary['converged'])
+        self.assertLessEqual(summary['relative_half_width'], 0.01)
+        self.assertEqual(summary['duration'], stop / HZ)
+        self.assertAlmostEqual(summary['mean_current'],
+                               values[:stop].mean() * 1000, places=5)
+
+    def test_monitor_absolute_precision(self):
+        monitor = convergence.ConvergenceMonitor(
+            HZ, precision=0.01, min_batches=2, absolute_precision=0.001)
+        rand = np.random.RandomState(2)
+        self.assertFalse(monitor(rand.randn(HZ) * 0.0001))
+        self.assertTrue(monitor(rand.randn(HZ) * 0.0001))
+
+
+if __name__ == '__main__':
+    unittest.main()
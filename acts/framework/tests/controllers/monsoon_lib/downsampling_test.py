@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from acts.controllers.monsoon_lib import downsampling
+
+
+def reference_lttb(values, num_points):
+    """A sample by sample Largest-Triangle-Three-Buckets."""
+    n = len(values)
+    every = (n - 2) / (num_points - 2)
+    edges = [1 + int(b * every) for b in range(num_points - 2)] + [n - 1]
+    selected = [0]
+    for b in range(num_points - 2):
+        if b + 1 < num_points - 2:
+            next_bucket = range(edges[b + 1], edges[b + 2])
+            next_x = sum(next_bucket) / len(next_bucket)
+            next_y = sum(values[i] for i in next_bucket) / len(next_bucket)
+        else:
+            next_x, next_y = n - 1, values[-1]
+        a = selected[-1]
+        best, best_area = None, -1
+        for i in range(edges[b], edges[b + 1]):
+            area = abs((a - next_x) * (values[i] - values[a]) -
+                       (a - i) * (next_y - values[a]))
+            if area > best_area:
+                best, best_area = i, area
+        selected.append(best)
+    return selected + [n - 1]
+
+
+def read_tile(path):
+    with open(path) as f:
+        line = f.read().splitlines()[1]
+    return json.loads(line[line.index('= ') + 2:-1])
+
+
+class DownsamplingTest(unittest.TestCase):
+    """Tests the downsampling module."""
+
+    def setUp(self):
+        self.values = np.random.RandomState(0).rand(10000)
+
+    def test_min_max_keeps_the_extremes_of_each_bucket(self):
+        trace = downsampling.min_max(self.values, 100)
+        self.assertLessEqual(len(trace.indices), 100)
+        self.assertTrue(np.all(np.diff(trace.indices) > 0))
+        buckets = self.values.reshape(50, 200)
+        kept = set(trace.indices.tolist())
+        for b, bucket in enumerate(buckets):
+            self.assertIn(b * 200 + int(bucket.argmin()), kept)
+            self.assertIn(b * 200 + int(bucket.argmax()), kept)
+        self.assertAlmostEqual(trace.means.mean(), self.values.mean())
+
+    def test_lttb_matches_reference(self):
+        trace = downsampling.lttb(self.values, 300)
+        self.assertEqual(trace.indices.tolist(),
+                         reference_lttb(self.values.tolist(), 300))
+        self.assertEqual(len(trace.means), 300)
+
+    def test_downsample_within_budget_keeps_every_sample(self):
+        for method in downsampling.METHODS:
+            trace = downsampling.downsample(self.values[:50], 100, method)
+            self.assertEqual(trace.indices.tolist(), list(range(50)))
+            np.testing.assert_array_equal(trace.means, self.values[:50])
+
+    def test_downsample_unknown_method(self):
+        with self.assertRaises(ValueError):
+            downsampling.downsample(self.values, 100, 'average')
+
+    def test_write_tiles(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        tile_dir = os.path.join(tmp_dir, 'plot_tiles')
+        index = downsampling.write_tiles(
+            self.values, 1000, tile_dir, 200, scale=1000)
+
+        self.assertEqual(index['spans'], [1250, 157])
+        self.assertEqual(index['counts'], [8, 64])
+        with open(os.path.join(tile_dir, 'index.json')) as f:
+            self.assertEqual(json.load(f), index)
+        tile = read_tile(os.path.join(tile_dir, '1_2.js'))
+        self.assertEqual(len(tile['x0']), len(tile['y0']))
+        self.assertLessEqual(len(tile['y0']), 200)
+        self.assertGreaterEqual(min(tile['x0']), 2.5)
+        self.assertAlmostEqual(
+            max(tile['y0']), self.values[2500:3750].max() * 1000, places=3)
+        # The finest level holds every sample.
+        tile = read_tile(os.path.join(tile_dir, '2_63.js'))
+        self.assertEqual(tile['start'], 9.891)
+        np.testing.assert_allclose(
+            tile['y0'], self.values[9891:] * 1000, atol=1e-4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import datetime
+import unittest
+
+import numpy as np
+
+from acts import profiler
+from acts.controllers import monsoon
+from acts.controllers.monsoon_lib import energy
+
+HZ = 100
+VOLTAGE = 4.0
+
+
+def create_data(values, first_timestamp=1000):
+    return monsoon.MonsoonData(values,
+                               np.full(len(values), first_timestamp), HZ,
+                               VOLTAGE)
+
+
+def create_span(name, begin, end, children=()):
+    span = profiler.Span(name)
+    span.begin = begin
+    span.end = end
+    span.children = list(children)
+    return span
+
+
+class EnergyTest(unittest.TestCase):
+    """Tests the energy module."""
+
+    def test_phases_from_markers(self):
+        phases = energy.phases_from_markers([('b', 2.0), ('a', 1.0),
+                                             ('c', 3.5)])
+        self.assertEqual(phases, [
+            energy.Phase('a', 1.0, 2.0),
+            energy.Phase('b', 2.0, 3.5),
+            energy.Phase('c', 3.5, float('inf'))
+        ])
+
+    def test_phases_from_spans(self):
+        root = create_span('test', 0, 10, [
+            create_span('scan', 1, 3, [create_span('adb shell', 1.5, 2)]),
+            create_span('running', 4, None)
+        ])
+        self.assertEqual(
+            energy.phases_from_spans(root), [
+                energy.Phase('scan', 1, 3),
+                energy.Phase('scan/adb shell', 1.5, 2)
+            ])
+
+    def test_markers_from_logcat(self):
+        lines = [
+            '07-21 13:51:02.116  1234  1250 I WifiScanner: scan started',
+            '07-21 13:51:03.500  1234  1250 I WifiScanner: scan done',
+            '--------- beginning of main',
+            '07-21 13:51:04.000  1234  1250 D Other: scan started elsewhere',
+        ]
+        markers = energy.markers_from_logcat(
+            lines, {
+                'scan': r'WifiScanner: scan started',
+                'idle': r'WifiScanner: scan done'
+            },
+            year=2018)
+        start = datetime.datetime(2018, 7, 21, 13, 51, 2, 116000)
+        self.assertEqual([name for name, _ in markers], ['scan', 'idle'])
+        self.assertAlmostEqual(markers[0][1], start.timestamp())
+        self.assertAlmostEqual(
+            markers[1][1] - markers[0][1], 1.384, places=5)
+
+    def test_phase_stats(self):
+        values = np.random.RandomState(0).rand(1000)
+        data = create_data(values)
+        # Overlapping, out of range and empty phases.
+        phases = [
+            energy.Phase('a', 1000.5, 1003),
+            energy.Phase('b', 1002, 1007.25),
+            energy.Phase('c', 1001, 1001.004),
+            energy.Phase('d', 1009, 1020),
+            energy.Phase('e', 990, 995),
+        ]
+        stats = energy.phase_stats(data, phases)
+
+        self.assertEqual([s.name for s in stats], ['a', 'b', 'd'])
+        for s, (start, end) in zip(stats, [(50, 300), (200, 725),
+                                            (900, 1000)]):
+            phase = values[start:end]
+            self.assertAlmostEqual(s.start, 1000 + start / HZ)
+            self.assertAlmostEqual(s.duration, (end - start) / HZ)
+            charge = phase.sum() / HZ * 1000 / 3600
+            self.assertAlmostEqual(s.charge, charge)
+            self.assertAlmostEqual(s.energy, charge * VOLTAGE)
+            self.assertAlmostEqual(s.average_current, phase.mean() * 1000)
+            self.assertAlmostEqual(s.peak_current, phase.max() * 1000)
+            self.assertAlmostEqual(s.peak_time,
+                                   1000 + (start + phase.argmax()) / HZ)
+
+    def test_phase_stats_start_time(self):
+        data = create_data(np.arange(10, dtype=np.float64))
+        stats = energy.phase_stats(
+            data, [energy.Phase('a', 5.02, 5.05)], start_time=5.0)
+        self.assertEqual(stats[0].peak_current, 4000)
+
+    def test_detect_bursts(self):
+        values = np.full(1000, 0.005)
+        values[100:110] = 0.1
+        values[400:402] = 0.2
+        values[404:410] = 0.1
+        values[700:701] = 0.3
+        data = create_data(values, first_timestamp=0)
+
+        bursts = energy.detect_bursts(data, merge_gap=0.02, min_duration=0.02)
+        self.assertEqual([(b.start, b.duration) for b in bursts],
+                         [(1.0, 0.1), (4.0, 0.1)])
+        self.assertTrue(
+            all(b.name == energy.BURST_PHASE_NAME for b in bursts))
+        self.assertAlmostEqual(bursts[1].peak_current, 200)
+        self.assertAlmostEqual(bursts[1].average_current,
+                               values[400:410].mean() * 1000)
+
+        bursts = energy.detect_bursts(data)
+        self.assertEqual([b.start for b in bursts], [1.0, 4.0, 4.04, 7.0])
+
+    def test_burst_threshold(self):
+        values = 0.005 + np.random.RandomState(0).randn(10000) * 0.0001
+        data = create_data(values)
+        self.assertAlmostEqual(
+            energy.burst_threshold(data), 0.005 + energy.MIN_BURST_RISE,
+            places=4)
+        values[::100] = 0.1
+        self.assertEqual(len(energy.detect_bursts(create_data(values))), 100)
+
+    def test_summarize_bursts(self):
+        bursts = [
+            energy.PhaseStats('burst', start, 0.01, 0.001, 0.004, 100, 150,
+                              start) for start in (0.1, 0.4, 0.7, 1.1)
+        ]
+        summary = energy.summarize_bursts(bursts, 2.0)
+        self.assertEqual(summary['count'], 4)
+        self.assertEqual(summary['rate'], 2.0)
+        self.assertAlmostEqual(summary['period'], 0.3)
+        self.assertAlmostEqual(summary['charge'], 0.004)
+        self.assertAlmostEqual(summary['duty_cycle'], 0.02)
+        self.assertIsNone(energy.summarize_bursts(bursts[:1], 2.0)['period'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import json
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import mock
+import numpy as np
+
+from acts.controllers import monsoon
+from acts.controllers.monsoon_lib import streaming
+
+NATIVE_HZ = 5000
+
+
+class FakeProxy(object):
+    """A MonsoonProxy whose samples are put in a queue by the test.
+
+    An exception in the queue is raised by CollectData, and an empty list
+    ends the acquisition.
+    """
+
+    def __init__(self):
+        self.ser = mock.Mock()
+        self.batches = queue.Queue()
+        self.collecting = False
+
+    def GetVoltage(self):
+        return 4.2
+
+    def GetStatus(self):
+        return {"sampleRate": NATIVE_HZ // 1000}
+
+    def StartDataCollection(self):
+        self.collecting = True
+
+    def StopDataCollection(self):
+        self.collecting = False
+
+    def CollectData(self):
+        batch = self.batches.get(timeout=10)
+        if isinstance(batch, Exception):
+            raise batch
+        return batch
+
+
+class MonsoonStreamTest(unittest.TestCase):
+    """Tests the streaming.MonsoonStream class."""
+
+    def setUp(self):
+        self.proxy = FakeProxy()
+        with mock.patch.object(
+                monsoon, "MonsoonProxy", return_value=self.proxy):
+            self.mon = monsoon.Monsoon(serial=1)
+        self.stream = streaming.MonsoonStream(self.mon, NATIVE_HZ)
+
+    def feed(self, values):
+        """Feeds samples and waits until the stream decoded them."""
+        expected = self.stream.sample_count + len(values)
+        self.proxy.batches.put(list(values))
+        deadline = time.time() + 10
+        while self.stream.sample_count < expected:
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.001)
+
+    def finish(self):
+        self.proxy.batches.put([])
+        return self.stream.stop()
+
+    def test_running_average_by_phase(self):
+        average = self.stream.subscribe(streaming.RunningAverage())
+        self.stream.start()
+        self.assertTrue(self.proxy.collecting)
+        self.feed([0.1] * 100)
+        self.stream.mark("screen_on")
+        self.feed([0.3] * 50)
+        self.feed([0.5] * 50)
+        self.stream.mark("screen_off")
+        self.feed([0.2] * 300)
+        data = self.finish()
+
+        self.assertFalse(self.proxy.collecting)
+        self.assertEqual(len(data), 500)
+        self.assertEqual([m.index for m in self.stream.marks], [100, 200])
+        self.assertEqual(
+            list(average.phase_averages.keys()),
+            [None, "screen_on", "screen_off"])
+        self.assertAlmostEqual(average.phase_averages[None], 0.1)
+        self.assertAlmostEqual(average.phase_averages["screen_on"], 0.4)
+        self.assertAlmostEqual(average.phase_averages["screen_off"], 0.2)
+        self.assertAlmostEqual(average.average * 1000, data.average_current)
+
+    def test_rolling_average(self):
+        rolling = self.stream.subscribe(
+            streaming.RollingAverage(3, keep_record=True))
+        self.stream.start()
+        self.feed([0.1, 0.2])
+        self.feed([0.3, 0.7])
+        data = self.finish()
+
+        self.assertAlmostEqual(rolling.latest, 0.4)
+        np.testing.assert_allclose(rolling.get_record(),
+                                   data.get_average_record(3))
+
+    def test_threshold_trigger(self):
+        callback = mock.Mock()
+        trigger = self.stream.subscribe(
+            streaming.ThresholdTrigger(0.5, callback))
+        falling = self.stream.subscribe(
+            streaming.ThresholdTrigger(0.5, falling=True))
+        self.stream.start()
+        self.feed([0.1, 0.2, 0.9, 0.8])
+        self.assertTrue(trigger.triggered.wait(10))
+        self.feed([0.7, 0.1, 0.6])
+        self.finish()
+
+        self.assertEqual(trigger.crossings, [2, 6])
+        callback.assert_has_calls([mock.call(2, 0.9), mock.call(6, 0.6)])
+        self.assertEqual(falling.crossings, [0, 5])
+
+    def test_sample_file_writer(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, "samples.bin")
+        writer = self.stream.subscribe(streaming.SampleFileWriter(path))
+        self.stream.start()
+        values = np.random.RandomState(0).rand(1000)
+        self.feed(values[:600])
+        self.stream.mark("phase")
+        self.feed(values[600:])
+        self.finish()
+
+        np.testing.assert_allclose(
+            np.fromfile(path, writer.DTYPE), values, rtol=1e-6)
+        with open(writer.metadata_path) as f:
+            metadata = json.load(f)
+        self.assertEqual(metadata["hz"], NATIVE_HZ)
+        self.assertEqual(metadata["samples"], 1000)
+        self.assertEqual([(m["name"], m["index"]) for m in metadata["marks"]],
+                         [("phase", 600)])
+
+    def test_full_queue_drops_samples_for_consumers_only(self):
+        release = threading.Event()
+
+        class SlowConsumer(streaming.StreamConsumer):
+            def __init__(self):
+                self.count = 0
+
+            def on_samples(self, batch):
+                release.wait(10)
+                self.count += len(batch.values)
+
+        logging.disable(logging.WARNING)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        self.stream = streaming.MonsoonStream(self.mon, NATIVE_HZ, 1)
+        consumer = self.stream.subscribe(SlowConsumer())
+        self.stream.start()
+        for _ in range(5):
+            self.feed([0.1] * 10)
+        release.set()
+        data = self.finish()
+
+        self.assertEqual(len(data), 50)
+        self.assertGreater(self.stream.dropped_samples, 0)
+        self.assertEqual(consumer.count + self.stream.dropped_samples, 50)
+
+    def test_acquisition_error_keeps_collected_samples(self):
+        self.stream.start()
+        self.feed([0.1] * 10)
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        self.proxy.batches.put(monsoon.MonsoonError("timed out"))
+        self.stream._acquisition_thread.join(10)
+        self.assertFalse(self.stream.is_running)
+        data = self.stream.stop()
+
+        self.assertIsInstance(self.stream.error, monsoon.MonsoonError)
+        self.assertEqual(len(data), 10)
+
+    def test_subscribe_after_start(self):
+        self.stream.start()
+        with self.assertRaises(monsoon.MonsoonError):
+            self.stream.subscribe(streaming.RunningAverage())
+        self.finish()
+
+
+if __name__ == "__main__":
+    unittest.main()